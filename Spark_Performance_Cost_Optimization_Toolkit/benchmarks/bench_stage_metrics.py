@@ -0,0 +1,59 @@
+"""Benchmark: vectorized build_stage_metrics vs the previous dict-of-lists implementation.
+
+    python -m benchmarks.bench_stage_metrics --tasks 1000000 --stages 10000
+"""
+from __future__ import annotations
+import argparse, time
+from typing import List
+import numpy as np
+from spark_opt.eventlog_reader import StageCompleted, TaskEnd, TaskTable, TASK_COLUMNS
+from spark_opt.metrics import build_stage_metrics, _percentile
+
+def legacy_build_stage_metrics(stages: List[StageCompleted], tasks: List[TaskEnd]):
+    by = {}
+    for t in tasks:
+        by.setdefault((t.stage_id, t.attempt), []).append(t)
+    out = []
+    for s in stages:
+        ts = by.get((s.stage_id, s.attempt), [])
+        durations = [int(t.duration_ms) for t in ts]
+        out.append((
+            _percentile(durations, 50), _percentile(durations, 95), int(max(durations) if durations else 0),
+            sum(int(t.gc_time_ms) for t in ts), sum(int(t.duration_ms) for t in ts) or 1,
+            sum(int(t.shuffle_read_bytes) for t in ts), sum(int(t.shuffle_write_bytes) for t in ts),
+            sum(int(t.spill_mem_bytes) for t in ts) + sum(int(t.spill_disk_bytes) for t in ts),
+        ))
+    return out
+
+def synthetic(n_tasks: int, n_stages: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    cols = {name: rng.integers(0, 1 << 20, size=n_tasks) for name, _ in TASK_COLUMNS}
+    cols["stage_id"] = rng.integers(0, n_stages, size=n_tasks).astype(np.int32)
+    cols["attempt"] = np.zeros(n_tasks, dtype=np.int32)
+    cols["duration_ms"] = rng.lognormal(6, 1.2, size=n_tasks).astype(np.int64)
+    stages = [StageCompleted(i, 0, f"stage {i}", 0, 0, 1000) for i in range(n_stages)]
+    return stages, TaskTable(cols)
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--tasks", type=int, default=1_000_000)
+    p.add_argument("--stages", type=int, default=10_000)
+    p.add_argument("--skip-legacy", action="store_true")
+    args = p.parse_args()
+
+    stages, table = synthetic(args.tasks, args.stages)
+    t0 = time.perf_counter()
+    build_stage_metrics(stages, table)
+    vec = time.perf_counter() - t0
+    print(f"vectorized: {vec:.3f}s  ({args.tasks / vec:,.0f} tasks/s)")
+
+    if not args.skip_legacy:
+        records = list(table)
+        t0 = time.perf_counter()
+        legacy_build_stage_metrics(stages, records)
+        leg = time.perf_counter() - t0
+        print(f"legacy:     {leg:.3f}s  ({args.tasks / leg:,.0f} tasks/s)")
+        print(f"speedup:    {leg / vec:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""Throughput + peak-RSS benchmark suite over synthetic event logs, with stored baselines.
+
+    python -m benchmarks.bench_suite                                  # 1k,100k; compare to baselines.json
+    python -m benchmarks.bench_suite --scenarios 1k,100k,1m --check   # exit 1 on a regression
+    python -m benchmarks.bench_suite --scenarios 1k,100k --save-baseline
+
+Phases (timed separately, each on the previous phase's output): parse -> metrics -> timeline ->
+detectors -> report. Throughput is tasks/s for every phase (plus MB/s for parse); peak RSS is the
+process high-water mark during the phase, reset before it where the OS allows (Linux clear_refs).
+"""
+from __future__ import annotations
+import argparse, json, os, platform, sys, tempfile, time
+from dataclasses import asdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from spark_opt.config import SparkConf
+from spark_opt.detectors import detect_all
+from spark_opt.eventlog_reader import parse_eventlog
+from spark_opt.metrics import build_stage_metrics
+from spark_opt.profiling import reset_peak_rss, rss_mb
+from spark_opt.recommendations import recommend
+from spark_opt.report import render_markdown_report
+from spark_opt.synth import SynthSpec, generate_eventlog
+from spark_opt.timeline import build_timeline
+
+SCENARIOS = {
+    "1k": SynthSpec(tasks=1_000, stages=10),
+    "100k": SynthSpec(tasks=100_000, stages=100),
+    "1m": SynthSpec(tasks=1_000_000, stages=400),
+    "10m": SynthSpec(tasks=10_000_000, stages=2_000, executors=64),
+}
+PHASES = ("parse", "metrics", "timeline", "detectors", "report")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+SAMPLE_MIN_S = 0.02
+RSS_SLACK_MB = 32.0  # allocator noise; RSS growth below this never counts as a regression
+
+def measure(fn: Callable[[], Any], repeat: int = 3, min_time: float = 1.0) -> Tuple[Any, Dict[str, float]]:
+    """Best-of-`repeat` wall time (stopping early once `min_time` has been spent) and peak RSS of `fn`.
+
+    Calls faster than SAMPLE_MIN_S are batched into samples of several calls, like timeit's autorange.
+    """
+    reset_peak_rss()
+    start_rss = rss_mb("VmRSS")
+    t0 = time.perf_counter()
+    out = fn()
+    best = spent = time.perf_counter() - t0
+    runs, per_sample = 1, min(1000, max(1, int(SAMPLE_MIN_S / max(best, 1e-9))))
+    while runs < max(1, repeat) and spent < min_time:
+        t0 = time.perf_counter()
+        for _ in range(per_sample):
+            out = fn()
+        dt = time.perf_counter() - t0
+        best, spent, runs = min(best, dt / per_sample), spent + dt, runs + 1
+    peak = rss_mb("VmHWM")
+    return out, {"seconds": best, "runs": runs, "peak_rss_mb": round(peak, 1), "rss_delta_mb": round(max(0.0, peak - start_rss), 1)}
+
+def run_scenario(path: str, info: Dict[str, Any], repeat: int = 3, min_time: float = 1.0) -> Dict[str, Dict[str, float]]:
+    conf = SparkConf(conf={})
+    spec = info["spec"]
+    cores_total = spec["executors"] * spec["cores_per_executor"]
+    phases: Dict[str, Dict[str, float]] = {}
+
+    (stages, tasks, meta), phases["parse"] = measure(lambda: parse_eventlog(path), repeat, min_time)
+    (df, stage_objs), phases["metrics"] = measure(lambda: build_stage_metrics(stages, tasks), repeat, min_time)
+    timeline, phases["timeline"] = measure(lambda: build_timeline(stages, tasks, meta), repeat, min_time)
+    findings, phases["detectors"] = measure(
+        lambda: detect_all(stage_objs, conf, cores_total=cores_total, timeline=timeline, tasks=tasks, meta=meta), repeat, min_time)
+    _, phases["report"] = measure(
+        lambda: render_markdown_report(path, meta, df, timeline, findings, recommend(findings, conf)), repeat, min_time)
+
+    for name, ph in phases.items():
+        ph["tasks_per_s"] = round(len(tasks) / ph["seconds"], 1) if ph["seconds"] else 0.0
+        ph["seconds"] = round(ph["seconds"], 6)
+    phases["parse"]["mb_per_s"] = round(info["bytes"] / (1024 * 1024) / phases["parse"]["seconds"], 2)
+    return phases
+
+def _machine() -> Dict[str, Any]:
+    return {"python": platform.python_version(), "platform": platform.platform(), "machine": platform.machine(),
+            "cpu_count": os.cpu_count()}
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.25,
+            rss_tolerance: float = 0.25) -> List[str]:
+    """Regressions of `current` vs `baseline` (same layout as baselines.json "scenarios")."""
+    problems = []
+    for name, cur in current.items():
+        base = baseline.get(name)
+        if base is None or base.get("spec") != cur["spec"]:
+            continue  # no comparable baseline for this scenario
+        for phase, ph in cur["phases"].items():
+            b = base["phases"].get(phase)
+            if b is None:
+                continue
+            if ph["tasks_per_s"] < b["tasks_per_s"] * (1 - tolerance):
+                problems.append(f"{name}/{phase}: throughput {ph['tasks_per_s']:,.0f} tasks/s is "
+                                f"{1 - ph['tasks_per_s'] / b['tasks_per_s']:.0%} below baseline {b['tasks_per_s']:,.0f}")
+            limit = b["rss_delta_mb"] * (1 + rss_tolerance) + RSS_SLACK_MB
+            if ph["rss_delta_mb"] > limit:
+                problems.append(f"{name}/{phase}: peak RSS growth {ph['rss_delta_mb']:.0f} MB exceeds "
+                                f"baseline {b['rss_delta_mb']:.0f} MB (+{rss_tolerance:.0%} + {RSS_SLACK_MB:.0f} MB)")
+    return problems
+
+def load_baselines(path: str) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {"version": 1, "machine": {}, "scenarios": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _eventlog_for(workdir: str, name: str, spec: SynthSpec) -> Tuple[str, Dict[str, Any]]:
+    """Generated logs are reused across runs while the spec is unchanged."""
+    path = os.path.join(workdir, f"synthetic-{name}.jsonl")
+    info_path = path + ".json"
+    if os.path.exists(path) and os.path.exists(info_path):
+        with open(info_path, "r", encoding="utf-8") as f:
+            info = json.load(f)
+        if info.get("spec") == asdict(spec) and info.get("bytes") == os.path.getsize(path):
+            return path, info
+    info = generate_eventlog(path, spec)
+    with open(info_path, "w", encoding="utf-8") as f:
+        json.dump(info, f)
+    return path, info
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--scenarios", default="1k,100k", help=f"Comma-separated: {', '.join(SCENARIOS)}")
+    p.add_argument("--repeat", type=int, default=3, help="Max runs per phase (best time is kept)")
+    p.add_argument("--min-time", type=float, default=1.0, help="Stop repeating a phase after this many seconds")
+    p.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "spark-opt-bench"),
+                   help="Where generated event logs are kept between runs")
+    p.add_argument("--baseline", default=DEFAULT_BASELINE)
+    p.add_argument("--save-baseline", action="store_true", help="Record these results as the new baseline")
+    p.add_argument("--check", action="store_true", help="Exit 1 if any phase regressed beyond tolerance")
+    p.add_argument("--tolerance", type=float, default=0.25, help="Allowed throughput drop (fraction)")
+    p.add_argument("--rss-tolerance", type=float, default=0.25, help="Allowed peak RSS growth (fraction)")
+    p.add_argument("--out", help="Also write the results as JSON here")
+    args = p.parse_args(argv)
+
+    names = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        p.error(f"unknown scenarios {unknown}; choose from {list(SCENARIOS)}")
+
+    baselines = load_baselines(args.baseline)
+    results: Dict[str, Any] = {}
+    for name in names:
+        path, info = _eventlog_for(args.workdir, name, SCENARIOS[name])
+        phases = run_scenario(path, info, repeat=args.repeat, min_time=args.min_time)
+        results[name] = {"spec": info["spec"], "tasks": info["tasks"], "bytes": info["bytes"], "phases": phases}
+        base = baselines["scenarios"].get(name, {}).get("phases", {})
+        print(f"== {name}: {info['tasks']:,} tasks, {info['bytes'] / 1e6:,.1f} MB")
+        for phase in PHASES:
+            ph, b = phases[phase], base.get(phase)
+            vs = f"  ({ph['tasks_per_s'] / b['tasks_per_s'] - 1:+.0%} vs baseline)" if b and b.get("tasks_per_s") else ""
+            print(f"  {phase:<10} {ph['seconds']:>9.3f}s {ph['tasks_per_s']:>14,.0f} tasks/s "
+                  f"peak {ph['peak_rss_mb']:>8.1f} MB (+{ph['rss_delta_mb']:.1f}){vs}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"machine": _machine(), "scenarios": results}, f, indent=2)
+
+    if baselines.get("machine") and baselines["machine"] != _machine():
+        print(f"note: baselines were recorded on {baselines['machine']}; throughput may not be comparable")
+    problems = compare(results, baselines["scenarios"], args.tolerance, args.rss_tolerance)
+    for msg in problems:
+        print(f"REGRESSION {msg}")
+
+    if args.save_baseline:
+        baselines["machine"] = _machine()
+        baselines["scenarios"].update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, indent=2)
+            f.write("\n")
+        print(f"baseline saved to {args.baseline}")
+    return 1 if args.check and problems else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
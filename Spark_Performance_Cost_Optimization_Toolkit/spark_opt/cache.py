@@ -0,0 +1,157 @@
+from __future__ import annotations
+from dataclasses import fields
+from typing import Any, Dict, List, Optional, Tuple
+import hashlib, json, os, tempfile, time
+import numpy as np
+from spark_opt.eventlog_io import fingerprint
+from spark_opt.eventlog_reader import StageCompleted, TaskTable, TASK_COLUMNS, parse_eventlog
+from spark_opt.profiling import profiled
+
+# Bump when parse semantics change; column/field layout changes are folded into the key automatically.
+CACHE_VERSION = 10
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "spark-opt")
+DEFAULT_MAX_BYTES = 4 * 1024 * 1024 * 1024
+# Temp files older than this were left by a writer that died mid-save; eviction removes them.
+STALE_TMP_S = 3600
+
+def cache_dir_default() -> str:
+    return os.environ.get("SPARK_OPT_CACHE_DIR") or DEFAULT_CACHE_DIR
+
+def max_bytes_default() -> int:
+    mb = os.environ.get("SPARK_OPT_CACHE_MAX_MB")
+    return int(float(mb) * 1024 * 1024) if mb else DEFAULT_MAX_BYTES
+
+def _layout_signature() -> str:
+    return repr((CACHE_VERSION, TASK_COLUMNS, [f.name for f in fields(StageCompleted)]))
+
+def cache_key(path: str) -> str:
+    size, mtime_ns = fingerprint(path)
+    raw = f"{_layout_signature()}|{os.path.abspath(path)}|{size}|{mtime_ns}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+# Text is stored as UTF-8 bytes (np.str_ would be UTF-32, padded to the longest string): a string
+# column is one uint8 buffer plus the end offset of each value.
+def _utf8(text: str) -> np.ndarray:
+    return np.frombuffer(text.encode("utf-8"), dtype=np.uint8)
+
+def _pack_strings(vals: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    encoded = [v.encode("utf-8") for v in vals]
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), np.cumsum([len(b) for b in encoded], dtype=np.int64)
+
+def _unpack_strings(buf: np.ndarray, ends: np.ndarray) -> List[str]:
+    raw, ends = buf.tobytes(), ends.tolist()
+    return [raw[a:b].decode("utf-8") for a, b in zip([0] + ends[:-1], ends)]
+
+def _stage_columns(stages: List[StageCompleted]) -> Dict[str, np.ndarray]:
+    out: Dict[str, np.ndarray] = {}
+    for f in fields(StageCompleted):
+        vals = [getattr(s, f.name) for s in stages]
+        if all(isinstance(v, str) for v in vals):
+            out[f"u:{f.name}"], out[f"o:{f.name}"] = _pack_strings(vals)
+        elif all(v is None or (isinstance(v, (int, np.integer)) and not isinstance(v, bool)) for v in vals):
+            out[f"s:{f.name}"] = np.array([0 if v is None else v for v in vals], dtype=np.int64)
+            out[f"m:{f.name}"] = np.array([v is None for v in vals], dtype=bool)
+        else:
+            out[f"j:{f.name}"], out[f"o:{f.name}"] = _pack_strings([json.dumps(v) for v in vals])
+    return out
+
+def _stages_from_columns(data: Any, n: int) -> List[StageCompleted]:
+    cols: Dict[str, list] = {}
+    for f in fields(StageCompleted):
+        if f"s:{f.name}" in data:
+            vals = data[f"s:{f.name}"].tolist()
+            if f"m:{f.name}" in data:
+                vals = [None if m else v for v, m in zip(vals, data[f"m:{f.name}"].tolist())]
+        elif f"u:{f.name}" in data:
+            vals = _unpack_strings(data[f"u:{f.name}"], data[f"o:{f.name}"])
+        else:
+            vals = [json.loads(v) for v in _unpack_strings(data[f"j:{f.name}"], data[f"o:{f.name}"])]
+        cols[f.name] = vals
+    return [StageCompleted(**{k: cols[k][i] for k in cols}) for i in range(n)]
+
+def save_parsed(path: str, stages: List[StageCompleted], tasks: TaskTable, meta: Dict[str, Any]) -> None:
+    arrays: Dict[str, np.ndarray] = {f"t:{name}": tasks[name] for name, _ in TASK_COLUMNS}
+    arrays.update(_stage_columns(stages))
+    arrays["n_stages"] = np.array(len(stages), dtype=np.int64)
+    arrays["meta"] = _utf8(json.dumps(meta, default=str))
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+@profiled("cache_load")
+def load_parsed(path: str) -> Tuple[List[StageCompleted], TaskTable, Dict[str, Any]]:
+    with np.load(path, allow_pickle=False) as data:
+        tasks = TaskTable({name: data[f"t:{name}"] for name, _ in TASK_COLUMNS})
+        stages = _stages_from_columns(data, int(data["n_stages"]))
+        meta = json.loads(data["meta"].tobytes())
+    return stages, tasks, meta
+
+def evict(cache_dir: str, max_bytes: int, keep: Optional[str] = None, suffix: str = ".npz") -> int:
+    """Delete stale temp files, then least-recently-used entries until the cache fits in `max_bytes`;
+    returns bytes freed."""
+    try:
+        names = os.listdir(cache_dir)
+    except FileNotFoundError:
+        return 0
+    entries = []
+    freed = 0
+    stale = time.time() - STALE_TMP_S
+    for n in names:
+        if not n.endswith((suffix, ".tmp")):
+            continue
+        p = os.path.join(cache_dir, n)
+        try:
+            st = os.stat(p)
+            if n.endswith(".tmp"):
+                if st.st_mtime < stale:
+                    os.remove(p)
+                    freed += st.st_size
+            else:
+                entries.append((st.st_mtime, st.st_size, p))
+        except FileNotFoundError:
+            pass
+    total = sum(e[1] for e in entries)
+    for _, size, p in sorted(entries):
+        if total <= max_bytes:
+            break
+        if keep and os.path.abspath(p) == os.path.abspath(keep):
+            continue
+        try:
+            os.remove(p)
+        except FileNotFoundError:
+            pass
+        total -= size
+        freed += size
+    return freed
+
+def load_eventlog(path: str, use_cache: bool = True, cache_dir: Optional[str] = None,
+                  max_bytes: Optional[int] = None, workers: int = 1) -> Tuple[List[StageCompleted], TaskTable, Dict[str, Any]]:
+    if not use_cache:
+        return parse_eventlog(path, workers=workers)
+    cache_dir = cache_dir or cache_dir_default()
+    entry = os.path.join(cache_dir, cache_key(path) + ".npz")
+    if os.path.exists(entry):
+        try:
+            out = load_parsed(entry)
+            os.utime(entry)  # LRU touch
+            return out
+        except Exception:
+            # Corrupt or partially written entry: drop it and reparse.
+            try:
+                os.remove(entry)
+            except OSError:
+                pass
+    stages, tasks, meta = parse_eventlog(path, workers=workers)
+    try:
+        save_parsed(entry, stages, tasks, meta)
+        evict(cache_dir, max_bytes if max_bytes is not None else max_bytes_default(), keep=entry)
+    except OSError:
+        pass  # a read-only or full cache dir must never fail the analysis
+    return stages, tasks, meta
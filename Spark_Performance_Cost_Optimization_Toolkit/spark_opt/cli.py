@@ -1,12 +1,21 @@
 from __future__ import annotations
-import argparse, json
-from spark_opt.eventlog_reader import parse_eventlog
+import argparse, json, math, os, sys, time
+from spark_opt.cache import load_eventlog
 from spark_opt.metrics import build_stage_metrics
-from spark_opt.config import SparkConf, ClusterSpec
-from spark_opt.detectors import detect_skew, detect_shuffle_heavy, detect_spill_or_gc, detect_partitioning_issues
-from spark_opt.recommendations import recommend
+from spark_opt.config import SparkConf, ClusterSpec, CostSpec
+from spark_opt.detectors import detect_all, load_thresholds
+from spark_opt.diff import diff_runs, run_stages, summarize
+from spark_opt.recommendations import recommend, to_payload
 from spark_opt.report import generate_markdown_report
-from spark_opt.cost_model import estimate_cost
+from spark_opt.cost_model import compare, estimate_cost
+from spark_opt.fleet import discover_eventlogs, run_fleet
+from spark_opt.history import HistoryStore, history_db_default, load_baselines, record_run
+from spark_opt.profiling import profiling
+from spark_opt.serve import AnalysisService, serve
+from spark_opt.simulator import build_plan, cost_key, sweep
+from spark_opt.synth import SynthSpec, generate_eventlog
+from spark_opt.timeline import build_timeline
+from spark_opt.watch import watch
 
 def _load_conf(path: str | None) -> SparkConf:
     if not path:
@@ -14,8 +23,48 @@ def _load_conf(path: str | None) -> SparkConf:
     with open(path, "r", encoding="utf-8") as f:
         return SparkConf(conf=json.load(f))
 
+def _load_eventlog(args):
+    return load_eventlog(args.eventlog, use_cache=not args.no_cache, cache_dir=args.cache_dir,
+                         workers=args.parse_workers)
+
+def _add_cache_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--no-cache", action="store_true", help="Always reparse the event log (skip the parsed-log cache)")
+    p.add_argument("--cache-dir", help="Parsed-log cache dir (default: $SPARK_OPT_CACHE_DIR or ~/.cache/spark-opt)")
+
+def _load_thresholds(path: str | None):
+    return load_thresholds(path) if path else None
+
+def _add_thresholds_arg(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--thresholds", help="JSON/YAML file of per-rule detector thresholds (see samples/thresholds.yaml)")
+
+def _add_rate_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--rate-per-node-hour", type=float, default=0.0)
+    p.add_argument("--dbus-per-node", type=float, default=0.0)
+    p.add_argument("--rate-per-dbu-hour", type=float, default=0.0)
+
+def _cost_spec(args) -> CostSpec:
+    return CostSpec(rate_per_node_hour=args.rate_per_node_hour, dbus_per_node=args.dbus_per_node,
+                    rate_per_dbu_hour=args.rate_per_dbu_hour)
+
+def _add_parse_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--parse-workers", type=int, default=1,
+                   help="Parse one large uncompressed log with this many processes (byte-range split)")
+
+def _add_profile_arg(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--profile", nargs="?", const="-", metavar="PATH",
+                   help="Time each phase (wall, events/s, MB/s, peak RSS); JSON to PATH or stderr, "
+                        "and an appendix in Markdown reports")
+
+def _write_profile(prof, dest: str) -> None:
+    payload = json.dumps(prof.to_dict(), indent=2)
+    if dest == "-":
+        print(payload, file=sys.stderr)
+    else:
+        with open(dest, "w", encoding="utf-8") as f:
+            f.write(payload + "\n")
+
 def cmd_analyze_eventlog(args):
-    stages, tasks, _ = parse_eventlog(args.eventlog)
+    stages, tasks, _ = _load_eventlog(args)
     df, _ = build_stage_metrics(stages, tasks)
     if df is None or df.empty:
         print({"message": "no stage/task metrics found"})
@@ -27,34 +76,144 @@ def cmd_recommend(args):
     cluster = ClusterSpec(nodes=args.nodes, cores_per_node=args.cores_per_node, memory_gb_per_node=args.memory_gb_per_node)
     cores_total = cluster.nodes * cluster.cores_per_node
 
-    stages, tasks, _ = parse_eventlog(args.eventlog)
+    stages, tasks, meta = _load_eventlog(args)
     _, stage_objs = build_stage_metrics(stages, tasks)
 
-    findings = []
-    findings += detect_skew(stage_objs)
-    findings += detect_shuffle_heavy(stage_objs)
-    findings += detect_spill_or_gc(stage_objs)
-    findings += detect_partitioning_issues(stage_objs, spark_conf, cores_total=cores_total)
-
-    recs = recommend(findings, spark_conf)
-    payload = []
-    for r in recs:
-        payload.append({
-            "severity": r.severity,
-            "title": r.title,
-            "stage_id": r.stage_id,
-            "rationale": r.rationale,
-            "actions": r.actions,
-            "evidence": r.evidence,
-        })
+    findings = detect_all(stage_objs, spark_conf, cores_total=cores_total, timeline=build_timeline(stages, tasks, meta),
+                          thresholds=_load_thresholds(args.thresholds),
+                          baselines=load_baselines(args.history_db, meta, args.eventlog), tasks=tasks, meta=meta,
+                          memory_gb_per_node=cluster.memory_gb_per_node)
+    record_run(args.history_db, meta, stage_objs, args.eventlog)
+
+    recs = recommend(findings, spark_conf, cost=_cost_spec(args), cores_per_node=cluster.cores_per_node)
+    payload = to_payload(recs)
     print(json.dumps(payload, indent=2))
 
 def cmd_report(args):
     spark_conf = _load_conf(args.spark_conf)
     cores_total = int(args.nodes) * int(args.cores_per_node) if args.nodes and args.cores_per_node else None
-    outp = generate_markdown_report(args.eventlog, spark_conf, args.out, cores_total=cores_total)
+    outp = generate_markdown_report(args.eventlog, spark_conf, args.out, cores_total=cores_total,
+                                    use_cache=not args.no_cache, cache_dir=args.cache_dir,
+                                    parse_workers=args.parse_workers, thresholds=_load_thresholds(args.thresholds),
+                                    history_db=args.history_db, cost=_cost_spec(args),
+                                    cores_per_node=args.cores_per_node, memory_gb_per_node=args.memory_gb_per_node)
     print({"report": outp})
 
+def cmd_fleet(args):
+    spark_conf = _load_conf(args.spark_conf)
+    cores_total = int(args.nodes) * int(args.cores_per_node) if args.nodes and args.cores_per_node else None
+    paths = discover_eventlogs(args.eventlog_dir, pattern=args.pattern, recursive=args.recursive)
+    result = run_fleet(paths, args.out, conf=spark_conf.conf, cores_total=cores_total, workers=args.workers,
+                       use_cache=not args.no_cache, cache_dir=args.cache_dir, top_n=args.top,
+                       thresholds=_load_thresholds(args.thresholds))
+    ranking_out = args.ranking_out or os.path.splitext(args.out)[0] + ".ranking.json"
+    with open(ranking_out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, default=str)
+    print(json.dumps({"summary": args.out, "ranking": ranking_out, "apps_ok": result["apps_ok"],
+                      "apps_failed": result["apps_failed"], "elapsed_s": result["elapsed_s"]}))
+
+def cmd_serve(args):
+    defaults = {"spark_conf": _load_conf(args.spark_conf).conf, "nodes": args.nodes, "cores_per_node": args.cores_per_node,
+                "memory_gb_per_node": args.memory_gb_per_node, "rate_per_node_hour": args.rate_per_node_hour,
+                "dbus_per_node": args.dbus_per_node, "rate_per_dbu_hour": args.rate_per_dbu_hour}
+    service = AnalysisService(workers=args.workers, max_queue=args.max_queue, defaults=defaults,
+                              thresholds=_load_thresholds(args.thresholds), use_cache=not args.no_cache,
+                              cache_dir=args.cache_dir, results_dir=args.results_dir, roots=args.eventlog_root,
+                              max_upload_bytes=int(args.max_upload_mb * 1024 * 1024))
+    print(json.dumps({"listening": f"http://{args.host}:{args.port}", "workers": service.workers,
+                      "max_queue": service.max_queue}), flush=True)
+    serve(service, host=args.host, port=args.port, verbose=args.verbose)
+
+def cmd_watch(args):
+    spark_conf = _load_conf(args.spark_conf)
+    cores_total = int(args.nodes) * int(args.cores_per_node) if args.nodes and args.cores_per_node else None
+
+    def emit(f):
+        print(json.dumps({"ts": round(time.time(), 3), **f.__dict__}, default=str), flush=True)
+
+    analyzer = watch(args.eventlog, emit, conf=spark_conf, cores_total=cores_total, interval_s=args.interval,
+                     timeout_s=args.timeout, once=args.once, relative_accuracy=args.sketch_accuracy,
+                     thresholds=_load_thresholds(args.thresholds))
+    print(json.dumps({"app_id": analyzer.meta.get("app_id"), "app_ended": analyzer.app_ended,
+                      "stages_completed": len(analyzer.completed), "stages_running": len(analyzer.running),
+                      "events": analyzer.events_seen, "late_tasks_dropped": analyzer.late_tasks_dropped}), flush=True)
+
+def _add_history_arg(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--history-db", help="Run history store (SQLite): compare stages against their recent runs "
+                                        "(STAGE_REGRESSION), then record this run")
+
+def cmd_history_ingest(args):
+    with HistoryStore(args.db) as store:
+        for path in args.eventlog:
+            stages, tasks, meta = load_eventlog(path, use_cache=not args.no_cache, cache_dir=args.cache_dir)
+            _, stage_objs = build_stage_metrics(stages, tasks)
+            run_id = store.ingest(meta, stage_objs, eventlog=path)
+            print(json.dumps({"eventlog": path, "app_name": meta.get("app_name"), "run_id": run_id,
+                              "stages": len(stage_objs)}), flush=True)
+
+def cmd_history_apps(args):
+    with HistoryStore(args.db) as store:
+        print(json.dumps(store.apps(), indent=2))
+
+def cmd_history_show(args):
+    with HistoryStore(args.db) as store:
+        print(json.dumps(store.stage_history(args.app, stage_name=args.stage, limit=args.limit), indent=2))
+
+def _int_list(spec: str) -> list:
+    """"4,8,16" or an inclusive range "2:40:2"."""
+    if ":" in spec:
+        parts = [int(x) for x in spec.split(":")]
+        start, stop, step = parts[0], parts[1], parts[2] if len(parts) > 2 else 1
+        return list(range(start, stop + 1, step))
+    return [int(x) for x in spec.split(",") if x.strip()]
+
+def cmd_rightsize(args):
+    stages, tasks, meta = _load_eventlog(args)
+    plan = build_plan(stages, tasks, meta)
+    cost = _cost_spec(args)
+    clusters = [ClusterSpec(nodes=n, cores_per_node=c) for n in _int_list(args.nodes) for c in _int_list(args.cores_per_node)]
+    results = sweep(plan, clusters, cost)
+    out = {"observed_wall_s": plan.observed_wall_ms / 1000.0, "num_tasks": plan.num_tasks,
+           "results": [r.__dict__ for r in results],
+           "pareto": [r.__dict__ for r in sorted(results, key=lambda r: r.runtime_seconds) if r.pareto]}
+    if args.current_nodes:
+        current = ClusterSpec(nodes=args.current_nodes, cores_per_node=args.current_cores_per_node)
+        [cur] = sweep(plan, [current], cost)
+        out["current"] = {k: v for k, v in cur.__dict__.items() if k != "pareto"}
+        no_slower = [r for r in results if r.pareto and r.runtime_seconds <= cur.runtime_seconds]
+        if no_slower:
+            best = min(no_slower, key=cost_key(results + [cur]))
+            out["cheapest_no_slower"] = best.__dict__
+            out["comparison"] = compare(*(
+                estimate_cost(math.ceil(r.runtime_seconds), r.nodes, cost.rate_per_node_hour,
+                              cost.dbus_per_node, cost.rate_per_dbu_hour) for r in (cur, best)))
+    print(json.dumps(out, indent=2))
+
+def cmd_diff(args):
+    runs = []
+    for path in (args.before, args.after):
+        stages, tasks, meta = load_eventlog(path, use_cache=not args.no_cache, cache_dir=args.cache_dir,
+                                            workers=args.parse_workers)
+        _, objs = build_stage_metrics(stages, tasks)
+        runs.append(run_stages(stages, objs, meta))
+    before, after = runs
+    diffs = diff_runs(before, after)
+    cost = _cost_spec(args)
+    out = summarize(before, after, diffs, args.before_nodes or args.nodes, args.after_nodes or args.nodes, cost)
+    ranked = sorted(diffs, key=lambda d: -abs(d.duration_delta_ms))
+    out["stage_diffs"] = [d.__dict__ for d in (ranked[:args.top] if args.top else ranked)]
+    print(json.dumps(out, indent=2))
+
+def cmd_generate(args):
+    spec = SynthSpec(tasks=args.tasks, stages=args.stages, stages_per_job=args.stages_per_job, executors=args.executors,
+                     cores_per_executor=args.cores_per_executor, task_ms=args.task_ms, skew_stages=args.skew_stages,
+                     skew_factor=args.skew_factor, spill_stages=args.spill_stages, noise=args.noise, seed=args.seed,
+                     slow_hosts=args.slow_hosts, slow_host_factor=args.slow_host_factor,
+                     failed_tasks=args.failed_tasks, speculative_tasks=args.speculative_tasks,
+                     python_udf_stages=args.python_udf_stages, small_file_stages=args.small_file_stages,
+                     small_file_writes=args.small_file_writes)
+    print(json.dumps(generate_eventlog(args.out, spec), indent=2))
+
 def cmd_cost(args):
     est = estimate_cost(
         runtime_seconds=args.runtime_seconds,
@@ -72,6 +231,9 @@ def main():
     a = sub.add_parser("analyze-eventlog", help="Print top stage metrics from an event log")
     a.add_argument("--eventlog", required=True)
     a.add_argument("--top", type=int, default=10)
+    _add_cache_args(a)
+    _add_parse_args(a)
+    _add_profile_arg(a)
     a.set_defaults(fn=cmd_analyze_eventlog)
 
     r = sub.add_parser("recommend", help="Generate recommendations from event log + spark conf")
@@ -80,6 +242,12 @@ def main():
     r.add_argument("--nodes", type=int, default=10)
     r.add_argument("--cores-per-node", type=int, default=4)
     r.add_argument("--memory-gb-per-node", type=float, default=16.0)
+    _add_rate_args(r)
+    _add_cache_args(r)
+    _add_parse_args(r)
+    _add_profile_arg(r)
+    _add_thresholds_arg(r)
+    _add_history_arg(r)
     r.set_defaults(fn=cmd_recommend)
 
     rep = sub.add_parser("report", help="Generate a Markdown report")
@@ -87,9 +255,132 @@ def main():
     rep.add_argument("--spark-conf")
     rep.add_argument("--nodes", type=int, default=10)
     rep.add_argument("--cores-per-node", type=int, default=4)
+    rep.add_argument("--memory-gb-per-node", type=float, help="Node memory, to check that recommended executor sizes fit")
     rep.add_argument("--out", required=True)
+    _add_rate_args(rep)
+    _add_cache_args(rep)
+    _add_parse_args(rep)
+    _add_profile_arg(rep)
+    _add_thresholds_arg(rep)
+    _add_history_arg(rep)
     rep.set_defaults(fn=cmd_report)
 
+    fl = sub.add_parser("fleet", help="Analyze a directory of event logs in parallel")
+    fl.add_argument("--eventlog-dir", required=True)
+    fl.add_argument("--pattern", default="*", help="Filename glob for event logs inside --eventlog-dir")
+    fl.add_argument("--recursive", action="store_true")
+    fl.add_argument("--spark-conf")
+    fl.add_argument("--nodes", type=int, default=10)
+    fl.add_argument("--cores-per-node", type=int, default=4)
+    fl.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    fl.add_argument("--top", type=int, default=50, help="Size of the cross-app worst-stage / finding rankings")
+    fl.add_argument("--out", required=True, help="Per-app JSONL summary")
+    fl.add_argument("--ranking-out", help="Cross-app ranking JSON (default: <out>.ranking.json)")
+    _add_cache_args(fl)
+    _add_thresholds_arg(fl)
+    fl.set_defaults(fn=cmd_fleet)
+
+    sv = sub.add_parser("serve", help="Run a local HTTP analysis service with a worker pool and a result cache")
+    sv.add_argument("--host", default="127.0.0.1")
+    sv.add_argument("--port", type=int, default=8080)
+    sv.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    sv.add_argument("--max-queue", type=int, default=256, help="Queued + running jobs before new ones get 503")
+    sv.add_argument("--eventlog-root", action="append",
+                    help="Only accept event-log paths under this dir (repeatable; default: any path)")
+    sv.add_argument("--max-upload-mb", type=float, default=4096.0)
+    sv.add_argument("--results-dir", help="Result cache dir (default: <cache dir>/results)")
+    sv.add_argument("--spark-conf", help="Default Spark conf; a job's spark_conf overrides it key by key")
+    sv.add_argument("--nodes", type=int, default=10)
+    sv.add_argument("--cores-per-node", type=int, default=4)
+    sv.add_argument("--memory-gb-per-node", type=float, default=16.0)
+    sv.add_argument("--verbose", action="store_true", help="Log every request to stderr")
+    _add_rate_args(sv)
+    _add_cache_args(sv)
+    _add_thresholds_arg(sv)
+    sv.set_defaults(fn=cmd_serve)
+
+    w = sub.add_parser("watch", help="Follow an in-progress event log and emit new findings as they appear")
+    w.add_argument("--eventlog", required=True, help="Growing .inprogress file or rolling eventlog_v2_* dir")
+    w.add_argument("--spark-conf")
+    w.add_argument("--nodes", type=int, default=10)
+    w.add_argument("--cores-per-node", type=int, default=4)
+    w.add_argument("--interval", type=float, default=2.0, help="Seconds between polls")
+    w.add_argument("--timeout", type=float, help="Stop after this many seconds even if the app is still running")
+    w.add_argument("--once", action="store_true", help="Process what is in the log now and exit")
+    w.add_argument("--sketch-accuracy", type=float,
+                   help="Keep per-stage quantile sketches (e.g. 0.01 = 1%% relative error) instead of task rows")
+    _add_thresholds_arg(w)
+    w.set_defaults(fn=cmd_watch)
+
+    rs = sub.add_parser("rightsize", help="Replay the log's tasks on other cluster sizes; cost vs runtime Pareto frontier")
+    rs.add_argument("--eventlog", required=True)
+    rs.add_argument("--nodes", default="1:20", help='Node counts to try: "2,4,8" or inclusive range "2:40:2"')
+    rs.add_argument("--cores-per-node", default="4,8,16", help="Cores per node to try (same syntax)")
+    _add_rate_args(rs)
+    rs.add_argument("--current-nodes", type=int, help="Current cluster, to compare against the cheapest no-slower size")
+    rs.add_argument("--current-cores-per-node", type=int, default=4)
+    _add_cache_args(rs)
+    _add_parse_args(rs)
+    _add_profile_arg(rs)
+    rs.set_defaults(fn=cmd_rightsize)
+
+    df = sub.add_parser("diff", help="Compare two runs of an app stage by stage (aligned by name and DAG shape)")
+    df.add_argument("--before", required=True, help="Event log of the baseline run")
+    df.add_argument("--after", required=True, help="Event log of the run to compare")
+    df.add_argument("--nodes", type=int, default=10, help="Cluster size of both runs, for the cost delta")
+    df.add_argument("--before-nodes", type=int, help="Override --nodes for the before run")
+    df.add_argument("--after-nodes", type=int, help="Override --nodes for the after run")
+    _add_rate_args(df)
+    df.add_argument("--top", type=int, default=50, help="Stage diffs to print, largest duration change first (0 = all)")
+    _add_cache_args(df)
+    _add_parse_args(df)
+    _add_profile_arg(df)
+    df.set_defaults(fn=cmd_diff)
+
+    h = sub.add_parser("history", help="Query or fill the run history store")
+    hsub = h.add_subparsers(dest="history_cmd", required=True)
+    hi = hsub.add_parser("ingest", help="Record event logs in the store")
+    hi.add_argument("--eventlog", nargs="+", required=True)
+    _add_cache_args(hi)
+    hi.set_defaults(fn=cmd_history_ingest)
+    ha = hsub.add_parser("apps", help="Applications in the store with run counts")
+    ha.set_defaults(fn=cmd_history_apps)
+    hs = hsub.add_parser("show", help="Recent per-stage rows of one application, newest first")
+    hs.add_argument("--app", required=True, help="Application name")
+    hs.add_argument("--stage", help="Only stages whose name contains this")
+    hs.add_argument("--limit", type=int, default=50)
+    hs.set_defaults(fn=cmd_history_show)
+    for hp in (hi, ha, hs):
+        hp.add_argument("--db", default=history_db_default(), help="SQLite store (default: $SPARK_OPT_HISTORY_DB "
+                                                                   "or ~/.cache/spark-opt/history.sqlite)")
+
+    d = SynthSpec()
+    g = sub.add_parser("generate", help="Write a synthetic event log (benchmarks, tests, demos)")
+    g.add_argument("--out", required=True)
+    g.add_argument("--tasks", type=int, default=d.tasks)
+    g.add_argument("--stages", type=int, default=d.stages)
+    g.add_argument("--stages-per-job", type=int, default=d.stages_per_job)
+    g.add_argument("--executors", type=int, default=d.executors)
+    g.add_argument("--cores-per-executor", type=int, default=d.cores_per_executor)
+    g.add_argument("--task-ms", type=float, default=d.task_ms, help="Median task duration")
+    g.add_argument("--skew-stages", type=float, default=d.skew_stages, help="Fraction of stages with a skewed task tail")
+    g.add_argument("--skew-factor", type=float, default=d.skew_factor)
+    g.add_argument("--spill-stages", type=float, default=d.spill_stages, help="Fraction of stages that spill")
+    g.add_argument("--noise", type=float, default=d.noise, help="Irrelevant events per TaskEnd")
+    g.add_argument("--slow-hosts", type=int, default=d.slow_hosts, help="Hosts whose tasks all run slower")
+    g.add_argument("--slow-host-factor", type=float, default=d.slow_host_factor)
+    g.add_argument("--failed-tasks", type=float, default=d.failed_tasks, help="Fraction of tasks that fail once, then succeed")
+    g.add_argument("--speculative-tasks", type=float, default=d.speculative_tasks,
+                   help="Fraction of tasks with a losing speculative copy")
+    g.add_argument("--python-udf-stages", type=float, default=d.python_udf_stages,
+                   help="Fraction of stages that run Python UDFs")
+    g.add_argument("--small-file-stages", type=float, default=d.small_file_stages,
+                   help="Fraction of scan stages that read small files")
+    g.add_argument("--small-file-writes", type=float, default=d.small_file_writes,
+                   help="Fraction of write stages that write small files")
+    g.add_argument("--seed", type=int, default=d.seed)
+    g.set_defaults(fn=cmd_generate)
+
     c = sub.add_parser("cost", help="Estimate cost from runtime + cluster size")
     c.add_argument("--runtime-seconds", type=int, required=True)
     c.add_argument("--nodes", type=int, required=True)
@@ -99,7 +390,11 @@ def main():
     c.set_defaults(fn=cmd_cost)
 
     args = p.parse_args()
-    args.fn(args)
+    profile = getattr(args, "profile", None)
+    with profiling(enabled=profile is not None) as prof:
+        args.fn(args)
+    if prof is not None:
+        _write_profile(prof, profile)
 
 if __name__ == "__main__":
     main()
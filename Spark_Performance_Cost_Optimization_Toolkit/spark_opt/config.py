@@ -1,5 +1,5 @@
 from __future__ import annotations
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 from pydantic import BaseModel, Field
 
 class ClusterSpec(BaseModel):
@@ -33,3 +33,21 @@ class SparkConf(BaseModel):
         if s in ("false", "0", "no", "n"):
             return False
         return default
+
+    def get_size_mb(self, key: str, default_mb: Optional[float] = None, unit: str = "m") -> Optional[float]:
+        """JVM-style size ("4g", "512m", "2048k"); bare numbers are in `unit` (MiB for executor memory)."""
+        return parse_size_mb(self.conf.get(key), unit=unit, default=default_mb)
+
+_SIZE_UNITS_MB = {"b": 1 / 1024 ** 2, "k": 1 / 1024, "m": 1.0, "g": 1024.0, "t": 1024.0 ** 2, "p": 1024.0 ** 3}
+
+def parse_size_mb(value: Any, unit: str = "m", default: Optional[float] = None) -> Optional[float]:
+    if value is None:
+        return default
+    s = str(value).strip().lower()
+    if s.endswith("b") and len(s) > 1 and s[-2] in _SIZE_UNITS_MB:
+        s = s[:-1]  # "4gb" -> "4g"
+    u = s[-1] if s and s[-1] in _SIZE_UNITS_MB else unit
+    try:
+        return float(s.rstrip("".join(_SIZE_UNITS_MB))) * _SIZE_UNITS_MB[u]
+    except ValueError:
+        return default
@@ -1,6 +1,7 @@
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterable, List
+from spark_opt.config import CostSpec
 
 @dataclass
 class CostEstimate:
@@ -38,7 +39,7 @@ def estimate_cost(runtime_seconds: int, nodes: int, rate_per_node_hour: float =
     )
 
 def compare(current: CostEstimate, optimized: CostEstimate) -> Dict[str, Any]:
-    return {
+    out = {
         "current_cost": current.estimated_cost,
         "optimized_cost": optimized.estimated_cost,
         "savings": current.estimated_cost - optimized.estimated_cost,
@@ -46,3 +47,58 @@ def compare(current: CostEstimate, optimized: CostEstimate) -> Dict[str, Any]:
         "optimized_node_hours": optimized.node_hours,
         "node_hours_saved": current.node_hours - optimized.node_hours,
     }
+    if current.estimated_cost_dbu is not None and optimized.estimated_cost_dbu is not None:
+        out.update(current_cost_dbu=current.estimated_cost_dbu, optimized_cost_dbu=optimized.estimated_cost_dbu,
+                   savings_dbu=current.estimated_cost_dbu - optimized.estimated_cost_dbu)
+    return out
+
+
+# Per-stage attribution: a task holds one core while it runs, so a stage's summed task time is the
+# core time it consumed. A core-hour is priced as the node's hourly cost (node rate plus its DBUs)
+# spread over its cores; idle capacity is not attributed to any stage. Wasted time (failed, killed and
+# losing duplicate attempts, recomputed lost output) is part of that core time and is also priced on
+# its own, since it buys nothing.
+
+@dataclass
+class StageCost:
+    stage_id: int
+    attempt: int
+    name: str
+    task_seconds: float
+    core_hours: float
+    cost: float
+    wasted_core_hours: float = 0.0
+    wasted_cost: float = 0.0
+
+@dataclass
+class Savings:
+    """Estimated per-run saving of one fix, as a low..high range."""
+    core_hours_low: float
+    core_hours_high: float
+    cost_low: float
+    cost_high: float
+    basis: str  # what the estimate was derived from
+
+    @property
+    def cost_mid(self) -> float:
+        return (self.cost_low + self.cost_high) / 2
+
+    @property
+    def core_hours_mid(self) -> float:
+        return (self.core_hours_low + self.core_hours_high) / 2
+
+def core_hour_rate(cost: Optional[CostSpec], cores_per_node: Optional[int]) -> float:
+    if cost is None or not cores_per_node:
+        return 0.0
+    return (cost.rate_per_node_hour + cost.dbus_per_node * cost.rate_per_dbu_hour) / max(1, int(cores_per_node))
+
+def stage_costs(stages: Iterable[Any], rate_per_core_hour: float = 0.0) -> List[StageCost]:
+    """Core-hours and cost of each stage attempt (StageMetrics), most expensive first."""
+    out = [StageCost(s.stage_id, s.attempt, s.name, s.task_time_ms / 1000.0, s.task_time_ms / 3_600_000,
+                     s.task_time_ms / 3_600_000 * rate_per_core_hour, s.wasted_ms / 3_600_000,
+                     s.wasted_ms / 3_600_000 * rate_per_core_hour) for s in stages]
+    return sorted(out, key=lambda c: (-c.core_hours, c.stage_id, c.attempt))
+
+def savings(core_ms_low: float, core_ms_high: float, rate_per_core_hour: float, basis: str) -> Savings:
+    lo, hi = max(0.0, core_ms_low) / 3_600_000, max(0.0, core_ms_high) / 3_600_000
+    return Savings(lo, hi, lo * rate_per_core_hour, hi * rate_per_core_hour, basis)
@@ -1,76 +1,141 @@
 from __future__ import annotations
-from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+from dataclasses import dataclass, field
+from importlib.metadata import entry_points
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+import json, math, os, warnings
+import numpy as np
 from spark_opt.metrics import StageMetrics
 from spark_opt.config import SparkConf
+from spark_opt.eventlog_reader import TaskTable
+from spark_opt.fileio import detect_file_io
+from spark_opt.findings import Finding, StageTable
+from spark_opt.history import StageBaseline, detect_stage_regressions
+from spark_opt.hosts import analyze_hosts, detect_slow_hosts
+from spark_opt.memory import MemoryAnalysis, analyze_memory, detect_executor_memory
+from spark_opt.profiling import phase
+from spark_opt.pyudf import detect_python_udfs, python_stages
+from spark_opt.sqlplan import SqlAttribution, attribute_operators, has_sql_plans
+from spark_opt.timeline import AppTimeline, detect_idle_executors, detect_serial_stage_chains
+from spark_opt.wasted import detect_wasted_work
+
+ENTRY_POINT_GROUP = "spark_opt.detectors"
 
 @dataclass
-class Finding:
+class Check:
+    """Vectorized result of one stage rule: which rows fire, at what severity, and how to describe a hit."""
     code: str
-    severity: str  # INFO|WARN|ERROR
-    stage_id: Optional[int]
-    message: str
-    evidence: Dict[str, Any]
+    mask: np.ndarray
+    severity: Union[str, np.ndarray]
+    render: Callable[[StageMetrics], Any]  # stage -> (message, evidence)
 
-def detect_skew(stages: List[StageMetrics], p95_p50_warn: float = 3.0, max_p50_warn: float = 8.0) -> List[Finding]:
-    out: List[Finding] = []
-    for s in stages:
-        if s.num_tasks < 10:
+@dataclass
+class AppContext:
+    stages: List[StageMetrics]
+    table: StageTable
+    conf: SparkConf
+    cores_total: Optional[int] = None
+    timeline: Optional[AppTimeline] = None
+    baselines: Optional[Dict[Tuple[str, int], StageBaseline]] = None
+    tasks: Optional[TaskTable] = None
+    meta: Optional[Dict[str, Any]] = None
+    memory_gb_per_node: Optional[float] = None
+    memory: Optional[MemoryAnalysis] = None  # precomputed analyze_memory result, if the caller has one
+
+@dataclass
+class Rule:
+    """A detector. scope="stage": fn(table, **thresholds) -> List[Check]; scope="app": fn(ctx, **thresholds) -> List[Finding]."""
+    name: str
+    fn: Callable[..., Any]
+    thresholds: Dict[str, Any] = field(default_factory=dict)
+    scope: str = "stage"
+
+def annotate_operators(findings: List[Finding], sql: SqlAttribution) -> None:
+    """Name the SQL operator behind each stage finding (in its evidence and message)."""
+    for f in findings:
+        op = sql.for_stage(f.stage_id) if f.stage_id is not None else None
+        if op is None or not isinstance(f.evidence, dict):
             continue
-        if s.skew_ratio_p95_p50 >= p95_p50_warn or s.skew_ratio_max_p50 >= max_p50_warn:
-            sev = "ERROR" if s.skew_ratio_max_p50 >= (max_p50_warn * 2) else "WARN"
-            out.append(Finding(
-                code="SKEW_DETECTED",
-                severity=sev,
-                stage_id=s.stage_id,
-                message=f"Stage {s.stage_id} shows task skew (p95/p50={s.skew_ratio_p95_p50:.2f}, max/p50={s.skew_ratio_max_p50:.2f}).",
-                evidence={"p95_p50": s.skew_ratio_p95_p50, "max_p50": s.skew_ratio_max_p50, "p50_ms": s.task_p50_ms, "p95_ms": s.task_p95_ms, "max_ms": s.task_max_ms},
-            ))
-    return out
+        f.evidence["sql_operator"] = op.label
+        f.evidence["sql_execution_id"] = op.execution_id
+        f.message += f" Operator: {op.label} (SQL execution {op.execution_id})."
 
-def detect_shuffle_heavy(stages: List[StageMetrics], shuffle_mb_warn: float = 1024.0) -> List[Finding]:
+def stage_findings(table: StageTable, checks: List[Check]) -> List[Finding]:
+    if not checks:
+        return []
+    any_hit = np.zeros(len(table), dtype=bool)
+    for c in checks:
+        any_hit |= c.mask
     out: List[Finding] = []
-    for s in stages:
-        total = s.shuffle_read_mb + s.shuffle_write_mb
-        if total >= shuffle_mb_warn:
-            sev = "ERROR" if total >= shuffle_mb_warn * 5 else "WARN"
-            out.append(Finding(
-                code="SHUFFLE_HEAVY",
-                severity=sev,
-                stage_id=s.stage_id,
-                message=f"Stage {s.stage_id} is shuffle-heavy (~{total:.0f} MB shuffle I/O).",
-                evidence={"shuffle_read_mb": s.shuffle_read_mb, "shuffle_write_mb": s.shuffle_write_mb, "spill_mb": s.spill_mb},
-            ))
+    for i in np.flatnonzero(any_hit).tolist():
+        s = table.stages[i]
+        for c in checks:
+            if c.mask[i]:
+                sev = c.severity if isinstance(c.severity, str) else str(c.severity[i])
+                message, evidence = c.render(s)
+                out.append(Finding(code=c.code, severity=sev, stage_id=s.stage_id, message=message, evidence=evidence))
     return out
 
+def skew_checks(t: StageTable, p95_p50_warn: float = 3.0, max_p50_warn: float = 8.0, min_tasks: int = 10,
+                data_corr: float = 0.5, host_share: float = 0.5) -> List[Check]:
+    # Stragglers that mostly ran on slow hosts and did not read more data are a host problem
+    # (SLOW_HOST), not data skew; with task data, those stages are left to the slow_hosts rule.
+    p95, mx, corr = t["skew_ratio_p95_p50"], t["skew_ratio_max_p50"], t["bytes_duration_corr"]
+    host_caused = (t.slow_host_share() >= host_share) & (corr < data_corr)
+    return [Check(
+        "SKEW_DETECTED",
+        (t["num_tasks"] >= min_tasks) & ((p95 >= p95_p50_warn) | (mx >= max_p50_warn)) & ~host_caused,
+        np.where(mx >= max_p50_warn * 2, "ERROR", "WARN"),
+        lambda s: (f"Stage {s.stage_id} shows task skew (p95/p50={s.skew_ratio_p95_p50:.2f}, max/p50={s.skew_ratio_max_p50:.2f}).",
+                   {"p95_p50": s.skew_ratio_p95_p50, "max_p50": s.skew_ratio_max_p50, "p50_ms": s.task_p50_ms, "p95_ms": s.task_p95_ms, "max_ms": s.task_max_ms,
+                    "task_time_ms": s.task_time_ms, "straggler_ms": s.straggler_ms,
+                    "bytes_duration_corr": s.bytes_duration_corr,
+                    "cause": "data" if s.bytes_duration_corr >= data_corr else "unclear"}),
+    )]
+
+def shuffle_checks(t: StageTable, shuffle_mb_warn: float = 1024.0) -> List[Check]:
+    total = t["shuffle_read_mb"] + t["shuffle_write_mb"]
+    return [Check(
+        "SHUFFLE_HEAVY",
+        total >= shuffle_mb_warn,
+        np.where(total >= shuffle_mb_warn * 5, "ERROR", "WARN"),
+        lambda s: (f"Stage {s.stage_id} is shuffle-heavy (~{s.shuffle_read_mb + s.shuffle_write_mb:.0f} MB shuffle I/O).",
+                   {"shuffle_read_mb": s.shuffle_read_mb, "shuffle_write_mb": s.shuffle_write_mb, "spill_mb": s.spill_mb,
+                    "task_time_ms": s.task_time_ms, "fetch_wait_ms": s.fetch_wait_ms,
+                    "shuffle_write_time_ms": s.shuffle_write_time_ms}),
+    )]
+
+def spill_gc_checks(t: StageTable, spill_mb_warn: float = 512.0, gc_pct_warn: float = 0.10) -> List[Check]:
+    spill, gc = t["spill_mb"], t["gc_pct"]
+    return [
+        Check("SPILL_DETECTED", spill >= spill_mb_warn, np.where(spill < spill_mb_warn * 5, "WARN", "ERROR"),
+              lambda s: (f"Stage {s.stage_id} spilled ~{s.spill_mb:.0f} MB, indicating memory pressure.",
+                                 {"spill_mb": s.spill_mb, "task_time_ms": s.task_time_ms})),
+        Check("GC_PRESSURE", gc >= gc_pct_warn, np.where(gc < gc_pct_warn * 2, "WARN", "ERROR"),
+              lambda s: (f"Stage {s.stage_id} spent {s.gc_pct*100:.1f}% of task time in GC.",
+                                 {"gc_pct": s.gc_pct, "task_time_ms": s.task_time_ms})),
+    ]
+
+def detect_skew(stages: List[StageMetrics], p95_p50_warn: float = 3.0, max_p50_warn: float = 8.0) -> List[Finding]:
+    t = StageTable(stages)
+    return stage_findings(t, skew_checks(t, p95_p50_warn=p95_p50_warn, max_p50_warn=max_p50_warn))
+
+def detect_shuffle_heavy(stages: List[StageMetrics], shuffle_mb_warn: float = 1024.0) -> List[Finding]:
+    t = StageTable(stages)
+    return stage_findings(t, shuffle_checks(t, shuffle_mb_warn=shuffle_mb_warn))
+
 def detect_spill_or_gc(stages: List[StageMetrics], spill_mb_warn: float = 512.0, gc_pct_warn: float = 0.10) -> List[Finding]:
-    out: List[Finding] = []
-    for s in stages:
-        if s.spill_mb >= spill_mb_warn:
-            out.append(Finding(
-                code="SPILL_DETECTED",
-                severity="WARN" if s.spill_mb < spill_mb_warn * 5 else "ERROR",
-                stage_id=s.stage_id,
-                message=f"Stage {s.stage_id} spilled ~{s.spill_mb:.0f} MB, indicating memory pressure.",
-                evidence={"spill_mb": s.spill_mb},
-            ))
-        if s.gc_pct >= gc_pct_warn:
-            out.append(Finding(
-                code="GC_PRESSURE",
-                severity="WARN" if s.gc_pct < gc_pct_warn * 2 else "ERROR",
-                stage_id=s.stage_id,
-                message=f"Stage {s.stage_id} spent {s.gc_pct*100:.1f}% of task time in GC.",
-                evidence={"gc_pct": s.gc_pct},
-            ))
-    return out
+    t = StageTable(stages)
+    return stage_findings(t, spill_gc_checks(t, spill_mb_warn=spill_mb_warn, gc_pct_warn=gc_pct_warn))
 
-def detect_partitioning_issues(stages: List[StageMetrics], conf: SparkConf, cores_total: Optional[int] = None) -> List[Finding]:
+def detect_partitioning_issues(stages: List[StageMetrics], conf: SparkConf, cores_total: Optional[int] = None,
+                               over_partition_factor: int = 20, under_partition_divisor: int = 4,
+                               min_partitions: int = 8) -> List[Finding]:
     out: List[Finding] = []
     shuffle_parts = conf.get_int("spark.sql.shuffle.partitions", 200)
     default_par = conf.get_int("spark.default.parallelism", 0)
 
     if cores_total:
-        if shuffle_parts >= cores_total * 20:
+        if shuffle_parts >= cores_total * over_partition_factor:
             out.append(Finding(
                 code="OVER_PARTITIONED",
                 severity="WARN",
@@ -78,7 +143,7 @@ def detect_partitioning_issues(stages: List[StageMetrics], conf: SparkConf, core
                 message=f"spark.sql.shuffle.partitions={shuffle_parts} is very high vs total cores ({cores_total}).",
                 evidence={"shuffle_partitions": shuffle_parts, "cores_total": cores_total},
             ))
-        if shuffle_parts <= max(8, cores_total // 4):
+        if shuffle_parts <= max(min_partitions, cores_total // under_partition_divisor):
             out.append(Finding(
                 code="UNDER_PARTITIONED",
                 severity="WARN",
@@ -86,7 +151,7 @@ def detect_partitioning_issues(stages: List[StageMetrics], conf: SparkConf, core
                 message=f"spark.sql.shuffle.partitions={shuffle_parts} may be low vs total cores ({cores_total}).",
                 evidence={"shuffle_partitions": shuffle_parts, "cores_total": cores_total},
             ))
-        if default_par and default_par <= max(8, cores_total // 4):
+        if default_par and default_par <= max(min_partitions, cores_total // under_partition_divisor):
             out.append(Finding(
                 code="LOW_DEFAULT_PARALLELISM",
                 severity="INFO",
@@ -95,3 +160,257 @@ def detect_partitioning_issues(stages: List[StageMetrics], conf: SparkConf, core
                 evidence={"default_parallelism": default_par, "cores_total": cores_total},
             ))
     return out
+
+def _recommended_partitions(read_mb: np.ndarray, cores_total: Optional[int], target_partition_mb: float) -> np.ndarray:
+    rec = np.maximum(np.ceil(read_mb / target_partition_mb), 1)
+    if cores_total:
+        rec = np.where(rec > cores_total, np.ceil(rec / cores_total) * cores_total, rec)  # fill the last wave
+    return rec
+
+def partition_sizing(t: StageTable, cores_total: Optional[int] = None, target_partition_mb: float = 128.0,
+                     mask: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+    """Observed shuffle MB per reduce partition and the partition count (and task waves) for the target size,
+    for the stages in `mask` (default: every stage that read shuffle data)."""
+    read, spill, parts = t["shuffle_read_mb"], t["spill_mb"], np.maximum(t["num_tasks"], 1)
+    rec = _recommended_partitions(read, cores_total, target_partition_mb)
+    out = []
+    for i in np.flatnonzero(read > 0 if mask is None else mask).tolist():
+        n, r = int(parts[i]), int(rec[i])
+        out.append({"stage_id": int(t["stage_id"][i]), "name": t.stages[i].name, "shuffle_read_mb": float(read[i]),
+                    "partitions": n, "mb_per_partition": float(read[i]) / n, "recommended_partitions": r,
+                    "waves": math.ceil(n / cores_total) if cores_total else None,
+                    "recommended_waves": math.ceil(r / cores_total) if cores_total else None,
+                    "spill_mb": float(spill[i])})
+    return out
+
+def detect_shuffle_partition_sizing(t: StageTable, conf: SparkConf, cores_total: Optional[int] = None,
+                                    target_partition_mb: float = 128.0, undersized_fill: float = 0.25,
+                                    oversized_fill: float = 2.0, min_shuffle_mb: float = 256.0,
+                                    max_listed: int = 20) -> List[Finding]:
+    # Undersized: partitions well below the target size *and* more than one wave of tasks, so the
+    # extra partitions cost scheduling overhead rather than buying parallelism (not flagged when the
+    # stage spills anyway: fewer, larger partitions would make that worse). Oversized: partitions well
+    # above the target, which is where spill starts.
+    read, spill, parts = t["shuffle_read_mb"], t["spill_mb"], np.maximum(t["num_tasks"], 1)
+    rec = _recommended_partitions(read, cores_total, target_partition_mb)
+    per_part = read / parts
+    sized = (read > 0) & (read >= min_shuffle_mb)
+    many_waves = parts > cores_total if cores_total else True
+    under = sized & (per_part < target_partition_mb * undersized_fill) & many_waves & (spill == 0) & (parts >= 2 * rec)
+    over = sized & ~under & (per_part > target_partition_mb * oversized_fill)
+    if not (under | over).any():
+        return []
+    hit = under | over
+    bad = [{**r, "issue": "undersized" if under[i] else "oversized"}
+           for i, r in zip(np.flatnonzero(hit).tolist(), partition_sizing(t, cores_total, target_partition_mb, hit))]
+    aqe = conf.get_bool("spark.sql.adaptive.enabled", False)
+    setting = int(rec[sized].max())
+    recommended_conf = {"spark.sql.shuffle.partitions": setting,
+                        "spark.sql.adaptive.advisoryPartitionSizeInBytes": f"{int(target_partition_mb)}m"}
+    if not aqe:
+        recommended_conf["spark.sql.adaptive.enabled"] = "true"
+        recommended_conf["spark.sql.adaptive.coalescePartitions.enabled"] = "true"
+    counts = {"undersized": int(under.sum()), "oversized": int(over.sum())}
+    worst = sorted(bad, key=lambda r: -abs(math.log(max(r["mb_per_partition"], 1e-6) / target_partition_mb)))[:max_listed]
+    return [Finding(
+        code="SHUFFLE_PARTITION_SIZING",
+        severity="ERROR" if (over & (spill > 0)).any() else "WARN",
+        stage_id=None,
+        message=(f"{len(bad)} shuffle stages are far from {target_partition_mb:.0f} MB partitions "
+                 f"({counts['undersized']} undersized, {counts['oversized']} oversized); "
+                 f"the observed data suggests spark.sql.shuffle.partitions={setting}."),
+        evidence={"target_partition_mb": target_partition_mb, "cores_total": cores_total,
+                  "configured_shuffle_partitions": conf.get_int("spark.sql.shuffle.partitions", 200), "aqe_enabled": aqe,
+                  "recommended_conf": recommended_conf, **counts, "stages": sorted(worst, key=lambda r: r["stage_id"])},
+    )]
+
+class DetectorRegistry:
+    """Ordered set of rules evaluated by one engine over one StageTable built per run. Stage rules are
+    column masks over it; app rules get it (with the other analyses) through AppContext."""
+
+    def __init__(self):
+        self._rules: Dict[str, Rule] = {}
+
+    @property
+    def rules(self) -> List[Rule]:
+        return list(self._rules.values())
+
+    def register(self, rule: Rule) -> Rule:
+        if rule.scope not in ("stage", "app"):
+            raise ValueError(f"rule {rule.name!r}: scope must be 'stage' or 'app'")
+        if rule.name in self._rules:
+            raise ValueError(f"detector rule {rule.name!r} is already registered")
+        self._rules[rule.name] = rule
+        return rule
+
+    def rule(self, name: str, scope: str = "stage", **thresholds: Any) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+        def deco(fn: Callable[..., Any]) -> Callable[..., Any]:
+            self.register(Rule(name, fn, thresholds, scope))
+            return fn
+        return deco
+
+    def resolve(self, overrides: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Dict[str, Any]]:
+        """Effective thresholds per rule; unknown rules or keys are errors so typos do not pass silently."""
+        overrides = overrides or {}
+        unknown = set(overrides) - set(self._rules)
+        if unknown:
+            raise ValueError(f"thresholds for unknown detector rules: {sorted(unknown)}")
+        out = {}
+        for r in self._rules.values():
+            cfg = dict(overrides.get(r.name) or {})
+            bad = set(cfg) - set(r.thresholds) - {"enabled"}
+            if bad:
+                raise ValueError(f"unknown thresholds for rule {r.name!r}: {sorted(bad)} (known: {sorted(r.thresholds)})")
+            out[r.name] = {**r.thresholds, **cfg}
+        return out
+
+    def run(self, stages: List[StageMetrics], conf: Optional[SparkConf] = None, cores_total: Optional[int] = None,
+            timeline: Optional[AppTimeline] = None, thresholds: Optional[Dict[str, Dict[str, Any]]] = None,
+            scope: Optional[str] = None, baselines: Optional[Dict[Tuple[str, int], StageBaseline]] = None,
+            tasks: Optional[TaskTable] = None, meta: Optional[Dict[str, Any]] = None,
+            memory_gb_per_node: Optional[float] = None, memory: Optional[MemoryAnalysis] = None,
+            sql: Optional[SqlAttribution] = None) -> List[Finding]:
+        cfg = self.resolve(thresholds)
+        table = StageTable(stages)
+        ctx = AppContext(stages, table, conf or SparkConf(conf={}), cores_total, timeline, baselines, tasks, meta,
+                         memory_gb_per_node, memory)
+        out: List[Finding] = []
+        with phase("detectors") as ph:
+            ph.count(events=len(stages))
+            host_cfg = cfg.get("slow_hosts", {})
+            if tasks is not None and host_cfg.get("enabled", True):
+                # One task-level pass shared by the skew rule (to set host stragglers apart) and slow_hosts.
+                table.hosts = analyze_hosts(tasks, meta or {}, **{k: host_cfg[k] for k in HOST_ANALYSIS_KEYS if k in host_cfg})
+            if sql is not None:
+                table.sql = sql
+            elif has_sql_plans(meta):
+                table.sql = attribute_operators(stages, meta)
+            for r in self._rules.values():
+                if scope is not None and r.scope != scope:
+                    continue
+                th = dict(cfg[r.name])
+                if not th.pop("enabled", True):
+                    continue
+                with phase(r.name):
+                    out += stage_findings(table, r.fn(table, **th)) if r.scope == "stage" else r.fn(ctx, **th)
+            if table.sql is not None:
+                annotate_operators(out, table.sql)
+        return out
+
+HOST_ANALYSIS_KEYS = ("slow_factor", "min_tasks", "min_stage_tasks")
+
+REGISTRY = DetectorRegistry()
+REGISTRY.register(Rule("skew", skew_checks, {"p95_p50_warn": 3.0, "max_p50_warn": 8.0, "min_tasks": 10,
+                                             "data_corr": 0.5, "host_share": 0.5}))
+REGISTRY.register(Rule("shuffle_heavy", shuffle_checks, {"shuffle_mb_warn": 1024.0}))
+REGISTRY.register(Rule("spill_or_gc", spill_gc_checks, {"spill_mb_warn": 512.0, "gc_pct_warn": 0.10}))
+
+@REGISTRY.rule("partitioning", scope="app", over_partition_factor=20, under_partition_divisor=4, min_partitions=8)
+def _partitioning(ctx: AppContext, **th: Any) -> List[Finding]:
+    return detect_partitioning_issues(ctx.stages, ctx.conf, cores_total=ctx.cores_total, **th)
+
+@REGISTRY.rule("shuffle_partition_sizing", scope="app", target_partition_mb=128.0, undersized_fill=0.25,
+               oversized_fill=2.0, min_shuffle_mb=256.0, max_listed=20)
+def _shuffle_partition_sizing(ctx: AppContext, **th: Any) -> List[Finding]:
+    return detect_shuffle_partition_sizing(ctx.table, ctx.conf, cores_total=ctx.cores_total, **th)
+
+@REGISTRY.rule("slow_hosts", scope="app", slow_factor=2.0, min_tasks=20, min_stage_tasks=10, host_share=0.5,
+               max_stages=20)
+def _slow_hosts(ctx: AppContext, slow_factor: float, host_share: float, max_stages: int, **_: Any) -> List[Finding]:
+    hosts = ctx.table.hosts
+    return detect_slow_hosts(hosts, slow_factor, host_share, max_stages) if hosts is not None else []
+
+@REGISTRY.rule("wasted_work", scope="app", min_attempts=2, wasted_pct_warn=0.10, speculation_pct_warn=0.05,
+               min_wasted_ms=60_000, max_listed=20)
+def _wasted_work(ctx: AppContext, **th: Any) -> List[Finding]:
+    return detect_wasted_work(ctx.table, ctx.conf, **th)
+
+@REGISTRY.rule("executor_memory", scope="app", spill_mb_warn=512.0, heap_pressure_pct=0.9, overprovisioned_pct=0.5,
+               overhead_pressure_pct=0.9, headroom=0.25, max_executor_gb=64.0, max_listed=20)
+def _executor_memory(ctx: AppContext, **th: Any) -> List[Finding]:
+    mem = ctx.memory if ctx.memory is not None else analyze_memory(ctx.tasks, ctx.meta or {}, ctx.conf)
+    return detect_executor_memory(ctx.table, mem, ctx.memory_gb_per_node, **th)
+
+@REGISTRY.rule("python_udf", scope="app", min_python_ms=60_000, python_pct_warn=0.3, arrow_speedup=3.0,
+               worker_boot_ms=250)
+def _python_udf(ctx: AppContext, worker_boot_ms: int, **th: Any) -> List[Finding]:
+    meta = ctx.meta or {}
+    conf = SparkConf(conf={**(meta.get("spark_properties") or {}), **ctx.conf.conf})
+    pys = python_stages(ctx.table, meta, ctx.table.sql, conf.get_bool("spark.python.worker.reuse", True), worker_boot_ms)
+    return detect_python_udfs(pys, conf, **th)
+
+@REGISTRY.rule("file_io", scope="app", min_tasks=50, small_input_mb=16.0, overhead_pct_warn=0.1, short_task_ms=200,
+               large_split_mb=512.0, small_output_mb=32.0, target_file_mb=128.0)
+def _file_io(ctx: AppContext, **th: Any) -> List[Finding]:
+    conf = SparkConf(conf={**((ctx.meta or {}).get("spark_properties") or {}), **ctx.conf.conf})
+    return detect_file_io(ctx.table, conf, ctx.table.sql, **th)
+
+@REGISTRY.rule("idle_executors", scope="app", idle_pct_warn=0.5, min_idle_core_ms=3_600_000)
+def _idle_executors(ctx: AppContext, **th: Any) -> List[Finding]:
+    return detect_idle_executors(ctx.timeline, **th) if ctx.timeline is not None else []
+
+@REGISTRY.rule("serial_stage_chain", scope="app", max_utilization=0.5, min_stages=3, min_chain_ms=60_000)
+def _serial_stage_chain(ctx: AppContext, **th: Any) -> List[Finding]:
+    return detect_serial_stage_chains(ctx.timeline, **th) if ctx.timeline is not None else []
+
+@REGISTRY.rule("stage_regression", scope="app", sigmas=3.0, min_relative_increase=0.2, min_runs=3,
+               min_duration_ms=1000, min_mb=64.0)
+def _stage_regression(ctx: AppContext, **th: Any) -> List[Finding]:
+    return detect_stage_regressions(ctx.table, ctx.baselines, **th) if ctx.baselines else []
+
+_plugins_loaded = False
+
+def load_plugins(registry: Optional[DetectorRegistry] = None) -> None:
+    """Register third-party rules from the `spark_opt.detectors` entry-point group.
+
+    An entry point may name a Rule, a list of Rules, or a function taking the registry.
+    A plugin that fails to load is skipped with a warning rather than failing the analysis.
+    """
+    registry = registry or REGISTRY
+    for ep in entry_points(group=ENTRY_POINT_GROUP):
+        try:
+            obj = ep.load()
+            if isinstance(obj, Rule):
+                registry.register(obj)
+            elif isinstance(obj, (list, tuple)):
+                for r in obj:
+                    registry.register(r)
+            else:
+                obj(registry)
+        except Exception as e:
+            warnings.warn(f"skipping detector plugin {ep.name!r}: {type(e).__name__}: {e}")
+
+def default_registry() -> DetectorRegistry:
+    global _plugins_loaded
+    if not _plugins_loaded:
+        _plugins_loaded = True
+        load_plugins(REGISTRY)
+    return REGISTRY
+
+def load_thresholds(path: str) -> Dict[str, Dict[str, Any]]:
+    """Per-rule threshold overrides from JSON or YAML, e.g. {"skew": {"max_p50_warn": 10}, "spill_or_gc": {"enabled": false}}."""
+    with open(path, "r", encoding="utf-8") as f:
+        if os.path.splitext(path)[1].lower() in (".yaml", ".yml"):
+            try:
+                import yaml
+            except ImportError as e:
+                raise ImportError("YAML threshold files require the optional 'PyYAML' package") from e
+            data = yaml.safe_load(f) or {}
+        else:
+            data = json.load(f)
+    if not isinstance(data, dict) or not all(isinstance(v, dict) for v in data.values()):
+        raise ValueError(f"{path}: expected a mapping of rule name -> thresholds")
+    return data
+
+def detect_all(stages: List[StageMetrics], conf: SparkConf, cores_total: Optional[int] = None,
+               timeline: Optional[AppTimeline] = None,
+               thresholds: Optional[Dict[str, Dict[str, Any]]] = None,
+               baselines: Optional[Dict[Tuple[str, int], StageBaseline]] = None,
+               tasks: Optional[TaskTable] = None, meta: Optional[Dict[str, Any]] = None,
+               memory_gb_per_node: Optional[float] = None, memory: Optional[MemoryAnalysis] = None,
+               sql: Optional[SqlAttribution] = None) -> List[Finding]:
+    """All enabled rules; with `tasks` (and `meta` for host names) host-level rules run as well. `memory` and
+    `sql` take analyses the caller already has, so they are not computed twice."""
+    return default_registry().run(stages, conf, cores_total=cores_total, timeline=timeline, thresholds=thresholds,
+                                  baselines=baselines, tasks=tasks, meta=meta, memory_gb_per_node=memory_gb_per_node,
+                                  memory=memory, sql=sql)
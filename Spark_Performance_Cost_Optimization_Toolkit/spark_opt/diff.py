@@ -0,0 +1,119 @@
+from __future__ import annotations
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import math
+from spark_opt.config import CostSpec
+from spark_opt.cost_model import compare, estimate_cost
+from spark_opt.eventlog_reader import StageCompleted
+from spark_opt.metrics import StageMetrics
+from spark_opt.profiling import profiled
+
+# Stage ids shift between runs, so stages are aligned by what they are: first by name plus the names of
+# their parent stages (the structure), then leftovers by name alone (e.g. a join whose inputs changed
+# when a broadcast removed an exchange). Within a key, stages pair up in stage-id order. Both passes
+# are dict lookups, so alignment is O(stages).
+DIFF_METRICS = ("stage_duration_ms", "task_p50_ms", "task_p95_ms", "task_max_ms", "shuffle_read_mb",
+                "shuffle_write_mb", "spill_mb", "gc_pct")
+
+@dataclass
+class RunStages:
+    metrics: Dict[int, StageMetrics]  # last attempt per stage id
+    parents: Dict[int, List[int]]
+    wall_ms: int
+
+    @property
+    def order(self) -> List[int]:
+        return sorted(self.metrics)
+
+    def signature(self, sid: int) -> Tuple[str, Tuple[str, ...]]:
+        names = {p: self.metrics[p].name if p in self.metrics else "?" for p in self.parents.get(sid, ())}
+        return self.metrics[sid].name, tuple(sorted(names.values()))
+
+@dataclass
+class StageDiff:
+    stage_name: str
+    match: str  # "structure" | "name" | "added" | "removed"
+    before_stage_id: Optional[int]
+    after_stage_id: Optional[int]
+    metrics: Dict[str, Dict[str, Optional[float]]] = field(default_factory=dict)
+
+    @property
+    def duration_delta_ms(self) -> float:
+        return self.metrics["stage_duration_ms"]["delta"] or 0.0
+
+def run_stages(stages: List[StageCompleted], metrics: List[StageMetrics], meta: Dict[str, Any]) -> RunStages:
+    last: Dict[int, StageMetrics] = {}
+    for m in metrics:
+        if m.stage_id not in last or m.attempt > last[m.stage_id].attempt:
+            last[m.stage_id] = m
+    parents: Dict[int, set] = {}
+    for job in meta.get("jobs") or []:
+        for sid, pids in job.get("stages") or []:
+            parents.setdefault(sid, set()).update(pids)
+    for s in stages:
+        parents.setdefault(s.stage_id, set()).update(s.parent_ids)
+    times = [t for s in stages for t in (s.submission_time_ms, s.completion_time_ms) if t is not None]
+    start = meta.get("start_time_ms") if meta.get("start_time_ms") is not None else min(times, default=0)
+    end = meta.get("end_time_ms") if meta.get("end_time_ms") is not None else max(times, default=start)
+    return RunStages(last, {k: sorted(v) for k, v in parents.items()}, int(max(0, end - start)))
+
+def align(before: RunStages, after: RunStages) -> List[Tuple[Optional[int], Optional[int], str]]:
+    """(before stage id, after stage id, match kind) pairs covering every stage of both runs."""
+    pairs: Dict[int, Tuple[int, str]] = {}
+    left_after = set(after.metrics)
+    for kind, key_b, key_a in (("structure", before.signature, after.signature),
+                               ("name", lambda s: before.metrics[s].name, lambda s: after.metrics[s].name)):
+        pool: Dict[Any, Deque[int]] = {}
+        for sid in after.order:
+            if sid in left_after:
+                pool.setdefault(key_a(sid), deque()).append(sid)
+        for sid in before.order:
+            if sid in pairs:
+                continue
+            q = pool.get(key_b(sid))
+            if q:
+                a = q.popleft()
+                pairs[sid] = (a, kind)
+                left_after.discard(a)
+    out: List[Tuple[Optional[int], Optional[int], str]] = []
+    for sid in before.order:
+        a, kind = pairs.get(sid, (None, "removed"))
+        out.append((sid, a, kind))
+    out += [(None, a, "added") for a in after.order if a in left_after]
+    return out
+
+def _delta(b: Optional[float], a: Optional[float]) -> Dict[str, Optional[float]]:
+    d = a - b if a is not None and b is not None else None
+    pct = d / b * 100 if d is not None and b else None
+    return {"before": b, "after": a, "delta": d, "delta_pct": pct}
+
+@profiled("diff")
+def diff_runs(before: RunStages, after: RunStages) -> List[StageDiff]:
+    out = []
+    for b, a, kind in align(before, after):
+        mb = before.metrics.get(b) if b is not None else None
+        ma = after.metrics.get(a) if a is not None else None
+        name = (mb or ma).name
+        out.append(StageDiff(name, kind, b, a, {
+            m: _delta(float(getattr(mb, m)) if mb else None, float(getattr(ma, m)) if ma else None) for m in DIFF_METRICS}))
+    return out
+
+def summarize(before: RunStages, after: RunStages, diffs: List[StageDiff], before_nodes: int, after_nodes: int,
+              cost: Optional[CostSpec] = None) -> Dict[str, Any]:
+    cost = cost or CostSpec()
+    total = lambda run, m: sum(float(getattr(s, m)) for s in run.metrics.values())
+    est = [estimate_cost(math.ceil(run.wall_ms / 1000), nodes, cost.rate_per_node_hour, cost.dbus_per_node,
+                         cost.rate_per_dbu_hour) for run, nodes in ((before, before_nodes), (after, after_nodes))]
+    counts: Dict[str, int] = {}
+    for d in diffs:
+        counts[d.match] = counts.get(d.match, 0) + 1
+    return {
+        "stages": {"before": len(before.metrics), "after": len(after.metrics), **counts},
+        "wall_s": _delta(before.wall_ms / 1000, after.wall_ms / 1000),
+        "total_stage_ms": _delta(total(before, "stage_duration_ms"), total(after, "stage_duration_ms")),
+        "shuffle_mb": _delta(total(before, "shuffle_read_mb") + total(before, "shuffle_write_mb"),
+                             total(after, "shuffle_read_mb") + total(after, "shuffle_write_mb")),
+        "spill_mb": _delta(total(before, "spill_mb"), total(after, "spill_mb")),
+        "cost": {**compare(est[0], est[1]), "before": est[0].__dict__, "after": est[1].__dict__},
+    }
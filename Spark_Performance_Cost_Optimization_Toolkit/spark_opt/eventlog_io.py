@@ -0,0 +1,185 @@
+from __future__ import annotations
+from typing import Any, BinaryIO, Iterator, List, Optional, Tuple
+import gzip, io, os, re, struct
+
+# Spark's event-log codecs (spark.eventLog.compression.codec) are stream formats of the JVM libraries:
+#   lz4    -> lz4-java LZ4BlockOutputStream   ("LZ4Block" framed blocks)
+#   snappy -> xerial SnappyOutputStream       ("\x82SNAPPY\x00" header + length-prefixed blocks)
+#   zstd   -> zstd-jni ZstdOutputStream       (standard zstd frames)
+# All are decoded block by block into a bounded buffer; nothing is written to disk.
+CODEC_SUFFIXES = {".lz4": "lz4", ".snappy": "snappy", ".zstd": "zstd", ".zst": "zstd", ".gz": "gzip", ".lzf": "lzf"}
+INPROGRESS_SUFFIX = ".inprogress"
+READ_BUFFER = 1024 * 1024
+
+_ROLLING_PREFIX = "eventlog_v2_"
+_PART_RE = re.compile(r"^events_(\d+)_")
+
+_LZ4_BLOCK_MAGIC = b"LZ4Block"
+_LZ4_FRAME_MAGIC = b"\x04\x22\x4d\x18"
+_LZ4_RAW, _LZ4_COMPRESSED = 0x10, 0x20
+_SNAPPY_XERIAL_MAGIC = b"\x82SNAPPY\x00"
+_SNAPPY_FRAMED_MAGIC = b"\xff\x06\x00\x00sNaPpY"
+
+def is_rolling_dir(path: str) -> bool:
+    return os.path.isdir(path) and os.path.basename(os.path.normpath(path)).startswith(_ROLLING_PREFIX)
+
+def eventlog_parts(path: str) -> List[str]:
+    """Files making up an event log: the file itself, or the `events_N_*` parts of a rolling (v2) dir in order."""
+    if not os.path.isdir(path):
+        return [path]
+    parts: List[Tuple[int, str]] = []
+    for n in os.listdir(path):
+        m = _PART_RE.match(n)
+        if m:
+            parts.append((int(m.group(1)), os.path.join(path, n)))
+    if not parts:
+        raise FileNotFoundError(f"no events_N_* files in rolling event log dir {path}")
+    return [p for _, p in sorted(parts)]
+
+def codec_of(path: str) -> Optional[str]:
+    name = path[:-len(INPROGRESS_SUFFIX)] if path.endswith(INPROGRESS_SUFFIX) else path
+    return CODEC_SUFFIXES.get(os.path.splitext(name)[1].lower())
+
+def is_plain_file(path: str) -> bool:
+    return os.path.isfile(path) and codec_of(path) is None
+
+def fingerprint(path: str) -> Tuple[int, int]:
+    """(total size, newest mtime_ns) over all parts; changes whenever any part is appended or added."""
+    size, mtime = 0, 0
+    for p in eventlog_parts(path):
+        st = os.stat(p)
+        size += st.st_size
+        mtime = max(mtime, st.st_mtime_ns)
+    return size, mtime
+
+def _require(module: str, codec: str) -> Any:
+    try:
+        return __import__(module, fromlist=["_"])
+    except ImportError as e:
+        raise ImportError(f"reading {codec}-compressed event logs requires the optional '{module.split('.')[0]}' package") from e
+
+def _read_exact(f: BinaryIO, n: int) -> bytes:
+    buf = f.read(n)
+    while len(buf) < n:
+        more = f.read(n - len(buf))
+        if not more:
+            raise EOFError("truncated compressed event log block")
+        buf += more
+    return buf
+
+class _BlockStream(io.RawIOBase):
+    def __init__(self, blocks: Iterator[bytes], raw: BinaryIO):
+        self._blocks = blocks
+        self._raw = raw
+        self._buf = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b: Any) -> int:
+        while not len(self._buf):
+            nxt = next(self._blocks, None)
+            if nxt is None:
+                return 0
+            self._buf = memoryview(nxt)
+        n = min(len(b), len(self._buf))
+        b[:n] = self._buf[:n]
+        self._buf = self._buf[n:]
+        return n
+
+    def close(self) -> None:
+        if not self.closed:
+            self._raw.close()
+        super().close()
+
+def _lz4_blocks(f: BinaryIO) -> Iterator[bytes]:
+    lz4_block = None
+    while True:
+        magic = f.read(len(_LZ4_BLOCK_MAGIC))
+        if not magic:
+            return
+        if magic != _LZ4_BLOCK_MAGIC:
+            raise ValueError("not an LZ4Block stream")
+        token, clen, dlen, _checksum = struct.unpack("<Biii", _read_exact(f, 13))
+        data = _read_exact(f, clen)
+        if dlen == 0:
+            continue  # end-of-stream marker; a concatenated stream may follow
+        if token & 0xF0 == _LZ4_RAW:
+            yield data
+        elif token & 0xF0 == _LZ4_COMPRESSED:
+            lz4_block = lz4_block or _require("lz4.block", "lz4")
+            yield lz4_block.decompress(data, uncompressed_size=dlen)
+        else:
+            raise ValueError(f"unknown LZ4Block compression method 0x{token & 0xF0:02x}")
+
+def _snappy_xerial_blocks(f: BinaryIO) -> Iterator[bytes]:
+    snappy = _require("snappy", "snappy")
+    while True:
+        head = f.read(4)
+        if not head:
+            return
+        if len(head) < 4:
+            head += _read_exact(f, 4 - len(head))
+        if head == _SNAPPY_XERIAL_MAGIC[:4]:
+            # (Re)start of a stream: 8-byte magic + version + compatible version. Block lengths
+            # never collide with it because they are positive big-endian ints.
+            if head + _read_exact(f, 12)[:4] != _SNAPPY_XERIAL_MAGIC:
+                raise ValueError("corrupt snappy stream header")
+            continue
+        (clen,) = struct.unpack(">i", head)
+        yield snappy.decompress(_read_exact(f, clen))
+
+def _snappy_framed_blocks(f: BinaryIO) -> Iterator[bytes]:
+    d = _require("snappy", "snappy").StreamDecompressor()
+    while True:
+        chunk = f.read(READ_BUFFER)
+        if not chunk:
+            d.flush()
+            return
+        out = d.decompress(chunk)
+        if out:
+            yield out
+
+def _stream_blocks(reader: Any) -> Iterator[bytes]:
+    while True:
+        chunk = reader.read(READ_BUFFER)
+        if not chunk:
+            return
+        yield chunk
+
+def open_eventlog_file(path: str) -> BinaryIO:
+    """Open one event-log file as a buffered binary stream, decompressing on the fly."""
+    codec = codec_of(path)
+    if codec is None:
+        return open(path, "rb")
+    if codec == "gzip":
+        return gzip.open(path, "rb")
+    if codec == "lzf":
+        raise ValueError(f"lzf-compressed event logs are not supported: {path}")
+    raw = open(path, "rb")
+    try:
+        head = raw.read(16)
+        raw.seek(0)
+        blocks: Iterator[bytes]
+        if codec == "zstd":
+            zstd = _require("zstandard", "zstd")
+            blocks = _stream_blocks(zstd.ZstdDecompressor().stream_reader(raw, read_across_frames=True))
+        elif codec == "lz4" and head.startswith(_LZ4_FRAME_MAGIC):
+            blocks = _stream_blocks(_require("lz4.frame", "lz4").open(raw, "rb"))
+        elif codec == "lz4":
+            blocks = _lz4_blocks(raw)
+        elif head.startswith(_SNAPPY_FRAMED_MAGIC):
+            blocks = _snappy_framed_blocks(raw)
+        else:
+            blocks = _snappy_xerial_blocks(raw)
+    except BaseException:
+        raw.close()
+        raise
+    return io.BufferedReader(_BlockStream(blocks, raw), buffer_size=READ_BUFFER)
+
+def iter_lines(path: str) -> Iterator[bytes]:
+    """Raw lines of an event log: plain or compressed file, or all parts of a rolling (v2) directory."""
+    # Spark rolls v2 logs on event boundaries, so parts can simply be streamed back to back.
+    for part in eventlog_parts(path):
+        with open_eventlog_file(part) as f:
+            yield from f
@@ -1,7 +1,17 @@
 from __future__ import annotations
-from dataclasses import dataclass
-from typing import Any, Dict, Iterable, List, Optional, Tuple
-import json
+from array import array
+from dataclasses import dataclass, field
+from typing import Any, Callable, Collection, Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+import json, os, re
+import numpy as np
+from spark_opt.eventlog_io import is_plain_file, iter_lines
+from spark_opt.profiling import count, counted, profiled
+
+try:  # optional faster JSON backend
+    import orjson as _fastjson
+except ImportError:  # pragma: no cover - depends on environment
+    _fastjson = None
 
 @dataclass
 class TaskEnd:
@@ -14,6 +24,24 @@ class TaskEnd:
     shuffle_write_bytes: int
     spill_mem_bytes: int
     spill_disk_bytes: int
+    executor_id: int = -1  # -1: driver / unknown
+    launch_time_ms: int = -1
+    finish_time_ms: int = -1
+    input_bytes: int = 0
+    outcome: int = 0       # TASK_SUCCESS / TASK_FAILED / TASK_KILLED / TASK_SUPERSEDED / TASK_LOST
+    speculative: int = 0   # 1 for a speculative copy
+    peak_execution_bytes: int = 0  # "Peak Execution Memory": the task's sort/aggregation/join buffers
+    jvm_heap_bytes: int = 0        # executor peaks while the task ran ("Task Executor Metrics")
+    off_heap_bytes: int = 0        # JVM off-heap + direct + mapped buffer pools
+    python_bytes: int = 0          # Python workers' and other child processes' RSS
+    cpu_time_ms: int = 0           # "Executor CPU Time" of the task thread (Python workers run in other processes)
+    serialization_ms: int = 0      # task deserialization + result serialization
+    fetch_wait_ms: int = 0         # blocked on shuffle fetches
+    run_time_ms: int = 0           # "Executor Run Time"; the rest of the duration is per-task overhead
+    input_records: int = 0
+    output_bytes: int = 0
+    output_records: int = 0
+    shuffle_write_time_ms: int = 0  # blocked writing shuffle files ("Shuffle Write Time", ns in the log)
 
 @dataclass
 class StageCompleted:
@@ -23,60 +51,539 @@ class StageCompleted:
     num_tasks: int
     submission_time_ms: Optional[int]
     completion_time_ms: Optional[int]
+    parent_ids: List[int] = field(default_factory=list)
+
+# (column, array typecode) for the columnar task table; order matches TaskEnd fields.
+TASK_COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ("stage_id", "i"),
+    ("attempt", "i"),
+    ("task_id", "q"),
+    ("duration_ms", "q"),
+    ("gc_time_ms", "q"),
+    ("shuffle_read_bytes", "q"),
+    ("shuffle_write_bytes", "q"),
+    ("spill_mem_bytes", "q"),
+    ("spill_disk_bytes", "q"),
+    ("executor_id", "i"),
+    ("launch_time_ms", "q"),
+    ("finish_time_ms", "q"),
+    ("input_bytes", "q"),
+    ("outcome", "i"),
+    ("speculative", "i"),
+    ("peak_execution_bytes", "q"),
+    ("jvm_heap_bytes", "q"),
+    ("off_heap_bytes", "q"),
+    ("python_bytes", "q"),
+    ("cpu_time_ms", "q"),
+    ("serialization_ms", "q"),
+    ("fetch_wait_ms", "q"),
+    ("run_time_ms", "q"),
+    ("input_records", "q"),
+    ("output_bytes", "q"),
+    ("output_records", "q"),
+    ("shuffle_write_time_ms", "q"),
+)
+# Task outcomes from "Task End Reason". Superseded: a duplicate attempt killed or denied its commit
+# because another attempt of the same task (usually a speculative copy) finished first. Lost: a
+# "Resubmitted" marker for a task that had succeeded but whose map output was lost with its executor;
+# it repeats that earlier run's times, so its duration counts as wasted, not as extra task time.
+TASK_SUCCESS, TASK_FAILED, TASK_KILLED, TASK_SUPERSEDED, TASK_LOST = range(5)
+DEFAULT_CHUNK_ROWS = 65536
+# Below this size process start-up costs more than parallel decoding saves.
+MIN_PARALLEL_BYTES = 32 * 1024 * 1024
+
+def _dtype(code: str) -> np.dtype:
+    return np.dtype(np.int32 if code == "i" else np.int64)
+
+@dataclass
+class TaskTable:
+    columns: Dict[str, np.ndarray]
+
+    def __len__(self) -> int:
+        return int(len(self.columns["stage_id"]))
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    def __iter__(self) -> Iterator[TaskEnd]:
+        cols = [self.columns[name].tolist() for name, _ in TASK_COLUMNS]
+        for row in zip(*cols):
+            yield TaskEnd(*row)
+
+    @property
+    def nbytes(self) -> int:
+        return int(sum(c.nbytes for c in self.columns.values()))
+
+    @classmethod
+    def empty(cls) -> "TaskTable":
+        return cls({name: np.empty(0, dtype=_dtype(code)) for name, code in TASK_COLUMNS})
+
+    @classmethod
+    def from_records(cls, tasks: Iterable[TaskEnd]) -> "TaskTable":
+        b = TaskTableBuilder()
+        for t in tasks:
+            b.append(tuple(getattr(t, name) for name, _ in TASK_COLUMNS))
+        return b.build()
+
+    @classmethod
+    def concat(cls, tables: List["TaskTable"]) -> "TaskTable":
+        tables = [t for t in tables if len(t)]
+        if not tables:
+            return cls.empty()
+        if len(tables) == 1:
+            return tables[0]
+        return cls({name: np.concatenate([t.columns[name] for t in tables]) for name, _ in TASK_COLUMNS})
+
+def as_task_table(tasks: Any) -> TaskTable:
+    return tasks if isinstance(tasks, TaskTable) else TaskTable.from_records(tasks)
+
+class TaskTableBuilder:
+    """Appends task rows into compact typed buffers and seals them into NumPy chunks every `chunk_size` rows."""
+
+    def __init__(self, chunk_size: int = DEFAULT_CHUNK_ROWS):
+        self.chunk_size = max(1, int(chunk_size))
+        self._chunks: List[TaskTable] = []
+        self._reset()
+
+    def _reset(self) -> None:
+        self._bufs = [array(code) for _, code in TASK_COLUMNS]
+        self._appends = [b.append for b in self._bufs]
+        self._n = 0
+
+    def __len__(self) -> int:
+        return sum(len(c) for c in self._chunks) + self._n
+
+    def append(self, row: Tuple[int, ...]) -> None:
+        for ap, v in zip(self._appends, row):
+            ap(v)
+        self._n += 1
+        if self._n >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._n:
+            return
+        self._chunks.append(TaskTable({
+            name: np.frombuffer(buf, dtype=_dtype(code)).copy()
+            for (name, code), buf in zip(TASK_COLUMNS, self._bufs)
+        }))
+        self._reset()
+
+    def drain(self) -> List[TaskTable]:
+        """Return the sealed chunks so far and release them (for streaming consumers)."""
+        self.flush()
+        out, self._chunks = self._chunks, []
+        return out
+
+    def build(self) -> TaskTable:
+        return TaskTable.concat(self.drain())
+
+def _loads(raw: bytes) -> Dict[str, Any]:
+    if _fastjson is not None:
+        try:
+            return _fastjson.loads(raw)
+        except _fastjson.JSONDecodeError:
+            pass  # e.g. NaN/Infinity literals, which only the stdlib parser accepts
+    return json.loads(raw)
+
+def event_type_of(line: bytes) -> Optional[bytes]:
+    """Read the "Event" value straight from the raw line without decoding the JSON."""
+    i = line.find(b'"Event"')
+    if i < 0:
+        return None
+    c = line.find(b":", i + 7)
+    if c < 0:
+        return None
+    a = line.find(b'"', c + 1)
+    if a < 0:
+        return None
+    b = line.find(b'"', a + 1)
+    return line[a + 1:b] if b > a else None
+
+def decode_lines(lines: Iterable[bytes], event_types: Optional[Collection[str]] = None) -> Iterator[Dict[str, Any]]:
+    """Decode JSON lines, skipping (before decoding) events whose type is not in `event_types`."""
+    wanted = frozenset(e.encode("utf-8") for e in event_types) if event_types is not None else None
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if wanted is not None:
+            et = event_type_of(line)
+            if et is not None and et not in wanted:
+                continue
+        yield _loads(line)
+
+def read_jsonl(path: str, event_types: Optional[Collection[str]] = None) -> Iterable[Dict[str, Any]]:
+    """Events from a plain, compressed (.gz/.lz4/.snappy/.zstd) or rolling (eventlog_v2_*) event log."""
+    yield from decode_lines(iter_lines(path), event_types)
+
+def stage_from_event(evt: Dict[str, Any]) -> StageCompleted:
+    info = evt.get("Stage Info") or {}
+    return StageCompleted(
+        stage_id=int(info.get("Stage ID", info.get("Stage Id", -1))),
+        attempt=int(info.get("Stage Attempt ID", info.get("Stage Attempt Id", 0))),
+        name=str(info.get("Stage Name", "")),
+        num_tasks=int(info.get("Number of Tasks", 0)),
+        submission_time_ms=info.get("Submission Time"),
+        completion_time_ms=info.get("Completion Time"),
+        parent_ids=[int(p) for p in info.get("Parent IDs") or ()],
+    )
+
+def executor_num(executor_id: Any) -> int:
+    """Executor IDs are numeric strings except for the driver ("driver"), which maps to -1 like a missing ID."""
+    try:
+        return int(executor_id)
+    except (TypeError, ValueError):
+        return -1
+
+SQL_EXECUTION_START = "org.apache.spark.sql.execution.ui.SparkListenerSQLExecutionStart"
+SQL_ADAPTIVE_UPDATE = "org.apache.spark.sql.execution.ui.SparkListenerSQLAdaptiveExecutionUpdate"
+SQL_DRIVER_ACCUM_UPDATES = "org.apache.spark.sql.execution.ui.SparkListenerDriverAccumUpdates"
+_SECRET_KEY = re.compile(r"password|secret|token|credential|key$", re.IGNORECASE)
+MAX_PLAN_STRING = 200  # operator descriptions can list thousands of columns
+
+def _int_or_none(v: Any) -> Optional[int]:
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return None
+
+def plan_nodes(info: Any) -> Iterator[Tuple[str, str, List[Dict[str, Any]]]]:
+    """(nodeName, simpleString, metrics) of every node of a sparkPlanInfo tree, pre-order, without
+    recursion: linear in plan size and safe for plans thousands of nodes deep."""
+    stack = [info]
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, dict):
+            continue
+        yield node.get("nodeName") or "", node.get("simpleString") or "", node.get("metrics") or []
+        stack.extend(reversed(node.get("children") or []))
+
+def stage_accumulables(evt: Dict[str, Any]) -> List[List[int]]:
+    """[[accumulator id, value], ...] of a completed stage's non-internal (SQL metric) accumulables."""
+    out = []
+    for a in (evt.get("Stage Info") or {}).get("Accumulables") or ():
+        name, aid = a.get("Name") or "", _int_or_none(a.get("ID"))
+        if aid is None or name.startswith("internal."):
+            continue
+        try:
+            out.append([aid, int(float(a.get("Value")))])
+        except (TypeError, ValueError):
+            pass
+    return out
 
-def read_jsonl(path: str) -> Iterable[Dict[str, Any]]:
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
+def executor_peaks(m: Any) -> Tuple[int, int, int]:
+    """(JVM heap, off-heap incl. direct/mapped pools, Python + other process RSS) from an "Executor Metrics" dict."""
+    if not isinstance(m, dict):
+        return 0, 0, 0
+    def g(k: str) -> int:
+        return int(m.get(k, 0) or 0)
+    return (g("JVMHeapMemory"), g("JVMOffHeapMemory") + g("DirectPoolMemory") + g("MappedPoolMemory"),
+            g("ProcessTreePythonRSSMemory") + g("ProcessTreeOtherRSSMemory"))
+
+# Python execution in a stage, from its name, call-site details and RDD operation scopes (the physical
+# operator that created each RDD) or SQL plan node names. Row-at-a-time pickled UDFs first, then
+# Arrow-based ones (pandas UDFs, mapInPandas/mapInArrow, applyInPandas...), then the RDD API.
+PYTHON_KINDS: Tuple[Tuple[str, Any], ...] = (
+    ("row_udf", re.compile(r"BatchEvalPython")),
+    ("arrow_udf", re.compile(r"ArrowEvalPython|(?:FlatMapGroups|FlatMapCoGroups|MapPartitions|Aggregate|Window|Map|apply)In"
+                             r"(?:Pandas|Arrow)", re.IGNORECASE)),
+    ("python_rdd", re.compile(r"PythonRDD|PythonRunner|PairwiseRDD")),
+)
+
+def python_kind(text: str) -> Optional[str]:
+    for kind, pattern in PYTHON_KINDS:
+        if pattern.search(text):
+            return kind
+    return None
+
+def stage_python_kind(evt: Dict[str, Any]) -> Optional[str]:
+    info = evt.get("Stage Info") or {}
+    parts = [str(info.get("Stage Name") or ""), str(info.get("Details") or "")]
+    for rdd in info.get("RDD Info") or ():
+        parts += [str(rdd.get("Name") or ""), str(rdd.get("Scope") or "")]
+    return python_kind("\n".join(parts))
+
+def task_outcome(reason: Any, info: Dict[str, Any]) -> int:
+    if not isinstance(reason, dict):  # older logs: only the Task Info flags
+        return TASK_KILLED if info.get("Killed") else TASK_FAILED if info.get("Failed") else TASK_SUCCESS
+    kind = reason.get("Reason", "Success")
+    if kind == "Success":
+        return TASK_SUCCESS
+    if kind == "TaskCommitDenied" or (kind == "TaskKilled" and "another attempt succeeded" in str(reason.get("Kill Reason", ""))):
+        return TASK_SUPERSEDED
+    if kind == "TaskKilled":
+        return TASK_KILLED
+    return TASK_LOST if kind == "Resubmitted" else TASK_FAILED
+
+def _task_row(evt: Dict[str, Any]) -> Tuple[int, ...]:
+    si = evt.get("Stage ID", evt.get("Stage Id", -1))
+    sa = evt.get("Stage Attempt ID", evt.get("Stage Attempt Id", 0))
+    ti = evt.get("Task Info") or {}
+    metrics = evt.get("Task Metrics") or {}
+    srm = (metrics.get("Shuffle Read Metrics") or {})
+    swm = (metrics.get("Shuffle Write Metrics") or {})
+    shuffle_read = int(srm.get("Remote Bytes Read", 0) or 0) + int(srm.get("Local Bytes Read", 0) or 0)
+    shuffle_write = int(swm.get("Shuffle Bytes Written", 0) or 0)
+    mem_spill = int(metrics.get("Memory Bytes Spilled", 0) or 0)
+    disk_spill = int(metrics.get("Disk Bytes Spilled", 0) or 0)
+    im, om = metrics.get("Input Metrics") or {}, metrics.get("Output Metrics") or {}
+    input_bytes = int(im.get("Bytes Read", 0) or 0)
+    run_time = int(metrics.get("Executor Run Time", 0) or 0)
+
+    launch = ti.get("Launch Time")
+    finish = ti.get("Finish Time")
+    duration = int(finish - launch) if launch is not None and finish is not None else run_time
+
+    return (
+        int(si),
+        int(sa),
+        int(ti.get("Task ID", ti.get("Task Id", 0)) or 0),
+        max(0, duration),
+        int(metrics.get("JVM GC Time", 0) or 0),
+        shuffle_read,
+        shuffle_write,
+        mem_spill,
+        disk_spill,
+        executor_num(ti.get("Executor ID")),
+        int(launch) if launch is not None else -1,
+        int(finish) if finish is not None else -1,
+        input_bytes,
+        task_outcome(evt.get("Task End Reason"), ti),
+        int(bool(ti.get("Speculative"))),
+        int(metrics.get("Peak Execution Memory", 0) or 0),
+        *executor_peaks(evt.get("Task Executor Metrics")),
+        int(metrics.get("Executor CPU Time", 0) or 0) // 1_000_000,
+        int(metrics.get("Executor Deserialize Time", 0) or 0) + int(metrics.get("Result Serialization Time", 0) or 0),
+        int(srm.get("Fetch Wait Time", 0) or 0),
+        run_time,
+        int(im.get("Records Read", 0) or 0),
+        int(om.get("Bytes Written", 0) or 0),
+        int(om.get("Records Written", 0) or 0),
+        int(swm.get("Shuffle Write Time", 0) or 0) // 1_000_000,
+    )
+
+class EventLogParser:
+    """Incremental event-log parser: feed decoded events, then call `result()`.
+
+    Every consumer declares the event types it handles (`register` / `add_consumer`); `event_types`
+    is the union, which the reader uses to skip all other events before JSON decoding.
+    """
+
+    def __init__(self, chunk_size: int = DEFAULT_CHUNK_ROWS, consumers: Iterable[Any] = ()):
+        self.stages: List[StageCompleted] = []
+        self.tasks = TaskTableBuilder(chunk_size)
+        # Lists and dicts in `meta` are merged by extending/updating, first-seen dicts by keeping the
+        # earlier entry (see merge_meta), so byte ranges and cached parses combine like a serial parse.
+        self.meta: Dict[str, Any] = {"app_id": None, "app_name": None, "start_time_ms": None, "end_time_ms": None,
+                                     "jobs": [], "job_ends": [], "executors": [], "executor_hosts": {},
+                                     "sql_executions": {}, "sql_operators": {}, "sql_metrics": {}, "stage_accumulables": [],
+                                     "stage_executor_peaks": [], "spark_properties": {}, "python_stages": {},
+                                     "sql_driver_accums": {}}
+        self._hosts: Dict[str, Optional[str]] = self.meta["executor_hosts"]
+        self._handlers: Dict[str, List[Callable[[Dict[str, Any]], None]]] = {}
+        self.register("SparkListenerApplicationStart", self._on_app_start)
+        self.register("SparkListenerApplicationEnd", self._on_app_end)
+        self.register("SparkListenerStageCompleted", self._on_stage_completed)
+        self.register("SparkListenerTaskEnd", self._on_task_end)
+        self.register("SparkListenerJobStart", self._on_job_start)
+        self.register("SparkListenerJobEnd", self._on_job_end)
+        self.register("SparkListenerExecutorAdded", self._on_executor)
+        self.register("SparkListenerExecutorRemoved", self._on_executor)
+        self.register("SparkListenerStageExecutorMetrics", self._on_stage_executor_metrics)
+        self.register("SparkListenerEnvironmentUpdate", self._on_environment)
+        self.register(SQL_EXECUTION_START, self._on_sql_plan)
+        self.register(SQL_ADAPTIVE_UPDATE, self._on_sql_plan)
+        self.register(SQL_DRIVER_ACCUM_UPDATES, self._on_driver_accums)
+        for c in consumers:
+            self.add_consumer(c)
+
+    def register(self, event_type: str, handler: Callable[[Dict[str, Any]], None]) -> None:
+        self._handlers.setdefault(event_type, []).append(handler)
+
+    def add_consumer(self, consumer: Any) -> None:
+        """`consumer` exposes `EVENTS` (event type names) and `feed(evt)`."""
+        for et in consumer.EVENTS:
+            self.register(et, consumer.feed)
+
+    @property
+    def event_types(self) -> FrozenSet[str]:
+        return frozenset(self._handlers)
+
+    def feed(self, evt: Dict[str, Any]) -> None:
+        for h in self._handlers.get(evt.get("Event"), ()):
+            h(evt)
+
+    def _on_app_start(self, evt: Dict[str, Any]) -> None:
+        self.meta["app_name"] = evt.get("App Name")
+        self.meta["app_id"] = evt.get("App ID") or evt.get("App Id")
+        self.meta["start_time_ms"] = evt.get("Timestamp")
+
+    def _on_app_end(self, evt: Dict[str, Any]) -> None:
+        self.meta["end_time_ms"] = evt.get("Timestamp")
+
+    def _on_job_start(self, evt: Dict[str, Any]) -> None:
+        infos = evt.get("Stage Infos") or []
+        self.meta["jobs"].append({
+            "job_id": int(evt.get("Job ID", -1)),
+            "submission_time_ms": evt.get("Submission Time"),
+            "stages": [[int(i.get("Stage ID", -1)), [int(p) for p in i.get("Parent IDs") or ()]] for i in infos],
+        })
+
+    def _on_job_end(self, evt: Dict[str, Any]) -> None:
+        self.meta["job_ends"].append({"job_id": int(evt.get("Job ID", -1)), "completion_time_ms": evt.get("Completion Time")})
+
+    def _on_executor(self, evt: Dict[str, Any]) -> None:
+        info = evt.get("Executor Info") or {}
+        added = evt.get("Event") == "SparkListenerExecutorAdded"
+        self.meta["executors"].append({
+            "executor_id": executor_num(evt.get("Executor ID")),
+            "event": "added" if added else "removed",
+            "time_ms": evt.get("Timestamp"),
+            "host": info.get("Host"),
+            "cores": info.get("Total Cores"),
+            "reason": evt.get("Removed Reason"),
+        })
+
+    def _on_stage_completed(self, evt: Dict[str, Any]) -> None:
+        stage = stage_from_event(evt)
+        self.stages.append(stage)
+        kind = stage_python_kind(evt)
+        if kind:
+            self.meta["python_stages"][str(stage.stage_id)] = kind
+        accs = stage_accumulables(evt)
+        if accs:
+            self.meta["stage_accumulables"].append([stage.stage_id, stage.attempt, accs])
+
+    def _on_stage_executor_metrics(self, evt: Dict[str, Any]) -> None:
+        # Per-(stage, executor) peaks, logged when the stage ends (spark.eventLog.logStageExecutorMetrics).
+        eid = executor_num(evt.get("Executor ID"))
+        if eid < 0:
+            return
+        self.meta["stage_executor_peaks"].append([int(evt.get("Stage ID", -1)), int(evt.get("Stage Attempt ID", 0)), eid,
+                                                  *executor_peaks(evt.get("Executor Metrics"))])
+
+    def _on_environment(self, evt: Dict[str, Any]) -> None:
+        props = evt.get("Spark Properties") or {}
+        if isinstance(props, list):  # very old logs: [[key, value], ...]
+            props = dict(p for p in props if isinstance(p, (list, tuple)) and len(p) == 2)
+        # Kept in the parse cache, so credentials are dropped here.
+        self.meta["spark_properties"].update({str(k): str(v) for k, v in props.items()
+                                              if str(k).startswith("spark.") and not _SECRET_KEY.search(str(k))})
+
+    def _on_sql_plan(self, evt: Dict[str, Any]) -> None:
+        # Start and AQE updates are merged: stages that ran before a re-plan updated the old nodes'
+        # accumulators, later ones the new nodes'. Accumulator ids are unique per app, so flat dicts
+        # keyed by them also merge correctly across byte ranges.
+        eid = _int_or_none(evt.get("executionId"))
+        if eid is None:
+            return
+        if "description" in evt:
+            self.meta["sql_executions"][str(eid)] = evt.get("description")
+        ops, metrics = self.meta["sql_operators"], self.meta["sql_metrics"]
+        for name, desc, node_metrics in plan_nodes(evt.get("sparkPlanInfo")):
+            ids = [m.get("accumulatorId") for m in node_metrics if m.get("accumulatorId") is not None]
+            if not ids:
                 continue
-            yield json.loads(line)
+            key = str(ids[0])
+            ops[key] = [eid, name, desc[:MAX_PLAN_STRING]]
+            for m in node_metrics:
+                if m.get("accumulatorId") is not None:
+                    metrics[str(m["accumulatorId"])] = [key, m.get("name"), m.get("metricType")]
+
+    def _on_driver_accums(self, evt: Dict[str, Any]) -> None:
+        # Metrics the driver sets once per query, e.g. a file scan's "number of files read".
+        for upd in evt.get("accumUpdates") or ():
+            try:
+                self.meta["sql_driver_accums"][str(int(upd[0]))] = int(upd[1])
+            except (TypeError, ValueError, IndexError):
+                pass
 
-def parse_eventlog(path: str) -> Tuple[List[StageCompleted], List[TaskEnd], Dict[str, Any]]:
+    def _on_task_end(self, evt: Dict[str, Any]) -> None:
+        row = _task_row(evt)
+        self.tasks.append(row)
+        # Task Info names the host even for executors whose ExecutorAdded event is missing.
+        # Keys are strings so the mapping survives the JSON round trip of the parse cache.
+        key = str(row[9])
+        if key not in self._hosts:
+            self._hosts[key] = (evt.get("Task Info") or {}).get("Host")
+
+    def result(self) -> Tuple[List[StageCompleted], TaskTable, Dict[str, Any]]:
+        return self.stages, self.tasks.build(), self.meta
+
+def split_byte_ranges(path: str, parts: int) -> List[Tuple[int, int]]:
+    """Split a file into up to `parts` [start, end) ranges whose boundaries fall right after a newline."""
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, "rb") as f:
+        for i in range(1, max(1, parts)):
+            f.seek(max(bounds[-1], size * i // parts))
+            f.readline()
+            pos = f.tell()
+            if pos >= size:
+                break
+            if pos > bounds[-1]:
+                bounds.append(pos)
+    bounds.append(size)
+    return [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+def _range_lines(f: Any, start: int, end: int) -> Iterator[bytes]:
+    f.seek(start)
+    pos = start
+    while pos < end:
+        line = f.readline()
+        if not line:
+            return
+        pos += len(line)
+        yield line
+
+def _parse_range(path: str, start: int, end: int, chunk_size: int) -> Tuple[List[StageCompleted], TaskTable, Dict[str, Any]]:
+    # Reads every line that *starts* in [start, end); `start` is always a line start.
+    parser = EventLogParser(chunk_size=chunk_size)
+    with open(path, "rb") as f:
+        for evt in decode_lines(_range_lines(f, start, end), parser.event_types):
+            parser.feed(evt)
+    return parser.result()
+
+# Dicts in `meta` whose entries the parser records on first sight (an executor's host comes from the
+# first task it ran); later byte ranges must not overwrite them. All other dicts keep the latest value.
+FIRST_SEEN_META = frozenset({"executor_hosts"})
+
+def merge_meta(into: Dict[str, Any], part: Dict[str, Any]) -> None:
+    for k, v in part.items():
+        cur = into.get(k)
+        if isinstance(cur, list) and isinstance(v, list):
+            cur.extend(v)
+        elif isinstance(cur, dict) and isinstance(v, dict):
+            if k in FIRST_SEEN_META:
+                for key, val in v.items():
+                    cur.setdefault(key, val)
+            else:
+                cur.update(v)
+        elif v is not None:
+            into[k] = v
+
+def merge_parsed(parts: List[Tuple[List[StageCompleted], TaskTable, Dict[str, Any]]]) -> Tuple[List[StageCompleted], TaskTable, Dict[str, Any]]:
+    """Combine per-range parse results, in file order, into what a serial parse would have produced."""
     stages: List[StageCompleted] = []
-    tasks: List[TaskEnd] = []
-    meta: Dict[str, Any] = {"app_id": None, "app_name": None}
-
-    for evt in read_jsonl(path):
-        et = evt.get("Event")
-        if et == "SparkListenerApplicationStart":
-            meta["app_name"] = evt.get("App Name")
-            meta["app_id"] = evt.get("App ID") or evt.get("App Id")
-        elif et == "SparkListenerStageCompleted":
-            info = evt.get("Stage Info") or {}
-            stages.append(StageCompleted(
-                stage_id=int(info.get("Stage ID", info.get("Stage Id", -1))),
-                attempt=int(info.get("Stage Attempt ID", info.get("Stage Attempt Id", 0))),
-                name=str(info.get("Stage Name", "")),
-                num_tasks=int(info.get("Number of Tasks", 0)),
-                submission_time_ms=info.get("Submission Time"),
-                completion_time_ms=info.get("Completion Time"),
-            ))
-        elif et == "SparkListenerTaskEnd":
-            si = evt.get("Stage ID", evt.get("Stage Id", -1))
-            sa = evt.get("Stage Attempt ID", evt.get("Stage Attempt Id", 0))
-            ti = evt.get("Task Info") or {}
-            metrics = evt.get("Task Metrics") or {}
-            srm = (metrics.get("Shuffle Read Metrics") or {})
-            swm = (metrics.get("Shuffle Write Metrics") or {})
-            shuffle_read = int(srm.get("Remote Bytes Read", 0) or 0) + int(srm.get("Local Bytes Read", 0) or 0)
-            shuffle_write = int(swm.get("Shuffle Bytes Written", 0) or 0)
-            mem_spill = int(metrics.get("Memory Bytes Spilled", 0) or 0)
-            disk_spill = int(metrics.get("Disk Bytes Spilled", 0) or 0)
-
-            launch = ti.get("Launch Time")
-            finish = ti.get("Finish Time")
-            duration = int(finish - launch) if launch is not None and finish is not None else int(metrics.get("Executor Run Time", 0) or 0)
-
-            tasks.append(TaskEnd(
-                stage_id=int(si),
-                attempt=int(sa),
-                task_id=int(ti.get("Task ID", ti.get("Task Id", 0)) or 0),
-                duration_ms=max(0, duration),
-                gc_time_ms=int(metrics.get("JVM GC Time", 0) or 0),
-                shuffle_read_bytes=shuffle_read,
-                shuffle_write_bytes=shuffle_write,
-                spill_mem_bytes=mem_spill,
-                spill_disk_bytes=disk_spill,
-            ))
-    return stages, tasks, meta
+    meta = EventLogParser().meta
+    for st, _, m in parts:
+        stages.extend(st)
+        merge_meta(meta, m)
+    return stages, TaskTable.concat([t for _, t, _ in parts]), meta
+
+@profiled("parse")
+def parse_eventlog(path: str, chunk_size: int = DEFAULT_CHUNK_ROWS, workers: int = 1,
+                   min_parallel_bytes: int = MIN_PARALLEL_BYTES) -> Tuple[List[StageCompleted], TaskTable, Dict[str, Any]]:
+    # Byte-range splitting needs random access, so compressed files and rolling dirs parse serially.
+    if workers > 1 and is_plain_file(path) and os.path.getsize(path) >= min_parallel_bytes:
+        ranges = split_byte_ranges(path, workers * 2)
+        if len(ranges) > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as pool:
+                futures = [pool.submit(_parse_range, path, a, b, chunk_size) for a, b in ranges]
+                count(bytes=os.path.getsize(path))  # lines are read in the workers; no event count
+                return merge_parsed([f.result() for f in futures])
+    parser = EventLogParser(chunk_size=chunk_size)
+    for evt in decode_lines(counted(iter_lines(path)), parser.event_types):
+        parser.feed(evt)
+    return parser.result()
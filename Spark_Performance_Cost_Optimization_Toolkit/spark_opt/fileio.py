@@ -0,0 +1,161 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+import math
+import numpy as np
+from spark_opt.config import SparkConf
+from spark_opt.findings import Finding, StageTable
+from spark_opt.memory import round_up_mb, size_str
+from spark_opt.metrics import MB
+from spark_opt.sqlplan import SqlAttribution
+
+# File input/output per stage, from task "Input Metrics"/"Output Metrics". Each task that writes
+# output writes at least one file (more under dynamic partitioning), so output_tasks is a lower bound
+# on the files written. Per-task overhead is task time outside "Executor Run Time": scheduling,
+# (de)serialization of the task and its result. File scans also report driver-side SQL metrics
+# ("number of files read", "size of files read"), which give the actual file sizes when present.
+_FILES_READ, _SIZE_READ = "number of files read", "size of files read"
+
+@dataclass
+class StageIO:
+    stage_id: int
+    attempt: int
+    name: str
+    tasks: int
+    task_time_ms: int
+    run_time_ms: int
+    task_p50_ms: float
+    input_tasks: int
+    input_mb: float
+    input_records: int
+    max_task_input_mb: float
+    output_tasks: int
+    output_mb: float
+    output_records: int
+    max_task_output_mb: float
+    files_read: Optional[int] = None     # from the stage's file scan SQL metrics
+    file_mb_read: Optional[float] = None
+
+    @property
+    def overhead_ms(self) -> int:
+        return max(0, self.task_time_ms - self.run_time_ms) if self.run_time_ms else 0
+
+    @property
+    def overhead_pct(self) -> float:
+        return self.overhead_ms / self.task_time_ms if self.task_time_ms else 0.0
+
+    @property
+    def mb_per_input_task(self) -> float:
+        return self.input_mb / self.input_tasks if self.input_tasks else 0.0
+
+    @property
+    def mb_per_output_task(self) -> float:
+        return self.output_mb / self.output_tasks if self.output_tasks else 0.0
+
+    @property
+    def mb_per_file_read(self) -> Optional[float]:
+        return self.file_mb_read / self.files_read if self.files_read else None
+
+def stage_io(t: StageTable, sql: Optional[SqlAttribution] = None, mask: Optional[np.ndarray] = None) -> List[StageIO]:
+    """Stages in `mask` (default: those that read or wrote files), with the file counts of their scans when
+    the SQL plan has them."""
+    if mask is None:
+        mask = (t["input_tasks"] > 0) | (t["output_tasks"] > 0)
+    out = []
+    for i in np.flatnonzero(mask).tolist():
+        s = t.stages[i]
+        files = size = None
+        if sql is not None:
+            for key in sql.stage_operators.get((s.stage_id, s.attempt), ()):
+                m = sql.operators[key].metrics
+                if _FILES_READ in m:
+                    files, size = (files or 0) + m[_FILES_READ], (size or 0) + m.get(_SIZE_READ, 0)
+        out.append(StageIO(s.stage_id, s.attempt, s.name, s.num_tasks, s.task_time_ms, s.run_time_ms, s.task_p50_ms,
+                           s.input_tasks, s.input_mb, s.input_records, s.max_task_input_mb, s.output_tasks, s.output_mb,
+                           s.output_records, s.max_task_output_mb, files, size / MB if size else None))
+    return out
+
+def detect_file_io(t: StageTable, conf: SparkConf, sql: Optional[SqlAttribution] = None, min_tasks: int = 50,
+                   small_input_mb: float = 16.0, overhead_pct_warn: float = 0.1, short_task_ms: int = 200,
+                   large_split_mb: float = 512.0, small_output_mb: float = 32.0,
+                   target_file_mb: float = 128.0) -> List[Finding]:
+    # SMALL_FILE_SCAN: many input tasks each reading a few MB, so per-task overhead (scheduling,
+    # task/result serialization, file opens) is a large share of the stage. Packing ~target_file_mb per
+    # task removes that overhead for all but ceil(input / target) tasks.
+    # OVERSIZED_INPUT_SPLITS: a task reading large_split_mb or more; far above the stage's mean it is an
+    # unsplittable file (gzip, one huge JSON/CSV), otherwise the split size itself is too large.
+    # SMALL_FILE_WRITES: many writing tasks each writing less than small_output_mb, i.e. at least that
+    # many small files for every later reader to list and open.
+    # The three tests are column masks; StageIO rows (with their scans' file counts) are built for hits only.
+    out: List[Finding] = []
+    max_part = conf.get_size_mb("spark.sql.files.maxPartitionBytes", 128.0, unit="b")
+    open_cost = conf.get_size_mb("spark.sql.files.openCostInBytes", 4.0, unit="b")
+    task, run, in_tasks, out_tasks = t["task_time_ms"], t["run_time_ms"], t["input_tasks"], t["output_tasks"]
+    overhead = np.where(run > 0, np.maximum(task - run, 0), 0)
+    overhead_pct = np.divide(overhead, task, out=np.zeros(len(t)), where=task > 0)
+    mb_in = np.divide(t["input_mb"], in_tasks, out=np.zeros(len(t)), where=in_tasks > 0)
+    mb_out = np.divide(t["output_mb"], out_tasks, out=np.zeros(len(t)), where=out_tasks > 0)
+    small_scan = ((in_tasks >= min_tasks) & (mb_in < small_input_mb)
+                  & ((overhead_pct >= overhead_pct_warn) | (t["task_p50_ms"] < short_task_ms)))
+    oversized = (in_tasks > 0) & (t["max_task_input_mb"] >= large_split_mb)
+    small_writes = (out_tasks >= min_tasks) & (mb_out < small_output_mb)
+    hit = small_scan | oversized | small_writes
+    for i, s in zip(np.flatnonzero(hit).tolist(), stage_io(t, sql, hit)):
+        per_task, per_file = s.mb_per_input_task, s.mb_per_file_read
+        io = {"stage_name": s.name, "tasks": s.tasks, "input_tasks": s.input_tasks, "input_mb": s.input_mb,
+              "input_records": s.input_records, "mb_per_input_task": per_task, "max_task_input_mb": s.max_task_input_mb,
+              "files_read": s.files_read, "mb_per_file_read": per_file, "max_partition_mb": max_part}
+        if small_scan[i]:
+            rec_tasks = max(1, math.ceil(s.input_mb / target_file_mb))
+            rec_conf: Dict[str, str] = {}
+            if per_file is not None and per_file < open_cost:
+                # Each file counts as its size plus openCostInBytes when files are packed into splits.
+                rec_conf["spark.sql.files.openCostInBytes"] = size_str(max(1.0, per_file))
+            else:
+                mpb = min(1024.0, round_up_mb(max_part * target_file_mb / max(per_task, 0.01), 64.0))
+                if mpb > max_part:
+                    rec_conf["spark.sql.files.maxPartitionBytes"] = size_str(mpb)
+            detail = f", {per_file:.1f} MB per file" if per_file is not None else ""
+            out.append(Finding(
+                code="SMALL_FILE_SCAN",
+                severity="ERROR" if s.overhead_pct >= 2 * overhead_pct_warn else "WARN",
+                stage_id=s.stage_id,
+                message=(f"Stage {s.stage_id} read {s.input_mb:,.0f} MB in {s.input_tasks:,} tasks ({per_task:.1f} MB per "
+                         f"task{detail}); {s.overhead_pct*100:.0f}% of task time was per-task overhead."),
+                evidence={**io, "overhead_ms": s.overhead_ms, "overhead_pct": s.overhead_pct, "task_p50_ms": s.task_p50_ms,
+                          "open_cost_mb": open_cost, "recommended_tasks": rec_tasks, "target_file_mb": target_file_mb,
+                          "recommended_conf": rec_conf,
+                          "saved_ms": int(s.overhead_ms * max(0.0, 1 - rec_tasks / s.input_tasks))},
+            ))
+        if oversized[i]:
+            unsplittable = s.max_task_input_mb >= 4 * per_task
+            rec_conf = {}
+            if not unsplittable and max_part > target_file_mb:
+                rec_conf["spark.sql.files.maxPartitionBytes"] = size_str(target_file_mb)
+            out.append(Finding(
+                code="OVERSIZED_INPUT_SPLITS",
+                severity="ERROR" if s.max_task_input_mb >= 4 * large_split_mb else "WARN",
+                stage_id=s.stage_id,
+                message=(f"Stage {s.stage_id} has tasks reading up to {s.max_task_input_mb:,.0f} MB of input "
+                         f"({per_task:,.0f} MB per task on average)"
+                         + ("; a few input files are not being split." if unsplittable else ".")),
+                evidence={**io, "unsplittable": unsplittable, "large_split_mb": large_split_mb,
+                          "recommended_tasks": max(1, math.ceil(s.input_mb / target_file_mb)),
+                          "target_file_mb": target_file_mb, "recommended_conf": rec_conf},
+            ))
+        if small_writes[i]:
+            per_out = s.mb_per_output_task
+            out.append(Finding(
+                code="SMALL_FILE_WRITES",
+                severity="ERROR" if per_out < small_output_mb / 8 else "WARN",
+                stage_id=s.stage_id,
+                message=(f"Stage {s.stage_id} wrote {s.output_mb:,.0f} MB from {s.output_tasks:,} tasks, at least "
+                         f"{s.output_tasks:,} files of {per_out:.1f} MB on average."),
+                evidence={"stage_name": s.name, "tasks": s.tasks, "output_tasks": s.output_tasks, "output_mb": s.output_mb,
+                          "output_records": s.output_records, "mb_per_output_task": per_out,
+                          "max_task_output_mb": s.max_task_output_mb, "target_file_mb": target_file_mb,
+                          "recommended_files": max(1, math.ceil(s.output_mb / target_file_mb)),
+                          "aqe_enabled": conf.get_bool("spark.sql.adaptive.enabled", False),
+                          "max_records_per_file": conf.get_int("spark.sql.files.maxRecordsPerFile", 0)},
+            ))
+    return out
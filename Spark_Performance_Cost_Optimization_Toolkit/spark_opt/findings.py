@@ -0,0 +1,51 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+import numpy as np
+from spark_opt.metrics import StageMetrics
+
+if TYPE_CHECKING:
+    from spark_opt.hosts import HostAnalysis
+    from spark_opt.sqlplan import SqlAttribution
+
+# What every detector shares: the Finding it emits and the StageTable it reads. The detectors live with
+# their feature (hosts, memory, file I/O, Python UDFs, ...) and are registered in spark_opt.detectors.
+
+@dataclass
+class Finding:
+    code: str
+    severity: str  # INFO|WARN|ERROR
+    stage_id: Optional[int]
+    message: str
+    evidence: Dict[str, Any]
+
+class StageTable:
+    """StageMetrics as NumPy columns, built once per run and shared by every rule."""
+
+    def __init__(self, stages: List[StageMetrics], hosts: Optional[HostAnalysis] = None,
+                 sql: Optional[SqlAttribution] = None):
+        self.stages = stages
+        self.columns: Dict[str, np.ndarray] = {}
+        self.hosts = hosts  # task-level host analysis, when the run has the task table
+        self.sql = sql      # stage -> SQL operator attribution, when the log has SQL plans
+
+    def __len__(self) -> int:
+        return len(self.stages)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        # Columns are materialized on first use and shared by every later rule.
+        col = self.columns.get(name)
+        if col is None:
+            col = self.columns[name] = np.array([getattr(s, name) for s in self.stages], dtype=np.float64)
+        return col
+
+    def lookup(self, values: Dict[Tuple[int, int], float], default: float = 0.0) -> np.ndarray:
+        """A column from a (stage_id, attempt) -> value mapping (not cached: the mapping is the caller's)."""
+        return np.array([values.get((s.stage_id, s.attempt), default) for s in self.stages], dtype=np.float64)
+
+    def slow_host_share(self) -> np.ndarray:
+        """Per stage: share of its straggler time that ran on slow hosts (zeros without host analysis)."""
+        col = self.columns.get("slow_host_share")
+        if col is None:
+            col = self.columns["slow_host_share"] = self.lookup(self.hosts.slow_host_share if self.hosts is not None else {})
+        return col
@@ -0,0 +1,167 @@
+from __future__ import annotations
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import fnmatch, heapq, itertools, json, os, time
+from spark_opt.cache import load_eventlog
+from spark_opt.config import SparkConf
+from spark_opt.eventlog_io import is_rolling_dir
+from spark_opt.detectors import default_registry, detect_all
+from spark_opt.metrics import build_stage_metrics
+from spark_opt.recommendations import recommend, to_payload
+from spark_opt.timeline import build_timeline
+
+SEVERITY_RANK = {"ERROR": 0, "WARN": 1, "INFO": 2}
+# Recycle pool workers periodically so a leaky or huge log cannot grow a worker forever.
+MAX_TASKS_PER_CHILD = 100
+
+def discover_eventlogs(root: str, pattern: str = "*", recursive: bool = False) -> Iterator[str]:
+    # Rolling (eventlog_v2_*) directories count as one log each and are never descended into.
+    if recursive:
+        for d, dirs, files in os.walk(root):
+            rolling = sorted(x for x in dirs if is_rolling_dir(os.path.join(d, x)))
+            dirs[:] = sorted(x for x in dirs if not x.startswith(".") and x not in rolling)
+            for n in sorted(files + rolling):
+                if not n.startswith(".") and fnmatch.fnmatch(n, pattern):
+                    yield os.path.join(d, n)
+        return
+    for n in sorted(os.listdir(root)):
+        p = os.path.join(root, n)
+        if not n.startswith(".") and (os.path.isfile(p) or is_rolling_dir(p)) and fnmatch.fnmatch(n, pattern):
+            yield p
+
+def analyze_app(path: str, conf: Dict[str, Any], cores_total: Optional[int] = None, use_cache: bool = True,
+                cache_dir: Optional[str] = None, top_stages: int = 5,
+                thresholds: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """Full single-app pipeline; returns a compact, JSON-serializable summary (never raises)."""
+    t0 = time.perf_counter()
+    try:
+        spark_conf = SparkConf(conf=conf)
+        stages, tasks, meta = load_eventlog(path, use_cache=use_cache, cache_dir=cache_dir)
+        _, stage_objs = build_stage_metrics(stages, tasks)
+        timeline = build_timeline(stages, tasks, meta)
+        findings = detect_all(stage_objs, spark_conf, cores_total=cores_total, timeline=timeline, thresholds=thresholds,
+                              tasks=tasks, meta=meta)
+        recs = recommend(findings, spark_conf)
+
+        durations = {s.stage_id: s.stage_duration_ms for s in stage_objs}
+        worst = sorted(stage_objs, key=lambda s: s.stage_duration_ms, reverse=True)[:top_stages]
+        return {
+            "path": path,
+            "status": "ok",
+            "app_id": meta.get("app_id"),
+            "app_name": meta.get("app_name"),
+            "num_stages": len(stage_objs),
+            "num_tasks": len(tasks),
+            "total_stage_ms": int(sum(s.stage_duration_ms for s in stage_objs)),
+            "wasted_core_hours": sum(s.wasted_ms for s in stage_objs) / 3_600_000,
+            "idle_pct": timeline.idle_pct,
+            "top_stages": [dict(s.__dict__) for s in worst],
+            "findings": [
+                {**f.__dict__, "stage_duration_ms": durations.get(f.stage_id) if f.stage_id is not None else None}
+                for f in findings
+            ],
+            "recommendations": to_payload(recs),
+            "elapsed_s": round(time.perf_counter() - t0, 4),
+        }
+    except Exception as e:
+        return {"path": path, "status": "error", "error": f"{type(e).__name__}: {e}",
+                "elapsed_s": round(time.perf_counter() - t0, 4)}
+
+class FleetRanking:
+    """Bounded top-N heaps across apps, so ranking memory does not grow with the number of logs."""
+
+    def __init__(self, top_n: int = 50):
+        self.top_n = top_n
+        self._stages: List[Tuple[Any, ...]] = []
+        self._findings: List[Tuple[Any, ...]] = []
+        self._seq = itertools.count()
+
+    def _push(self, heap: List[Tuple[Any, ...]], key: Tuple[Any, ...], item: Dict[str, Any]) -> None:
+        entry = (key, next(self._seq), item)
+        if len(heap) < self.top_n:
+            heapq.heappush(heap, entry)
+        elif entry[0] > heap[0][0]:
+            heapq.heapreplace(heap, entry)
+
+    def add(self, summary: Dict[str, Any]) -> None:
+        if summary.get("status") != "ok":
+            return
+        app = {"path": summary["path"], "app_id": summary.get("app_id"), "app_name": summary.get("app_name")}
+        for s in summary.get("top_stages", []):
+            self._push(self._stages, (s["stage_duration_ms"],), {**app, **s})
+        for f in summary.get("findings", []):
+            key = (-SEVERITY_RANK.get(f["severity"], 9), f.get("stage_duration_ms") or 0)
+            self._push(self._findings, key, {**app, **f})
+
+    def result(self) -> Dict[str, Any]:
+        return {
+            "worst_stages": [e[2] for e in sorted(self._stages, key=lambda e: (e[0], -e[1]), reverse=True)],
+            "top_findings": [e[2] for e in sorted(self._findings, key=lambda e: (e[0], -e[1]), reverse=True)],
+        }
+
+def _isolated(path: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            return pool.submit(analyze_app, path, **kwargs).result()
+    except BrokenProcessPool:
+        return {"path": path, "status": "error", "error": "worker process crashed"}
+
+def _iter_results(paths: Iterable[str], kwargs: Dict[str, Any], workers: int) -> Iterator[Dict[str, Any]]:
+    if workers <= 1:
+        for p in paths:
+            yield analyze_app(p, **kwargs)
+        return
+
+    pending = iter(paths)
+    max_in_flight = workers * 2
+    while True:
+        suspects: List[str] = []
+        with ProcessPoolExecutor(max_workers=workers, max_tasks_per_child=MAX_TASKS_PER_CHILD) as pool:
+            in_flight: Dict[Future, str] = {}
+            exhausted = False
+            while True:
+                while len(in_flight) < max_in_flight and not exhausted:
+                    p = next(pending, None)
+                    if p is None:
+                        exhausted = True
+                        break
+                    in_flight[pool.submit(analyze_app, p, **kwargs)] = p
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    p = in_flight.pop(fut)
+                    try:
+                        yield fut.result()
+                    except BrokenProcessPool:
+                        suspects.append(p)
+                if suspects:
+                    suspects += list(in_flight.values())
+                    break
+        if not suspects:
+            return
+        # A worker died hard (OOM kill, segfault) and took the pool with it. Rerun every in-flight
+        # log alone so only the one that actually crashes is reported, then resume with a fresh pool.
+        for p in suspects:
+            yield _isolated(p, kwargs)
+
+def run_fleet(paths: Iterable[str], out_path: str, conf: Optional[Dict[str, Any]] = None,
+              cores_total: Optional[int] = None, workers: int = 1, use_cache: bool = True,
+              cache_dir: Optional[str] = None, top_n: int = 50, top_stages: int = 5,
+              thresholds: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+    default_registry().resolve(thresholds)  # a bad thresholds file should fail once, not once per app
+    kwargs = {"conf": conf or {}, "cores_total": cores_total, "use_cache": use_cache,
+              "cache_dir": cache_dir, "top_stages": top_stages, "thresholds": thresholds}
+    ranking = FleetRanking(top_n=top_n)
+    counts = {"ok": 0, "error": 0}
+    t0 = time.perf_counter()
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    with open(out_path, "w", encoding="utf-8") as out:
+        for summary in _iter_results(paths, kwargs, workers):
+            out.write(json.dumps(summary, default=str) + "\n")
+            out.flush()
+            counts[summary["status"]] = counts.get(summary["status"], 0) + 1
+            ranking.add(summary)
+    return {"apps_ok": counts["ok"], "apps_failed": counts["error"],
+            "elapsed_s": round(time.perf_counter() - t0, 3), **ranking.result()}
@@ -0,0 +1,219 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+import math, os, sqlite3, time
+import numpy as np
+from spark_opt.cache import cache_dir_default
+from spark_opt.findings import Finding, StageTable
+from spark_opt.metrics import StageMetrics
+
+# Local run history in SQLite (stdlib, one file, safe for concurrent readers). Each ingested run stores
+# one row per stage, keyed by (app name, stage name, occurrence) so the same stage can be followed
+# across runs even though stage ids shift: occurrence numbers repeated names ("join at etl.py:88")
+# within a run in stage-id order. Baselines for every stage of an app come from one indexed query.
+DEFAULT_WINDOW = 10
+HISTORY_METRICS = ("stage_duration_ms", "shuffle_mb", "spill_mb")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    run_key TEXT NOT NULL UNIQUE,
+    app_id TEXT,
+    app_name TEXT NOT NULL,
+    run_time_ms INTEGER NOT NULL,
+    eventlog TEXT,
+    ingested_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stage_runs (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    app_name TEXT NOT NULL,
+    stage_name TEXT NOT NULL,
+    occurrence INTEGER NOT NULL,
+    run_time_ms INTEGER NOT NULL,
+    stage_id INTEGER NOT NULL,
+    attempt INTEGER NOT NULL,
+    num_tasks INTEGER NOT NULL,
+    stage_duration_ms INTEGER NOT NULL,
+    task_p50_ms REAL NOT NULL,
+    task_p95_ms REAL NOT NULL,
+    task_max_ms INTEGER NOT NULL,
+    gc_pct REAL NOT NULL,
+    shuffle_read_mb REAL NOT NULL,
+    shuffle_write_mb REAL NOT NULL,
+    shuffle_mb REAL NOT NULL,
+    spill_mb REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS stage_runs_lookup ON stage_runs (app_name, stage_name, occurrence, run_time_ms);
+CREATE INDEX IF NOT EXISTS stage_runs_run ON stage_runs (run_id);
+CREATE INDEX IF NOT EXISTS runs_app ON runs (app_name, run_time_ms);
+"""
+
+@dataclass
+class StageBaseline:
+    stage_name: str
+    occurrence: int
+    runs: int
+    mean: Dict[str, float]  # per HISTORY_METRICS
+    std: Dict[str, float]   # sample standard deviation (0.0 with a single run)
+
+def history_db_default() -> str:
+    return os.environ.get("SPARK_OPT_HISTORY_DB") or os.path.join(cache_dir_default(), "history.sqlite")
+
+def stage_keys(stages: List[StageMetrics]) -> List[Tuple[str, int]]:
+    """(stage name, occurrence) for each stage, occurrences counted in stage-id order (attempts share one)."""
+    seen: Dict[str, int] = {}
+    occ: Dict[int, Tuple[str, int]] = {}
+    for sid, name in sorted({(s.stage_id, s.name) for s in stages}):
+        occ[sid] = (name, seen.get(name, 0))
+        seen[name] = occ[sid][1] + 1
+    return [occ[s.stage_id] for s in stages]
+
+def last_attempts(stages: List[StageMetrics]) -> List[StageMetrics]:
+    last: Dict[int, StageMetrics] = {}
+    for s in stages:
+        if s.stage_id not in last or s.attempt > last[s.stage_id].attempt:
+            last[s.stage_id] = s
+    return sorted(last.values(), key=lambda s: s.stage_id)
+
+def run_time_of(meta: Dict[str, Any], eventlog: Optional[str] = None) -> int:
+    if meta.get("start_time_ms") is not None:
+        return int(meta["start_time_ms"])
+    if eventlog and os.path.exists(eventlog):
+        return int(os.path.getmtime(eventlog) * 1000)
+    return int(time.time() * 1000)
+
+class HistoryStore:
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or history_db_default()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> "HistoryStore":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def ingest(self, meta: Dict[str, Any], stages: List[StageMetrics], eventlog: Optional[str] = None,
+               run_time_ms: Optional[int] = None) -> int:
+        """Store one run (the last attempt of every stage); re-ingesting the same app replaces it."""
+        app_name = meta.get("app_name") or "unknown"
+        run_time_ms = run_time_ms if run_time_ms is not None else run_time_of(meta, eventlog)
+        run_key = meta.get("app_id") or f"{app_name}|{os.path.abspath(eventlog) if eventlog else ''}|{run_time_ms}"
+        stages = last_attempts(stages)
+        with self.conn:
+            self.conn.execute("DELETE FROM runs WHERE run_key = ?", (run_key,))
+            run_id = self.conn.execute(
+                "INSERT INTO runs (run_key, app_id, app_name, run_time_ms, eventlog, ingested_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (run_key, meta.get("app_id"), app_name, run_time_ms, eventlog, time.time())).lastrowid
+            self.conn.executemany(
+                "INSERT INTO stage_runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(run_id, app_name, name, occ, run_time_ms, s.stage_id, s.attempt, s.num_tasks, s.stage_duration_ms,
+                  s.task_p50_ms, s.task_p95_ms, s.task_max_ms, s.gc_pct, s.shuffle_read_mb, s.shuffle_write_mb,
+                  s.shuffle_read_mb + s.shuffle_write_mb, s.spill_mb)
+                 for s, (name, occ) in zip(stages, stage_keys(stages))])
+        return int(run_id)
+
+    def baselines(self, app_name: str, before_ms: int, window: int = DEFAULT_WINDOW) -> Dict[Tuple[str, int], StageBaseline]:
+        """Mean/std of each stage over the app's last `window` runs strictly before `before_ms`."""
+        cols = ", ".join(f"AVG({m}) AS {m}_mean, AVG({m} * {m}) AS {m}_sq" for m in HISTORY_METRICS)
+        rows = self.conn.execute(f"""
+            SELECT stage_name, occurrence, COUNT(*) AS n, {cols} FROM (
+                SELECT *, ROW_NUMBER() OVER (PARTITION BY stage_name, occurrence ORDER BY run_time_ms DESC) AS rn
+                FROM stage_runs WHERE app_name = ? AND run_time_ms < ?
+            ) WHERE rn <= ? GROUP BY stage_name, occurrence""", (app_name, before_ms, window)).fetchall()
+        out = {}
+        for r in rows:
+            n = r["n"]
+            mean = {m: float(r[f"{m}_mean"]) for m in HISTORY_METRICS}
+            std = {m: math.sqrt(max(0.0, (r[f"{m}_sq"] - mean[m] ** 2) * n / (n - 1))) if n > 1 else 0.0
+                   for m in HISTORY_METRICS}
+            out[(r["stage_name"], r["occurrence"])] = StageBaseline(r["stage_name"], r["occurrence"], n, mean, std)
+        return out
+
+    def apps(self) -> List[Dict[str, Any]]:
+        return [dict(r) for r in self.conn.execute(
+            "SELECT app_name, COUNT(*) AS runs, MIN(run_time_ms) AS first_run_ms, MAX(run_time_ms) AS last_run_ms "
+            "FROM runs GROUP BY app_name ORDER BY app_name")]
+
+    def stage_history(self, app_name: str, stage_name: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Most recent stage rows of an app, newest first; `stage_name` matches as a substring."""
+        sql = ("SELECT r.app_id, s.run_time_ms, s.stage_name, s.occurrence, s.stage_id, s.num_tasks, s.stage_duration_ms, "
+               "s.task_p50_ms, s.task_p95_ms, s.task_max_ms, s.gc_pct, s.shuffle_mb, s.spill_mb "
+               "FROM stage_runs s JOIN runs r USING (run_id) WHERE s.app_name = ?")
+        args: List[Any] = [app_name]
+        if stage_name:
+            sql += " AND instr(s.stage_name, ?) > 0"
+            args.append(stage_name)
+        sql += " ORDER BY s.run_time_ms DESC, s.stage_id LIMIT ?"
+        args.append(limit)
+        return [dict(r) for r in self.conn.execute(sql, args)]
+
+def load_baselines(path: Optional[str], meta: Dict[str, Any], eventlog: Optional[str] = None,
+                   window: int = DEFAULT_WINDOW) -> Optional[Dict[Tuple[str, int], StageBaseline]]:
+    """Baselines for this run's app from the store at `path` (None when no store is configured)."""
+    if not path:
+        return None
+    with HistoryStore(path) as store:
+        return store.baselines(meta.get("app_name") or "unknown", run_time_of(meta, eventlog), window)
+
+def record_run(path: Optional[str], meta: Dict[str, Any], stages: List[StageMetrics], eventlog: Optional[str] = None) -> Optional[int]:
+    if not path:
+        return None
+    with HistoryStore(path) as store:
+        return store.ingest(meta, stages, eventlog=eventlog)
+
+_REGRESSION_LABELS = {"stage_duration_ms": "duration", "shuffle_mb": "shuffle", "spill_mb": "spill"}
+
+def detect_stage_regressions(t: StageTable, baselines: Dict[Tuple[str, int], StageBaseline],
+                             sigmas: float = 3.0, min_relative_increase: float = 0.2, min_runs: int = 3,
+                             min_duration_ms: int = 1000, min_mb: float = 64.0) -> List[Finding]:
+    # Baselines are keyed by (stage name, occurrence), so they are gathered with one lookup per stage;
+    # the tests themselves are column masks, and only the stages that regressed are rendered.
+    keys = stage_keys(t.stages)
+    base = [b if b is not None and b.runs >= min_runs else None for b in (baselines.get(k) for k in keys)]
+    if not any(base):
+        return []
+    values = {"stage_duration_ms": t["stage_duration_ms"], "shuffle_mb": t["shuffle_read_mb"] + t["shuffle_write_mb"],
+              "spill_mb": t["spill_mb"]}
+    has = np.array([b is not None for b in base])
+    stats, hits = {}, {}
+    for m, v in values.items():
+        mean = np.array([b.mean[m] if b else 0.0 for b in base])
+        std = np.array([b.std[m] if b else 0.0 for b in base])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z = np.where(std > 0, (v - mean) / std, np.inf)  # inf: a metric that never varied before
+        floor = min_duration_ms if m == "stage_duration_ms" else min_mb
+        hits[m] = has & (v >= floor) & (v > mean * (1 + min_relative_increase)) & (z >= sigmas)
+        stats[m] = (v, mean, std, z)
+    out: List[Finding] = []
+    for i in np.flatnonzero(np.logical_or.reduce(list(hits.values()))).tolist():
+        s, key, b = t.stages[i], keys[i], base[i]
+        regressed = {}
+        for m, (v, mean, std, z) in stats.items():
+            if hits[m][i]:
+                zi = float(z[i])
+                regressed[m] = {"value": float(v[i]), "mean": float(mean[i]), "std": float(std[i]),
+                                "z": zi if math.isfinite(zi) else None,
+                                "change_pct": float(v[i] / mean[i] - 1) * 100 if mean[i] > 0 else None}
+        worst = max(float(stats[m][3][i]) for m in regressed)
+        parts = []
+        for m, r in regressed.items():
+            change = f"+{r['change_pct']:.0f}%" if r["change_pct"] is not None else "new"
+            z = f"{r['z']:.1f}σ" if r["z"] is not None else "was constant"
+            parts.append(f"{_REGRESSION_LABELS[m]} {change} ({z})")
+        out.append(Finding(
+            code="STAGE_REGRESSION",
+            severity="ERROR" if worst >= 2 * sigmas else "WARN",
+            stage_id=s.stage_id,
+            message=f"Stage {s.stage_id} ({s.name}) regressed vs its last {b.runs} runs: {', '.join(parts)}.",
+            evidence={"stage_name": s.name, "occurrence": key[1], "baseline_runs": b.runs, "metrics": regressed},
+        ))
+    return out
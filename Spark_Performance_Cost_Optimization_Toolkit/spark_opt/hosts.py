@@ -0,0 +1,138 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+import numpy as np
+from spark_opt.eventlog_reader import TaskTable
+from spark_opt.findings import Finding
+from spark_opt.metrics import MB, _segmented_percentile
+from spark_opt.profiling import profiled
+
+# Per-executor and per-host task speed, normalized per stage so that hosts are compared on the same
+# work: each task's duration is divided by its stage attempt's median duration ("slowdown") and its
+# bytes read (input + shuffle) by the stage median ("data ratio"). A host whose tasks are slow
+# without reading more data is degraded; slow tasks that read more data are data skew. Everything is
+# a few sorts and segment reductions over the task table.
+
+@dataclass
+class WorkerStats:
+    key: str                    # executor id or host name
+    host: str
+    executors: List[int]
+    tasks: int
+    task_time_ms: int
+    bytes_mb: float
+    slowdown: float             # median task duration / stage median
+    data_ratio: float           # median task bytes / stage median (1.0 where a stage reads nothing)
+
+@dataclass
+class HostAnalysis:
+    executors: List[WorkerStats]
+    hosts: List[WorkerStats]
+    slow_hosts: List[str]
+    # (stage_id, attempt) -> (host with the most straggler time, its share of the stage's straggler time)
+    stage_hosts: Dict[Tuple[int, int], Tuple[str, float]] = field(default_factory=dict)
+    # (stage_id, attempt) -> share of the stage's straggler time that ran on slow hosts
+    slow_host_share: Dict[Tuple[int, int], float] = field(default_factory=dict)
+
+def executor_hosts(meta: Dict[str, Any]) -> Dict[int, str]:
+    hosts = {int(k): v for k, v in (meta.get("executor_hosts") or {}).items() if v}
+    for e in meta.get("executors") or []:
+        if e.get("host"):
+            hosts.setdefault(int(e["executor_id"]), e["host"])
+    return hosts
+
+def _group_medians(groups: np.ndarray, values: np.ndarray, n_groups: int) -> np.ndarray:
+    order = np.lexsort((values, groups))
+    g = groups[order]
+    starts = np.flatnonzero(np.r_[True, g[1:] != g[:-1]])
+    counts = np.diff(np.r_[starts, len(g)])
+    out = np.ones(n_groups, dtype=np.float64)
+    out[g[starts]] = _segmented_percentile(values[order], starts, counts, 50)
+    return out
+
+def _stats(keys: List[str], group_hosts: List[str], groups: np.ndarray, eid: np.ndarray, dur: np.ndarray,
+           nbytes: np.ndarray, rel_t: np.ndarray, rel_b: np.ndarray, use: np.ndarray) -> List[WorkerStats]:
+    k = len(keys)
+    tasks = np.bincount(groups, minlength=k)
+    time_ms = np.bincount(groups, weights=dur, minlength=k)
+    mb = np.bincount(groups, weights=nbytes, minlength=k) / MB
+    slow = _group_medians(groups[use], rel_t[use], k) if use.any() else np.ones(k)
+    data = _group_medians(groups[use], rel_b[use], k) if use.any() else np.ones(k)
+    pairs = np.unique((groups.astype(np.int64) << 32) + (eid & 0xFFFFFFFF))
+    members: Dict[int, List[int]] = {}
+    for g, e in zip((pairs >> 32).tolist(), (pairs & 0xFFFFFFFF).astype(np.int32).tolist()):
+        members.setdefault(g, []).append(e)
+    return [WorkerStats(keys[i], group_hosts[i], members.get(i, []), int(tasks[i]), int(time_ms[i]), float(mb[i]),
+                        float(slow[i]), float(data[i])) for i in range(k)]
+
+@profiled("hosts")
+def analyze_hosts(tasks: TaskTable, meta: Dict[str, Any], slow_factor: float = 2.0, min_tasks: int = 20,
+                  min_stage_tasks: int = 10) -> HostAnalysis:
+    """Per-executor/per-host speed; hosts at least `slow_factor` slower than their stages' medians
+    (and not because they read that much more data) over at least `min_tasks` tasks are slow."""
+    if not len(tasks):
+        return HostAnalysis([], [], [])
+    hosts = executor_hosts(meta)
+    sid = tasks["stage_id"].astype(np.int64)
+    att = tasks["attempt"].astype(np.int64)
+    dur = tasks["duration_ms"].astype(np.float64)
+    nbytes = (tasks["input_bytes"] + tasks["shuffle_read_bytes"]).astype(np.float64)
+    eid = tasks["executor_id"].astype(np.int64)
+
+    # Stage medians of duration and bytes, broadcast back to every task.
+    uniq, seg = np.unique((sid << 32) + (att & 0xFFFFFFFF), return_inverse=True)
+    counts = np.bincount(seg, minlength=len(uniq))
+    p50_t = _group_medians(seg, dur, len(uniq))
+    p50_b = _group_medians(seg, nbytes, len(uniq))
+    rel_t = dur / np.maximum(p50_t[seg], 1.0)
+    rel_b = np.where(p50_b[seg] > 0, nbytes / np.maximum(p50_b[seg], 1.0), 1.0)
+    use = counts[seg] >= min_stage_tasks
+
+    ex_ids, ex_groups = np.unique(eid, return_inverse=True)
+    ex_hosts = [hosts.get(e, f"executor-{e}" if e >= 0 else "unknown") for e in ex_ids.tolist()]
+    host_keys, host_of_ex = np.unique(np.array(ex_hosts, dtype=str), return_inverse=True)
+    host_groups = host_of_ex[ex_groups]
+    host_keys = host_keys.tolist()
+    executors = _stats([str(e) for e in ex_ids.tolist()], ex_hosts, ex_groups, eid, dur, nbytes, rel_t, rel_b, use)
+    by_host = _stats(host_keys, host_keys, host_groups, eid, dur, nbytes, rel_t, rel_b, use)
+    slow = [h.host for h in by_host if h.tasks >= min_tasks and len(by_host) > 1
+            and h.slowdown >= slow_factor and h.slowdown / max(h.data_ratio, 1.0) >= slow_factor]
+
+    # Straggler time (above the stage median) per (stage, host) pair that occurs; no stages x hosts matrix.
+    excess = np.maximum(dur - p50_t[seg], 0.0)
+    total = np.bincount(seg, weights=excess, minlength=len(uniq))
+    on_slow = np.bincount(seg, weights=excess * np.isin(host_groups, [host_keys.index(h) for h in slow]),
+                          minlength=len(uniq))
+    pair, pinv = np.unique(seg.astype(np.int64) * len(host_keys) + host_groups, return_inverse=True)
+    psum = np.bincount(pinv, weights=excess, minlength=len(pair))
+    pstage, phost = pair // len(host_keys), pair % len(host_keys)
+    order = np.lexsort((-psum, pstage))
+    first = order[np.r_[True, pstage[order][1:] != pstage[order][:-1]]]
+    stage_hosts, slow_share = {}, {}
+    for p in first.tolist():
+        i = int(pstage[p])
+        key = (int(uniq[i] >> 32), int(uniq[i] & 0xFFFFFFFF))
+        stage_hosts[key] = (host_keys[int(phost[p])], float(psum[p] / total[i]) if total[i] > 0 else 0.0)
+        slow_share[key] = float(on_slow[i] / total[i]) if total[i] > 0 else 0.0
+    return HostAnalysis(executors, by_host, slow, stage_hosts, slow_share)
+
+def detect_slow_hosts(hosts: HostAnalysis, slow_factor: float = 2.0, host_share: float = 0.5,
+                      max_stages: int = 20) -> List[Finding]:
+    out: List[Finding] = []
+    stats = {h.host: h for h in hosts.hosts}
+    for name in hosts.slow_hosts:
+        h = stats[name]
+        stages = sorted(sid for (sid, _), (worst, share) in hosts.stage_hosts.items() if worst == name and share >= host_share)
+        out.append(Finding(
+            code="SLOW_HOST",
+            severity="ERROR" if h.slowdown >= 2 * slow_factor else "WARN",
+            stage_id=None,
+            message=(f"Host {name} ran tasks {h.slowdown:.1f}x slower than their stage medians while reading "
+                     f"{h.data_ratio:.1f}x the median data ({h.tasks} tasks on executors {h.executors}); it holds most "
+                     f"of the straggler time in {len(stages)} stages."),
+            evidence={"host": name, "executors": h.executors, "tasks": h.tasks, "task_time_ms": h.task_time_ms,
+                      "slowdown": h.slowdown, "data_ratio": h.data_ratio, "stage_ids": stages[:max_stages],
+                      "stages_dominated": len(stages),
+                      "cluster_hosts": len(hosts.hosts)},
+        ))
+    return out
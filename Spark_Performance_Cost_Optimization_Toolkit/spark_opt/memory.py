@@ -0,0 +1,247 @@
+from __future__ import annotations
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+import math, re
+import numpy as np
+from spark_opt.config import SparkConf
+from spark_opt.eventlog_reader import TaskTable
+from spark_opt.findings import Finding, StageTable
+from spark_opt.hosts import executor_hosts
+from spark_opt.metrics import MB
+from spark_opt.profiling import profiled
+
+# Executor memory model (Spark unified memory manager): the heap (spark.executor.memory) keeps 300 MB
+# reserved, spark.memory.fraction of the rest is shared by execution and storage, and one task gets
+# up to 1/cores of that. The container also holds spark.executor.memoryOverhead (JVM non-heap,
+# direct buffers, Python workers unless spark.executor.pyspark.memory is set) and the off-heap pool.
+# Peaks come from TaskEnd "Task Executor Metrics" and SparkListenerStageExecutorMetrics.
+RESERVED_MB = 300.0
+MIN_OVERHEAD_MB = 384.0
+DEFAULT_OVERHEAD_FACTOR = 0.10
+# Removal reasons of executors killed by YARN/Kubernetes for exceeding their container's memory.
+MEMORY_KILL = re.compile(r"memory limit|OOMKilled|OutOfMemory|exit code 137|exit status 137", re.IGNORECASE)
+
+@dataclass
+class MemoryConfig:
+    executor_mb: float         # spark.executor.memory (JVM heap)
+    overhead_mb: float         # spark.executor.memoryOverhead, or its default
+    off_heap_mb: float         # spark.memory.offHeap.size when enabled
+    pyspark_mb: float          # spark.executor.pyspark.memory
+    cores: int
+    memory_fraction: float
+    configured: bool           # spark.executor.memory was set in the log or the given conf
+
+    @property
+    def container_mb(self) -> float:
+        return self.executor_mb + self.overhead_mb + self.off_heap_mb + self.pyspark_mb
+
+    @property
+    def execution_per_task_mb(self) -> float:
+        """Unified (execution + storage) memory one task can use when every core runs a task."""
+        return max(self.executor_mb - RESERVED_MB, 0.0) * self.memory_fraction / max(self.cores, 1)
+
+@dataclass
+class ExecutorMemory:
+    executor_id: int
+    host: Optional[str]
+    heap_mb: float
+    off_heap_mb: float
+    python_mb: float
+
+    @property
+    def non_heap_mb(self) -> float:
+        return self.off_heap_mb + self.python_mb
+
+@dataclass
+class MemoryAnalysis:
+    config: MemoryConfig
+    executors: List[ExecutorMemory]
+    executors_per_node: int = 1
+    memory_kills: int = 0                       # executors removed for exceeding memory limits
+    # (stage_id, attempt) -> peak (heap, off-heap, Python) MB across the stage's executors
+    stage_peaks: Dict[Tuple[int, int], Tuple[float, float, float]] = field(default_factory=dict)
+
+    @property
+    def has_metrics(self) -> bool:
+        return any(e.heap_mb for e in self.executors)
+
+    @property
+    def peak_heap_mb(self) -> float:
+        return max((e.heap_mb for e in self.executors), default=0.0)
+
+    @property
+    def peak_non_heap_mb(self) -> float:
+        return max((e.non_heap_mb for e in self.executors), default=0.0)
+
+def heap_for_task_mb(per_task_mb: float, cores: int, memory_fraction: float) -> float:
+    """Executor heap whose unified memory gives each of `cores` concurrent tasks `per_task_mb`."""
+    return per_task_mb * max(cores, 1) / max(memory_fraction, 1e-6) + RESERVED_MB
+
+def round_up_mb(mb: float, step: float = 1024.0) -> int:
+    return int(math.ceil(max(mb, 0.0) / step) * step)
+
+def size_str(mb: float) -> str:
+    """A Spark size setting: whole GiB as "Ng", anything else as "Nm"."""
+    mb = int(math.ceil(mb))
+    return f"{mb // 1024}g" if mb and mb % 1024 == 0 else f"{mb}m"
+
+def default_overhead_mb(executor_mb: float, factor: float = DEFAULT_OVERHEAD_FACTOR) -> float:
+    return max(MIN_OVERHEAD_MB, factor * executor_mb)
+
+def memory_config(conf: SparkConf, meta: Optional[Dict[str, Any]] = None) -> MemoryConfig:
+    """Settings from the log's Spark properties, overridden by `conf`."""
+    meta = meta or {}
+    eff = SparkConf(conf={**(meta.get("spark_properties") or {}), **conf.conf})
+    executor_mb = eff.get_size_mb("spark.executor.memory", 1024.0)
+    factor = float(eff.conf.get("spark.executor.memoryOverheadFactor", DEFAULT_OVERHEAD_FACTOR))
+    overhead = eff.get_size_mb("spark.executor.memoryOverhead", default_overhead_mb(executor_mb, factor))
+    off_heap = eff.get_size_mb("spark.memory.offHeap.size", 0.0, unit="b") if eff.get_bool("spark.memory.offHeap.enabled", False) else 0.0
+    observed = [int(e["cores"]) for e in meta.get("executors") or [] if e.get("cores")]
+    cores = eff.get_int("spark.executor.cores", max(observed, default=1))
+    return MemoryConfig(executor_mb, overhead, off_heap, eff.get_size_mb("spark.executor.pyspark.memory", 0.0), max(cores, 1),
+                        float(eff.conf.get("spark.memory.fraction", 0.6)), "spark.executor.memory" in eff.conf)
+
+@profiled("memory")
+def analyze_memory(tasks: Optional[TaskTable], meta: Dict[str, Any], conf: SparkConf) -> MemoryAnalysis:
+    peaks: Dict[int, List[float]] = {}
+
+    def add(eid: int, heap: float, off: float, py: float) -> None:
+        cur = peaks.setdefault(eid, [0.0, 0.0, 0.0])
+        cur[0], cur[1], cur[2] = max(cur[0], heap), max(cur[1], off), max(cur[2], py)
+
+    if tasks is not None and len(tasks):
+        eid = tasks["executor_id"]
+        order = np.argsort(eid, kind="stable")
+        order = order[eid[order] >= 0]
+        e = eid[order]
+        if len(e):
+            starts = np.flatnonzero(np.r_[True, e[1:] != e[:-1]])
+            cols = [(np.maximum.reduceat(tasks[name][order], starts) / MB).tolist()
+                    for name in ("jvm_heap_bytes", "off_heap_bytes", "python_bytes")]
+            for i, x in enumerate(e[starts].tolist()):
+                add(x, cols[0][i], cols[1][i], cols[2][i])
+    stage_peaks: Dict[Tuple[int, int], Tuple[float, float, float]] = {}
+    for sid, att, e, heap, off, py in meta.get("stage_executor_peaks") or ():
+        add(int(e), heap / MB, off / MB, py / MB)
+        cur = stage_peaks.get((int(sid), int(att)), (0.0, 0.0, 0.0))
+        stage_peaks[(int(sid), int(att))] = (max(cur[0], heap / MB), max(cur[1], off / MB), max(cur[2], py / MB))
+
+    hosts = executor_hosts(meta)
+    per_node = Counter(hosts.values())
+    kills = {int(e["executor_id"]) for e in meta.get("executors") or []
+             if e.get("event") == "removed" and MEMORY_KILL.search(str(e.get("reason") or ""))}
+    execs = [ExecutorMemory(e, hosts.get(e), *v) for e, v in sorted(peaks.items())]
+    return MemoryAnalysis(memory_config(conf, meta), execs, max(per_node.values(), default=1), len(kills), stage_peaks)
+
+def detect_executor_memory(t: StageTable, mem: MemoryAnalysis, memory_gb_per_node: Optional[float] = None,
+                           spill_mb_warn: float = 512.0, heap_pressure_pct: float = 0.9,
+                           overprovisioned_pct: float = 0.5, overhead_pressure_pct: float = 0.9,
+                           headroom: float = 0.25, max_executor_gb: float = 64.0, max_listed: int = 20) -> List[Finding]:
+    # MEMORY_UNDERSIZED: stages spilled because a task's execution memory (its peak plus what it
+    # spilled) exceeded its share of unified memory; sized from the largest task of each spilling stage.
+    # MEMORY_OVERPROVISIONED: no spill and the executors' peak heap stayed far below the heap.
+    # MEMORY_OVERHEAD_PRESSURE: non-heap memory (JVM off-heap, buffers, Python) near the overhead, or
+    # executors killed for exceeding their container. Sizes are rounded up: heaps to 1 GiB, overhead to 256 MiB.
+    out: List[Finding] = []
+    c = mem.config
+    fits = memory_gb_per_node * 1024 if memory_gb_per_node else None
+    node = {"executors_per_node": mem.executors_per_node, "memory_gb_per_node": memory_gb_per_node}
+
+    def container(heap: float, overhead: Optional[float] = None) -> float:
+        oh = overhead if overhead is not None else max(c.overhead_mb, default_overhead_mb(heap))
+        return heap + oh + c.off_heap_mb + c.pyspark_mb
+
+    # Which stages spilled past their share of memory is a column mask; only the hits are looked up
+    # in the per-stage executor peaks and listed.
+    need_col = (t["peak_execution_mb"] + t["max_task_spill_mb"]) * (1 + headroom)
+    heap_col = heap_for_task_mb(need_col, c.cores, c.memory_fraction)
+    # Heap findings need the actual heap, not Spark's 1g default.
+    hit = np.flatnonzero((t["spill_mb"] >= spill_mb_warn) & (need_col > 0) & (heap_col > c.executor_mb)) \
+        if c.configured else np.zeros(0, dtype=np.int64)
+    if len(hit):
+        j = hit[np.argmax(heap_col[hit])]
+        heap, need = float(heap_col[j]), float(need_col[j])
+        peak_heap = np.maximum(t["peak_heap_mb"][hit], [mem.stage_peaks.get((t.stages[i].stage_id, t.stages[i].attempt),
+                                                                            (0.0,))[0] for i in hit.tolist()])
+        cap = max_executor_gb * 1024
+        rec_heap, rec_cores = float(round_up_mb(min(heap, cap))), c.cores
+        if heap > cap:  # no heap that size: run fewer tasks per executor instead
+            rec_cores = max(1, int((rec_heap - RESERVED_MB) * c.memory_fraction // need))
+        conf = {"spark.executor.memory": size_str(rec_heap)}
+        if rec_cores != c.cores:
+            conf["spark.executor.cores"] = rec_cores
+        new_container = container(rec_heap)
+        spill = float(t["spill_mb"][hit].sum())
+        pressured = bool((peak_heap >= heap_pressure_pct * c.executor_mb).any())
+        worst = [(t.stages[hit[k]], float(peak_heap[k]), float(heap_col[hit[k]]))
+                 for k in np.argsort(-t["spill_mb"][hit], kind="stable")[:max_listed].tolist()]
+        out.append(Finding(
+            code="MEMORY_UNDERSIZED",
+            severity="ERROR" if pressured or spill >= 10 * spill_mb_warn else "WARN",
+            stage_id=None,
+            message=(f"{len(hit)} stages spilled {spill:,.0f} MB: their largest tasks needed up to {need:,.0f} MB of "
+                     f"execution memory, but each of the {c.cores} cores gets about {c.execution_per_task_mb:,.0f} MB of "
+                     f"the {size_str(c.executor_mb)} heap. Set spark.executor.memory={conf['spark.executor.memory']}"
+                     + (f" with spark.executor.cores={rec_cores}." if rec_cores != c.cores else ".")),
+            evidence={"executor_memory_mb": c.executor_mb, "executor_cores": c.cores, "memory_fraction": c.memory_fraction,
+                      "execution_per_task_mb": c.execution_per_task_mb, "needed_per_task_mb": need,
+                      "peak_heap_mb": float(peak_heap.max()), "spill_mb": spill, "recommended_conf": conf,
+                      "task_time_ms": int(t["task_time_ms"][hit].sum()),
+                      "container_mb": c.container_mb, "recommended_container_mb": new_container,
+                      "fits_node": fits is None or new_container * mem.executors_per_node <= fits, **node,
+                      "stages": [{"stage_id": s.stage_id, "name": s.name, "spill_mb": s.spill_mb,
+                                  "peak_execution_mb": s.peak_execution_mb, "max_task_spill_mb": s.max_task_spill_mb,
+                                  "peak_heap_mb": ph, "needed_heap_mb": h} for s, ph, h in worst]},
+        ))
+
+    peak = mem.peak_heap_mb
+    total_spill = float(t["spill_mb"].sum())
+    if c.configured and mem.has_metrics and total_spill < spill_mb_warn and peak < overprovisioned_pct * c.executor_mb:
+        exec_need = float(np.max(heap_for_task_mb(t["peak_execution_mb"] * (1 + headroom), c.cores, c.memory_fraction),
+                                 initial=0.0))
+        rec_heap = float(round_up_mb(max(peak * (1 + headroom), exec_need, RESERVED_MB + 1)))
+        if rec_heap < c.executor_mb:
+            overhead = None
+            if mem.peak_non_heap_mb:
+                overhead = min(c.overhead_mb, max(MIN_OVERHEAD_MB, float(round_up_mb(mem.peak_non_heap_mb * (1 + headroom), 256))))
+            new_container = container(rec_heap, overhead if overhead is not None else default_overhead_mb(rec_heap))
+            conf = {"spark.executor.memory": size_str(rec_heap)}
+            if overhead is not None and overhead < c.overhead_mb and overhead != default_overhead_mb(rec_heap):
+                conf["spark.executor.memoryOverhead"] = size_str(overhead)
+            saved = c.container_mb - new_container
+            ev = {"executor_memory_mb": c.executor_mb, "peak_heap_mb": peak, "peak_heap_pct": peak / c.executor_mb,
+                  "peak_non_heap_mb": mem.peak_non_heap_mb, "overhead_mb": c.overhead_mb, "recommended_conf": conf,
+                  "container_mb": c.container_mb, "recommended_container_mb": new_container,
+                  "reclaimed_mb_per_executor": saved, "executors": len(mem.executors),
+                  "reclaimed_gb": saved * len(mem.executors) / 1024, **node}
+            if fits:
+                ev["node_memory_needed_gb"] = new_container * mem.executors_per_node / 1024
+            out.append(Finding(
+                code="MEMORY_OVERPROVISIONED",
+                severity="WARN" if peak < overprovisioned_pct / 2 * c.executor_mb else "INFO",
+                stage_id=None,
+                message=(f"Executors peaked at {peak:,.0f} MB of their {size_str(c.executor_mb)} heap ({peak / c.executor_mb * 100:.0f}%) "
+                         f"without spilling; spark.executor.memory={conf['spark.executor.memory']} frees {saved:,.0f} MB "
+                         f"per executor ({ev['reclaimed_gb']:,.1f} GB across {len(mem.executors)} executors)."),
+                evidence=ev,
+            ))
+
+    non_heap, budget = mem.peak_non_heap_mb, c.overhead_mb + c.pyspark_mb
+    if mem.memory_kills or (non_heap and non_heap >= overhead_pressure_pct * budget):
+        rec = max(c.overhead_mb, float(round_up_mb(non_heap * (1 + headroom) - c.pyspark_mb, 256)))
+        if mem.memory_kills and rec <= c.overhead_mb:
+            rec = float(round_up_mb(c.overhead_mb * 1.5, 256))  # killed without metrics: grow by half
+        out.append(Finding(
+            code="MEMORY_OVERHEAD_PRESSURE",
+            severity="ERROR" if mem.memory_kills or non_heap >= budget else "WARN",
+            stage_id=None,
+            message=(f"Executor non-heap memory (JVM off-heap, buffers, Python workers) peaked at {non_heap:,.0f} MB of "
+                     f"{budget:,.0f} MB overhead"
+                     + (f"; {mem.memory_kills} executors were killed for exceeding memory limits" if mem.memory_kills else "")
+                     + f". Set spark.executor.memoryOverhead={size_str(rec)}."),
+            evidence={"peak_non_heap_mb": non_heap, "overhead_mb": c.overhead_mb, "pyspark_memory_mb": c.pyspark_mb,
+                      "memory_kills": mem.memory_kills, "recommended_conf": {"spark.executor.memoryOverhead": size_str(rec)},
+                      "container_mb": c.container_mb, "recommended_container_mb": container(c.executor_mb, rec), **node},
+        ))
+    return out
@@ -1,9 +1,12 @@
 from __future__ import annotations
-from dataclasses import dataclass
-from typing import List, Tuple
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 import numpy as np
 import pandas as pd
-from spark_opt.eventlog_reader import StageCompleted, TaskEnd
+from spark_opt.eventlog_reader import (TASK_FAILED, TASK_KILLED, TASK_LOST, TASK_SUPERSEDED, StageCompleted, TaskEnd,
+                                       TaskTable, as_task_table)
+from spark_opt.profiling import count, phase, profiled
+from spark_opt.sketch import DEFAULT_RELATIVE_ACCURACY, DDSketch
 
 @dataclass
 class StageMetrics:
@@ -21,52 +24,302 @@ class StageMetrics:
     shuffle_read_mb: float
     shuffle_write_mb: float
     spill_mb: float
+    task_time_ms: int = 0   # summed task durations: core-ms the stage occupied
+    straggler_ms: int = 0   # task time above the stage's p50, summed over its slower tasks
+    input_mb: float = 0.0
+    bytes_duration_corr: float = 0.0  # Pearson r of per-task bytes read (input + shuffle) vs duration; 0 if undefined
+    failed_tasks: int = 0
+    killed_tasks: int = 0            # killed for other reasons than a faster duplicate (cancelled stage or job)
+    speculative_tasks: int = 0       # speculative copies launched
+    failed_ms: int = 0
+    killed_ms: int = 0
+    speculation_wasted_ms: int = 0   # duplicate attempts that lost to another attempt of the same task
+    wasted_ms: int = 0               # failed + killed + lost duplicates + lost map output recomputed elsewhere
+    peak_execution_mb: float = 0.0   # largest per-task peak execution memory
+    max_task_spill_mb: float = 0.0   # largest per-task memory spill (deserialized size)
+    peak_heap_mb: float = 0.0        # peak JVM heap of the executors while the stage's tasks ran
+    peak_off_heap_mb: float = 0.0
+    peak_python_mb: float = 0.0
+    cpu_time_ms: int = 0             # task-thread CPU time (JVM only)
+    serialization_ms: int = 0        # task deserialization + result serialization
+    fetch_wait_ms: int = 0
+    run_time_ms: int = 0             # summed executor run time; task_time_ms minus this is per-task overhead
+    input_records: int = 0
+    input_tasks: int = 0             # tasks that read input
+    max_task_input_mb: float = 0.0
+    output_mb: float = 0.0
+    output_records: int = 0
+    output_tasks: int = 0            # tasks that wrote output (each writes at least one file)
+    max_task_output_mb: float = 0.0
+    shuffle_write_time_ms: int = 0
 
-def _percentile(values: List[int], p: float) -> float:
-    if not values:
+MB = 1024 * 1024
+_TASK_SUM_COLUMNS = ("duration_ms", "gc_time_ms", "shuffle_read_bytes", "shuffle_write_bytes", "spill_mem_bytes", "spill_disk_bytes",
+                     "input_bytes", "cpu_time_ms", "serialization_ms", "fetch_wait_ms", "run_time_ms", "input_records",
+                     "output_bytes", "output_records", "shuffle_write_time_ms")
+# Per-segment moments of (bytes read in MB, duration in s) for the bytes/duration correlation; float
+# sums, so they merge exactly like the integer sums above.
+_MOMENTS = ("m_x", "m_y", "m_xx", "m_yy", "m_xy")
+# Per-segment task counts and times by outcome (see eventlog_reader.task_outcome), and counts of tasks
+# that read or wrote data; integer sums.
+_OUTCOMES = ("failed_tasks", "killed_tasks", "speculative_tasks", "failed_ms", "killed_ms", "superseded_ms", "lost_ms",
+             "input_tasks", "output_tasks")
+# Per-segment maxima; they merge by max, so sketches stay exact.
+_MAX_COLUMNS = ("peak_execution_bytes", "spill_mem_bytes", "jvm_heap_bytes", "off_heap_bytes", "python_bytes",
+                "input_bytes", "output_bytes")
+SKETCH_COLUMNS = ("duration_ms", "gc_time_ms", "shuffle_read_bytes", "shuffle_write_bytes")
+
+@dataclass
+class StageSketch:
+    """Mergeable per-stage aggregate: exact count and sums, DDSketch quantiles for SKETCH_COLUMNS."""
+    stage_id: int
+    attempt: int
+    count: int = 0
+    sums: Dict[str, int] = field(default_factory=dict)
+    sketches: Dict[str, DDSketch] = field(default_factory=dict)
+    maxes: Dict[str, int] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def merge(self, other: "StageSketch") -> "StageSketch":
+        self.count += other.count
+        for name, v in other.sums.items():
+            self.sums[name] = self.sums.get(name, 0) + v
+        for name, v in other.maxes.items():
+            self.maxes[name] = max(self.maxes.get(name, 0), v)
+        for name, sk in other.sketches.items():
+            if name in self.sketches:
+                self.sketches[name].merge(sk)
+            else:
+                self.sketches[name] = sk.copy()
+        return self
+
+def _percentile(values, p: float) -> float:
+    if len(values) == 0:
         return 0.0
-    return float(np.percentile(np.array(values, dtype=np.float64), p))
-
-def build_stage_metrics(stages: List[StageCompleted], tasks: List[TaskEnd]) -> Tuple[pd.DataFrame, List[StageMetrics]]:
-    by = {}
-    for t in tasks:
-        by.setdefault((t.stage_id, t.attempt), []).append(t)
-
-    rows = []
-    objs: List[StageMetrics] = []
-    for s in stages:
-        ts = by.get((s.stage_id, s.attempt), [])
-        durations = [int(t.duration_ms) for t in ts if t.duration_ms is not None]
-        p50 = _percentile(durations, 50)
-        p95 = _percentile(durations, 95)
-        mx = int(max(durations) if durations else 0)
-
-        gc = sum(int(t.gc_time_ms) for t in ts)
-        run = sum(int(t.duration_ms) for t in ts) or 1
-        gc_pct = float(gc) / float(run)
-
-        shuffle_read = sum(int(t.shuffle_read_bytes) for t in ts) / (1024 * 1024)
-        shuffle_write = sum(int(t.shuffle_write_bytes) for t in ts) / (1024 * 1024)
-        spill = (sum(int(t.spill_mem_bytes) for t in ts) + sum(int(t.spill_disk_bytes) for t in ts)) / (1024 * 1024)
-
-        if s.submission_time_ms is not None and s.completion_time_ms is not None:
-            stage_dur = int(max(0, s.completion_time_ms - s.submission_time_ms))
+    return float(np.percentile(np.asarray(values, dtype=np.float64), p))
+
+def _segmented_percentile(values: np.ndarray, starts: np.ndarray, counts: np.ndarray, p: float) -> np.ndarray:
+    # Linear interpolation exactly as np.percentile does it, for every segment of a
+    # (segment, value)-sorted array at once.
+    q = np.true_divide(p, 100)
+    virtual = (counts - 1) * q
+    prev = np.floor(virtual)
+    gamma = virtual - prev
+    prev = prev.astype(np.int64)
+    a = values[starts + prev]
+    b = values[starts + np.minimum(prev + 1, counts - 1)]
+    diff = b - a
+    out = a + diff * gamma
+    np.subtract(b, diff * (1 - gamma), out=out, where=gamma >= 0.5)
+    return out
+
+def _moments(tasks: TaskTable, order: np.ndarray, starts: np.ndarray) -> Dict[str, np.ndarray]:
+    x = (tasks["input_bytes"][order] + tasks["shuffle_read_bytes"][order]) / MB
+    y = tasks["duration_ms"][order] / 1000.0
+    if not len(starts):
+        return {m: np.empty(0, dtype=np.float64) for m in _MOMENTS}
+    return dict(zip(_MOMENTS, (np.add.reduceat(v, starts) for v in (x, y, x * x, y * y, x * y))))
+
+def _outcomes(tasks: TaskTable, order: np.ndarray, starts: np.ndarray) -> Dict[str, np.ndarray]:
+    outcome, dur = tasks["outcome"][order], tasks["duration_ms"][order].astype(np.int64)
+    flags = {"failed": outcome == TASK_FAILED, "killed": outcome == TASK_KILLED}
+    cols = [flags["failed"], flags["killed"], tasks["speculative"][order] == 1, dur * flags["failed"],
+            dur * flags["killed"], dur * (outcome == TASK_SUPERSEDED), dur * (outcome == TASK_LOST),
+            tasks["input_bytes"][order] > 0, tasks["output_bytes"][order] > 0]
+    if not len(starts):
+        return {m: np.empty(0, dtype=np.int64) for m in _OUTCOMES}
+    return dict(zip(_OUTCOMES, (np.add.reduceat(c.astype(np.int64), starts) for c in cols)))
+
+def _maxima(tasks: TaskTable, order: np.ndarray, starts: np.ndarray) -> Dict[str, np.ndarray]:
+    if not len(starts):
+        return {f"max:{m}": np.empty(0, dtype=np.int64) for m in _MAX_COLUMNS}
+    return {f"max:{m}": np.maximum.reduceat(tasks[m][order], starts) for m in _MAX_COLUMNS}
+
+def _correlation(n: np.ndarray, m: Dict[str, np.ndarray]) -> np.ndarray:
+    cov = m["m_xy"] - m["m_x"] * m["m_y"] / np.maximum(n, 1)
+    vx = m["m_xx"] - m["m_x"] ** 2 / np.maximum(n, 1)
+    vy = m["m_yy"] - m["m_y"] ** 2 / np.maximum(n, 1)
+    den = np.sqrt(np.maximum(vx, 0) * np.maximum(vy, 0))
+    ok = (n > 2) & (den > 1e-12 * np.maximum(1.0, np.abs(m["m_xx"]) + np.abs(m["m_yy"])))
+    # Rounded so chunked and whole-log sums (which differ in the last float bits) give the same r.
+    return np.round(np.clip(np.where(ok, cov / np.where(ok, den, 1.0), 0.0), -1.0, 1.0), 6)
+
+def aggregate_tasks(tasks: TaskTable) -> Dict[str, np.ndarray]:
+    """One sort by (stage_id, attempt, duration) then segment reductions; one row per stage attempt."""
+    sid = tasks["stage_id"].astype(np.int64)
+    att = tasks["attempt"].astype(np.int64)
+    dur = tasks["duration_ms"]
+    order = np.lexsort((dur, att, sid))
+    sid, att = sid[order], att[order]
+    starts = np.flatnonzero(np.r_[True, (sid[1:] != sid[:-1]) | (att[1:] != att[:-1])]) if len(sid) else np.empty(0, dtype=np.int64)
+    counts = np.diff(np.r_[starts, len(sid)])
+
+    out: Dict[str, np.ndarray] = {"stage_id": sid[starts], "attempt": att[starts], "count": counts}
+    for name in _TASK_SUM_COLUMNS:
+        col = tasks[name][order]
+        out[name] = np.add.reduceat(col, starts) if len(starts) else np.empty(0, dtype=np.int64)
+    sorted_dur = dur[order].astype(np.float64)
+    out["p50"] = _segmented_percentile(sorted_dur, starts, counts, 50)
+    out["p95"] = _segmented_percentile(sorted_dur, starts, counts, 95)
+    out["max"] = dur[order][starts + counts - 1] if len(starts) else np.empty(0, dtype=np.int64)
+    excess = np.maximum(sorted_dur - np.repeat(out["p50"], counts), 0.0)
+    out["straggler"] = np.add.reduceat(excess, starts) if len(starts) else np.empty(0, dtype=np.float64)
+    out["corr"] = _correlation(counts, _moments(tasks, order, starts))
+    out.update(_outcomes(tasks, order, starts))
+    out.update(_maxima(tasks, order, starts))
+    return out
+
+def sketch_stages(tasks: Union[TaskTable, Iterable[TaskEnd]],
+                  relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY) -> Dict[Tuple[int, int], StageSketch]:
+    tasks = as_task_table(tasks)
+    sid = tasks["stage_id"].astype(np.int64)
+    att = tasks["attempt"].astype(np.int64)
+    order = np.lexsort((att, sid))
+    sid, att = sid[order], att[order]
+    starts = np.flatnonzero(np.r_[True, (sid[1:] != sid[:-1]) | (att[1:] != att[:-1])]) if len(sid) else np.empty(0, dtype=np.int64)
+    ends = np.r_[starts[1:], len(sid)]
+    cols = {name: tasks[name][order] for name in _TASK_SUM_COLUMNS}
+    sums = {name: np.add.reduceat(c, starts).tolist() if len(starts) else [] for name, c in cols.items()}
+    sums.update({name: v.tolist() for name, v in _moments(tasks, order, starts).items()})
+    sums.update({name: v.tolist() for name, v in _outcomes(tasks, order, starts).items()})
+    maxes = {name[4:]: v.tolist() for name, v in _maxima(tasks, order, starts).items()}
+    out: Dict[Tuple[int, int], StageSketch] = {}
+    for i, (a, b) in enumerate(zip(starts.tolist(), ends.tolist())):
+        key = (int(sid[a]), int(att[a]))
+        out[key] = StageSketch(key[0], key[1], b - a, {name: sums[name][i] for name in _TASK_SUM_COLUMNS + _MOMENTS + _OUTCOMES},
+                               {name: DDSketch(relative_accuracy).add(cols[name][a:b]) for name in SKETCH_COLUMNS},
+                               {name: maxes[name][i] for name in _MAX_COLUMNS})
+    return out
+
+def merge_stage_sketches(into: Dict[Tuple[int, int], StageSketch], other: Dict[Tuple[int, int], StageSketch]) -> Dict[Tuple[int, int], StageSketch]:
+    """Merges `other` into `into` (in place); the result equals sketching the concatenated tasks."""
+    for key, sk in other.items():
+        if key in into:
+            into[key].merge(sk)
+        else:
+            into[key] = StageSketch(sk.stage_id, sk.attempt).merge(sk)
+    return into
+
+def aggregate_sketches(sketches: Dict[Tuple[int, int], StageSketch]) -> Dict[str, np.ndarray]:
+    """Same rows and columns as aggregate_tasks, with p50/p95 from the duration sketch (max stays exact)."""
+    items = [sketches[k] for k in sorted(sketches)]
+    out: Dict[str, np.ndarray] = {
+        "stage_id": np.array([s.stage_id for s in items], dtype=np.int64),
+        "attempt": np.array([s.attempt for s in items], dtype=np.int64),
+        "count": np.array([s.count for s in items], dtype=np.int64),
+    }
+    for name in _TASK_SUM_COLUMNS + _OUTCOMES:
+        out[name] = np.array([s.sums.get(name, 0) for s in items], dtype=np.int64)
+    for name in _MAX_COLUMNS:
+        out[f"max:{name}"] = np.array([s.maxes.get(name, 0) for s in items], dtype=np.int64)
+    dur = [s.sketches.get("duration_ms") or DDSketch() for s in items]
+    out["p50"] = np.array([d.percentile(50) for d in dur], dtype=np.float64)
+    out["p95"] = np.array([d.percentile(95) for d in dur], dtype=np.float64)
+    out["max"] = np.array([d.max or 0 for d in dur], dtype=np.int64)
+    out["straggler"] = np.array([d.excess_over(p) for d, p in zip(dur, out["p50"].tolist())], dtype=np.float64)
+    out["corr"] = _correlation(out["count"], {m: np.array([s.sums.get(m, 0.0) for s in items], dtype=np.float64)
+                                              for m in _MOMENTS})
+    return out
+
+def _stage_key(sid: np.ndarray, att: np.ndarray) -> np.ndarray:
+    return (sid.astype(np.int64) << 32) + (att.astype(np.int64) & 0xFFFFFFFF)
+
+@profiled("metrics")
+def build_stage_metrics(stages: List[StageCompleted], tasks: Union[TaskTable, Iterable[TaskEnd], None] = None,
+                        sketches: Optional[Dict[Tuple[int, int], StageSketch]] = None) -> Tuple[pd.DataFrame, List[StageMetrics]]:
+    # With `sketches` (see sketch_stages) the task rows are not needed; percentiles are then
+    # within the sketch's relative accuracy of the exact ones.
+    with phase("aggregate"):
+        if sketches is not None:
+            agg = aggregate_sketches(sketches)
         else:
-            stage_dur = mx
-
-        skew_p95_p50 = float(p95 / p50) if p50 > 0 else 0.0
-        skew_max_p50 = float(mx / p50) if p50 > 0 else 0.0
-
-        obj = StageMetrics(
-            stage_id=s.stage_id, attempt=s.attempt, name=s.name, num_tasks=s.num_tasks,
-            stage_duration_ms=stage_dur, task_p50_ms=p50, task_p95_ms=p95, task_max_ms=mx,
-            skew_ratio_p95_p50=skew_p95_p50, skew_ratio_max_p50=skew_max_p50,
-            gc_pct=gc_pct, shuffle_read_mb=float(shuffle_read), shuffle_write_mb=float(shuffle_write), spill_mb=float(spill),
-        )
-        objs.append(obj)
-        rows.append(obj.__dict__)
-
-    df = pd.DataFrame(rows)
-    if not df.empty:
-        df = df.sort_values(["stage_duration_ms"], ascending=False)
+            table = as_task_table(tasks)
+            count(events=len(table))
+            agg = aggregate_tasks(table)
+    n = len(stages)
+
+    # Align stage attempts to task segments (stages without tasks get zeros).
+    keys = _stage_key(agg["stage_id"], agg["attempt"])
+    skeys = _stage_key(np.fromiter((s.stage_id for s in stages), dtype=np.int64, count=n),
+                       np.fromiter((s.attempt for s in stages), dtype=np.int64, count=n))
+    pos = np.minimum(np.searchsorted(keys, skeys), max(len(keys) - 1, 0))
+    hit = (keys[pos] == skeys) if len(keys) else np.zeros(n, dtype=bool)
+
+    def col(name: str, dtype) -> np.ndarray:
+        return np.where(hit, agg[name][pos], 0).astype(dtype) if len(keys) else np.zeros(n, dtype=dtype)
+
+    p50 = col("p50", np.float64)
+    p95 = col("p95", np.float64)
+    mx = col("max", np.int64)
+    lost = col("lost_ms", np.int64)
+    failed, killed, superseded = col("failed_ms", np.int64), col("killed_ms", np.int64), col("superseded_ms", np.int64)
+    run = col("duration_ms", np.int64) - lost  # "Resubmitted" markers repeat a run that is already counted
+    straggler = np.rint(col("straggler", np.float64)).astype(np.int64)
+    input_mb = col("input_bytes", np.int64) / MB
+    corr = col("corr", np.float64)
+    gc_pct = col("gc_time_ms", np.int64) / np.where(run == 0, 1, run)
+    shuffle_read = col("shuffle_read_bytes", np.int64) / MB
+    shuffle_write = col("shuffle_write_bytes", np.int64) / MB
+    spill = (col("spill_mem_bytes", np.int64) + col("spill_disk_bytes", np.int64)) / MB
+    safe_p50 = np.where(p50 > 0, p50, 1.0)
+    skew_p95_p50 = np.where(p50 > 0, p95 / safe_p50, 0.0)
+    skew_max_p50 = np.where(p50 > 0, mx / safe_p50, 0.0)
+
+    stage_dur = [
+        int(max(0, s.completion_time_ms - s.submission_time_ms)) if s.submission_time_ms is not None and s.completion_time_ms is not None else m
+        for s, m in zip(stages, mx.tolist())
+    ]
+    data = {
+        "stage_id": [s.stage_id for s in stages],
+        "attempt": [s.attempt for s in stages],
+        "name": [s.name for s in stages],
+        "num_tasks": [s.num_tasks for s in stages],
+        "stage_duration_ms": stage_dur,
+        "task_p50_ms": p50.tolist(),
+        "task_p95_ms": p95.tolist(),
+        "task_max_ms": mx.tolist(),
+        "skew_ratio_p95_p50": skew_p95_p50.tolist(),
+        "skew_ratio_max_p50": skew_max_p50.tolist(),
+        "gc_pct": gc_pct.tolist(),
+        "shuffle_read_mb": shuffle_read.tolist(),
+        "shuffle_write_mb": shuffle_write.tolist(),
+        "spill_mb": spill.tolist(),
+        "task_time_ms": run.tolist(),
+        "straggler_ms": straggler.tolist(),
+        "input_mb": input_mb.tolist(),
+        "bytes_duration_corr": corr.tolist(),
+        "failed_tasks": col("failed_tasks", np.int64).tolist(),
+        "killed_tasks": col("killed_tasks", np.int64).tolist(),
+        "speculative_tasks": col("speculative_tasks", np.int64).tolist(),
+        "failed_ms": failed.tolist(),
+        "killed_ms": killed.tolist(),
+        "speculation_wasted_ms": superseded.tolist(),
+        "wasted_ms": (failed + killed + superseded + lost).tolist(),
+        "peak_execution_mb": (col("max:peak_execution_bytes", np.int64) / MB).tolist(),
+        "max_task_spill_mb": (col("max:spill_mem_bytes", np.int64) / MB).tolist(),
+        "peak_heap_mb": (col("max:jvm_heap_bytes", np.int64) / MB).tolist(),
+        "peak_off_heap_mb": (col("max:off_heap_bytes", np.int64) / MB).tolist(),
+        "peak_python_mb": (col("max:python_bytes", np.int64) / MB).tolist(),
+        "cpu_time_ms": col("cpu_time_ms", np.int64).tolist(),
+        "serialization_ms": col("serialization_ms", np.int64).tolist(),
+        "fetch_wait_ms": col("fetch_wait_ms", np.int64).tolist(),
+        "run_time_ms": col("run_time_ms", np.int64).tolist(),
+        "input_records": col("input_records", np.int64).tolist(),
+        "input_tasks": col("input_tasks", np.int64).tolist(),
+        "max_task_input_mb": (col("max:input_bytes", np.int64) / MB).tolist(),
+        "output_mb": (col("output_bytes", np.int64) / MB).tolist(),
+        "output_records": col("output_records", np.int64).tolist(),
+        "output_tasks": col("output_tasks", np.int64).tolist(),
+        "max_task_output_mb": (col("max:output_bytes", np.int64) / MB).tolist(),
+        "shuffle_write_time_ms": col("shuffle_write_time_ms", np.int64).tolist(),
+    }
+    names = list(data)
+    objs = [StageMetrics(**dict(zip(names, row))) for row in zip(*data.values())]
+
+    with phase("dataframe"):
+        df = pd.DataFrame(data) if objs else pd.DataFrame()
+        if not df.empty:
+            df = df.sort_values(["stage_duration_ms"], ascending=False)
     return df, objs
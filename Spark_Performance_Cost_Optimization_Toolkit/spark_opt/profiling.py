@@ -0,0 +1,205 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TypeVar
+import functools, resource, sys, time
+
+# Self-profiling for spark-opt runs. Instrumented code wraps its work in `phase("name")`; while no
+# Profiler is active that returns a shared no-op object (one global lookup per call), so the hooks
+# can stay in hot-ish paths such as per-rule detector evaluation.
+#
+# Peak memory is the process RSS high-water mark (VmHWM) while the phase ran. On Linux it is reset
+# at every phase boundary (/proc/self/clear_refs), so each phase gets its own peak; nested phases
+# fold their peak into the enclosing one. Elsewhere the never-reset ru_maxrss is reported.
+
+def reset_peak_rss() -> bool:
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")  # resets VmHWM (Linux >= 4.0)
+        return True
+    except OSError:
+        return False
+
+def rss_mb(field: str = "VmRSS") -> float:
+    """Current (VmRSS) or peak (VmHWM) resident set size in MB."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0
+
+@dataclass
+class PhaseStats:
+    name: str                     # nested phases are "parent/child"
+    calls: int = 0
+    wall_s: float = 0.0
+    events: Optional[int] = None
+    bytes: Optional[int] = None
+    peak_rss_mb: float = 0.0
+    rss_delta_mb: float = 0.0     # peak above the RSS at phase start
+
+    @property
+    def events_per_s(self) -> Optional[float]:
+        return self.events / self.wall_s if self.events is not None and self.wall_s > 0 else None
+
+    @property
+    def bytes_per_s(self) -> Optional[float]:
+        return self.bytes / self.wall_s if self.bytes is not None and self.wall_s > 0 else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), "wall_s": round(self.wall_s, 6), "events_per_s": self.events_per_s,
+                "bytes_per_s": self.bytes_per_s}
+
+class _Frame:
+    __slots__ = ("stats", "events", "bytes", "peak")
+
+    def __init__(self, stats: PhaseStats):
+        self.stats = stats
+        self.events: Optional[int] = None
+        self.bytes: Optional[int] = None
+        self.peak = 0.0
+
+    def count(self, events: Optional[int] = None, bytes: Optional[int] = None) -> None:
+        if events is not None:
+            self.events = (self.events or 0) + int(events)
+        if bytes is not None:
+            self.bytes = (self.bytes or 0) + int(bytes)
+
+class _NullFrame:
+    def count(self, events: Optional[int] = None, bytes: Optional[int] = None) -> None:
+        pass
+
+    def __enter__(self) -> "_NullFrame":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        pass
+
+_NULL = _NullFrame()
+F = TypeVar("F", bound=Callable[..., Any])
+_active: Optional["Profiler"] = None
+
+class Profiler:
+    def __init__(self):
+        self.phases: Dict[str, PhaseStats] = {}
+        self._stack: List[_Frame] = []
+        self._resettable = reset_peak_rss()
+        self._started = time.perf_counter()
+        self._stopped: Optional[float] = None
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[_Frame]:
+        full = "/".join([f.stats.name for f in self._stack[-1:]] + [name])
+        stats = self.phases.get(full)
+        if stats is None:
+            stats = self.phases[full] = PhaseStats(full)
+        frame = _Frame(stats)
+        self._mark_peak()
+        start_rss = rss_mb("VmRSS")
+        self._stack.append(frame)
+        t0 = time.perf_counter()
+        try:
+            yield frame
+        finally:
+            dt = time.perf_counter() - t0
+            self._mark_peak()
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1].peak = max(self._stack[-1].peak, frame.peak)
+            stats.calls += 1
+            stats.wall_s += dt
+            if frame.events is not None:
+                stats.events = (stats.events or 0) + frame.events
+            if frame.bytes is not None:
+                stats.bytes = (stats.bytes or 0) + frame.bytes
+            stats.peak_rss_mb = round(max(stats.peak_rss_mb, frame.peak), 1)
+            stats.rss_delta_mb = round(max(stats.rss_delta_mb, frame.peak - start_rss), 1)
+
+    def _mark_peak(self) -> None:
+        # Credit the high-water mark so far to every open phase, then start a fresh one.
+        peak = rss_mb("VmHWM")
+        for f in self._stack:
+            f.peak = max(f.peak, peak)
+        if self._resettable:
+            reset_peak_rss()
+
+    @property
+    def wall_s(self) -> float:
+        return (self._stopped or time.perf_counter()) - self._started
+
+    def stop(self) -> "Profiler":
+        self._stopped = time.perf_counter()
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"wall_s": round(self.wall_s, 6), "peak_rss_mb": max((p.peak_rss_mb for p in self.phases.values()), default=0.0),
+                "phases": [p.to_dict() for p in self.phases.values()]}
+
+    def markdown(self) -> str:
+        lines = ["## Appendix: spark-opt Profile", "",
+                 f"Wall time so far {self.wall_s:.3f} s; nested phases are shown as parent/child.", "",
+                 "| Phase | Calls | Wall (s) | Events | Events/s | MB/s | Peak RSS (MB) | RSS growth (MB) |",
+                 "|---|---:|---:|---:|---:|---:|---:|---:|"]
+        fmt = lambda v, f: format(v, f) if v is not None else "—"
+        for p in self.phases.values():
+            mbs = p.bytes_per_s / (1024 * 1024) if p.bytes_per_s is not None else None
+            lines.append(f"| {p.name} | {p.calls} | {p.wall_s:.3f} | {fmt(p.events, ',')} | {fmt(p.events_per_s, ',.0f')} "
+                         f"| {fmt(mbs, ',.1f')} | {p.peak_rss_mb:.1f} | {p.rss_delta_mb:.1f} |")
+        return "\n".join(lines)
+
+def active() -> Optional[Profiler]:
+    return _active
+
+def phase(name: str) -> Any:
+    """`with phase("parse") as p: ...; p.count(events=n, bytes=b)`; a no-op unless profiling is enabled."""
+    return _NULL if _active is None else _active.phase(name)
+
+@contextmanager
+def profiling(enabled: bool = True) -> Iterator[Optional[Profiler]]:
+    """Activate a Profiler for the enclosed block (yields None when not enabled)."""
+    global _active
+    if not enabled:
+        yield None
+        return
+    prof = Profiler()
+    prev, _active = _active, prof
+    try:
+        yield prof
+    finally:
+        prof.stop()
+        _active = prev
+
+def count(events: Optional[int] = None, bytes: Optional[int] = None) -> None:
+    """Add to the events/bytes of the innermost running phase (no-op when not profiling)."""
+    if _active is not None and _active._stack:
+        _active._stack[-1].count(events=events, bytes=bytes)
+
+def profiled(name: str) -> Callable[[F], F]:
+    """Decorator: run the whole function as phase `name`."""
+    def deco(fn: F) -> F:
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if _active is None:
+                return fn(*args, **kwargs)
+            with _active.phase(name):
+                return fn(*args, **kwargs)
+        return wrapper  # type: ignore[return-value]
+    return deco
+
+def counted(lines: Iterable[bytes]) -> Iterator[bytes]:
+    """Pass lines through, adding their number and size to the current phase's events/bytes."""
+    if _active is None:
+        yield from lines
+        return
+    n = size = 0
+    try:
+        for line in lines:
+            n += 1
+            size += len(line)
+            yield line
+    finally:
+        count(events=n, bytes=size)
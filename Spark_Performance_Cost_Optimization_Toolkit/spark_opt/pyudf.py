@@ -0,0 +1,114 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+import numpy as np
+from spark_opt.config import SparkConf
+from spark_opt.eventlog_reader import python_kind
+from spark_opt.findings import Finding, StageTable
+from spark_opt.metrics import MB
+from spark_opt.sqlplan import SqlAttribution
+
+# Time a Python stage spends outside the JVM. Python workers are separate processes, so the task
+# thread's "Executor CPU Time" does not include them: while a task waits for its worker to evaluate a
+# batch, it is on the clock but off the CPU. Worker time is therefore the "Executor Run Time" left
+# after JVM CPU, GC, shuffle fetch waits and shuffle write time; it includes pickling/Arrow conversion
+# in the worker and the UDF itself, but also any other off-CPU wait of the task thread (input reads,
+# lock and scheduling waits), so it is an upper bound. Worker start-up has no metric: it is estimated per task only when
+# spark.python.worker.reuse is off (with reuse, a forked worker serves many tasks).
+KIND_LABELS = {"row_udf": "row-at-a-time Python UDFs (BatchEvalPython)",
+               "arrow_udf": "Arrow/pandas UDFs (ArrowEvalPython, mapInPandas, applyInPandas...)",
+               "python_rdd": "Python RDD functions (PythonRDD)"}
+_KIND_ORDER = ("row_udf", "arrow_udf", "python_rdd")
+# SQL metrics of Python plan nodes (Spark 3.4+).
+_SENT, _RECEIVED = "data sent to Python workers", "data returned from Python workers"
+
+@dataclass
+class PythonStage:
+    stage_id: int
+    attempt: int
+    name: str
+    kind: str                   # row_udf | arrow_udf | python_rdd
+    tasks: int
+    task_time_ms: int
+    cpu_time_ms: int
+    gc_time_ms: int
+    serialization_ms: int
+    fetch_wait_ms: int
+    shuffle_write_ms: int
+    python_ms: int              # worker time, an upper bound (0 when the log has no CPU time)
+    boot_ms: int = 0            # estimated worker start-up, part of python_ms
+    measured: bool = True       # False: no "Executor CPU Time" in the log
+    mb_to_python: float = 0.0
+    mb_from_python: float = 0.0
+    peak_python_mb: float = 0.0
+
+    @property
+    def python_pct(self) -> float:
+        return self.python_ms / self.task_time_ms if self.task_time_ms else 0.0
+
+def stage_kinds(meta: Dict[str, Any], sql: Optional[SqlAttribution] = None) -> Dict[int, str]:
+    """stage_id -> Python kind, from stage names/details/RDD scopes and the SQL plan nodes each stage ran."""
+    kinds = {int(k): v for k, v in (meta.get("python_stages") or {}).items()}
+    if sql is not None:
+        for (sid, _), keys in sql.stage_operators.items():
+            for key in keys:
+                kind = python_kind(sql.operators[key].name)
+                if kind and (sid not in kinds or _KIND_ORDER.index(kind) < _KIND_ORDER.index(kinds[sid])):
+                    kinds[sid] = kind
+    return kinds
+
+def python_stages(t: StageTable, meta: Dict[str, Any], sql: Optional[SqlAttribution] = None,
+                  worker_reuse: bool = True, worker_boot_ms: int = 250) -> List[PythonStage]:
+    kinds = stage_kinds(meta, sql)
+    sid, task, run, cpu = t["stage_id"], t["task_time_ms"], t["run_time_ms"], t["cpu_time_ms"]
+    gc = (t["gc_pct"] * task).astype(np.int64)
+    measured = (cpu > 0) & (run > 0)
+    python_ms = np.where(measured, np.maximum(0, run - cpu - gc - t["fetch_wait_ms"] - t["shuffle_write_time_ms"]), 0)
+    boot = np.minimum(python_ms, t["num_tasks"] * worker_boot_ms) if not worker_reuse else np.zeros(len(t))
+    out = []
+    for i in np.flatnonzero(np.isin(sid, list(kinds)) & (task > 0)).tolist():
+        s = t.stages[i]
+        sent = received = 0
+        if sql is not None:
+            for key in sql.stage_operators.get((s.stage_id, s.attempt), ()):
+                op = sql.operators[key]
+                if python_kind(op.name):
+                    sent += op.metrics.get(_SENT, 0)
+                    received += op.metrics.get(_RECEIVED, 0)
+        out.append(PythonStage(s.stage_id, s.attempt, s.name, kinds[s.stage_id], s.num_tasks, s.task_time_ms,
+                               s.cpu_time_ms, int(gc[i]), s.serialization_ms, s.fetch_wait_ms, s.shuffle_write_time_ms,
+                               int(python_ms[i]), int(boot[i]), bool(measured[i]), sent / MB, received / MB,
+                               s.peak_python_mb))
+    return out
+
+def detect_python_udfs(stages: List[PythonStage], conf: SparkConf, min_python_ms: int = 60_000,
+                       python_pct_warn: float = 0.3, arrow_speedup: float = 3.0) -> List[Finding]:
+    # PYTHON_UDF_OVERHEAD: a stage spending a large share of its task time in Python workers. Moving the
+    # logic to native expressions saves that time; for row-at-a-time UDFs, Arrow batches save about
+    # 1 - 1/arrow_speedup of it. Only the stages that run Python are rows here, so the loop is over those.
+    out: List[Finding] = []
+    for p in stages:
+        if p.measured and (p.python_ms < min_python_ms or p.python_pct < python_pct_warn):
+            continue
+        if not p.measured and p.task_time_ms < min_python_ms:
+            continue
+        arrow_ms = int(p.python_ms * (1 - 1 / max(arrow_speedup, 1.0))) if p.kind == "row_udf" else 0
+        detail = (f"up to {p.python_ms / 1000:,.0f}s of {p.task_time_ms / 1000:,.0f}s task time ({p.python_pct*100:.0f}%) "
+                  f"was spent in Python workers" if p.measured else "the log has no task CPU time to split it by")
+        out.append(Finding(
+            code="PYTHON_UDF_OVERHEAD",
+            severity="INFO" if not p.measured else "ERROR" if p.python_pct >= 2 * python_pct_warn else "WARN",
+            stage_id=p.stage_id,
+            message=f"Stage {p.stage_id} runs a {KIND_LABELS[p.kind]}; {detail}.",
+            evidence={"stage_name": p.name, "kind": p.kind, "tasks": p.tasks, "task_time_ms": p.task_time_ms,
+                      "cpu_time_ms": p.cpu_time_ms, "gc_time_ms": p.gc_time_ms, "serialization_ms": p.serialization_ms,
+                      "fetch_wait_ms": p.fetch_wait_ms, "shuffle_write_ms": p.shuffle_write_ms, "python_ms": p.python_ms,
+                      "python_ms_is_upper_bound": True, "python_pct": p.python_pct,
+                      "worker_boot_ms": p.boot_ms, "measured": p.measured, "mb_to_python": p.mb_to_python,
+                      "mb_from_python": p.mb_from_python, "peak_python_mb": p.peak_python_mb,
+                      "native_savings_ms": p.python_ms, "arrow_savings_ms": arrow_ms,
+                      "arrow_udfs_enabled": conf.get_bool("spark.sql.execution.pythonUDF.arrow.enabled", False),
+                      "worker_reuse": conf.get_bool("spark.python.worker.reuse", True),
+                      "max_records_per_batch": conf.get_int("spark.sql.execution.arrow.maxRecordsPerBatch", 10000)},
+        ))
+    return out
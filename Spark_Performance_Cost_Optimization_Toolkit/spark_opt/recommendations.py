@@ -1,8 +1,27 @@
 from __future__ import annotations
-from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
 from spark_opt.detectors import Finding
-from spark_opt.config import SparkConf
+from spark_opt.config import CostSpec, SparkConf
+from spark_opt.cost_model import Savings, core_hour_rate, savings
+from spark_opt.profiling import profiled
+
+# Savings heuristics, per run. Skew: evening out partitions recovers at most the straggler time above
+# p50. Spill: the spilled bytes are written and read back, at somewhere between a fast and a slow
+# local disk. GC: time above a healthy GC share is recoverable. Slow host: its task time beyond what
+# a normal host would have needed. Retries and speculation: the task time that was thrown away.
+# Idle executors: the idle core-hours. Python UDFs: the Python worker time that native expressions remove.
+# Heavy shuffle: the time tasks spent writing shuffle output and waiting on fetches (or, when the log has
+# no shuffle timings, the shuffled bytes at the spill throughputs). Undersized executor memory: the spill
+# time of the stages it makes spill. The low end assumes only half of each is actually recovered (for
+# spill, half of the fast-disk time).
+# Not priced: configuration findings (partition counts and sizing, file writes, oversized splits),
+# regressions and serial stage chains, whose cost is already in the stages they slow down, and the other
+# memory findings: reclaimed memory is not core time, and overhead kills are priced as STAGE_RETRIES.
+SPILL_MB_PER_S = (400.0, 100.0)  # fast / slow spill throughput
+HEALTHY_GC_PCT = 0.05
+RECOVERED_LOW = 0.5
+MAX_LISTED_STAGES = 20  # per-stage evidence kept in a grouped recommendation
 
 @dataclass
 class Recommendation:
@@ -12,13 +31,91 @@ class Recommendation:
     actions: List[str]
     stage_id: Optional[int] = None
     evidence: Optional[Dict[str, Any]] = None
+    savings: Optional[Savings] = None
+    code: Optional[str] = None  # the finding code it answers
+    stage_ids: List[int] = field(default_factory=list)
+
+def estimate_savings(f: Finding, rate_per_core_hour: float = 0.0) -> Optional[Savings]:
+    ev = f.evidence or {}
+    if f.code == "SKEW_DETECTED" and "straggler_ms" in ev:
+        hi = ev["straggler_ms"]
+        return savings(hi * RECOVERED_LOW, hi, rate_per_core_hour, "task time above p50")
+    if f.code in ("SPILL_DETECTED", "MEMORY_UNDERSIZED") and "task_time_ms" in ev:
+        cap = ev["task_time_ms"]
+        fast, slow = (min(cap, ev["spill_mb"] * 2 / mb_s * 1000) for mb_s in SPILL_MB_PER_S)
+        return savings(fast * RECOVERED_LOW, slow, rate_per_core_hour, "spill write + read-back time")
+    if f.code == "SHUFFLE_HEAVY" and "task_time_ms" in ev:
+        hi = ev.get("fetch_wait_ms", 0) + ev.get("shuffle_write_time_ms", 0)
+        if hi:
+            return savings(hi * RECOVERED_LOW, hi, rate_per_core_hour, "shuffle write + fetch wait time")
+        mb, cap = ev["shuffle_read_mb"] + ev["shuffle_write_mb"], ev["task_time_ms"]
+        fast, slow = (min(cap, mb / mb_s * 1000) for mb_s in SPILL_MB_PER_S)
+        return savings(fast * RECOVERED_LOW, slow, rate_per_core_hour, "shuffle write + read time")
+    if f.code == "GC_PRESSURE" and "task_time_ms" in ev:
+        hi = max(0.0, ev["gc_pct"] - HEALTHY_GC_PCT) * ev["task_time_ms"]
+        return savings(hi * RECOVERED_LOW, hi, rate_per_core_hour, f"GC time above {HEALTHY_GC_PCT:.0%} of task time")
+    if f.code == "SLOW_HOST":
+        hi = ev["task_time_ms"] * (1 - 1 / max(ev["slowdown"], 1.0))
+        return savings(hi * RECOVERED_LOW, hi, rate_per_core_hour, "task time lost to the slow host")
+    if f.code in ("STAGE_RETRIES", "SPECULATION_WASTE"):
+        hi = ev["wasted_ms"]
+        return savings(hi * RECOVERED_LOW, hi, rate_per_core_hour, "failed, killed and duplicate task time")
+    if f.code == "PYTHON_UDF_OVERHEAD" and ev.get("native_savings_ms"):
+        hi = ev["native_savings_ms"]
+        return savings(hi * RECOVERED_LOW, hi, rate_per_core_hour, "Python worker time replaced by native expressions")
+    if f.code == "SMALL_FILE_SCAN" and ev.get("saved_ms"):
+        hi = ev["saved_ms"]
+        return savings(hi * RECOVERED_LOW, hi, rate_per_core_hour, "per-task overhead of fewer, larger input splits")
+    if f.code == "IDLE_EXECUTORS":
+        hi = ev["idle_core_hours"] * 3_600_000
+        return savings(hi * RECOVERED_LOW, hi, rate_per_core_hour, "idle executor core-hours")
+    return None
+
+def group_recommendations(recs: List[Recommendation]) -> List[Recommendation]:
+    """One recommendation per finding code and title: the stages it applies to are listed, their savings
+    summed, their actions merged (first occurrence kept) and the worst severity kept."""
+    groups: Dict[Tuple[Optional[str], str], List[Recommendation]] = {}
+    for r in recs:
+        groups.setdefault((r.code, r.title), []).append(r)
+    order = {"ERROR": 0, "WARN": 1, "INFO": 2}
+    out: List[Recommendation] = []
+    for rs in groups.values():
+        if len(rs) == 1:
+            out.append(rs[0])
+            continue
+        rs.sort(key=lambda r: (r.savings is None, -(r.savings.core_hours_mid if r.savings else 0.0),
+                               order.get(r.severity, 9)))
+        priced = [r.savings for r in rs if r.savings]
+        total = Savings(*(sum(getattr(sv, k) for sv in priced) for k in
+                          ("core_hours_low", "core_hours_high", "cost_low", "cost_high")), priced[0].basis) if priced else None
+        stage_ids = sorted({i for r in rs for i in r.stage_ids})
+        out.append(Recommendation(
+            severity=min((r.severity for r in rs), key=lambda sev: order.get(sev, 9)),
+            title=rs[0].title,
+            rationale=rs[0].rationale,
+            actions=list(dict.fromkeys(a for r in rs for a in r.actions)),
+            stage_id=stage_ids[0] if len(stage_ids) == 1 else None,
+            evidence={"stages_total": len(rs), "stages": [{"stage_id": r.stage_id, **(r.evidence or {})}
+                                                           for r in rs[:MAX_LISTED_STAGES]]},
+            savings=total,
+            code=rs[0].code,
+            stage_ids=stage_ids,
+        ))
+    return out
 
-def recommend(findings: List[Finding], conf: SparkConf) -> List[Recommendation]:
+@profiled("recommend")
+def recommend(findings: List[Finding], conf: SparkConf, cost: Optional[CostSpec] = None,
+              cores_per_node: Optional[int] = None) -> List[Recommendation]:
+    """Recommendations, one per finding code (stage findings grouped), largest estimated saving first:
+    dollars, or core-hours when unpriced, with severity breaking ties. Those without an estimate come
+    last, by severity, rather than ranking as a zero saving."""
+    rate = core_hour_rate(cost, cores_per_node)
     aqe = conf.get_bool("spark.sql.adaptive.enabled", False)
     skew_join = conf.get_bool("spark.sql.adaptive.skewJoin.enabled", False)
 
     recs: List[Recommendation] = []
     for f in findings:
+        n = len(recs)
         if f.code == "SKEW_DETECTED":
             actions = [
                 "Identify skewed keys (join/groupBy). Consider salting, pre-aggregation, or skew-aware partitioning.",
@@ -119,6 +216,307 @@ def recommend(findings: List[Finding], conf: SparkConf) -> List[Recommendation]:
                     evidence=f.evidence,
                 ))
 
+        elif f.code == "SHUFFLE_PARTITION_SIZING":
+            ev = f.evidence or {}
+            rc = ev.get("recommended_conf") or {}
+            cores = ev.get("cores_total")
+            actions = [f"Set {k}={v}." for k, v in rc.items()]
+            if not ev.get("aqe_enabled"):
+                actions.append("Without AQE one spark.sql.shuffle.partitions value applies to every shuffle; AQE coalescing "
+                               "lets small shuffles merge toward the advisory size.")
+            for r in (ev.get("stages") or [])[:5]:
+                waves = f" ({r['waves']} → {r['recommended_waves']} waves on {cores} cores)" if cores else ""
+                actions.append(f"Stage {r['stage_id']} ({r['name']}): {r['partitions']:,} partitions of "
+                               f"{r['mb_per_partition']:.1f} MB → {r['recommended_partitions']:,}{waves}; "
+                               f"use repartition()/coalesce() here if it must differ from the global setting.")
+            recs.append(Recommendation(
+                severity=f.severity,
+                title="Size shuffle partitions from the observed shuffle data",
+                rationale=(f"Reduce partitions far below {ev.get('target_partition_mb', 128):.0f} MB add per-task scheduling "
+                           "overhead; partitions far above it run out of execution memory and spill."),
+                actions=actions,
+                evidence=f.evidence,
+            ))
+
+        elif f.code == "SLOW_HOST":
+            ev = f.evidence or {}
+            recs.append(Recommendation(
+                severity=f.severity,
+                title=f"Replace or exclude degraded host {ev.get('host')}",
+                rationale="Tasks on this host were much slower than the same stages' tasks elsewhere without reading "
+                          "more data, so its stragglers come from the node, not from data skew.",
+                actions=[
+                    "Check the node's disk, network, CPU throttling and noisy neighbours; decommission or replace it.",
+                    "Until then keep it out of the pool (cordon the node / remove it from the instance group).",
+                    "Enable speculation (spark.speculation=true, spark.speculation.multiplier=1.5) so slow tasks are "
+                    "re-run on healthy executors.",
+                    "Do not salt keys for the listed stages; their stragglers are not caused by data.",
+                ],
+                evidence=f.evidence,
+            ))
+
+        elif f.code == "STAGE_RETRIES":
+            ev = f.evidence or {}
+            actions = [
+                "Find the task failure reason in the Spark UI / executor logs (OOM, FetchFailed, lost executor, bad record).",
+                "FetchFailed or lost executors: enable the external shuffle service or shuffle tracking "
+                "(spark.dynamicAllocation.shuffleTracking.enabled=true) and graceful decommissioning so map output "
+                "survives executor loss.",
+                "On spot/preemptible nodes, keep shuffle-heavy stages on on-demand capacity or enable "
+                "spark.decommission.enabled=true with storage migration.",
+                "Executor OOM kills: raise spark.executor.memoryOverhead or reduce cores per executor.",
+            ]
+            if ev.get("attempts", 1) > 1:
+                actions.append("Repeated stage attempts recompute parent map output; fix the root cause rather than "
+                               "raising spark.stage.maxConsecutiveAttempts.")
+            recs.append(Recommendation(
+                severity=f.severity,
+                title="Stop paying for failed and retried tasks",
+                rationale="Failed and killed task attempts and retried stages use executor time that produces nothing, "
+                          "and every retry extends the run.",
+                actions=actions,
+                stage_id=f.stage_id,
+                evidence=f.evidence,
+            ))
+
+        elif f.code == "SPECULATION_WASTE":
+            recs.append(Recommendation(
+                severity=f.severity,
+                title="Tune speculative execution",
+                rationale="Speculative copies that lose the race are killed; their time is pure overhead unless they "
+                          "rescue real stragglers.",
+                actions=[
+                    "Raise spark.speculation.multiplier (e.g. 3) and spark.speculation.quantile (e.g. 0.9) so only "
+                    "clear stragglers are duplicated.",
+                    "Set spark.speculation.minTaskRuntime so short tasks are never speculated.",
+                    "If stragglers come from skew or a slow host, fix that instead and disable speculation for the job.",
+                ],
+                evidence=f.evidence,
+            ))
+
+        elif f.code == "MEMORY_UNDERSIZED":
+            ev = f.evidence or {}
+            actions = [f"Set {k}={v}." for k, v in (ev.get("recommended_conf") or {}).items()]
+            if "spark.executor.cores" in (ev.get("recommended_conf") or {}):
+                actions.append("No executor that size is practical, so run fewer concurrent tasks per executor instead "
+                               "(more executors with fewer cores each).")
+            if not ev.get("fits_node", True):
+                actions.append(f"{ev['recommended_container_mb'] / 1024:,.1f} GB containers do not fit "
+                               f"{ev['executors_per_node']} per {ev['memory_gb_per_node']:g} GB node: run fewer executors "
+                               "per node or use memory-optimized nodes.")
+            actions.append("Alternatively split the work: more shuffle partitions for the listed stages shrink each "
+                           "task's execution memory without a bigger heap.")
+            recs.append(Recommendation(
+                severity=f.severity,
+                title="Give tasks enough execution memory to stop spilling",
+                rationale="The largest tasks of the spilling stages needed more execution memory than their share of the "
+                          "executor heap; the setting is sized from their peak execution memory plus what they spilled.",
+                actions=actions,
+                evidence=f.evidence,
+            ))
+
+        elif f.code == "MEMORY_OVERPROVISIONED":
+            ev = f.evidence or {}
+            actions = [f"Set {k}={v}." for k, v in (ev.get("recommended_conf") or {}).items()]
+            if ev.get("node_memory_needed_gb"):
+                actions.append(f"{ev['executors_per_node']} executors per node then need about "
+                               f"{ev['node_memory_needed_gb']:,.1f} GB of the {ev['memory_gb_per_node']:g} GB: pack more "
+                               "executors per node or use a smaller (or compute-optimized) node type.")
+            actions.append("Recheck peak memory after the next runs, since one run may not show the largest input.")
+            recs.append(Recommendation(
+                severity=f.severity,
+                title="Reclaim over-provisioned executor memory",
+                rationale="No stage spilled and the executors' peak JVM heap stayed well below the configured heap; "
+                          "the unused memory is reserved from the cluster for the whole run.",
+                actions=actions,
+                evidence=f.evidence,
+            ))
+
+        elif f.code == "MEMORY_OVERHEAD_PRESSURE":
+            ev = f.evidence or {}
+            actions = [f"Set {k}={v}." for k, v in (ev.get("recommended_conf") or {}).items()]
+            actions += [
+                "For PySpark jobs, cap Python worker memory with spark.executor.pyspark.memory and prefer Arrow-based "
+                "pandas UDFs over row-at-a-time Python UDFs.",
+                "Large direct buffers (Netty shuffle fetches) grow with spark.reducer.maxSizeInFlight; lower it if "
+                "off-heap peaks come from shuffle reads.",
+            ]
+            recs.append(Recommendation(
+                severity=f.severity,
+                title="Raise executor memory overhead",
+                rationale="Memory outside the JVM heap reached the container's overhead allowance; YARN or Kubernetes "
+                          "kills executors that exceed it, and every lost executor reruns its tasks.",
+                actions=actions,
+                evidence=f.evidence,
+            ))
+
+        elif f.code == "PYTHON_UDF_OVERHEAD":
+            ev = f.evidence or {}
+            native_h, arrow_h = ev.get("native_savings_ms", 0) / 3_600_000, ev.get("arrow_savings_ms", 0) / 3_600_000
+            actions = ["Rewrite the UDF with built-in functions (pyspark.sql.functions, SQL expressions, higher-order "
+                       "functions): rows then never leave the JVM"
+                       + (f" (about {native_h:.2f} core-hours per run)." if native_h else ".")]
+            if ev.get("kind") == "row_udf":
+                actions.append("If it must stay in Python, make it a vectorized @pandas_udf"
+                               + ("" if ev.get("arrow_udfs_enabled") else
+                                  " or set spark.sql.execution.pythonUDF.arrow.enabled=true (Spark 3.4+)")
+                               + ": Arrow batches instead of pickled rows"
+                               + (f" (about {arrow_h:.2f} core-hours per run)." if arrow_h else "."))
+            elif ev.get("kind") == "arrow_udf":
+                actions.append(f"Tune spark.sql.execution.arrow.maxRecordsPerBatch (now {ev.get('max_records_per_batch')}): "
+                               "larger batches for narrow rows, smaller ones if Python workers run short of memory.")
+                actions.append("Use mapInArrow instead of mapInPandas when the function does not need pandas.")
+            else:
+                actions.append("Move this RDD code to the DataFrame API: the RDD API pickles every record to Python "
+                               "and back.")
+            if ev.get("worker_boot_ms"):
+                actions.append("Set spark.python.worker.reuse=true so tasks reuse Python workers instead of starting "
+                               "new ones.")
+            actions.append("Keep heavy imports and model loading out of the per-row/per-batch function "
+                           "(load once per worker).")
+            recs.append(Recommendation(
+                severity=f.severity,
+                title="Cut Python UDF overhead",
+                rationale="Python UDFs run in separate worker processes: every row is serialized to Python and back, "
+                          "and the JVM task waits while the worker computes.",
+                actions=actions,
+                stage_id=f.stage_id,
+                evidence=f.evidence,
+            ))
+
+        elif f.code == "SMALL_FILE_SCAN":
+            ev = f.evidence or {}
+            target = ev.get("target_file_mb", 128)
+            actions = [f"Set {k}={v} so each task packs more files (about {ev.get('recommended_tasks')} tasks of "
+                       f"~{target:g} MB instead of {ev.get('input_tasks')})." for k, v in (ev.get("recommended_conf") or {}).items()]
+            actions += [
+                f"Compact the source into ~{target:g} MB files (Delta OPTIMIZE, Iceberg rewrite_data_files, or a periodic "
+                "rewrite job): every reader then lists and opens fewer files.",
+                "Fix the writer that produces the small files (see coalesce-before-write for small-file writes).",
+                "For Hive tables read through the Hive SerDe (one task per file), keep "
+                "spark.sql.hive.convertMetastoreParquet/Orc=true so Spark's file source packs small files.",
+            ]
+            recs.append(Recommendation(
+                severity=f.severity,
+                title="Read fewer, larger input splits",
+                rationale="Each input task pays fixed costs (scheduling, task and result serialization, file open) "
+                          "that dominate when it reads only a few MB.",
+                actions=actions,
+                stage_id=f.stage_id,
+                evidence=f.evidence,
+            ))
+
+        elif f.code == "OVERSIZED_INPUT_SPLITS":
+            ev = f.evidence or {}
+            actions = [f"Set {k}={v}." for k, v in (ev.get("recommended_conf") or {}).items()]
+            if ev.get("unsplittable"):
+                actions += [
+                    "Store the input in a splittable format (Parquet/ORC, or bzip2/zstd instead of gzip for text): a "
+                    "gzip file is always read by a single task.",
+                    f"Repartition right after the read (about {ev.get('recommended_tasks')} partitions) so later "
+                    "operators run in parallel.",
+                ]
+            else:
+                actions.append(f"Aim for ~{ev.get('target_file_mb', 128):g} MB per task (about "
+                               f"{ev.get('recommended_tasks')} tasks) to add parallelism and cut per-task memory.")
+            recs.append(Recommendation(
+                severity=f.severity,
+                title="Split oversized input partitions",
+                rationale="A task reading a very large split runs long and needs much memory; the stage waits for it.",
+                actions=actions,
+                stage_id=f.stage_id,
+                evidence=f.evidence,
+            ))
+
+        elif f.code == "SMALL_FILE_WRITES":
+            ev = f.evidence or {}
+            files = ev.get("recommended_files")
+            actions = [
+                f"coalesce({files}) or repartition({files}, <partition columns>) before the write, for ~{ev.get('target_file_mb', 128):g} MB files.",
+                "Let AQE size the final shuffle: spark.sql.adaptive.enabled=true, "
+                "spark.sql.adaptive.coalescePartitions.enabled=true and spark.sql.adaptive.advisoryPartitionSizeInBytes=128m"
+                + (" (AQE is already enabled; raise the advisory size)." if ev.get("aqe_enabled") else "."),
+                "On Delta/Iceberg tables, enable optimized writes or auto compaction (delta.autoOptimize.optimizeWrite, "
+                "write.distribution-mode=hash).",
+            ]
+            if not ev.get("max_records_per_file"):
+                actions.append("Cap oversized files with spark.sql.files.maxRecordsPerFile after coalescing.")
+            recs.append(Recommendation(
+                severity=f.severity,
+                title="Write fewer, larger files",
+                rationale="Every writing task creates at least one file; many small files slow down every later "
+                          "listing, planning and scan of the table.",
+                actions=actions,
+                stage_id=f.stage_id,
+                evidence=f.evidence,
+            ))
+
+        elif f.code == "IDLE_EXECUTORS":
+            recs.append(Recommendation(
+                severity=f.severity,
+                title="Release idle executor capacity",
+                rationale="Executor cores sat idle for much of the application; that capacity is paid for but unused.",
+                actions=[
+                    "Enable dynamic allocation (spark.dynamicAllocation.enabled=true) with a short executorIdleTimeout.",
+                    "Reduce the fixed executor count or cores if utilization stays low across runs.",
+                    "Check for stragglers and driver-side work that leave executors waiting (see skew findings).",
+                ],
+                evidence=f.evidence,
+            ))
+
+        elif f.code == "STAGE_REGRESSION":
+            recs.append(Recommendation(
+                severity=f.severity,
+                title="Investigate stage regression against previous runs",
+                rationale="This stage is well outside its recent range in duration, shuffle or spill; something changed "
+                          "in the data, the code or the cluster.",
+                actions=[
+                    "Compare input sizes and row counts with the previous runs (data growth or a changed filter).",
+                    "Diff the physical plan against a good run: join strategy, partition counts, lost pushdowns.",
+                    "Check recent code, Spark version and configuration changes for this job.",
+                    "Use `spark-opt history show` to see when the change started.",
+                ],
+                stage_id=f.stage_id,
+                evidence=f.evidence,
+            ))
+
+        elif f.code == "SERIAL_STAGE_CHAIN":
+            actions = [
+                "Increase partitions for these stages so each one can use all executor cores.",
+                "Look for driver-side loops, collect() or count() calls between the jobs.",
+            ]
+            if (f.evidence or {}).get("independent"):
+                actions.insert(0, "These stages do not depend on each other: submit their jobs concurrently "
+                                  "(separate threads/futures, spark.scheduler.mode=FAIR).")
+            recs.append(Recommendation(
+                severity=f.severity,
+                title="Overlap or widen serialized stages",
+                rationale="A run of stages executed one at a time while most executor cores were idle.",
+                actions=actions,
+                evidence=f.evidence,
+            ))
+
+        for r in recs[n:]:
+            r.savings = estimate_savings(f, rate)
+            r.code = f.code
+            r.stage_ids = [f.stage_id] if f.stage_id is not None else []
+
+    recs = group_recommendations(recs)
     order = {"ERROR": 0, "WARN": 1, "INFO": 2}
-    recs.sort(key=lambda r: (order.get(r.severity, 9), r.stage_id if r.stage_id is not None else 10**9))
+    recs.sort(key=lambda r: (r.savings is None, -(r.savings.cost_mid if r.savings else 0.0),
+                             -(r.savings.core_hours_mid if r.savings else 0.0), order.get(r.severity, 9),
+                             r.stage_ids[0] if r.stage_ids else 10**9))
     return recs
+
+def to_payload(recs: List[Recommendation]) -> List[Dict[str, Any]]:
+    return [{
+        "severity": r.severity,
+        "title": r.title,
+        "stage_id": r.stage_id,
+        "stage_ids": r.stage_ids,
+        "code": r.code,
+        "rationale": r.rationale,
+        "actions": r.actions,
+        "evidence": r.evidence,
+        "savings": asdict(r.savings) if r.savings else None,
+    } for r in recs]
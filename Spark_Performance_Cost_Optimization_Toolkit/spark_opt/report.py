@@ -1,27 +1,65 @@
 from __future__ import annotations
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 import json, os
-from spark_opt.eventlog_reader import parse_eventlog
+from spark_opt.cache import load_eventlog
 from spark_opt.metrics import build_stage_metrics
-from spark_opt.detectors import detect_skew, detect_shuffle_heavy, detect_spill_or_gc, detect_partitioning_issues
-from spark_opt.recommendations import recommend
-from spark_opt.config import SparkConf
+from spark_opt.detectors import Finding, detect_all
+from spark_opt.recommendations import Recommendation, recommend
+from spark_opt.config import CostSpec, SparkConf
+from spark_opt.cost_model import StageCost, core_hour_rate, stage_costs
+from spark_opt.history import load_baselines, record_run
+from spark_opt.memory import MemoryAnalysis, analyze_memory, size_str
+from spark_opt.profiling import active, profiled
+from spark_opt.sqlplan import SqlAttribution, attribute_operators, has_sql_plans
+from spark_opt.timeline import AppTimeline, build_timeline
 
 def generate_markdown_report(eventlog_path: str, spark_conf: SparkConf, out_path: str,
-                             cores_total: Optional[int] = None) -> str:
-    stages, tasks, meta = parse_eventlog(eventlog_path)
+                             cores_total: Optional[int] = None, use_cache: bool = True,
+                             cache_dir: Optional[str] = None, parse_workers: int = 1,
+                             thresholds: Optional[Dict[str, Dict[str, Any]]] = None,
+                             history_db: Optional[str] = None, cost: Optional[CostSpec] = None,
+                             cores_per_node: Optional[int] = None, memory_gb_per_node: Optional[float] = None) -> str:
+    content, _ = build_markdown_report(eventlog_path, spark_conf, cores_total=cores_total, use_cache=use_cache,
+                                       cache_dir=cache_dir, parse_workers=parse_workers, thresholds=thresholds,
+                                       history_db=history_db, cost=cost, cores_per_node=cores_per_node,
+                                       memory_gb_per_node=memory_gb_per_node)
+    prof = active()
+    if prof is not None:
+        content += "\n\n" + prof.markdown() + "\n"
+
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    with open(out_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    return out_path
+
+def build_markdown_report(eventlog_path: str, spark_conf: SparkConf, cores_total: Optional[int] = None,
+                          use_cache: bool = True, cache_dir: Optional[str] = None, parse_workers: int = 1,
+                          thresholds: Optional[Dict[str, Dict[str, Any]]] = None,
+                          history_db: Optional[str] = None, cost: Optional[CostSpec] = None,
+                          cores_per_node: Optional[int] = None,
+                          memory_gb_per_node: Optional[float] = None) -> Tuple[str, List[Recommendation]]:
+    """The report's Markdown and its recommendations, from one pass over the log."""
+    stages, tasks, meta = load_eventlog(eventlog_path, use_cache=use_cache, cache_dir=cache_dir, workers=parse_workers)
     df, stage_objs = build_stage_metrics(stages, tasks)
 
-    findings = []
-    findings += detect_skew(stage_objs)
-    findings += detect_shuffle_heavy(stage_objs)
-    findings += detect_spill_or_gc(stage_objs)
-    findings += detect_partitioning_issues(stage_objs, spark_conf, cores_total=cores_total)
+    timeline = build_timeline(stages, tasks, meta)
+    memory = analyze_memory(tasks, meta, spark_conf)
+    sql = attribute_operators(stage_objs, meta) if has_sql_plans(meta) else None
+    findings = detect_all(stage_objs, spark_conf, cores_total=cores_total, timeline=timeline, thresholds=thresholds,
+                          baselines=load_baselines(history_db, meta, eventlog_path), tasks=tasks, meta=meta,
+                          memory_gb_per_node=memory_gb_per_node, memory=memory, sql=sql)
+    record_run(history_db, meta, stage_objs, eventlog_path)
 
-    recs = recommend(findings, spark_conf)
-    top = df.head(10).to_dict(orient="records") if df is not None and not df.empty else []
+    recs = recommend(findings, spark_conf, cost=cost, cores_per_node=cores_per_node)
+    costs = stage_costs(stage_objs, core_hour_rate(cost, cores_per_node))
+    return render_markdown_report(eventlog_path, meta, df, timeline, findings, recs, costs, sql, memory), recs
 
-    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+@profiled("render")
+def render_markdown_report(eventlog_path: str, meta: Dict[str, Any], df: Any, timeline: AppTimeline,
+                           findings: List[Finding], recs: List[Recommendation],
+                           costs: Optional[List[StageCost]] = None, sql: Optional[SqlAttribution] = None,
+                           memory: Optional[MemoryAnalysis] = None) -> str:
+    top = df.head(10).to_dict(orient="records") if df is not None and not df.empty else []
 
     lines: List[str] = []
     lines.append("# Spark Performance + Cost Optimization Report")
@@ -41,6 +79,69 @@ def generate_markdown_report(eventlog_path: str, spark_conf: SparkConf, out_path
             sh = float(r.get("shuffle_read_mb", 0.0)) + float(r.get("shuffle_write_mb", 0.0))
             lines.append(f"| {r['stage_id']} | {r['stage_duration_ms']} | {r['num_tasks']} | {r['task_p50_ms']:.0f} | {r['task_p95_ms']:.0f} | {r['task_max_ms']} | {sh:.0f} | {r['spill_mb']:.0f} | {r['gc_pct']*100:.1f}% |")
 
+    if costs:
+        total_ch = sum(c.core_hours for c in costs)
+        priced = any(c.cost for c in costs)
+        lines.append("")
+        lines.append("## Cost by Stage")
+        lines.append("")
+        lines.append(f"Task time across all stages: {total_ch:.2f} core-hours"
+                     + (f" (${sum(c.cost for c in costs):,.2f} at the configured rates)." if priced else "."))
+        wasted_ch = sum(c.wasted_core_hours for c in costs)
+        if wasted_ch:
+            lines.append(f"Wasted on failed, killed and duplicate task attempts: {wasted_ch:.2f} core-hours"
+                         + (f" (${sum(c.wasted_cost for c in costs):,.2f})." if priced else "."))
+        lines.append("")
+        lines.append("| Stage | Name | Task time (s) | Core-hours | Share | Wasted (core-h) | Cost |")
+        lines.append("|---:|---|---:|---:|---:|---:|---:|")
+        for c in costs[:10]:
+            share = c.core_hours / total_ch * 100 if total_ch else 0.0
+            lines.append(f"| {c.stage_id} | {c.name} | {c.task_seconds:,.0f} | {c.core_hours:.3f} | {share:.1f}% "
+                         f"| {c.wasted_core_hours:.3f} | {f'${c.cost:,.2f}' if priced else '—'} |")
+
+    ops = [o for o in sql.top(10) if o.stage_ids] if sql is not None else []
+    if ops:
+        lines.append("")
+        lines.append("## Time by SQL Operator")
+        lines.append("")
+        lines.append("_Each stage's task time, shuffle and spill go to its main operator (join, aggregate, sort, scan, "
+                     "exchange)._")
+        lines.append("")
+        lines.append("| Operator | SQL | Stages | Task time (s) | Shuffle (MB) | Spill (MB) |")
+        lines.append("|---|---:|---|---:|---:|---:|")
+        for o in ops:
+            label = o.label.replace("|", "\\|")
+            lines.append(f"| `{label}` | {o.execution_id} | {', '.join(map(str, o.stage_ids))} | {o.task_time_ms / 1000:,.0f} "
+                         f"| {o.shuffle_read_mb + o.shuffle_write_mb:,.0f} | {o.spill_mb:,.0f} |")
+
+    lines.append("")
+    lines.append("## Executor Utilization and Critical Path")
+    lines.append("")
+    if not timeline.capacity_core_ms:
+        lines.append("_No task timing information found in event log._")
+    else:
+        lines.append(f"- Executors: {len(timeline.executors)}, busy {timeline.busy_core_ms / 3_600_000:.2f} of "
+                     f"{timeline.capacity_core_ms / 3_600_000:.2f} core-hours ({timeline.idle_pct*100:.0f}% idle)")
+        for cp in sorted(timeline.critical_paths, key=lambda c: c.wall_ms, reverse=True)[:5]:
+            job = f"Job {cp.job_id}" if cp.job_id is not None else "All stages"
+            lines.append(f"- {job}: critical path {' → '.join(map(str, cp.stage_ids))} "
+                         f"({cp.length_ms} ms of {cp.wall_ms} ms wall)")
+
+    if memory is not None and memory.has_metrics:
+        c = memory.config
+        lines.append("")
+        lines.append("## Executor Memory")
+        lines.append("")
+        lines.append(f"- Configured: {size_str(c.executor_mb)} heap + {size_str(c.overhead_mb)} overhead"
+                     + (f" + {size_str(c.off_heap_mb)} off-heap" if c.off_heap_mb else "")
+                     + (f" + {size_str(c.pyspark_mb)} PySpark" if c.pyspark_mb else "")
+                     + f" per executor, {c.cores} cores (~{c.execution_per_task_mb:,.0f} MB execution memory per task)")
+        lines.append(f"- Peak JVM heap: {memory.peak_heap_mb:,.0f} MB ({memory.peak_heap_mb / c.executor_mb * 100:.0f}% of heap); "
+                     f"peak non-heap (off-heap, buffers, Python): {memory.peak_non_heap_mb:,.0f} MB "
+                     f"({memory.peak_non_heap_mb / max(c.overhead_mb + c.pyspark_mb, 1) * 100:.0f}% of overhead)")
+        if memory.memory_kills:
+            lines.append(f"- Executors killed for exceeding memory limits: {memory.memory_kills}")
+
     lines.append("")
     lines.append("## Findings")
     lines.append("")
@@ -54,14 +155,22 @@ def generate_markdown_report(eventlog_path: str, spark_conf: SparkConf, out_path
     lines.append("")
     lines.append("## Recommendations")
     lines.append("")
+    if recs:
+        lines.append("_Ordered by estimated savings, then severity; recommendations without an estimate come last._")
+        lines.append("")
     if not recs:
         lines.append("No recommendations generated.")
     else:
         for r in recs:
-            sid = r.stage_id if r.stage_id is not None else "N/A"
+            sid = ", ".join(map(str, r.stage_ids)) if r.stage_ids else "N/A"
             lines.append(f"### {r.title}  \\")
             lines.append(f"**Severity:** {r.severity}  \\")
-            lines.append(f"**Stage:** {sid}")
+            lines.append(f"**{'Stages' if len(r.stage_ids) > 1 else 'Stage'}:** {sid}" + ("  \\" if r.savings else ""))
+            if r.savings:
+                sv = r.savings
+                dollars = f" (${sv.cost_low:,.2f}–${sv.cost_high:,.2f})" if sv.cost_high else ""
+                lines.append(f"**Estimated savings per run:** {sv.core_hours_low:.3f}–{sv.core_hours_high:.3f} "
+                             f"core-hours{dollars}, from {sv.basis}")
             lines.append("")
             lines.append(f"**Rationale:** {r.rationale}")
             lines.append("")
@@ -78,7 +187,4 @@ def generate_markdown_report(eventlog_path: str, spark_conf: SparkConf, out_path
                 lines.append("</details>")
             lines.append("")
 
-    content = "\n".join(lines)
-    with open(out_path, "w", encoding="utf-8") as f:
-        f.write(content)
-    return out_path
+    return "\n".join(lines)
@@ -0,0 +1,499 @@
+from __future__ import annotations
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+import hashlib, json, os, tempfile, threading, time, uuid
+from spark_opt.cache import CACHE_VERSION, cache_dir_default, evict, max_bytes_default
+from spark_opt.config import CostSpec, SparkConf
+from spark_opt.detectors import default_registry
+from spark_opt.eventlog_io import CODEC_SUFFIXES, eventlog_parts
+from spark_opt.fleet import MAX_TASKS_PER_CHILD
+from spark_opt.recommendations import to_payload
+from spark_opt.report import build_markdown_report
+
+# `spark-opt serve`: a local HTTP service for schedulers that post many finished apps. Pool workers
+# are long-lived processes, so imports are paid once per worker (recycled every MAX_TASKS_PER_CHILD
+# jobs), and jobs wait in a bounded queue: when it is full the service answers 503 and the client
+# retries later. Results are cached on disk by the SHA-256 of the log's bytes plus the analysis
+# options, so a log posted again, by path or as an upload, is answered without parsing; new options
+# on a known path still hit the parsed-log cache.
+HASH_CHUNK = 1024 * 1024
+DEFAULT_MAX_QUEUE = 256
+DEFAULT_MAX_UPLOAD_BYTES = 4 * 1024 * 1024 * 1024
+MAX_WAIT_S = 600.0
+MAX_JSON_BYTES = 1024 * 1024
+# Request options; anything else in a job request is rejected.
+OPTION_TYPES = {"spark_conf": dict, "nodes": int, "cores_per_node": int, "memory_gb_per_node": float,
+                "rate_per_node_hour": float, "dbus_per_node": float, "rate_per_dbu_hour": float}
+
+class QueueFull(Exception):
+    pass
+
+def content_hash(path: str) -> str:
+    """SHA-256 over the bytes of every part of the log (one file or a rolling dir's parts in order)."""
+    h = hashlib.sha256()
+    for p in eventlog_parts(path):
+        with open(p, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+                h.update(chunk)
+    return h.hexdigest()
+
+def result_key(digest: str, options: Dict[str, Any], thresholds: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
+    raw = json.dumps({"version": CACHE_VERSION, "log": digest, "options": options, "thresholds": thresholds},
+                     sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def parse_options(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """Validated job options (see OPTION_TYPES); raises ValueError on unknown keys or bad values."""
+    unknown = sorted(set(raw) - set(OPTION_TYPES))
+    if unknown:
+        raise ValueError(f"unknown option(s): {', '.join(unknown)}")
+    out: Dict[str, Any] = {}
+    for k, v in raw.items():
+        if v is None:
+            continue
+        kind = OPTION_TYPES[k]
+        if kind is dict:
+            if not isinstance(v, dict):
+                raise ValueError(f"{k} must be an object")
+            out[k] = v
+        else:
+            try:
+                out[k] = kind(v)
+            except (TypeError, ValueError):
+                raise ValueError(f"{k} must be a number") from None
+    return out
+
+class ResultCache:
+    """Finished analyses as JSON files keyed by result_key, written atomically and evicted least-recently-used."""
+
+    def __init__(self, root: str, max_bytes: Optional[int] = None):
+        self.root = root
+        self.max_bytes = max_bytes if max_bytes is not None else max_bytes_default()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key + ".json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                out = json.load(f)
+            os.utime(path)  # LRU touch
+            return out
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(result, f, default=str)
+            os.replace(tmp, self._path(key))
+            evict(self.root, self.max_bytes, keep=self._path(key), suffix=".json")
+        except OSError:
+            pass  # like the parsed-log cache, a full or read-only dir must never fail the analysis
+
+def analyze_job(path: str, options: Dict[str, Any], thresholds: Optional[Dict[str, Dict[str, Any]]] = None,
+                use_cache: bool = True, cache_dir: Optional[str] = None) -> Dict[str, Any]:
+    """One service job in a pool worker: recommendations and the Markdown report from one pass (never raises)."""
+    t0 = time.perf_counter()
+    try:
+        nodes, cores_per_node = options.get("nodes"), options.get("cores_per_node")
+        cost = CostSpec(rate_per_node_hour=options.get("rate_per_node_hour", 0.0),
+                        dbus_per_node=options.get("dbus_per_node", 0.0),
+                        rate_per_dbu_hour=options.get("rate_per_dbu_hour", 0.0))
+        report, recs = build_markdown_report(
+            path, SparkConf(conf=options.get("spark_conf") or {}),
+            cores_total=nodes * cores_per_node if nodes and cores_per_node else None, use_cache=use_cache,
+            cache_dir=cache_dir, thresholds=thresholds, cost=cost, cores_per_node=cores_per_node,
+            memory_gb_per_node=options.get("memory_gb_per_node"))
+        return {"status": "ok", "recommendations": to_payload(recs), "report": report,
+                "elapsed_s": round(time.perf_counter() - t0, 4)}
+    except Exception as e:
+        return {"status": "error", "error": f"{type(e).__name__}: {e}", "elapsed_s": round(time.perf_counter() - t0, 4)}
+
+def _isolated(path: str, args: Tuple[Any, ...]) -> Dict[str, Any]:
+    try:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            return pool.submit(analyze_job, path, *args).result()
+    except BrokenProcessPool:
+        return {"status": "error", "error": "worker process crashed"}
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+@dataclass
+class Job:
+    job_id: str
+    key: str
+    path: str
+    content_hash: str
+    options: Dict[str, Any]
+    submitted: float = field(default_factory=time.time)
+    status: str = "queued"           # queued | running | done | error
+    cached: bool = False             # answered from the result cache
+    upload: bool = False
+    finished: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    future: Optional[Future] = None
+    done: threading.Event = field(default_factory=threading.Event)
+
+    def summary(self) -> Dict[str, Any]:
+        status = self.status
+        if status == "queued" and self.future is not None and self.future.running():
+            status = "running"
+        out = {"job_id": self.job_id, "status": status, "cached": self.cached,
+               "path": None if self.upload else self.path, "content_hash": self.content_hash, "options": self.options,
+               "submitted": self.submitted, "finished": self.finished,
+               "links": {"self": f"/jobs/{self.job_id}", "recommendations": f"/jobs/{self.job_id}/recommendations",
+                         "report": f"/jobs/{self.job_id}/report"}}
+        if self.result is not None:
+            out["elapsed_s"] = self.result.get("elapsed_s")
+            if self.result.get("error"):
+                out["error"] = self.result["error"]
+        return out
+
+class AnalysisService:
+    """Job queue in front of a bounded process pool, with a content-hash result cache."""
+
+    def __init__(self, workers: int = 1, max_queue: int = DEFAULT_MAX_QUEUE, defaults: Optional[Dict[str, Any]] = None,
+                 thresholds: Optional[Dict[str, Dict[str, Any]]] = None, use_cache: bool = True,
+                 cache_dir: Optional[str] = None, results_dir: Optional[str] = None, upload_dir: Optional[str] = None,
+                 roots: Optional[List[str]] = None, max_upload_bytes: int = DEFAULT_MAX_UPLOAD_BYTES,
+                 max_jobs: int = 10_000):
+        default_registry().resolve(thresholds)  # a bad thresholds file fails at start-up, not per job
+        base = cache_dir or cache_dir_default()
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.defaults = parse_options(defaults or {})
+        self.thresholds = thresholds
+        self.use_cache = use_cache
+        self.cache_dir = cache_dir
+        self.results = ResultCache(results_dir or os.path.join(base, "results"))
+        self.upload_dir = upload_dir or os.path.join(base, "uploads")
+        self.roots = [os.path.realpath(r) for r in roots or ()]
+        self.max_upload_bytes = max_upload_bytes
+        self.max_jobs = max_jobs
+        self._lock = threading.RLock()  # re-entered when a future is already done as its callback is added
+        self._pool = self._new_pool()
+        self._isolating = False
+        self._suspects: "deque[Job]" = deque()      # jobs failed by a crashed worker, rerun one at a time
+        self._held: "deque[Job]" = deque()          # jobs submitted while suspects rerun
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._active: Dict[str, Job] = {}            # result key -> unfinished job, so duplicates share one run
+        self._uploads: Dict[str, int] = {}           # upload path -> unfinished jobs reading it
+        self._hashes: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+        self.counts = {"submitted": 0, "cache_hits": 0, "deduplicated": 0, "done": 0, "error": 0, "rejected": 0,
+                       "isolated": 0}
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers, max_tasks_per_child=MAX_TASKS_PER_CHILD)
+
+    def _job_args(self, options: Dict[str, Any]) -> Tuple[Any, ...]:
+        return options, self.thresholds, self.use_cache, self.cache_dir
+
+    def _options(self, options: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        opts = {**self.defaults, **parse_options(options or {})}
+        if "spark_conf" in self.defaults and options and "spark_conf" in options:
+            opts["spark_conf"] = {**self.defaults["spark_conf"], **opts["spark_conf"]}
+        return opts
+
+    def _path_hash(self, path: str) -> str:
+        # Hashing reads the whole log; an unchanged path (same size and mtime) is hashed once.
+        st = os.stat(path) if os.path.isfile(path) else None
+        sig = (path, st.st_size, st.st_mtime_ns) if st else None
+        with self._lock:
+            if sig in self._hashes:
+                self._hashes.move_to_end(sig)
+                return self._hashes[sig]
+        digest = content_hash(path)
+        if sig is not None:
+            with self._lock:
+                self._hashes[sig] = digest
+                while len(self._hashes) > self.max_jobs:
+                    self._hashes.popitem(last=False)
+        return digest
+
+    def submit_path(self, path: str, options: Optional[Dict[str, Any]] = None) -> Job:
+        real = os.path.realpath(path)
+        if self.roots and not any(real == r or real.startswith(r + os.sep) for r in self.roots):
+            raise PermissionError(f"{path} is outside the allowed event-log roots")
+        if not os.path.exists(real):
+            raise FileNotFoundError(f"no such event log: {path}")
+        opts = self._options(options)
+        return self._submit(real, self._path_hash(real), opts)
+
+    def submit_upload(self, stream: BinaryIO, length: int, name: str = "", options: Optional[Dict[str, Any]] = None) -> Job:
+        """Store an uploaded log under its content hash (keeping a codec suffix such as .lz4) and queue it."""
+        if length > self.max_upload_bytes:
+            raise ValueError(f"upload of {length} bytes exceeds the {self.max_upload_bytes}-byte limit")
+        opts = self._options(options)
+        ext = os.path.splitext(name)[1].lower()
+        suffix = ext if ext in CODEC_SUFFIXES else ""
+        os.makedirs(self.upload_dir, exist_ok=True)
+        h = hashlib.sha256()
+        fd, tmp = tempfile.mkstemp(dir=self.upload_dir, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                left = length
+                while left > 0:
+                    chunk = stream.read(min(HASH_CHUNK, left))
+                    if not chunk:
+                        raise ValueError("upload ended before Content-Length bytes")
+                    h.update(chunk)
+                    f.write(chunk)
+                    left -= len(chunk)
+            digest = h.hexdigest()
+            path = os.path.join(self.upload_dir, digest + suffix)
+            with self._lock:
+                # Hold a reference before the file appears, so a finishing job with the same content
+                # cannot delete it before this upload is queued.
+                self._uploads[path] = self._uploads.get(path, 0) + 1
+                os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        try:
+            return self._submit(path, digest, opts, upload=True)
+        finally:
+            self._release_upload(path)
+
+    def _release_upload(self, path: str) -> None:
+        with self._lock:
+            self._uploads[path] -= 1
+            if not self._uploads[path]:
+                del self._uploads[path]
+                _remove(path)
+
+    def _submit(self, path: str, digest: str, options: Dict[str, Any], upload: bool = False) -> Job:
+        key = result_key(digest, options, self.thresholds)
+        cached = self.results.get(key)
+        with self._lock:
+            self.counts["submitted"] += 1
+            if key in self._active:
+                self.counts["deduplicated"] += 1
+                return self._active[key]
+            job = Job(uuid.uuid4().hex, key, path, digest, options, upload=upload)
+            if cached is not None:
+                self.counts["cache_hits"] += 1
+                job.status, job.cached, job.result, job.finished = "done", True, cached, time.time()
+                job.done.set()
+                self._remember(job)
+                return job
+            if len(self._active) >= self.max_queue:
+                self.counts["rejected"] += 1
+                raise QueueFull(f"{len(self._active)} jobs queued or running; retry later")
+            self._active[key] = job
+            if upload:
+                self._uploads[path] = self._uploads.get(path, 0) + 1
+            self._remember(job)
+            self._start(job)
+        return job
+
+    def _start(self, job: Job) -> None:
+        # Called under the lock. While crash suspects rerun, new jobs are held back so no more than
+        # `workers` analysis processes ever run at once.
+        if self._isolating:
+            self._held.append(job)
+            return
+        try:
+            job.future = self._pool.submit(analyze_job, job.path, *self._job_args(job.options))
+        except BrokenProcessPool:
+            self._pool = self._new_pool()
+            job.future = self._pool.submit(analyze_job, job.path, *self._job_args(job.options))
+        job.future.add_done_callback(lambda f: self._on_done(job, f))
+
+    def _remember(self, job: Job) -> None:
+        self._jobs[job.job_id] = job
+        while len(self._jobs) > self.max_jobs:
+            old_id, old = next(iter(self._jobs.items()))
+            if not old.done.is_set():
+                break
+            del self._jobs[old_id]
+
+    def _on_done(self, job: Job, fut: Future) -> None:
+        try:
+            result = fut.result()
+        except BrokenProcessPool:
+            # A worker died hard (OOM kill, segfault) and failed every job in the pool. Like fleet runs,
+            # rerun those jobs alone, one at a time, so only the log that actually crashes is reported.
+            with self._lock:
+                self._suspects.append(job)
+                if not self._isolating:
+                    self._isolating = True
+                    threading.Thread(target=self._isolate, args=(self._pool,), daemon=True).start()
+            return
+        except Exception as e:
+            result = {"status": "error", "error": f"{type(e).__name__}: {e}"}
+        self._finish(job, result)
+
+    def _isolate(self, broken: ProcessPoolExecutor) -> None:
+        broken.shutdown(wait=True)  # its workers are gone before the first rerun starts
+        while True:
+            with self._lock:
+                if not self._suspects:
+                    self._pool = self._new_pool()
+                    self._isolating = False
+                    held, self._held = self._held, deque()
+                    for job in held:
+                        self._start(job)
+                    return
+                job = self._suspects.popleft()
+                self.counts["isolated"] += 1
+            self._finish(job, _isolated(job.path, self._job_args(job.options)))
+
+    def _finish(self, job: Job, result: Dict[str, Any]) -> None:
+        if result.get("status") == "ok":
+            self.results.put(job.key, result)
+        with self._lock:
+            job.result, job.finished = result, time.time()
+            job.status = "done" if result.get("status") == "ok" else "error"
+            self.counts["done" if job.status == "done" else "error"] += 1
+            self._active.pop(job.key, None)
+            if job.upload:
+                self._release_upload(job.path)
+        job.done.set()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            running = sum(1 for j in self._active.values() if j.future is not None and j.future.running())
+            return {"status": "ok", "workers": self.workers, "max_queue": self.max_queue, "active": len(self._active),
+                    "running": running, "queued": len(self._active) - running, **self.counts}
+
+    def close(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait, cancel_futures=not wait)
+
+def _wait_s(query: Dict[str, List[str]]) -> float:
+    try:
+        return min(max(float(query.get("wait", ["0"])[0]), 0.0), MAX_WAIT_S)
+    except ValueError:
+        raise ValueError("wait must be a number of seconds") from None
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """POST /jobs (JSON {"path": ..., options} or a raw upload), GET /jobs/<id>[/recommendations|/report], GET /health."""
+
+    service: AnalysisService
+    server_version = "spark-opt"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt: str, *args: Any) -> None:
+        if getattr(self.server, "verbose", False):
+            super().log_message(fmt, *args)
+
+    def _send(self, code: int, body: Any, content_type: str = "application/json",
+              headers: Optional[Dict[str, str]] = None) -> None:
+        data = body.encode("utf-8") if isinstance(body, str) else json.dumps(body, indent=2, default=str).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _error(self, code: int, message: str, headers: Optional[Dict[str, str]] = None) -> None:
+        self._send(code, {"error": message}, headers=headers)
+
+    def _job_reply(self, job: Job, wait: float) -> None:
+        if wait:
+            job.done.wait(wait)
+        done = job.done.is_set()
+        self._send(200 if done else 202, job.summary(),
+                   headers=None if done else {"Location": f"/jobs/{job.job_id}"})
+
+    def do_POST(self) -> None:
+        url = urlparse(self.path)
+        if url.path.rstrip("/") != "/jobs":
+            return self._error(404, "not found")
+        query = parse_qs(url.query)
+        raw_length = self.headers.get("Content-Length") or ""
+        if not raw_length.isdigit():
+            self.close_connection = True
+            return self._error(411, "Content-Length required")
+        length = int(raw_length)
+        try:
+            wait = _wait_s(query)
+            if (self.headers.get("Content-Type") or "").split(";")[0].strip() == "application/json":
+                if length > MAX_JSON_BYTES:
+                    while length > 0:  # drain it in chunks so the client still reads the reply
+                        length -= len(self.rfile.read(min(HASH_CHUNK, length)) or b"\0" * length)
+                    return self._error(413, f"JSON body over {MAX_JSON_BYTES} bytes")
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if not isinstance(body, dict) or not body.get("path"):
+                    raise ValueError('expected {"path": "<event log>", ...options}')
+                path = body.pop("path")
+                job = self.service.submit_path(str(path), body)
+            else:
+                options = json.loads(query["options"][0]) if "options" in query else {}
+                if not isinstance(options, dict):
+                    raise ValueError("options must be a JSON object")
+                name = query.get("name", [self.headers.get("X-Filename") or ""])[0]
+                job = self.service.submit_upload(self.rfile, length, name, options)
+        except QueueFull as e:
+            return self._error(503, str(e), headers={"Retry-After": "5"})
+        except PermissionError as e:
+            return self._error(403, str(e))
+        except FileNotFoundError as e:
+            return self._error(404, str(e))
+        except ValueError as e:
+            self.close_connection = True  # the body may be unread
+            return self._error(400, str(e))
+        self._job_reply(job, wait)
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split("/") if p]
+        if parts == ["health"]:
+            return self._send(200, self.service.stats())
+        if len(parts) not in (2, 3) or parts[0] != "jobs" or (len(parts) == 3 and parts[2] not in ("recommendations", "report")):
+            return self._error(404, "not found")
+        job = self.service.get(parts[1])
+        if job is None:
+            return self._error(404, f"unknown job {parts[1]}")
+        try:
+            wait = _wait_s(parse_qs(url.query))
+        except ValueError as e:
+            return self._error(400, str(e))
+        if len(parts) == 2:
+            return self._job_reply(job, wait)
+        if wait:
+            job.done.wait(wait)
+        if not job.done.is_set():
+            return self._send(202, job.summary(), headers={"Location": f"/jobs/{job.job_id}", "Retry-After": "1"})
+        if job.status != "done":
+            return self._send(422, job.summary())
+        if parts[2] == "report":
+            return self._send(200, job.result["report"], content_type="text/markdown")
+        self._send(200, job.result["recommendations"])
+
+def make_server(service: AnalysisService, host: str = "127.0.0.1", port: int = 8080,
+                verbose: bool = False) -> ThreadingHTTPServer:
+    handler = type("BoundServiceHandler", (ServiceHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.verbose = verbose
+    return server
+
+def serve(service: AnalysisService, host: str = "127.0.0.1", port: int = 8080, verbose: bool = False) -> None:
+    server = make_server(service, host, port, verbose)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close(wait=False)
@@ -0,0 +1,197 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import heapq, math
+import numpy as np
+from spark_opt.config import ClusterSpec, CostSpec
+from spark_opt.cost_model import estimate_cost
+from spark_opt.eventlog_reader import StageCompleted, TaskTable
+from spark_opt.profiling import profiled
+
+# Stages with more tasks than slots but at most this many are list-scheduled exactly on a heap of
+# slot free times. Larger ones are placed in snake-ordered waves of longest-first tasks: identical
+# to LPT list scheduling for up to two waves, and always a valid schedule.
+HEAP_MAX_TASKS = 512
+_DUR_BITS = 40
+_DUR_MASK = (1 << _DUR_BITS) - 1
+
+@dataclass
+class SimStage:
+    stage_id: int
+    durations: np.ndarray  # task durations in ms, longest first
+    parents: List[int]     # indices into SimPlan.stages
+    gate: int              # waits for the first `gate` stages in observed completion order...
+    gap_ms: int            # ...plus the driver time observed after the last of them
+    comp_rank: int         # this stage's position in observed completion order
+    overhead_ms: int = 0   # observed completion after its last task finished (commit, driver work)
+
+@dataclass
+class SimPlan:
+    stages: List[SimStage]  # observed submission order
+    tail_ms: int            # driver time after the last stage
+    observed_wall_ms: int
+
+    @property
+    def num_tasks(self) -> int:
+        return sum(len(s.durations) for s in self.stages)
+
+@dataclass
+class SizingResult:
+    nodes: int
+    cores_per_node: int
+    runtime_seconds: float
+    node_hours: float
+    estimated_cost: float
+    estimated_cost_dbu: Optional[float]
+    pareto: bool = False
+
+    @property
+    def total_cost(self) -> float:
+        """Node cost plus DBU cost, whichever of them is priced."""
+        return self.estimated_cost + (self.estimated_cost_dbu or 0.0)
+
+def cost_key(results: List[SizingResult]) -> Callable[[SizingResult], float]:
+    """What the sizes are ranked on: total cost, or node-hours when nothing is priced."""
+    if any(r.total_cost > 0 for r in results):
+        return lambda r: r.total_cost
+    return lambda r: r.node_hours
+
+@profiled("simulate_plan")
+def build_plan(stages: List[StageCompleted], tasks: TaskTable, meta: Dict[str, Any]) -> SimPlan:
+    """Per-stage task durations plus the ordering constraints to replay them on another cluster.
+
+    A stage waits for its DAG parents and for every stage that had completed before it was submitted
+    in the observed run (driver-side ordering between jobs), then for the observed driver gap.
+    """
+    spans: Dict[int, List[Any]] = {}
+    parents: Dict[int, set] = {}
+    for job in meta.get("jobs") or []:
+        for sid, pids in job.get("stages") or []:
+            parents.setdefault(sid, set()).update(pids)
+    for s in stages:
+        parents.setdefault(s.stage_id, set()).update(s.parent_ids)
+        if s.submission_time_ms is None or s.completion_time_ms is None:
+            continue
+        x = spans.setdefault(s.stage_id, [s.submission_time_ms, s.completion_time_ms])
+        x[0], x[1] = min(x[0], s.submission_time_ms), max(x[1], s.completion_time_ms)
+    ids = sorted(spans, key=lambda k: (spans[k][0], k))
+    if not ids:
+        return SimPlan([], 0, 0)
+
+    # One sort of packed (stage_id, longest-first duration) keys; several times faster than lexsort.
+    known = tasks["stage_id"] >= 0
+    sid = tasks["stage_id"][known].astype(np.int64)
+    dur = np.clip(tasks["duration_ms"][known], 0, _DUR_MASK)
+    key = np.sort((sid << _DUR_BITS) | (_DUR_MASK - dur))
+    sid, dur = key >> _DUR_BITS, _DUR_MASK - (key & _DUR_MASK)
+    bounds = np.flatnonzero(np.r_[True, sid[1:] != sid[:-1], True]) if len(sid) else np.zeros(1, dtype=np.int64)
+    by_stage = {int(sid[a]): dur[a:b] for a, b in zip(bounds[:-1].tolist(), bounds[1:].tolist())}
+    last_finish = np.full(int(sid.max()) + 1 if len(sid) else 0, -1, dtype=np.int64)
+    np.maximum.at(last_finish, tasks["stage_id"][known], tasks["finish_time_ms"][known])
+
+    submit = np.array([spans[k][0] for k in ids], dtype=np.int64)
+    comp = np.array([spans[k][1] for k in ids], dtype=np.int64)
+    comp_order = np.argsort(comp, kind="stable")
+    comp_sorted = comp[comp_order]
+    comp_rank = np.empty(len(ids), dtype=np.int64)
+    comp_rank[comp_order] = np.arange(len(ids))
+    gates = np.searchsorted(comp_sorted, submit, side="right")
+    start = meta.get("start_time_ms") if meta.get("start_time_ms") is not None else int(submit.min())
+    end = meta.get("end_time_ms") if meta.get("end_time_ms") is not None else int(comp.max())
+    index = {k: i for i, k in enumerate(ids)}
+
+    out = []
+    for i, k in enumerate(ids):
+        g = int(gates[i])
+        gap = int(submit[i] - (comp_sorted[g - 1] if g else start))
+        lf = int(last_finish[k]) if k < len(last_finish) and last_finish[k] >= 0 else int(comp[i])
+        out.append(SimStage(k, by_stage.get(k, np.empty(0, dtype=np.int64)),
+                            [index[p] for p in sorted(parents.get(k, ())) if p in index and p != k],
+                            g, max(0, gap), int(comp_rank[i]), max(0, int(comp[i]) - lf)))
+    return SimPlan(out, max(0, int(end - comp.max())), int(end - start))
+
+def simulate(plan: SimPlan, slots: int) -> float:
+    """Predicted wall-clock ms of the application on `slots` task slots (nodes x cores)."""
+    slots = max(1, int(slots))
+    free = np.zeros(slots, dtype=np.int64)
+    n_st = len(plan.stages)
+    finish = [0] * n_st
+    tree = [0] * (n_st + 1)  # Fenwick tree: prefix max of finish times by observed completion rank
+    last = 0
+    for i, st in enumerate(plan.stages):
+        ready, g = 0, st.gate
+        while g > 0:
+            ready = max(ready, tree[g])
+            g -= g & -g
+        ready += st.gap_ms
+        for p in st.parents:
+            ready = max(ready, finish[p])
+
+        d, n = st.durations, len(st.durations)
+        if n == 0:
+            end = ready
+        elif n <= slots:
+            idx = np.argpartition(free, n - 1)[:n] if n < slots else np.arange(slots)
+            idx = idx[np.argsort(free[idx], kind="stable")]
+            ends = np.maximum(free[idx], ready) + d
+            free[idx] = ends
+            end = int(ends.max())
+        elif n <= HEAP_MAX_TASKS:
+            heap = [(max(int(t), ready), j) for j, t in enumerate(free.tolist())]
+            heapq.heapify(heap)
+            end = ready
+            for x in d.tolist():
+                t, j = heap[0]
+                heapq.heapreplace(heap, (t + x, j))
+                end = max(end, t + x)
+            for t, j in heap:
+                if t > max(free[j], ready):  # only slots that received a task move
+                    free[j] = t
+        else:
+            eff = np.maximum(free, ready)
+            idx = np.argsort(eff, kind="stable")
+            waves = math.ceil(n / slots)
+            grid = np.zeros(waves * slots, dtype=np.int64)
+            grid[:n] = d
+            grid = grid.reshape(waves, slots)
+            grid[1::2] = grid[1::2, ::-1]
+            ends = eff[idx] + grid.sum(axis=0)
+            free[idx] = ends
+            end = int(ends.max())
+
+        end += st.overhead_ms
+        finish[i] = end
+        last = max(last, end)
+        r = st.comp_rank + 1
+        while r <= n_st:
+            tree[r] = max(tree[r], end)
+            r += r & -r
+    return float(last + plan.tail_ms)
+
+def pareto_frontier(results: List[SizingResult]) -> List[SizingResult]:
+    """Results no other result beats on both runtime and cost (node-hours if unpriced), fastest first."""
+    key = cost_key(results)
+    front: List[SizingResult] = []
+    for r in sorted(results, key=lambda r: (r.runtime_seconds, key(r))):
+        if not front or key(r) < key(front[-1]):
+            front.append(r)
+    return front
+
+@profiled("simulate_sweep")
+def sweep(plan: SimPlan, clusters: Iterable[ClusterSpec], cost: Optional[CostSpec] = None) -> List[SizingResult]:
+    """Simulate every cluster size (each distinct slot count once) and mark the cost/runtime Pareto frontier."""
+    cost = cost or CostSpec()
+    by_slots: Dict[int, float] = {}
+    results = []
+    for c in clusters:
+        slots = c.nodes * c.cores_per_node
+        if slots not in by_slots:
+            by_slots[slots] = simulate(plan, slots)
+        runtime_s = by_slots[slots] / 1000.0
+        est = estimate_cost(int(math.ceil(runtime_s)), c.nodes, cost.rate_per_node_hour,
+                            cost.dbus_per_node, cost.rate_per_dbu_hour)
+        results.append(SizingResult(c.nodes, c.cores_per_node, runtime_s, est.node_hours,
+                                    est.estimated_cost, est.estimated_cost_dbu))
+    for r in pareto_frontier(results):
+        r.pareto = True
+    return results
@@ -0,0 +1,111 @@
+from __future__ import annotations
+from typing import Iterable, Optional
+import math
+import numpy as np
+
+# DDSketch (Masson, Rim & Lee, VLDB 2019): values are counted in logarithmic buckets
+# (gamma^(i-1), gamma^i] with gamma = (1 + alpha) / (1 - alpha). Bucket counts simply add,
+# so merging sketches of chunks, byte ranges, processes or log parts gives exactly the sketch
+# of the concatenated data, in any order.
+#
+# Error bound: percentile(p) returns np.percentile's linear interpolation between the two
+# order statistics around rank (n-1)*p/100, with each order statistic replaced by its bucket
+# estimate. Each estimate is within +-alpha (relative) of the true value and the interpolation
+# weights are non-negative, so for non-negative data
+#     |sketch.percentile(p) - np.percentile(data, p)| <= alpha * np.percentile(data, p).
+# min, max, count and sum are exact. Size is O(log(max/min) / alpha) buckets, independent of
+# the number of values (~770 buckets for 1 ms .. 1 h at alpha = 1%).
+DEFAULT_RELATIVE_ACCURACY = 0.01
+
+class DDSketch:
+    """Mergeable relative-error quantile sketch over non-negative values."""
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be in (0, 1)")
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.bins = np.empty(0, dtype=np.int64)    # sorted bucket indices
+        self.counts = np.empty(0, dtype=np.int64)  # values per bucket
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def __len__(self) -> int:
+        return self.count
+
+    @classmethod
+    def from_values(cls, values: Iterable[float], relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY) -> "DDSketch":
+        s = cls(relative_accuracy)
+        s.add(values)
+        return s
+
+    def add(self, values: Iterable[float]) -> "DDSketch":
+        v = np.asarray(values if isinstance(values, np.ndarray) else list(values))
+        if not len(v):
+            return self
+        if (v < 0).any():
+            raise ValueError("DDSketch only accepts non-negative values")
+        pos = v[v > 0].astype(np.float64)
+        bins, counts = np.unique(np.ceil(np.log(pos) / self._log_gamma).astype(np.int64), return_counts=True)
+        self._merge_bins(bins, counts)
+        self.zero_count += int(len(v) - len(pos))
+        self._merge_summary(len(v), v.sum().item(), v.min().item(), v.max().item())
+        return self
+
+    def merge(self, other: "DDSketch") -> "DDSketch":
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("cannot merge sketches with different relative accuracy")
+        if other.count:
+            self._merge_bins(other.bins, other.counts)
+            self.zero_count += other.zero_count
+            self._merge_summary(other.count, other.sum, other.min, other.max)
+        return self
+
+    def copy(self) -> "DDSketch":
+        return DDSketch(self.relative_accuracy).merge(self)
+
+    def _merge_bins(self, bins: np.ndarray, counts: np.ndarray) -> None:
+        if not len(self.bins):
+            self.bins, self.counts = bins.copy(), counts.copy()
+            return
+        all_bins = np.concatenate([self.bins, bins])
+        self.bins, inv = np.unique(all_bins, return_inverse=True)
+        self.counts = np.bincount(inv, weights=np.concatenate([self.counts, counts]), minlength=len(self.bins)).astype(np.int64)
+
+    def _merge_summary(self, count: int, total, lo, hi) -> None:
+        self.count += count
+        self.sum += total
+        self.min = lo if self.min is None else min(self.min, lo)
+        self.max = hi if self.max is None else max(self.max, hi)
+
+    def _values_at_ranks(self, ranks: np.ndarray) -> np.ndarray:
+        out = np.zeros(len(ranks), dtype=np.float64)
+        nz = ranks >= self.zero_count
+        if nz.any():
+            cum = np.cumsum(self.counts)
+            i = np.minimum(np.searchsorted(cum, ranks[nz] - self.zero_count, side="right"), len(cum) - 1)
+            out[nz] = 2 * self._gamma ** self.bins[i].astype(np.float64) / (self._gamma + 1)
+        # The extreme order statistics are known exactly.
+        out[ranks == 0] = self.min
+        out[ranks == self.count - 1] = self.max
+        return np.clip(out, self.min, self.max)
+
+    def excess_over(self, threshold: float) -> float:
+        """Sum of max(0, v - threshold) over the values, each taken at its bucket's value (same accuracy)."""
+        if not len(self.bins):
+            return 0.0
+        values = np.clip(2 * self._gamma ** self.bins.astype(np.float64) / (self._gamma + 1), self.min, self.max)
+        return float((np.maximum(values - threshold, 0.0) * self.counts).sum())
+
+    def percentile(self, p: float) -> float:
+        """Same convention as np.percentile (p in [0, 100], linear interpolation); 0.0 when empty."""
+        if not self.count:
+            return 0.0
+        virtual = (self.count - 1) * (p / 100)
+        lo = math.floor(virtual)
+        a, b = self._values_at_ranks(np.array([lo, min(lo + 1, self.count - 1)], dtype=np.int64))
+        return float(a + (b - a) * (virtual - lo))
@@ -0,0 +1,103 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from spark_opt.metrics import StageMetrics
+from spark_opt.profiling import profiled
+
+# Stage -> SQL physical operator attribution. The parser keeps every plan node that owns SQL metrics
+# (keyed by its first accumulator id) and the accumulators each completed stage updated; a stage
+# touched an operator when it updated one of its metrics. One stage usually runs a pipeline (scan,
+# filter, aggregate, exchange write), so its time, shuffle and spill go to one primary operator: the
+# first by OPERATOR_RANK, i.e. the join or aggregation rather than the code-generation wrapper or
+# exchange around it. Every step is a dict lookup: linear in plan nodes plus stage accumulables.
+OPERATOR_RANK: Tuple[Tuple[str, int], ...] = (
+    ("Join", 0), ("CartesianProduct", 0), ("Aggregate", 1), ("Window", 2), ("Sort", 2), ("Generate", 2),
+    ("Python", 2), ("Scan", 3), ("Exchange", 4),
+)
+
+def operator_rank(name: str) -> int:
+    for part, rank in OPERATOR_RANK:
+        if part in name:
+            return rank
+    return len(OPERATOR_RANK)
+
+@dataclass
+class OperatorStats:
+    key: str                     # first accumulator id of the plan node
+    execution_id: int
+    name: str                    # e.g. SortMergeJoin, HashAggregate, "Scan parquet db.orders"
+    description: str             # the node's simpleString (truncated)
+    stage_ids: List[int] = field(default_factory=list)  # stages where this is the primary operator
+    task_time_ms: int = 0
+    shuffle_read_mb: float = 0.0
+    shuffle_write_mb: float = 0.0
+    spill_mb: float = 0.0
+    metrics: Dict[str, int] = field(default_factory=dict)  # the node's SQL metrics, summed over all stages (+ driver-side)
+
+    @property
+    def label(self) -> str:
+        return self.description or self.name
+
+@dataclass
+class SqlAttribution:
+    operators: Dict[str, OperatorStats]
+    stage_operator: Dict[Tuple[int, int], str]         # (stage_id, attempt) -> primary operator key
+    stage_operators: Dict[Tuple[int, int], List[str]]  # every operator the stage attempt touched
+    executions: Dict[int, Optional[str]]
+    unattributed_ms: int = 0                           # task time of stages without SQL metrics
+    latest_attempt: Dict[int, int] = field(default_factory=dict)
+
+    def for_stage(self, stage_id: int, attempt: Optional[int] = None) -> Optional[OperatorStats]:
+        """Primary operator of a stage attempt (the latest attributed attempt when `attempt` is None)."""
+        if attempt is None:
+            attempt = self.latest_attempt.get(stage_id)
+        key = self.stage_operator.get((stage_id, attempt))
+        return self.operators.get(key) if key is not None else None
+
+    def top(self, n: int = 10) -> List[OperatorStats]:
+        return sorted(self.operators.values(), key=lambda o: (-o.task_time_ms, -o.spill_mb, o.key))[:n]
+
+def has_sql_plans(meta: Optional[Dict[str, Any]]) -> bool:
+    return bool(meta and meta.get("sql_metrics") and meta.get("stage_accumulables"))
+
+@profiled("sql")
+def attribute_operators(stages: List[StageMetrics], meta: Dict[str, Any]) -> SqlAttribution:
+    ops_meta, metrics_meta = meta.get("sql_operators") or {}, meta.get("sql_metrics") or {}
+    ops = {k: OperatorStats(k, int(v[0]), v[1], v[2]) for k, v in ops_meta.items()}
+    primary: Dict[Tuple[int, int], str] = {}
+    touched: Dict[Tuple[int, int], List[str]] = {}
+    latest: Dict[int, int] = {}
+    for sid, attempt, accs in meta.get("stage_accumulables") or ():
+        seen: Dict[str, None] = {}
+        for aid, value in accs:
+            m = metrics_meta.get(str(aid))
+            if m is None or m[0] not in ops:
+                continue
+            op = ops[m[0]]
+            op.metrics[m[1]] = op.metrics.get(m[1], 0) + value
+            seen[m[0]] = None
+        if seen:
+            key = (int(sid), int(attempt))
+            touched[key] = list(seen)
+            primary[key] = min(seen, key=lambda k: (operator_rank(ops[k].name), int(k)))
+            latest[key[0]] = max(latest.get(key[0], key[1]), key[1])
+
+    for aid, value in (meta.get("sql_driver_accums") or {}).items():
+        m = metrics_meta.get(str(aid))
+        if m is not None and m[0] in ops:
+            ops[m[0]].metrics[m[1]] = ops[m[0]].metrics.get(m[1], 0) + value
+
+    unattributed = 0
+    for s in stages:
+        key = primary.get((s.stage_id, s.attempt))
+        if key is None:
+            unattributed += s.task_time_ms
+            continue
+        op = ops[key]
+        op.stage_ids.append(s.stage_id)
+        op.task_time_ms += s.task_time_ms
+        op.shuffle_read_mb += s.shuffle_read_mb
+        op.shuffle_write_mb += s.shuffle_write_mb
+        op.spill_mb += s.spill_mb
+    executions = {int(k): v for k, v in (meta.get("sql_executions") or {}).items()}
+    return SqlAttribution(ops, primary, touched, executions, unattributed, latest)
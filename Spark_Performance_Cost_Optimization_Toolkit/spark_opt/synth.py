@@ -0,0 +1,358 @@
+from __future__ import annotations
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple
+import json, math, os
+import numpy as np
+
+# Synthetic Spark event logs for tests and benchmarks. Stages run one after another inside jobs of
+# `stages_per_job` chained stages; tasks are placed on executor slots wave by wave, so task times,
+# executors and job/stage events are consistent enough for the timeline and simulator as well.
+# Event lines follow Spark's JSON field names; noise events (TaskStart, block and executor-metric
+# updates, SQL execution starts) carry nothing the analyzers read, like most of a real log. Failed
+# attempts run in the task's slot before its successful retry; losing speculative copies start halfway
+# through the original on the next executor and are killed when it finishes. Executors run with
+# `executor_memory_mb` of heap; their peak heap stays near `heap_used` of it except in spilling stages,
+# whose tasks also use up their share of execution memory. Python UDF stages (alternately row-at-a-time
+# and Arrow) spend most of their task time off the JVM's CPU, waiting for Python workers. Each job
+# scans a table in its first stage and writes its result in the last; small-file scans read a few
+# tiny files per task in short tasks, and small-file writes write a few MB per task.
+MB = 1024 * 1024
+BASE_TIME_MS = 1_700_000_000_000
+WRITE_BATCH = 50_000
+
+@dataclass
+class SynthSpec:
+    tasks: int = 10_000
+    stages: int = 20
+    stages_per_job: int = 4
+    executors: int = 8
+    cores_per_executor: int = 4
+    task_ms: float = 800.0       # median task duration
+    skew_stages: float = 0.2     # fraction of stages where ~1% of tasks run `skew_factor` times longer
+    skew_factor: float = 25.0
+    spill_stages: float = 0.1    # fraction of stages that spill (>= 1 GB) under GC pressure
+    noise: float = 1.0           # noise events per TaskEnd
+    slow_hosts: int = 0          # hosts (two executors each) whose tasks all run `slow_host_factor` times longer
+    slow_host_factor: float = 4.0
+    failed_tasks: float = 0.0    # fraction of tasks whose first attempt fails before a successful retry
+    speculative_tasks: float = 0.0  # fraction of tasks that get a speculative copy which loses and is killed
+    executor_memory_mb: int = 4096  # spark.executor.memory
+    heap_used: float = 0.6       # peak JVM heap / executor memory outside spilling stages
+    python_udf_stages: float = 0.0  # fraction of stages that run Python UDFs
+    small_file_stages: float = 0.0  # fraction of scan stages that read small files
+    small_file_writes: float = 0.0  # fraction of write stages that write small files
+    seed: int = 0
+
+_TASK_END = ('{"Event":"SparkListenerTaskEnd","Stage ID":%d,"Stage Attempt ID":0,"Task Type":"%s",'
+             '"Task End Reason":{"Reason":"Success"},"Task Info":{"Task ID":%d,"Index":%d,"Attempt":0,'
+             '"Launch Time":%d,"Executor ID":"%d","Host":"host-%d","Locality":"PROCESS_LOCAL","Speculative":false,'
+             '"Getting Result Time":0,"Finish Time":%d,"Failed":false,"Killed":false,"Accumulables":[]},'
+             '"Task Metrics":{"Executor Deserialize Time":%d,"Executor Run Time":%d,"Executor CPU Time":%d,"Result Size":2048,'
+             '"Result Serialization Time":1,"JVM GC Time":%d,'
+             '"Memory Bytes Spilled":%d,"Disk Bytes Spilled":%d,'
+             '"Shuffle Read Metrics":{"Remote Blocks Fetched":8,"Local Blocks Fetched":2,"Fetch Wait Time":0,'
+             '"Remote Bytes Read":%d,"Local Bytes Read":%d,"Total Records Read":%d},'
+             '"Shuffle Write Metrics":{"Shuffle Bytes Written":%d,"Shuffle Write Time":0,"Shuffle Records Written":%d},'
+             '"Input Metrics":{"Bytes Read":%d,"Records Read":%d},"Output Metrics":{"Bytes Written":%d,"Records Written":%d},'
+             '"Peak Execution Memory":%d},"Task Executor Metrics":{"JVMHeapMemory":%d,"JVMOffHeapMemory":%d,'
+             '"OnHeapExecutionMemory":%d,"DirectPoolMemory":%d,"MappedPoolMemory":0,"ProcessTreePythonRSSMemory":0}}')
+_TASK_START = ('{"Event":"SparkListenerTaskStart","Stage ID":%d,"Stage Attempt ID":0,"Task Info":{"Task ID":%d,'
+               '"Index":%d,"Attempt":0,"Launch Time":%d,"Executor ID":"%d","Host":"host-%d","Locality":"PROCESS_LOCAL",'
+               '"Speculative":false,"Getting Result Time":0,"Finish Time":0,"Failed":false,"Killed":false,"Accumulables":[]}}')
+_BLOCK_UPDATED = ('{"Event":"SparkListenerBlockUpdated","Block Updated Info":{"Block Manager ID":{"Executor ID":"%d",'
+                  '"Host":"host-%d","Port":7337},"Block ID":"broadcast_%d_piece0","Storage Level":{"Use Disk":false,'
+                  '"Use Memory":true,"Deserialized":false,"Replication":1},"Memory Size":%d,"Disk Size":0}}')
+_METRICS_UPDATE = ('{"Event":"SparkListenerExecutorMetricsUpdate","Executor ID":"%d","Metrics Updated":[],'
+                   '"Executor Metrics Updated":{"%d:0":{"JVMHeapMemory":%d,"JVMOffHeapMemory":%d,"OnHeapExecutionMemory":%d}}}')
+
+def _attempt_line(sid: int, task_id: int, index: int, attempt: int, launch: int, finish: int, executor: int,
+                  reason: Dict[str, Any], speculative: bool, task_type: str) -> str:
+    run = finish - launch
+    return json.dumps({
+        "Event": "SparkListenerTaskEnd", "Stage ID": sid, "Stage Attempt ID": 0, "Task Type": task_type,
+        "Task End Reason": reason,
+        "Task Info": {"Task ID": task_id, "Index": index, "Attempt": attempt, "Launch Time": launch,
+                      "Executor ID": str(executor), "Host": f"host-{_host(executor)}", "Locality": "PROCESS_LOCAL",
+                      "Speculative": speculative, "Getting Result Time": 0, "Finish Time": finish,
+                      "Failed": reason["Reason"] != "TaskKilled", "Killed": reason["Reason"] == "TaskKilled",
+                      "Accumulables": []},
+        "Task Metrics": {"Executor Deserialize Time": 0, "Executor Run Time": run, "Result Size": 0,
+                         "JVM GC Time": run // 50, "Memory Bytes Spilled": 0, "Disk Bytes Spilled": 0}},
+        separators=(",", ":"))
+
+def _host(executor: int) -> int:
+    return (executor - 1) // 2  # two executors per host
+
+def _stage_sizes(spec: SynthSpec, rng: np.random.Generator) -> np.ndarray:
+    n = max(1, min(spec.stages, spec.tasks))
+    sizes = np.ones(n, dtype=np.int64)
+    if spec.tasks > n:
+        sizes += rng.multinomial(spec.tasks - n, rng.dirichlet(np.full(n, 2.0)))
+    return sizes
+
+def _place(durations: np.ndarray, slots: int, start_ms: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Launch times and slot of each task when task i runs in wave i // slots on slot i % slots."""
+    n = len(durations)
+    waves = math.ceil(n / slots)
+    grid = np.zeros(waves * slots, dtype=np.int64)
+    grid[:n] = durations
+    grid = grid.reshape(waves, slots)
+    launch = (np.cumsum(grid, axis=0) - grid).reshape(-1)[:n] + start_ms
+    return launch, np.arange(n) % slots
+
+def _noise_lines(rng: np.random.Generator, count: int, sid: int, task_ids: np.ndarray, launch: np.ndarray,
+                 executor: np.ndarray) -> List[str]:
+    if count <= 0:
+        return []
+    pick = rng.integers(0, len(task_ids), size=count)
+    kind = rng.random(count)
+    mem = rng.integers(1, 4 * 1024, size=count) * MB
+    out = []
+    for k, i, m in zip(kind.tolist(), pick.tolist(), mem.tolist()):
+        e = int(executor[i])
+        if k < 0.6:
+            out.append(_TASK_START % (sid, task_ids[i], i, launch[i], e, _host(e)))
+        elif k < 0.8:
+            out.append(_BLOCK_UPDATED % (e, _host(e), sid, m // 64))
+        else:
+            out.append(_METRICS_UPDATE % (e, sid, m, m // 8, m // 2))
+    return out
+
+def _interleave(rng: np.random.Generator, lines: List[str], noise: List[str]) -> List[str]:
+    if not noise:
+        return lines
+    keys = np.r_[np.arange(len(lines), dtype=np.float64), rng.integers(0, len(lines) + 1, size=len(noise)) - 0.5]
+    merged = lines + noise
+    return [merged[i] for i in np.argsort(keys, kind="stable").tolist()]
+
+def _sql_plan(job: int, stage_ids: List[int], next_acc: int) -> Tuple[Dict[str, Any], Dict[int, List[Tuple[int, str, str]]], int]:
+    """A chain plan for one job: per stage a code-generated scan, join or aggregate, with an exchange
+    between stages. Returns the sparkPlanInfo, the (accumulator id, metric name, value kind) each stage
+    updates, and the next free accumulator id."""
+    updates: Dict[int, List[Tuple[int, str, str]]] = {sid: [] for sid in stage_ids}
+
+    def node(name: str, simple: str, children: List[Dict[str, Any]], metrics: List[Tuple[str, str, str, int]]) -> Dict[str, Any]:
+        nonlocal next_acc
+        out = []
+        for metric, mtype, kind, sid in metrics:
+            out.append({"name": metric, "accumulatorId": next_acc, "metricType": mtype})
+            updates[sid].append((next_acc, metric, kind))
+            next_acc += 1
+        return {"nodeName": name, "simpleString": simple, "children": children, "metadata": {}, "metrics": out}
+
+    plan: Dict[str, Any] = {}
+    for i, sid in enumerate(stage_ids):
+        if i == 0:
+            op = node(f"Scan parquet synthetic.table_{job}", f"FileScan parquet synthetic.table_{job}[key#1,value#2]", [],
+                      [("number of output rows", "sum", "rows", sid), ("number of files read", "sum", "files", sid),
+                       ("size of files read", "size", "input", sid)])
+        else:
+            prev = stage_ids[i - 1]
+            ex = node("Exchange", f"Exchange hashpartitioning(key#{sid}, 200), ENSURE_REQUIREMENTS, [plan_id={sid}]", [plan],
+                      [("shuffle bytes written", "size", "shuffle_write", prev), ("shuffle records written", "sum", "shuffle_records", prev),
+                       ("remote bytes read", "size", "shuffle_read", sid)])
+            name, simple = (("SortMergeJoin", f"SortMergeJoin [key#{sid}], [key#{sid + 1}], Inner") if sid % 2 else
+                            ("HashAggregate", f"HashAggregate(keys=[key#{sid}], functions=[sum(value#{sid})])"))
+            op = node(name, simple, [ex], [("number of output rows", "sum", "rows", sid), ("spill size", "size", "spill", sid)])
+        plan = node(f"WholeStageCodegen ({i + 1})", f"WholeStageCodegen ({i + 1})", [op], [("duration", "timing", "duration", sid)])
+    return plan, updates, next_acc
+
+def _sql_start(job: int, t: int, plan_info: Dict[str, Any]) -> str:
+    plan = " +- ".join(f"Exchange hashpartitioning(key#{i}, 200)" for i in range(40))
+    return json.dumps({"Event": "org.apache.spark.sql.execution.ui.SparkListenerSQLExecutionStart", "executionId": job,
+                       "description": f"job {job}", "details": "", "physicalPlanDescription": plan, "time": t,
+                       "sparkPlanInfo": plan_info}, separators=(",", ":"))
+
+def generate_eventlog(path: str, spec: Optional[SynthSpec] = None) -> Dict[str, Any]:
+    """Write a synthetic event log to `path`; returns what was planted (skewed/spilling stage ids, counts)."""
+    spec = spec or SynthSpec()
+    rng = np.random.default_rng(spec.seed)
+    noise_rng = np.random.default_rng(spec.seed + 1_000_003)  # noise never shifts the task data
+    fault_rng = np.random.default_rng(spec.seed + 2_000_003)  # neither do failed or speculative attempts
+    mem_rng = np.random.default_rng(spec.seed + 3_000_003)    # nor memory peaks
+    py_rng = np.random.default_rng(spec.seed + 4_000_003)     # nor Python UDF stages
+    io_rng = np.random.default_rng(spec.seed + 5_000_003)     # nor file sizes
+    sizes = _stage_sizes(spec, rng)
+    n_stages = len(sizes)
+    skewed = set(np.flatnonzero(rng.random(n_stages) < spec.skew_stages).tolist())
+    spilling = set(np.flatnonzero(rng.random(n_stages) < spec.spill_stages).tolist())
+    python = sorted(np.flatnonzero(py_rng.random(n_stages) < spec.python_udf_stages).tolist())
+    per_job = max(1, spec.stages_per_job)
+    scans = np.arange(n_stages) % per_job == 0
+    writes = (np.arange(n_stages) % per_job == per_job - 1) | (np.arange(n_stages) == n_stages - 1)
+    small_scans = set(np.flatnonzero(scans & (io_rng.random(n_stages) < spec.small_file_stages)).tolist())
+    small_writes = set(np.flatnonzero(writes & (io_rng.random(n_stages) < spec.small_file_writes)).tolist())
+    python_op = {sid: ("BatchEvalPython", "ArrowEvalPython")[i % 2] for i, sid in enumerate(python)}
+    executors = max(1, spec.executors)
+    slots = executors * max(1, spec.cores_per_executor)
+    heap_bytes = spec.executor_memory_mb * MB
+    exec_per_task = (heap_bytes - 300 * MB) * 0.6 / max(1, spec.cores_per_executor)  # unified memory share
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    events = 0
+    t = BASE_TIME_MS
+    task_id = 0
+    n_failed = n_speculative = 0
+    next_acc, sql_updates = 1000, {}
+    with open(path, "w", encoding="utf-8") as f:
+        def emit(lines: List[str]) -> None:
+            nonlocal events
+            if lines:
+                f.write("\n".join(lines) + "\n")
+                events += len(lines)
+
+        def stage_info(sid: int, submitted: Optional[int] = None, completed: Optional[int] = None,
+                       accumulables: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+            first = sid - sid % per_job
+            info = {"Stage ID": sid, "Stage Attempt ID": 0, "Stage Name": f"synthetic stage {sid}",
+                    "Number of Tasks": int(sizes[sid]), "Parent IDs": [sid - 1] if sid > first else [],
+                    "Details": "org.apache.spark.rdd.RDD.collect(RDD.scala:1049)", "Accumulables": accumulables or []}
+            if sid in python_op:
+                info["RDD Info"] = [{"RDD ID": sid, "Name": "MapPartitionsRDD", "Callsite": "javaToPython at <unknown>:0",
+                                     "Scope": json.dumps({"id": str(sid), "name": python_op[sid]}), "Parent IDs": []}]
+            if submitted is not None:
+                info["Submission Time"] = submitted
+            if completed is not None:
+                info["Completion Time"] = completed
+            return info
+
+        header = [{"Event": "SparkListenerLogStart", "Spark Version": "3.5.1"},
+                  {"Event": "SparkListenerApplicationStart", "App Name": "synthetic", "App ID": f"app-synthetic-{spec.seed}",
+                   "Timestamp": t, "User": "spark"}]
+        header += [{"Event": "SparkListenerExecutorAdded", "Timestamp": t, "Executor ID": str(e),
+                    "Executor Info": {"Host": f"host-{_host(e)}", "Total Cores": spec.cores_per_executor, "Log Urls": {}}}
+                   for e in range(1, executors + 1)]
+        header.append({"Event": "SparkListenerEnvironmentUpdate", "JVM Information": {"Java Version": "17.0.10"},
+                       "Spark Properties": {"spark.app.name": "synthetic", "spark.executor.memory": f"{spec.executor_memory_mb}m",
+                                            "spark.executor.cores": str(spec.cores_per_executor)},
+                       "System Properties": {}, "Classpath Entries": {}})
+        emit([json.dumps(e, separators=(",", ":")) for e in header])
+
+        for sid in range(n_stages):
+            if sid % per_job == 0:
+                job = sid // per_job
+                t += 200
+                job_stages = list(range(sid, min(sid + per_job, n_stages)))
+                plan_info, sql_updates, next_acc = _sql_plan(job, job_stages, next_acc)
+                emit([_sql_start(job, t, plan_info), json.dumps({
+                    "Event": "SparkListenerJobStart", "Job ID": job, "Submission Time": t,
+                    "Stage Infos": [stage_info(s) for s in job_stages], "Stage IDs": job_stages,
+                    "Properties": {"spark.sql.execution.id": str(job)}}, separators=(",", ":"))])
+            t += 50
+            submitted = t
+            emit([json.dumps({"Event": "SparkListenerStageSubmitted", "Stage Info": stage_info(sid, submitted)},
+                             separators=(",", ":"))])
+
+            n = int(sizes[sid])
+            dur = np.maximum(1, rng.lognormal(math.log(spec.task_ms), 0.35, size=n)).astype(np.int64)
+            if sid in small_scans:
+                dur = np.maximum(40, dur // 8)
+            shuffle_in = (rng.lognormal(math.log(8 * MB), 0.3, size=n) if sid % per_job else np.zeros(n)).astype(np.int64)
+            hot = None
+            if sid in skewed:
+                hot = rng.choice(n, size=max(1, n // 100), replace=False)
+                dur[hot] = (dur[hot] * spec.skew_factor).astype(np.int64)
+                shuffle_in[hot] = (shuffle_in[hot] * spec.skew_factor).astype(np.int64)
+            if spec.slow_hosts > 0:
+                on_slow = _host(np.arange(n) % slots % executors + 1) < spec.slow_hosts  # same placement as below
+                dur[on_slow] = (dur[on_slow] * spec.slow_host_factor).astype(np.int64)
+            is_last = sid % per_job == per_job - 1 or sid == n_stages - 1
+            shuffle_out = np.zeros(n, dtype=np.int64) if is_last else (rng.lognormal(math.log(6 * MB), 0.3, size=n)).astype(np.int64)
+            gc_lo, gc_hi = (0.15, 0.3) if sid in spilling else (0.01, 0.05)
+            gc = (dur * rng.uniform(gc_lo, gc_hi, size=n)).astype(np.int64)
+            if sid in spilling:
+                spill = np.full(n, max(64 * MB, -(-1024 * MB // n)), dtype=np.int64)
+            else:
+                spill = np.zeros(n, dtype=np.int64)
+            input_bytes = np.zeros(n, dtype=np.int64) if sid % per_job else rng.integers(64, 128, size=n) * MB
+            if sid in small_scans:
+                input_bytes = io_rng.integers(256, 4096, size=n) * 1024
+            if hot is not None:
+                input_bytes[hot] = (input_bytes[hot] * spec.skew_factor).astype(np.int64)  # skewed tasks read more
+            deser = np.minimum(dur - 1, rng.integers(1, 20, size=n))
+            if sid in small_scans:
+                deser = np.minimum(dur // 2, io_rng.integers(15, 40, size=n))
+            if not is_last:
+                output = np.zeros(n, dtype=np.int64)
+            elif sid in small_writes:
+                output = io_rng.integers(1024, 4096, size=n) * 1024
+            else:
+                output = io_rng.integers(64, 192, size=n) * MB
+            lo, hi = (0.9, 1.0) if sid in spilling else (0.1, 0.4)
+            peak_exec = (exec_per_task * mem_rng.uniform(lo, hi, size=n)).astype(np.int64)
+            heap_pct = 0.97 if sid in spilling else spec.heap_used
+            heap = (heap_bytes * heap_pct * mem_rng.uniform(0.8, 1.0, size=n)).astype(np.int64)
+            off_heap = mem_rng.integers(96, 160, size=n) * MB
+            cpu_lo, cpu_hi = (0.15, 0.3) if sid in python_op else (0.75, 0.9)
+            cpu_ns = ((dur - deser) * py_rng.uniform(cpu_lo, cpu_hi, size=n)).astype(np.int64) * 1_000_000
+
+            failed = fault_rng.random(n) < spec.failed_tasks if spec.failed_tasks > 0 else np.zeros(n, dtype=bool)
+            fail_ms = np.where(failed, (dur * fault_rng.uniform(0.2, 1.0, size=n)).astype(np.int64), 0)
+            launch, slot = _place(dur + fail_ms, slots, t)
+            launch = launch + fail_ms  # the successful attempt follows the failed one in the same slot
+            finish = launch + dur
+            executor = slot % executors + 1
+            ids = np.arange(task_id, task_id + n)
+            task_id += n
+            task_type = "ResultTask" if is_last else "ShuffleMapTask"
+            order = np.argsort(finish, kind="stable")
+            for a in range(0, n, WRITE_BATCH):
+                idx = order[a:a + WRITE_BATCH]
+                cols = [ids[idx], idx, launch[idx], executor[idx], executor[idx], finish[idx], deser[idx],
+                        dur[idx] - deser[idx], cpu_ns[idx], gc[idx], spill[idx], spill[idx] // 4, shuffle_in[idx] * 3 // 4,
+                        shuffle_in[idx] - shuffle_in[idx] * 3 // 4, shuffle_in[idx] // 100, shuffle_out[idx],
+                        shuffle_out[idx] // 100, input_bytes[idx], input_bytes[idx] // 100, output[idx], output[idx] // 100,
+                        peak_exec[idx], heap[idx], off_heap[idx], off_heap[idx] // 4]
+                lines = [_TASK_END % (sid, task_type, i, x, l, e, _host(e), fi, d, r, c, g, sm, sd, rr, lr, rrec, w, wrec, ib,
+                                      irec, ob, orec, pe, hp, oh, pe, dp)
+                         for i, x, l, e, _, fi, d, r, c, g, sm, sd, rr, lr, rrec, w, wrec, ib, irec, ob, orec, pe, hp, oh, dp
+                         in zip(*(c.tolist() for c in cols))]
+                count = int(noise_rng.poisson(spec.noise * len(idx))) if spec.noise > 0 else 0
+                emit(_interleave(noise_rng, lines, _noise_lines(noise_rng, count, sid, ids, launch, executor)))
+
+            extra = []
+            for i in np.flatnonzero(failed).tolist():
+                extra.append(_attempt_line(sid, task_id, i, 0, int(launch[i] - fail_ms[i]), int(launch[i]), int(executor[i]),
+                                           {"Reason": "ExceptionFailure", "Class Name": "java.io.IOException",
+                                            "Description": "synthetic failure"}, False, task_type))
+                task_id += 1
+            if spec.speculative_tasks > 0:
+                for i in np.flatnonzero(fault_rng.random(n) < spec.speculative_tasks).tolist():
+                    extra.append(_attempt_line(sid, task_id, i, 1 + int(failed[i]), int(launch[i] + dur[i] // 2),
+                                               int(finish[i]), int(executor[i]) % executors + 1,
+                                               {"Reason": "TaskKilled", "Kill Reason": "another attempt succeeded"},
+                                               True, task_type))
+                    task_id += 1
+            n_failed += int(failed.sum())
+            n_speculative += len(extra) - int(failed.sum())
+            emit(extra)
+
+            t = int(finish.max()) + 20
+            values = {"rows": n * 1000, "files": n * 4 if sid in small_scans else n, "input": int(input_bytes.sum()), "shuffle_write": int(shuffle_out.sum()),
+                      "shuffle_records": int(shuffle_out.sum()) // 100, "shuffle_read": int(shuffle_in.sum()),
+                      "spill": int(spill.sum()), "duration": int(dur.sum())}
+            accs = [{"ID": 1, "Name": "internal.metrics.executorRunTime", "Value": int(dur.sum()), "Internal": True,
+                     "Count Failed Values": True}]
+            accs += [{"ID": a, "Name": metric, "Value": str(values[kind]), "Internal": False, "Count Failed Values": True,
+                      "Metadata": "sql"} for a, metric, kind in sql_updates.get(sid, ())]
+            peaks = []
+            for e in np.unique(executor).tolist():
+                on = executor == e
+                peaks.append(json.dumps({"Event": "SparkListenerStageExecutorMetrics", "Executor ID": str(e), "Stage ID": sid,
+                                         "Stage Attempt ID": 0, "Executor Metrics": {
+                                             "JVMHeapMemory": int(heap[on].max()), "JVMOffHeapMemory": int(off_heap[on].max()),
+                                             "DirectPoolMemory": int(off_heap[on].max() // 4)}}, separators=(",", ":")))
+            emit(peaks + [json.dumps({"Event": "SparkListenerStageCompleted", "Stage Info": stage_info(sid, submitted, t, accs)},
+                                     separators=(",", ":"))])
+            if is_last:
+                t += 10
+                emit([json.dumps({"Event": "SparkListenerJobEnd", "Job ID": sid // per_job, "Completion Time": t,
+                                  "Job Result": {"Result": "JobSucceeded"}}, separators=(",", ":"))])
+        t += 500
+        emit([json.dumps({"Event": "SparkListenerApplicationEnd", "Timestamp": t})])
+
+    return {"path": path, "spec": asdict(spec), "stages": n_stages, "tasks": int(sizes.sum()), "events": events,
+            "bytes": os.path.getsize(path), "skewed_stages": sorted(skewed), "spill_stages": sorted(spilling),
+            "slow_hosts": [f"host-{h}" for h in range(min(spec.slow_hosts, _host(executors) + 1))],
+            "failed_tasks": n_failed, "speculative_tasks": n_speculative, "python_stages": python,
+            "small_file_stages": sorted(small_scans), "small_write_stages": sorted(small_writes)}
@@ -0,0 +1,315 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from graphlib import TopologicalSorter
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from spark_opt.eventlog_reader import StageCompleted, TaskTable
+from spark_opt.findings import Finding
+from spark_opt.profiling import profiled
+
+@dataclass
+class ExecutorSpan:
+    executor_id: int
+    host: Optional[str]
+    cores: int
+    start_ms: int
+    end_ms: int
+    busy_core_ms: int
+    inferred: bool  # no ExecutorAdded event: span = its first..last task, cores = its peak concurrency
+
+    @property
+    def idle_core_ms(self) -> int:
+        return max(0, self.cores * (self.end_ms - self.start_ms) - self.busy_core_ms)
+
+@dataclass
+class StageNode:
+    stage_id: int
+    name: str
+    start_ms: int
+    end_ms: int
+    parent_ids: List[int]
+    busy_core_ms: int
+    utilization: float  # task core-ms / executor core-ms available while the stage ran
+
+    @property
+    def duration_ms(self) -> int:
+        return self.end_ms - self.start_ms
+
+@dataclass
+class CriticalPath:
+    job_id: Optional[int]
+    stage_ids: List[int]      # in execution order
+    length_ms: int            # sum of stage durations on the path: the job's floor given its DAG
+    wall_ms: int
+    slack_ms: Dict[int, int]  # how long each stage could slip without lengthening the path
+
+@dataclass
+class AppTimeline:
+    start_ms: int
+    end_ms: int
+    times: np.ndarray           # breakpoints of the step functions below
+    busy_cores: np.ndarray      # running tasks on [times[i], times[i+1])
+    capacity_cores: np.ndarray  # executor cores alive on [times[i], times[i+1])
+    executors: List[ExecutorSpan]
+    stages: Dict[int, StageNode]
+    critical_paths: List[CriticalPath]
+
+    def integral(self, levels: np.ndarray, a: Any, b: Any) -> np.ndarray:
+        """Area under a step function between a and b (scalars or arrays), in core-ms."""
+        if len(self.times) < 2:
+            return np.zeros(np.shape(a))
+        cum = np.r_[0, np.cumsum(levels[:-1] * np.diff(self.times))]
+
+        def area(x):
+            x = np.clip(x, self.times[0], self.times[-1])
+            i = np.clip(np.searchsorted(self.times, x, side="right") - 1, 0, len(self.times) - 1)
+            return cum[i] + levels[i] * (x - self.times[i])
+        return area(np.asarray(b, dtype=np.float64)) - area(np.asarray(a, dtype=np.float64))
+
+    @property
+    def busy_core_ms(self) -> int:
+        return int(self.integral(self.busy_cores, self.start_ms, self.end_ms))
+
+    @property
+    def capacity_core_ms(self) -> int:
+        return int(self.integral(self.capacity_cores, self.start_ms, self.end_ms))
+
+    @property
+    def idle_pct(self) -> float:
+        cap = self.capacity_core_ms
+        return max(0.0, 1 - self.busy_core_ms / cap) if cap else 0.0
+
+def _levels(times: np.ndarray, starts: np.ndarray, ends: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    # Sweep line: +w at each start, -w at each end, summed per breakpoint, then a running sum.
+    idx = np.searchsorted(times, np.r_[starts, ends])
+    deltas = np.bincount(idx, weights=np.r_[weights, -weights], minlength=len(times))
+    return np.rint(np.cumsum(deltas)).astype(np.int64)
+
+def _peak_concurrency(keys: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    n = len(keys)
+    if not n:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    k, t = np.r_[keys, keys], np.r_[starts, ends]
+    d = np.r_[np.ones(n, dtype=np.int64), -np.ones(n, dtype=np.int64)]
+    order = np.lexsort((d, t, k))  # a task ending at t frees its core before one launching at t takes it
+    # Each key's deltas sum to zero, so the running sum restarts at every key.
+    level = np.cumsum(d[order])
+    k = k[order]
+    starts_k = np.flatnonzero(np.r_[True, k[1:] != k[:-1]])
+    return k[starts_k], np.maximum.reduceat(level, starts_k)
+
+def _executor_spans(meta: Dict[str, Any], eid: np.ndarray, launch: np.ndarray, finish: np.ndarray,
+                    app_end: int) -> List[ExecutorSpan]:
+    spans: Dict[int, Dict[str, Any]] = {}
+    for e in sorted(meta.get("executors") or [], key=lambda e: e.get("time_ms") or 0):
+        if e.get("time_ms") is None:
+            continue
+        x = spans.setdefault(e["executor_id"], {"start": None, "end": None, "host": None, "cores": None})
+        if e["event"] == "added":
+            x["start"] = e["time_ms"] if x["start"] is None else x["start"]
+            x["host"], x["cores"] = e.get("host") or x["host"], e.get("cores") or x["cores"]
+        else:
+            x["end"] = e["time_ms"]
+
+    ids, inv = np.unique(eid, return_inverse=True)
+    busy = np.bincount(inv, weights=finish - launch, minlength=len(ids)) if len(ids) else np.empty(0)
+    first = np.full(len(ids), np.iinfo(np.int64).max)
+    last = np.full(len(ids), np.iinfo(np.int64).min)
+    np.minimum.at(first, inv, launch)
+    np.maximum.at(last, inv, finish)
+    peak = dict(zip(*(a.tolist() for a in _peak_concurrency(eid, launch, finish))))
+    task_stats = {i: (int(b), int(f), int(l)) for i, b, f, l in zip(ids.tolist(), busy.tolist(), first.tolist(), last.tolist())}
+
+    out: List[ExecutorSpan] = []
+    for i in sorted(set(spans) | set(task_stats)):
+        b, f, l = task_stats.get(i, (0, None, None))
+        x = spans.get(i)
+        if x is not None and x["start"] is not None:
+            cores = int(x["cores"] or peak.get(i) or 1)
+            out.append(ExecutorSpan(i, x["host"], cores, x["start"], max(x["start"], x["end"] or app_end), b, False))
+        elif f is not None:
+            out.append(ExecutorSpan(i, None, int(peak.get(i, 1)), f, (x or {}).get("end") or l, b, True))
+    return out
+
+def _stage_nodes(stages: List[StageCompleted], tasks: TaskTable, meta: Dict[str, Any],
+                 tl_integral: Any) -> Dict[int, StageNode]:
+    parents: Dict[int, set] = {}
+    for job in meta.get("jobs") or []:
+        for sid, pids in job.get("stages") or []:
+            parents.setdefault(sid, set()).update(pids)
+    spans: Dict[int, List[Any]] = {}
+    for s in stages:
+        parents.setdefault(s.stage_id, set()).update(s.parent_ids)
+        if s.submission_time_ms is None or s.completion_time_ms is None:
+            continue
+        x = spans.setdefault(s.stage_id, [s.submission_time_ms, s.completion_time_ms, s.name])
+        x[0], x[1] = min(x[0], s.submission_time_ms), max(x[1], s.completion_time_ms)
+    if not spans:
+        return {}
+
+    ok = (tasks["launch_time_ms"] >= 0) & (tasks["finish_time_ms"] >= tasks["launch_time_ms"])
+    sid = tasks["stage_id"][ok]
+    ids, inv = np.unique(sid, return_inverse=True)
+    busy = np.bincount(inv, weights=(tasks["finish_time_ms"] - tasks["launch_time_ms"])[ok], minlength=len(ids))
+    busy_by_stage = dict(zip(ids.tolist(), busy.tolist()))
+
+    keys = sorted(spans)
+    cap = tl_integral(np.array([spans[k][0] for k in keys]), np.array([spans[k][1] for k in keys]))
+    out: Dict[int, StageNode] = {}
+    for k, c in zip(keys, np.atleast_1d(cap).tolist()):
+        a, b, name = spans[k]
+        work = int(busy_by_stage.get(k, 0))
+        out[k] = StageNode(k, name, a, b, sorted(p for p in parents.get(k, ()) if p != k), work, work / c if c > 0 else 0.0)
+    return out
+
+def critical_path(nodes: List[StageNode], job_id: Optional[int] = None, wall_ms: Optional[int] = None) -> CriticalPath:
+    """Longest duration-weighted path through the stage DAG (CPM forward/backward pass)."""
+    ids = {n.stage_id for n in nodes}
+    by_id = {n.stage_id: n for n in nodes}
+    ps = {n.stage_id: [p for p in n.parent_ids if p in ids] for n in nodes}
+    order = list(TopologicalSorter(ps).static_order())
+    finish: Dict[int, int] = {}
+    via: Dict[int, Optional[int]] = {}
+    for sid in order:
+        via[sid] = max(ps[sid], key=lambda p: (finish[p], -p)) if ps[sid] else None
+        finish[sid] = (finish[via[sid]] if via[sid] is not None else 0) + by_id[sid].duration_ms
+    length = max(finish.values(), default=0)
+    end = max(finish, key=lambda s: (finish[s], -s), default=None)
+    path: List[int] = []
+    while end is not None:
+        path.append(end)
+        end = via[end]
+
+    latest: Dict[int, int] = {}
+    children: Dict[int, List[int]] = {sid: [] for sid in ids}
+    for sid, pp in ps.items():
+        for p in pp:
+            children[p].append(sid)
+    for sid in reversed(order):
+        latest[sid] = min((latest[c] - by_id[c].duration_ms for c in children[sid]), default=length)
+    if wall_ms is None:
+        wall_ms = max((n.end_ms for n in nodes), default=0) - min((n.start_ms for n in nodes), default=0)
+    return CriticalPath(job_id, path[::-1], int(length), int(wall_ms), {sid: int(latest[sid] - finish[sid]) for sid in order})
+
+def _critical_paths(nodes: Dict[int, StageNode], meta: Dict[str, Any]) -> List[CriticalPath]:
+    jobs = meta.get("jobs") or []
+    if not jobs:
+        return [critical_path(list(nodes.values()))] if nodes else []
+    ends = {j["job_id"]: j.get("completion_time_ms") for j in meta.get("job_ends") or []}
+    out = []
+    for job in jobs:
+        members = [nodes[sid] for sid, _ in job.get("stages") or [] if sid in nodes]  # skipped stages never ran
+        if not members:
+            continue
+        start, end = job.get("submission_time_ms"), ends.get(job["job_id"])
+        out.append(critical_path(members, job["job_id"], end - start if start is not None and end is not None else None))
+    return out
+
+@profiled("timeline")
+def build_timeline(stages: List[StageCompleted], tasks: TaskTable, meta: Dict[str, Any]) -> AppTimeline:
+    """Core-occupancy sweep over tasks and executors (O(n log n)), stage utilization and per-job critical paths."""
+    ok = (tasks["launch_time_ms"] >= 0) & (tasks["finish_time_ms"] >= tasks["launch_time_ms"])
+    launch, finish, eid = tasks["launch_time_ms"][ok], tasks["finish_time_ms"][ok], tasks["executor_id"][ok].astype(np.int64)
+
+    bounds = [t for s in stages for t in (s.submission_time_ms, s.completion_time_ms) if t is not None]
+    bounds += [e["time_ms"] for e in meta.get("executors") or [] if e.get("time_ms") is not None]
+    if len(launch):
+        bounds += [int(launch.min()), int(finish.max())]
+    start = meta.get("start_time_ms") if meta.get("start_time_ms") is not None else min(bounds, default=0)
+    end = meta.get("end_time_ms") if meta.get("end_time_ms") is not None else max(bounds, default=start)
+
+    executors = _executor_spans(meta, eid, launch, finish, end)
+    ex_start = np.array([e.start_ms for e in executors], dtype=np.int64)
+    ex_end = np.array([e.end_ms for e in executors], dtype=np.int64)
+    times = np.sort(np.r_[launch, finish, ex_start, ex_end, start, end].astype(np.int64))
+    times = times[np.r_[True, times[1:] != times[:-1]]]
+    tl = AppTimeline(
+        start_ms=int(start), end_ms=int(end), times=times,
+        busy_cores=_levels(times, launch, finish, np.ones(len(launch))),
+        capacity_cores=_levels(times, ex_start, ex_end, np.array([e.cores for e in executors], dtype=np.float64)),
+        executors=executors, stages={}, critical_paths=[],
+    )
+    tl.stages = _stage_nodes(stages, tasks, meta, lambda a, b: tl.integral(tl.capacity_cores, a, b))
+    tl.critical_paths = _critical_paths(tl.stages, meta)
+    return tl
+
+def _depends_on(nodes: Dict[int, StageNode], child: int, ancestor: int) -> bool:
+    seen, todo = set(), [child]
+    while todo:
+        sid = todo.pop()
+        for p in nodes[sid].parent_ids if sid in nodes else ():
+            if p == ancestor:
+                return True
+            if p not in seen:
+                seen.add(p)
+                todo.append(p)
+    return False
+
+@dataclass
+class StageChain:
+    stage_ids: List[int]
+    duration_ms: int
+    mean_utilization: float
+    independent: bool  # some consecutive stages have no DAG dependency, so they could have overlapped
+
+def serial_stage_chains(tl: AppTimeline, max_utilization: float = 0.5, min_stages: int = 3) -> List[StageChain]:
+    """Runs of >= min_stages stages that each ran alone (no overlap with any other stage) below max_utilization."""
+    nodes = sorted(tl.stages.values(), key=lambda n: (n.start_ms, n.stage_id))
+    runs: List[List[StageNode]] = [[]]
+    horizon = None
+    for i, n in enumerate(nodes):
+        alone = (horizon is None or n.start_ms >= horizon) and (i + 1 == len(nodes) or nodes[i + 1].start_ms >= n.end_ms)
+        horizon = n.end_ms if horizon is None else max(horizon, n.end_ms)
+        if alone and n.utilization < max_utilization:
+            runs[-1].append(n)
+        elif runs[-1]:
+            runs.append([])
+    out = []
+    for run in runs:
+        if len(run) < min_stages:
+            continue
+        busy = sum(n.busy_core_ms for n in run)
+        cap = sum(n.busy_core_ms / n.utilization for n in run if n.utilization > 0)
+        out.append(StageChain(
+            stage_ids=[n.stage_id for n in run],
+            duration_ms=run[-1].end_ms - run[0].start_ms,
+            mean_utilization=busy / cap if cap else 0.0,
+            independent=any(not _depends_on(tl.stages, b.stage_id, a.stage_id) for a, b in zip(run, run[1:])),
+        ))
+    return out
+
+def detect_idle_executors(timeline: AppTimeline, idle_pct_warn: float = 0.5,
+                          min_idle_core_ms: int = 3_600_000) -> List[Finding]:
+    cap = timeline.capacity_core_ms
+    idle = cap - timeline.busy_core_ms
+    if not cap or idle < min_idle_core_ms or timeline.idle_pct < idle_pct_warn:
+        return []
+    worst = sorted(timeline.executors, key=lambda e: e.idle_core_ms, reverse=True)[:5]
+    return [Finding(
+        code="IDLE_EXECUTORS",
+        severity="ERROR" if timeline.idle_pct >= (1 + idle_pct_warn) / 2 else "WARN",
+        stage_id=None,
+        message=f"Executor cores were idle {timeline.idle_pct*100:.0f}% of the time ({idle / 3_600_000:.1f} core-hours).",
+        evidence={"idle_pct": timeline.idle_pct, "idle_core_hours": idle / 3_600_000,
+                  "capacity_core_hours": cap / 3_600_000, "executors": len(timeline.executors),
+                  "inferred_executors": any(e.inferred for e in timeline.executors),
+                  "most_idle": [{"executor_id": e.executor_id, "idle_core_hours": e.idle_core_ms / 3_600_000} for e in worst]},
+    )]
+
+def detect_serial_stage_chains(timeline: AppTimeline, max_utilization: float = 0.5, min_stages: int = 3,
+                               min_chain_ms: int = 60_000) -> List[Finding]:
+    out: List[Finding] = []
+    wall = max(1, timeline.end_ms - timeline.start_ms)
+    for c in serial_stage_chains(timeline, max_utilization=max_utilization, min_stages=min_stages):
+        if c.duration_ms < min_chain_ms:
+            continue
+        out.append(Finding(
+            code="SERIAL_STAGE_CHAIN",
+            severity="ERROR" if c.duration_ms >= wall / 2 else "WARN",
+            stage_id=None,
+            message=(f"Stages {c.stage_ids[0]}..{c.stage_ids[-1]} ran one at a time for {c.duration_ms / 1000:.0f}s "
+                     f"using {c.mean_utilization*100:.0f}% of executor cores."),
+            evidence={"stage_ids": c.stage_ids, "chain_ms": c.duration_ms, "app_wall_ms": wall,
+                      "mean_utilization": c.mean_utilization, "independent": c.independent},
+        ))
+    return out
@@ -0,0 +1,76 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Tuple
+import numpy as np
+from spark_opt.config import SparkConf
+from spark_opt.findings import Finding, StageTable
+
+# Task time that bought nothing, per stage id: failed and killed attempts, losing speculative copies and
+# map output recomputed after an executor loss, summed over the stage's attempts. The per-attempt
+# figures come from build_stage_metrics; here they are grouped by stage id with one bincount each.
+_SUMS = ("task_time_ms", "wasted_ms", "failed_tasks", "failed_ms", "killed_tasks", "killed_ms", "speculative_tasks",
+         "speculation_wasted_ms")
+
+def _by_stage_id(t: StageTable) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Dict[str, np.ndarray]]:
+    """(stage ids, index of each id's first attempt, attempts, summed columns), in stage-id order."""
+    ids, first, inv = np.unique(t["stage_id"], return_index=True, return_inverse=True)
+    sums = {k: np.bincount(inv, weights=t[k], minlength=len(ids)) for k in _SUMS}
+    sums["retry_wasted_ms"] = sums["wasted_ms"] - sums["speculation_wasted_ms"]
+    return ids, first, np.bincount(inv, minlength=len(ids)), sums
+
+def _row(t: StageTable, g: Tuple[np.ndarray, np.ndarray, np.ndarray, Dict[str, np.ndarray]], i: int) -> Dict[str, Any]:
+    ids, first, attempts, sums = g
+    r: Dict[str, Any] = {"stage_id": int(ids[i]), "name": t.stages[int(first[i])].name, "attempts": int(attempts[i]),
+                         **{k: int(sums[k][i]) for k in _SUMS}, "retry_wasted_ms": int(sums["retry_wasted_ms"][i])}
+    r["wasted_pct"] = r["wasted_ms"] / r["task_time_ms"] if r["task_time_ms"] else 0.0
+    return r
+
+def wasted_work(t: StageTable) -> List[Dict[str, Any]]:
+    """Per stage id, summed over its attempts: attempts, task time and the time that bought nothing."""
+    g = _by_stage_id(t)
+    return [_row(t, g, i) for i in range(len(g[0]))]
+
+def detect_wasted_work(t: StageTable, conf: SparkConf, min_attempts: int = 2,
+                       wasted_pct_warn: float = 0.10, speculation_pct_warn: float = 0.05,
+                       min_wasted_ms: int = 60_000, max_listed: int = 20) -> List[Finding]:
+    # STAGE_RETRIES: a stage that needed another attempt, or whose failed/killed tasks (and map output
+    # recomputed after an executor loss) took a large share of its task time. SPECULATION_WASTE: losing
+    # duplicate attempts across the app. Both are core time paid for and thrown away.
+    out: List[Finding] = []
+    g = _by_stage_id(t)
+    _, _, attempts, sums = g
+    task, retry = sums["task_time_ms"], sums["retry_wasted_ms"]
+    share = np.divide(retry, task, out=np.zeros(len(retry)), where=task > 0)
+    hit = (attempts >= min_attempts) | ((share >= wasted_pct_warn) & (retry >= min_wasted_ms))
+    for i in np.flatnonzero(hit).tolist():
+        r, sh = _row(t, g, i), float(share[i])
+        out.append(Finding(
+            code="STAGE_RETRIES",
+            severity="ERROR" if r["attempts"] >= min_attempts + 1 or sh >= 2 * wasted_pct_warn else "WARN",
+            stage_id=r["stage_id"],
+            message=(f"Stage {r['stage_id']} ran {r['attempts']} attempt(s) with {r['failed_tasks']} failed and "
+                     f"{r['killed_tasks']} killed tasks; {r['retry_wasted_ms'] / 1000:.0f}s of task time "
+                     f"({sh*100:.1f}%) was thrown away."),
+            evidence={"stage_name": r["name"], "attempts": r["attempts"], "failed_tasks": r["failed_tasks"],
+                      "killed_tasks": r["killed_tasks"], "failed_ms": r["failed_ms"], "killed_ms": r["killed_ms"],
+                      "task_time_ms": r["task_time_ms"], "wasted_ms": r["retry_wasted_ms"], "wasted_pct": sh},
+        ))
+    spec_ms = sums["speculation_wasted_ms"]
+    total, spec = int(task.sum()), int(spec_ms.sum())
+    if total and spec >= min_wasted_ms and spec / total >= speculation_pct_warn:
+        order = np.argsort(-spec_ms, kind="stable")
+        worst = [_row(t, g, i) for i in order[spec_ms[order] > 0][:max_listed].tolist()]
+        out.append(Finding(
+            code="SPECULATION_WASTE",
+            severity="ERROR" if spec / total >= 2 * speculation_pct_warn else "WARN",
+            stage_id=None,
+            message=(f"Losing duplicate task attempts used {spec / 3_600_000:.2f} core-hours "
+                     f"({spec / total * 100:.1f}% of task time) across {len(worst)} stages."),
+            evidence={"speculative_tasks": int(sums["speculative_tasks"].sum()), "wasted_ms": spec,
+                      "task_time_ms": total, "wasted_pct": spec / total,
+                      "speculation": conf.get_bool("spark.speculation", False),
+                      "speculation_multiplier": conf.conf.get("spark.speculation.multiplier"),
+                      "speculation_quantile": conf.conf.get("spark.speculation.quantile"),
+                      "stages": [{k: r[k] for k in ("stage_id", "name", "speculative_tasks", "speculation_wasted_ms")}
+                                 for r in worst]},
+        ))
+    return out
@@ -0,0 +1,257 @@
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+import os, time
+import numpy as np
+from spark_opt.config import SparkConf
+from spark_opt.detectors import DetectorRegistry, Finding, default_registry
+from spark_opt.eventlog_io import INPROGRESS_SUFFIX, codec_of, eventlog_parts
+from spark_opt.eventlog_reader import EventLogParser, StageCompleted, TaskTable, decode_lines, merge_meta, stage_from_event
+from spark_opt.metrics import StageMetrics, StageSketch, build_stage_metrics, sketch_stages
+
+StageKey = Tuple[int, int]
+SEVERITY_RANK = {"INFO": 0, "WARN": 1, "ERROR": 2}
+POLL_MAX_BYTES = 8 * 1024 * 1024
+MAX_COMPLETED = 10_000
+# Only the application's identity is kept from `meta`; its lists and dicts (jobs, executors, SQL plans...)
+# grow with the log, and the stage detectors run here do not read them.
+_APP_META = ("app_id", "app_name", "start_time_ms", "end_time_ms")
+
+class LogFollower:
+    """Tails a growing event log (plain `.inprogress` file or rolling dir) from the last byte offset."""
+
+    def __init__(self, path: str, max_bytes: int = POLL_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.part = 0
+        self.offset = 0
+        self._tail = b""
+
+    def _parts(self) -> List[str]:
+        if os.path.isdir(self.path):
+            try:
+                return eventlog_parts(self.path)
+            except FileNotFoundError:
+                return []
+        if os.path.exists(self.path):
+            return [self.path]
+        # Spark renames `<app>.inprogress` to `<app>` when the application finishes.
+        if self.path.endswith(INPROGRESS_SUFFIX) and os.path.exists(self.path[:-len(INPROGRESS_SUFFIX)]):
+            return [self.path[:-len(INPROGRESS_SUFFIX)]]
+        return []
+
+    def read_lines(self) -> List[bytes]:
+        """Complete lines appended since the last call (at most ~max_bytes); a trailing partial line is held back."""
+        parts = self._parts()
+        out: List[bytes] = []
+        budget = self.max_bytes
+        while self.part < len(parts) and budget > 0:
+            path = parts[self.part]
+            if codec_of(path) is not None:
+                raise ValueError(f"watch mode needs an uncompressed event log: {path}")
+            try:
+                f = open(path, "rb")
+            except FileNotFoundError:
+                # Renamed (`.inprogress` -> final name) since the listing: look again, the offset still holds.
+                fresh = self._parts()
+                if fresh == parts:
+                    break
+                parts = fresh
+                continue
+            with f:
+                f.seek(self.offset)
+                data = f.read(budget)
+            self.offset += len(data)
+            budget -= len(data)
+            data = self._tail + data
+            last_part = self.part == len(parts) - 1
+            if not last_part and self.offset >= os.path.getsize(path):
+                # A rolled-over part is complete (parts end on event boundaries): take all of it.
+                cut = len(data)
+                self.part, self.offset = self.part + 1, 0
+            else:
+                cut = data.rfind(b"\n") + 1
+            self._tail = data[cut:]
+            out.extend(data[:cut].splitlines())
+            if last_part or budget <= 0:
+                break
+        return out
+
+    def finish(self) -> List[bytes]:
+        """Release the held-back last line once the log is known to be complete (no trailing newline)."""
+        tail, self._tail = self._tail, b""
+        return [tail] if tail.strip() else []
+
+class _Lifecycle:
+    EVENTS = ("SparkListenerStageSubmitted", "SparkListenerApplicationEnd")
+
+    def __init__(self):
+        self.submitted: Dict[StageKey, StageCompleted] = {}
+        self.app_ended = False
+
+    def feed(self, evt: Dict[str, Any]) -> None:
+        if evt.get("Event") == "SparkListenerApplicationEnd":
+            self.app_ended = True
+            return
+        s = stage_from_event(evt)
+        self.submitted[(s.stage_id, s.attempt)] = s
+
+class IncrementalAnalyzer:
+    """Keeps per-stage aggregates up to date from appended events and reruns stage detectors on changed stages only.
+
+    Task rows are held for running stages and for the `grace_stages` most recently completed ones (TaskEnd
+    events can trail StageCompleted, e.g. killed speculative copies). Older completed stages are reduced
+    to their StageMetrics, of which the `max_completed` most recent are kept (and as many emitted-finding
+    keys), so memory tracks the stages in flight, not the length of the log. With `relative_accuracy` set, stages hold mergeable sketches instead of task rows, so even a stage with
+    millions of tasks costs a few KB (percentiles then within that relative error).
+    """
+
+    def __init__(self, conf: Optional[SparkConf] = None, cores_total: Optional[int] = None, grace_stages: int = 16,
+                 relative_accuracy: Optional[float] = None, thresholds: Optional[Dict[str, Dict[str, Any]]] = None,
+                 registry: Optional[DetectorRegistry] = None, max_completed: int = MAX_COMPLETED):
+        self.conf = conf or SparkConf(conf={})
+        self.registry = registry or default_registry()
+        self.thresholds = thresholds
+        self.registry.resolve(thresholds)  # fail on a bad thresholds file before tailing starts
+        self.cores_total = cores_total
+        self.grace_stages = grace_stages
+        self.relative_accuracy = relative_accuracy
+        self.max_completed = max_completed
+        self.meta: Dict[str, Any] = dict.fromkeys(_APP_META)
+        self.completed: "OrderedDict[StageKey, StageMetrics]" = OrderedDict()
+        self.running: Dict[StageKey, StageMetrics] = {}
+        self.late_tasks_dropped = 0
+        self.events_seen = 0
+        self._lifecycle = _Lifecycle()
+        self._pending: Dict[StageKey, Union[TaskTable, StageSketch]] = {}
+        self._recent: "OrderedDict[StageKey, StageCompleted]" = OrderedDict()
+        self._emitted: "OrderedDict[Tuple[str, Optional[int]], str]" = OrderedDict()
+        self._evicted_max = -1  # highest stage id dropped from `completed`
+
+    @property
+    def app_ended(self) -> bool:
+        return self._lifecycle.app_ended
+
+    def _split_by_stage(self, tasks: TaskTable) -> Dict[StageKey, TaskTable]:
+        if not len(tasks):
+            return {}
+        sid = tasks["stage_id"].astype(np.int64)
+        att = tasks["attempt"].astype(np.int64)
+        order = np.lexsort((att, sid))
+        sid, att = sid[order], att[order]
+        starts = np.flatnonzero(np.r_[True, (sid[1:] != sid[:-1]) | (att[1:] != att[:-1])])
+        ends = np.r_[starts[1:], len(sid)]
+        out = {}
+        for a, b in zip(starts.tolist(), ends.tolist()):
+            idx = order[a:b]
+            out[(int(sid[a]), int(att[a]))] = TaskTable({n: c[idx] for n, c in tasks.columns.items()})
+        return out
+
+    def ingest(self, lines: List[bytes]) -> List[Finding]:
+        """Fold newly appended lines into the state; returns findings that are new or got more severe."""
+        parser = EventLogParser(consumers=[self._lifecycle])
+        for evt in decode_lines(lines, parser.event_types):
+            self.events_seen += 1
+            parser.feed(evt)
+        stages, tasks, meta = parser.result()
+        merge_meta(self.meta, {k: meta.get(k) for k in _APP_META})
+
+        for s in stages:
+            self._recent[(s.stage_id, s.attempt)] = s
+        changed = {(s.stage_id, s.attempt) for s in stages}
+        sketching = self.relative_accuracy is not None
+        parts = sketch_stages(tasks, self.relative_accuracy) if sketching else self._split_by_stage(tasks)
+        for key, part in parts.items():
+            if key not in self._recent and (key in self.completed or self._evicted(key)):
+                self.late_tasks_dropped += len(part)
+                continue
+            prev = self._pending.get(key)
+            if prev is None:
+                self._pending[key] = part
+            else:
+                self._pending[key] = prev.merge(part) if sketching else TaskTable.concat([prev, part])
+            changed.add(key)
+        if not changed:
+            return []
+
+        keys = sorted(changed)
+        infos = []
+        for key in keys:
+            info = self._recent.get(key)
+            if info is None:
+                # Still running: no completion time yet, so the duration falls back to the longest task so far.
+                sub = self._lifecycle.submitted.get(key)
+                info = StageCompleted(key[0], key[1], sub.name if sub else "", sub.num_tasks if sub else 0, None, None)
+            infos.append(info)
+        if sketching:
+            _, metrics = build_stage_metrics(infos, sketches={k: self._pending[k] for k in keys if k in self._pending})
+        else:
+            _, metrics = build_stage_metrics(infos, TaskTable.concat([self._pending[k] for k in keys if k in self._pending]))
+
+        for m in metrics:
+            key = (m.stage_id, m.attempt)
+            if key in self._recent:
+                self.completed[key] = m
+                self.completed.move_to_end(key)
+                self.running.pop(key, None)
+                self._lifecycle.submitted.pop(key, None)
+            else:
+                self.running[key] = m
+        while len(self._recent) > self.grace_stages:
+            old, _ = self._recent.popitem(last=False)
+            self._pending.pop(old, None)
+        while len(self.completed) > self.max_completed:
+            old, _ = self.completed.popitem(last=False)
+            self._evicted_max = max(self._evicted_max, old[0])
+        return self._new_findings(metrics)
+
+    def _evicted(self, key: StageKey) -> bool:
+        # Stage ids only grow, so a stage at or below an evicted id that is neither in flight nor newly
+        # submitted (a retry attempt) is an old one whose StageMetrics were dropped.
+        return (key[0] <= self._evicted_max and key not in self._pending and key not in self.running
+                and key not in self._lifecycle.submitted)
+
+    def _new_findings(self, metrics: List[StageMetrics]) -> List[Finding]:
+        found = self.registry.run(metrics, self.conf, cores_total=self.cores_total, thresholds=self.thresholds, scope="stage")
+        out = []
+        for f in found:
+            key = (f.code, f.stage_id)
+            prev = self._emitted.get(key)
+            if prev is None or SEVERITY_RANK.get(f.severity, 0) > SEVERITY_RANK.get(prev, 0):
+                self._emitted[key] = f.severity
+                out.append(f)
+            self._emitted.move_to_end(key)
+        while len(self._emitted) > self.max_completed:
+            self._emitted.popitem(last=False)
+        return out
+
+    def config_findings(self) -> List[Finding]:
+        return self.registry.run([], self.conf, cores_total=self.cores_total, thresholds=self.thresholds, scope="app")
+
+def watch(path: str, on_finding: Callable[[Finding], None], conf: Optional[SparkConf] = None,
+          cores_total: Optional[int] = None, interval_s: float = 2.0, timeout_s: Optional[float] = None,
+          once: bool = False, relative_accuracy: Optional[float] = None,
+          thresholds: Optional[Dict[str, Dict[str, Any]]] = None) -> IncrementalAnalyzer:
+    """Follow `path` until the application ends (or `timeout_s`), calling `on_finding` for every new finding."""
+    follower = LogFollower(path)
+    analyzer = IncrementalAnalyzer(conf=conf, cores_total=cores_total, relative_accuracy=relative_accuracy,
+                                   thresholds=thresholds)
+    for f in analyzer.config_findings():
+        on_finding(f)
+    started = time.monotonic()
+    while True:
+        while True:
+            pos = (follower.part, follower.offset)
+            lines = follower.read_lines()
+            if lines:
+                for f in analyzer.ingest(lines):
+                    on_finding(f)
+            elif (follower.part, follower.offset) == pos:
+                break  # caught up with the writer
+        if once or analyzer.app_ended:
+            for f in analyzer.ingest(follower.finish()):
+                on_finding(f)
+            return analyzer
+        if timeout_s is not None and time.monotonic() - started >= timeout_s:
+            return analyzer
+        time.sleep(interval_s)
@@ -0,0 +1,24 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List
+import pytest
+from spark_opt.eventlog_reader import StageCompleted, TaskTable, parse_eventlog
+from spark_opt.metrics import StageMetrics, build_stage_metrics
+from spark_opt.synth import SynthSpec, generate_eventlog
+
+@dataclass
+class SyntheticApp:
+    info: Dict[str, Any]  # what generate_eventlog planted (skewed stages, slow hosts, ...)
+    stages: List[StageCompleted]
+    tasks: TaskTable
+    meta: Dict[str, Any]
+    metrics: List[StageMetrics]
+
+@pytest.fixture
+def synthetic_app(tmp_path):
+    """Factory: a synthetic event log from SynthSpec keywords (noise off unless given), parsed into metrics."""
+    def make(**spec: Any) -> SyntheticApp:
+        info = generate_eventlog(str(tmp_path / "app.jsonl"), SynthSpec(**{"noise": 0.0, **spec}))
+        stages, tasks, meta = parse_eventlog(info["path"])
+        _, metrics = build_stage_metrics(stages, tasks)
+        return SyntheticApp(info, stages, tasks, meta, metrics)
+    return make
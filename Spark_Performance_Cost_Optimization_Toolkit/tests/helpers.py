@@ -0,0 +1,25 @@
+from spark_opt.eventlog_reader import EventLogParser
+from spark_opt.metrics import StageMetrics
+
+# Plain builders shared by the tests; import them with `from helpers import ...` (pytest puts tests/ on sys.path).
+
+def make_stage(stage_id, **kw):
+    """A StageMetrics with unremarkable defaults (no skew, shuffle or spill); keywords override them."""
+    base = dict(stage_id=stage_id, attempt=0, name=f"s{stage_id}", num_tasks=200, stage_duration_ms=1000,
+                task_p50_ms=100.0, task_p95_ms=120.0, task_max_ms=200, skew_ratio_p95_p50=1.2,
+                skew_ratio_max_p50=2.0, gc_pct=0.01, shuffle_read_mb=0.0, shuffle_write_mb=0.0, spill_mb=0.0)
+    return StageMetrics(**{**base, **kw})
+
+def task_end(stage_id, task_id, finish_ms, launch_ms=0, executor=1, metrics=None, attempt=0):
+    """A SparkListenerTaskEnd event; `metrics` is its "Task Metrics" (default: run time = duration)."""
+    return {"Event": "SparkListenerTaskEnd", "Stage ID": stage_id, "Stage Attempt ID": attempt,
+            "Task Info": {"Task ID": task_id, "Executor ID": str(executor), "Launch Time": launch_ms,
+                          "Finish Time": finish_ms},
+            "Task Metrics": {"Executor Run Time": finish_ms - launch_ms} if metrics is None else metrics}
+
+def parse_events(events):
+    """(stages, tasks, meta) of events fed straight into an EventLogParser."""
+    p = EventLogParser()
+    for e in events:
+        p.feed(e)
+    return p.result()
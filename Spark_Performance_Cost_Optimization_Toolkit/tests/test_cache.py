@@ -0,0 +1,58 @@
+import dataclasses, os, shutil, time
+import numpy as np
+import spark_opt.cache as cache
+from spark_opt.eventlog_reader import parse_eventlog
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "..", "samples", "sample_eventlog.jsonl")
+
+def test_cache_roundtrip_and_hit(tmp_path, monkeypatch):
+    log = str(tmp_path / "app.jsonl")
+    shutil.copy(SAMPLE, log)
+    cdir = str(tmp_path / "cache")
+    stages, tasks, meta = cache.load_eventlog(log, cache_dir=cdir)
+    assert len(os.listdir(cdir)) == 1
+
+    def boom(path):
+        raise AssertionError("should not reparse")
+    monkeypatch.setattr(cache, "parse_eventlog", boom)
+    stages2, tasks2, meta2 = cache.load_eventlog(log, cache_dir=cdir)
+    assert stages2 == stages and meta2 == meta
+    for name in tasks.columns:
+        assert (tasks[name] == tasks2[name]).all() and tasks[name].dtype == tasks2[name].dtype
+
+def test_text_is_stored_as_utf8_bytes(tmp_path):
+    stages, tasks, meta = parse_eventlog(SAMPLE)
+    stages = [dataclasses.replace(s, name=n) for s, n in zip(stages, ["Größe at job.py:1", "x" * 200])]
+    meta = {**meta, "app_name": "日本語"}
+    p = str(tmp_path / "e.npz")
+    cache.save_parsed(p, stages, tasks, meta)
+    with np.load(p) as data:
+        assert data["meta"].dtype == np.uint8 and data["u:name"].dtype == np.uint8
+    stages2, _, meta2 = cache.load_parsed(p)
+    assert stages2 == stages and meta2 == meta
+
+def test_cache_key_tracks_file_changes(tmp_path):
+    log = tmp_path / "app.jsonl"
+    shutil.copy(SAMPLE, log)
+    k1 = cache.cache_key(str(log))
+    with open(log, "a", encoding="utf-8") as f:
+        f.write("\n")
+    assert cache.cache_key(str(log)) != k1
+
+def test_no_cache_and_eviction(tmp_path):
+    cdir = str(tmp_path / "cache")
+    cache.load_eventlog(SAMPLE, use_cache=False, cache_dir=cdir)
+    assert not os.path.exists(cdir)
+    stages, tasks, meta = parse_eventlog(SAMPLE)
+    for i in range(3):
+        p = os.path.join(cdir, f"{i}.npz")
+        cache.save_parsed(p, stages, tasks, meta)
+        os.utime(p, (i, i))
+    size = os.path.getsize(os.path.join(cdir, "0.npz"))
+    # Temp files of a crashed save go once they are stale; a fresh one may still be in progress.
+    for name, age in (("old.tmp", cache.STALE_TMP_S + 60), ("new.tmp", 0)):
+        with open(os.path.join(cdir, name), "wb") as f:
+            f.write(b"x" * 10)
+        os.utime(os.path.join(cdir, name), (time.time() - age,) * 2)
+    assert cache.evict(cdir, max_bytes=size * 2) == size + 10
+    assert sorted(os.listdir(cdir)) == ["1.npz", "2.npz", "new.tmp"]
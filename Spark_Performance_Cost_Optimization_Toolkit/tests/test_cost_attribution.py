@@ -0,0 +1,55 @@
+import os
+import numpy as np
+import pytest
+from spark_opt.config import CostSpec, SparkConf
+from spark_opt.cost_model import core_hour_rate, stage_costs
+from spark_opt.detectors import Finding
+from spark_opt.eventlog_reader import parse_eventlog
+from spark_opt.metrics import build_stage_metrics, sketch_stages
+from spark_opt.recommendations import recommend, to_payload
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "..", "samples", "sample_eventlog.jsonl")
+
+def test_stage_task_time_straggler_and_cost():
+    stages, tasks, _ = parse_eventlog(SAMPLE)
+    _, objs = build_stage_metrics(stages, tasks)
+    for o in objs:
+        d = tasks["duration_ms"][(tasks["stage_id"] == o.stage_id) & (tasks["attempt"] == o.attempt)].astype(float)
+        assert o.task_time_ms == int(d.sum())
+        assert o.straggler_ms == int(np.rint(np.maximum(d - np.percentile(d, 50), 0).sum()))
+    approx = build_stage_metrics(stages, sketches=sketch_stages(tasks))[1]
+    for e, a in zip(objs, approx):
+        assert a.straggler_ms == pytest.approx(e.straggler_ms, rel=0.05)
+
+    rate = core_hour_rate(CostSpec(rate_per_node_hour=3.0, dbus_per_node=2.0, rate_per_dbu_hour=0.5), cores_per_node=8)
+    assert rate == pytest.approx(0.5)
+    costs = stage_costs(objs, rate)
+    assert [c.stage_id for c in costs] == [2, 1]
+    assert costs[0].core_hours == pytest.approx(objs[1].task_time_ms / 3_600_000)
+    assert costs[0].cost == pytest.approx(costs[0].core_hours * 0.5)
+
+def test_recommendations_ranked_by_estimated_savings_then_severity():
+    findings = [
+        Finding("GC_PRESSURE", "ERROR", 1, "", {"gc_pct": 0.25, "task_time_ms": 3_600_000}),
+        Finding("SKEW_DETECTED", "WARN", 2, "", {"straggler_ms": 7_200_000, "task_time_ms": 20_000_000}),
+        Finding("SPILL_DETECTED", "WARN", 3, "", {"spill_mb": 1_000_000.0, "task_time_ms": 1_800_000}),
+        Finding("SHUFFLE_HEAVY", "ERROR", 4, "", {"shuffle_read_mb": 5000.0}),
+    ]
+    recs = recommend(findings, SparkConf(), cost=CostSpec(rate_per_node_hour=4.0), cores_per_node=4)
+    # A WARN worth more outranks an ERROR worth less; the unestimated rec comes last, not as a zero saving.
+    assert [r.stage_id for r in recs] == [2, 3, 1, 4]
+    skew, spill, gc, shuffle = recs
+    assert (skew.savings.core_hours_low, skew.savings.core_hours_high, skew.savings.cost_high) == (1.0, 2.0, 2.0)
+    assert (spill.savings.core_hours_low, spill.savings.core_hours_high) == (0.25, 0.5)  # capped at the stage's task time
+    assert gc.savings.core_hours_high == pytest.approx(0.2)
+    assert shuffle.savings is None and to_payload([shuffle])[0]["savings"] is None
+
+def test_stage_findings_with_one_code_become_one_recommendation():
+    findings = [Finding("SHUFFLE_HEAVY", "WARN" if sid % 2 else "ERROR", sid, "",
+                        {"shuffle_read_mb": 2048.0, "shuffle_write_mb": 0.0, "task_time_ms": 3_600_000,
+                         "fetch_wait_ms": sid * 360_000, "shuffle_write_time_ms": 0}) for sid in range(1, 6)]
+    [rec] = recommend(findings, SparkConf())
+    assert (rec.stage_id, rec.stage_ids, rec.severity) == (None, [1, 2, 3, 4, 5], "ERROR")
+    assert rec.savings.core_hours_high == pytest.approx(1.5)  # (1 + ... + 5) * 0.1h of fetch wait
+    assert [s["stage_id"] for s in rec.evidence["stages"]] == [5, 4, 3, 2, 1] and rec.evidence["stages_total"] == 5
+    assert len(rec.actions) == len(set(rec.actions))
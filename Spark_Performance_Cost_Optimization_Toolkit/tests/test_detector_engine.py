@@ -0,0 +1,52 @@
+import json
+from importlib import metadata
+import pytest
+from spark_opt import detectors
+from spark_opt.config import SparkConf
+from spark_opt.detectors import Check, DetectorRegistry, REGISTRY, Rule, detect_all, load_thresholds
+from helpers import make_stage
+
+STAGES = [make_stage(1, skew_ratio_p95_p50=5.0, skew_ratio_max_p50=20.0),
+          make_stage(2, spill_mb=4000.0, gc_pct=0.3, shuffle_read_mb=2000.0),
+          make_stage(3, num_tasks=5, skew_ratio_max_p50=50.0)]
+CONF = SparkConf(conf={"spark.sql.shuffle.partitions": "4000"})
+
+def test_engine_matches_legacy_detector_order():
+    legacy = (detectors.detect_skew(STAGES) + detectors.detect_shuffle_heavy(STAGES)
+              + detectors.detect_spill_or_gc(STAGES) + detectors.detect_partitioning_issues(STAGES, CONF, cores_total=40)
+              + detectors.detect_shuffle_partition_sizing(detectors.StageTable(STAGES), CONF, cores_total=40))
+    assert [f.__dict__ for f in detect_all(STAGES, CONF, cores_total=40)] == [f.__dict__ for f in legacy]
+    assert [(f.code, f.stage_id) for f in legacy][:4] == [
+        ("SKEW_DETECTED", 1), ("SHUFFLE_HEAVY", 2), ("SPILL_DETECTED", 2), ("GC_PRESSURE", 2)]
+
+def test_thresholds_file_overrides_and_disables(tmp_path):
+    p = tmp_path / "t.json"
+    p.write_text(json.dumps({"skew": {"min_tasks": 1}, "spill_or_gc": {"enabled": False},
+                             "partitioning": {"over_partition_factor": 200}}))
+    codes = [(f.code, f.stage_id) for f in detect_all(STAGES, CONF, cores_total=40, thresholds=load_thresholds(str(p)))]
+    assert codes == [("SKEW_DETECTED", 1), ("SKEW_DETECTED", 3), ("SHUFFLE_HEAVY", 2)]
+    with pytest.raises(ValueError, match="max_p95"):
+        detect_all(STAGES, CONF, thresholds={"skew": {"max_p95": 1}})
+    with pytest.raises(ValueError, match="nope"):
+        detect_all(STAGES, CONF, thresholds={"nope": {}})
+
+def test_custom_and_entry_point_rules(monkeypatch):
+    reg = DetectorRegistry()
+
+    @reg.rule("long_stage", max_ms=500)
+    def long_stage(t, max_ms):
+        return [Check("LONG_STAGE", t["stage_duration_ms"] > max_ms, "INFO", lambda s: (f"stage {s.stage_id}", {}))]
+
+    plugin = Rule("tiny_stage", lambda t, n=10: [Check("TINY", t["num_tasks"] < n, "INFO", lambda s: ("", {}))])
+    ep = metadata.EntryPoint("tiny", "x:y", detectors.ENTRY_POINT_GROUP)
+    monkeypatch.setattr(metadata.EntryPoint, "load", lambda self: plugin)
+    monkeypatch.setattr(detectors, "entry_points", lambda group: [ep] if group == detectors.ENTRY_POINT_GROUP else [])
+    detectors.load_plugins(reg)
+    with pytest.warns(UserWarning, match="already registered"):
+        detectors.load_plugins(reg)
+
+    found = reg.run(STAGES, thresholds={"long_stage": {"max_ms": 999}})
+    assert [(f.code, f.stage_id) for f in found] == [("LONG_STAGE", 1), ("LONG_STAGE", 2), ("LONG_STAGE", 3), ("TINY", 3)]
+    with pytest.raises(ValueError):
+        reg.register(Rule("long_stage", long_stage))
+    assert [r.name for r in REGISTRY.rules][:3] == ["skew", "shuffle_heavy", "spill_or_gc"]
@@ -0,0 +1,43 @@
+import time
+import pytest
+from spark_opt.diff import RunStages, align, diff_runs, summarize
+from helpers import make_stage
+
+def _stage(sid, name, dur, spill=0.0):
+    return make_stage(sid, name=name, num_tasks=4, stage_duration_ms=dur, shuffle_read_mb=100.0, spill_mb=spill)
+
+def _run(stages, parents, wall_ms):
+    return RunStages({s.stage_id: s for s in stages}, parents, wall_ms)
+
+def test_align_by_structure_then_name():
+    # Same plan, shifted stage ids; the two "join" stages are told apart by their parents, and the
+    # after run swapped the scan under the second join for a new one.
+    before = _run([_stage(0, "scan a", 1_000), _stage(1, "scan b", 1_000), _stage(2, "join", 5_000),
+                   _stage(3, "join", 8_000), _stage(4, "old agg", 500)],
+                  {2: [0], 3: [1]}, 60_000)
+    after = _run([_stage(10, "scan c", 900), _stage(11, "scan a", 1_000), _stage(12, "join", 4_000),
+                  _stage(13, "join", 5_500, spill=512.0), _stage(14, "new sort", 700)],
+                 {12: [10], 13: [11]}, 45_000)
+    assert align(before, after) == [(0, 11, "structure"), (1, None, "removed"), (2, 13, "structure"),
+                                    (3, 12, "name"), (4, None, "removed"), (None, 10, "added"), (None, 14, "added")]
+    diffs = diff_runs(before, after)
+    join = next(d for d in diffs if d.before_stage_id == 3)
+    assert join.metrics["stage_duration_ms"] == {"before": 8_000.0, "after": 4_000.0, "delta": -4_000.0, "delta_pct": -50.0}
+    assert diffs[2].metrics["spill_mb"]["delta"] == 512.0 and diffs[2].metrics["spill_mb"]["delta_pct"] is None
+    assert diffs[-1].metrics["stage_duration_ms"]["before"] is None
+
+    out = summarize(before, after, diffs, before_nodes=10, after_nodes=8)
+    assert out["stages"] == {"before": 5, "after": 5, "structure": 2, "name": 1, "removed": 2, "added": 2}
+    assert out["wall_s"]["delta"] == -15.0
+    assert out["cost"]["current_node_hours"] == pytest.approx(10 * 60 / 3600)
+    assert out["cost"]["node_hours_saved"] == pytest.approx((600 - 8 * 45) / 3600)
+
+def test_align_scales_to_many_stages():
+    n = 40_000
+    names = [f"stage at job.py:{i % 500}" for i in range(n)]
+    before = _run([_stage(i, names[i], 100) for i in range(n)], {i: [i - 1] for i in range(1, n)}, 1_000)
+    after = _run([_stage(i + 7, names[i], 110) for i in range(n)], {i + 7: [i + 6] for i in range(1, n)}, 1_100)
+    t0 = time.perf_counter()
+    pairs = align(before, after)
+    assert time.perf_counter() - t0 < 5.0
+    assert all(a == b + 7 for b, a, _ in pairs)
@@ -0,0 +1,69 @@
+import gzip, os, struct
+import pytest
+from spark_opt.eventlog_io import codec_of, fingerprint, iter_lines
+from spark_opt.eventlog_reader import parse_eventlog
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "..", "samples", "sample_eventlog.jsonl")
+
+def _sample_bytes():
+    with open(SAMPLE, "rb") as f:
+        return f.read()
+
+def _lz4_block_stream(data, block=4096, compress=None):
+    # lz4-java LZ4BlockOutputStream layout; method 0x10 stores blocks raw, 0x20 LZ4-compressed.
+    out = b""
+    for i in range(0, len(data), block):
+        chunk = data[i:i + block]
+        payload, token = (compress(chunk), 0x20) if compress else (chunk, 0x10)
+        out += b"LZ4Block" + struct.pack("<Biii", token, len(payload), len(chunk), 0) + payload
+    return out + b"LZ4Block" + struct.pack("<Biii", 0x10, 0, 0, 0)
+
+def _assert_same_as_plain(path):
+    s1, t1, m1 = parse_eventlog(SAMPLE)
+    s2, t2, m2 = parse_eventlog(path)
+    assert s1 == s2 and m1 == m2
+    for name in t1.columns:
+        assert (t1[name] == t2[name]).all()
+
+def test_codec_detection():
+    assert codec_of("app-1.lz4") == "lz4"
+    assert codec_of("app-1.zstd.inprogress") == "zstd"
+    assert codec_of("app-1") is None
+
+def test_gzip_and_lz4_block_streams(tmp_path):
+    gz = tmp_path / "app.gz"
+    gz.write_bytes(gzip.compress(_sample_bytes()))
+    _assert_same_as_plain(str(gz))
+    lz = tmp_path / "app.lz4"
+    lz.write_bytes(_lz4_block_stream(_sample_bytes()))
+    _assert_same_as_plain(str(lz))
+
+def test_lz4_compressed_blocks(tmp_path):
+    block = pytest.importorskip("lz4.block")
+    lz = tmp_path / "app.lz4"
+    lz.write_bytes(_lz4_block_stream(_sample_bytes(), compress=lambda b: block.compress(b, store_size=False)))
+    _assert_same_as_plain(str(lz))
+
+def test_zstd_stream(tmp_path):
+    zstd = pytest.importorskip("zstandard")
+    data = _sample_bytes()
+    half = data.index(b"\n", len(data) // 2) + 1
+    c = zstd.ZstdCompressor()
+    (tmp_path / "app.zstd").write_bytes(c.compress(data[:half]) + c.compress(data[half:]))
+    _assert_same_as_plain(str(tmp_path / "app.zstd"))
+
+def test_rolling_eventlog_dir(tmp_path):
+    lines = _sample_bytes().splitlines(keepends=True)
+    d = tmp_path / "eventlog_v2_app-001"
+    d.mkdir()
+    (d / "appstatus_app-001").write_bytes(b"")
+    (d / "events_10_app-001").write_bytes(b"".join(lines[200:]))
+    (d / "events_2_app-001.gz").write_bytes(gzip.compress(b"".join(lines[100:200])))
+    (d / "events_1_app-001").write_bytes(b"".join(lines[:100]))
+    assert b"".join(iter_lines(str(d))) == _sample_bytes()
+    _assert_same_as_plain(str(d))
+
+    before = fingerprint(str(d))
+    with open(d / "events_10_app-001", "ab") as f:
+        f.write(b"\n")
+    assert fingerprint(str(d)) != before
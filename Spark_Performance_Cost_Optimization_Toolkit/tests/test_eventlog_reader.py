@@ -0,0 +1,83 @@
+import json
+import os
+from spark_opt.eventlog_reader import EventLogParser, decode_lines, event_type_of, parse_eventlog, split_byte_ranges, TaskTable
+from spark_opt.metrics import build_stage_metrics
+from helpers import task_end
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "..", "samples", "sample_eventlog.jsonl")
+
+def test_parse_eventlog_returns_columnar_task_table():
+    stages, tasks, meta = parse_eventlog(SAMPLE)
+    assert isinstance(tasks, TaskTable)
+    assert len(tasks) == 250
+    assert tasks["stage_id"].dtype.itemsize == 4
+    assert meta["app_id"] == "app-001"
+    assert {s.stage_id for s in stages} == {1, 2}
+
+def test_small_chunks_match_single_chunk():
+    _, a, _ = parse_eventlog(SAMPLE)
+    _, b, _ = parse_eventlog(SAMPLE, chunk_size=7)
+    for name in a.columns:
+        assert (a[name] == b[name]).all()
+
+def test_build_stage_metrics_accepts_task_records():
+    stages, tasks, _ = parse_eventlog(SAMPLE)
+    _, from_table = build_stage_metrics(stages, tasks)
+    _, from_records = build_stage_metrics(stages, list(tasks))
+    assert from_table == from_records
+
+def test_byte_ranges_are_newline_aligned():
+    ranges = split_byte_ranges(SAMPLE, 7)
+    assert ranges[0][0] == 0 and ranges[-1][1] == os.path.getsize(SAMPLE)
+    with open(SAMPLE, "rb") as f:
+        data = f.read()
+    for (a, b), (c, _) in zip(ranges, ranges[1:]):
+        assert b == c and data[b - 1:b] == b"\n"
+
+def test_parallel_parse_matches_serial():
+    s1, t1, m1 = parse_eventlog(SAMPLE)
+    s2, t2, m2 = parse_eventlog(SAMPLE, workers=3, min_parallel_bytes=0)
+    assert s1 == s2 and m1 == m2
+    for name in t1.columns:
+        assert (t1[name] == t2[name]).all()
+
+def test_parallel_meta_keeps_first_seen_executor_host(tmp_path):
+    # Executor 1 is lost and re-added on another host; a serial parse keeps the host it was first seen on.
+    events = []
+    for i, host in enumerate(["host-a"] * 200 + ["host-b"] * 200):
+        evt = task_end(1, i, 100 * i + 50, launch_ms=100 * i)
+        evt["Task Info"]["Host"] = host
+        events.append(evt)
+    events.insert(200, {"Event": "SparkListenerExecutorAdded", "Executor ID": "1", "Timestamp": 20_000,
+                        "Executor Info": {"Host": "host-b", "Total Cores": 4}})
+    path = tmp_path / "app.jsonl"
+    path.write_text("".join(json.dumps(e) + "\n" for e in events))
+    _, _, serial = parse_eventlog(str(path))
+    _, _, parallel = parse_eventlog(str(path), workers=2, min_parallel_bytes=0)
+    assert serial["executor_hosts"] == {"1": "host-a"}
+    assert parallel == serial
+
+def test_prefilter_skips_undeclared_events_before_decoding():
+    lines = [
+        b'{"Event":"SparkListenerBlockUpdated", this is not even valid json',
+        b'{"Event": "SparkListenerApplicationStart", "App Name": "a", "App ID": "x"}',
+        b'{"no_event_key": 1}',
+    ]
+    assert event_type_of(lines[1]) == b"SparkListenerApplicationStart"
+    out = list(decode_lines(lines, {"SparkListenerApplicationStart"}))
+    assert [e.get("App ID") for e in out] == ["x", None]
+
+def test_consumers_declare_event_types():
+    class Jobs:
+        EVENTS = ("SparkListenerJobStart",)
+        def __init__(self):
+            self.seen = []
+        def feed(self, evt):
+            self.seen.append(evt["Job ID"])
+    jobs = Jobs()
+    parser = EventLogParser(consumers=[jobs])
+    assert "SparkListenerJobStart" in parser.event_types
+    assert "SparkListenerBlockUpdated" not in parser.event_types
+    for evt in decode_lines([b'{"Event":"SparkListenerJobStart","Job ID":3}'], parser.event_types):
+        parser.feed(evt)
+    assert jobs.seen == [3]
@@ -0,0 +1,73 @@
+from spark_opt.config import SparkConf
+from spark_opt.eventlog_reader import SQL_DRIVER_ACCUM_UPDATES, SQL_EXECUTION_START
+from spark_opt.fileio import detect_file_io, stage_io
+from spark_opt.findings import StageTable
+from spark_opt.metrics import MB, build_stage_metrics, sketch_stages
+from spark_opt.recommendations import recommend
+from spark_opt.sqlplan import attribute_operators
+from helpers import parse_events, task_end
+
+def _task(sid, tid, ms, run_ms, read=0, written=0):
+    return task_end(sid, tid, ms, metrics={"Executor Run Time": run_ms,
+                                           "Input Metrics": {"Bytes Read": read, "Records Read": read // 100},
+                                           "Output Metrics": {"Bytes Written": written, "Records Written": written // 100}})
+
+def test_io_metrics_and_driver_side_scan_metrics():
+    scan = {"nodeName": "Scan parquet db.events", "simpleString": "FileScan parquet db.events[id#1]", "children": [],
+            "metrics": [{"name": "number of output rows", "accumulatorId": 80, "metricType": "sum"},
+                        {"name": "number of files read", "accumulatorId": 81, "metricType": "sum"},
+                        {"name": "size of files read", "accumulatorId": 82, "metricType": "size"}]}
+    events = [{"Event": SQL_EXECUTION_START, "executionId": 3, "description": "q", "sparkPlanInfo": scan},
+              {"Event": SQL_DRIVER_ACCUM_UPDATES, "executionId": 3, "accumUpdates": [[81, 400], [82, 200 * MB]]}]
+    events += [_task(1, i, 100, 60, read=2 * MB) for i in range(100)]
+    events += [_task(2, 200 + i, 1000, 990, written=MB if i % 2 else 0) for i in range(60)]
+    events += [{"Event": "SparkListenerStageCompleted", "Stage Info": {
+        "Stage ID": 1, "Stage Attempt ID": 0, "Stage Name": "scan", "Number of Tasks": 100,
+        "Accumulables": [{"ID": 80, "Name": "number of output rows", "Value": "5000"}]}},
+        {"Event": "SparkListenerStageCompleted", "Stage Info": {
+            "Stage ID": 2, "Stage Attempt ID": 0, "Stage Name": "save", "Number of Tasks": 60}}]
+    stages, tasks, meta = parse_events(events)
+    assert meta["sql_driver_accums"] == {"81": 400, "82": 200 * MB}
+    _, objs = build_stage_metrics(stages, tasks)
+    _, sketched = build_stage_metrics(stages, sketches=sketch_stages(tasks))
+    for s in (objs, sketched):
+        assert (s[0].input_tasks, s[0].input_records, s[0].run_time_ms, s[0].max_task_input_mb) == (100, 100 * (2 * MB // 100), 6000, 2.0)
+        assert (s[1].output_tasks, s[1].output_mb, s[1].max_task_output_mb) == (30, 30.0, 1.0)
+    sql = attribute_operators(objs, meta)
+    io = {s.stage_id: s for s in stage_io(StageTable(objs), sql)}
+    assert (io[1].files_read, io[1].mb_per_file_read, io[1].overhead_pct) == (400, 0.5, 0.4)
+    assert io[2].files_read is None and io[2].mb_per_output_task == 1.0
+
+    found = detect_file_io(StageTable(objs), SparkConf(), sql, min_tasks=20)
+    assert [(f.code, f.stage_id, f.severity) for f in found] == [("SMALL_FILE_SCAN", 1, "ERROR"), ("SMALL_FILE_WRITES", 2, "ERROR")]
+    scan_ev = found[0].evidence
+    assert scan_ev["recommended_conf"] == {"spark.sql.files.openCostInBytes": "1m"} and scan_ev["recommended_tasks"] == 2
+    assert scan_ev["saved_ms"] == int(4000 * (1 - 2 / 100))
+    assert found[1].evidence["recommended_files"] == 1
+    # Without file counts, the split size is raised instead.
+    rec_conf = detect_file_io(StageTable(objs[:1]), SparkConf(), min_tasks=20)[0].evidence["recommended_conf"]
+    assert rec_conf == {"spark.sql.files.maxPartitionBytes": "1g"}
+
+def test_oversized_splits_tell_unsplittable_files_from_large_partitions():
+    tasks = [_task(1, i, 5000, 5000, read=(3000 if i == 0 else 10) * MB) for i in range(40)]
+    tasks += [_task(2, 100 + i, 5000, 5000, read=600 * MB) for i in range(40)]
+    tasks += [{"Event": "SparkListenerStageCompleted", "Stage Info": {"Stage ID": sid, "Stage Attempt ID": 0,
+                                                                     "Stage Name": "load", "Number of Tasks": 40}}
+              for sid in (1, 2)]
+    stages, t, meta = parse_events(tasks)
+    _, objs = build_stage_metrics(stages, t)
+    conf = SparkConf(conf={"spark.sql.files.maxPartitionBytes": "1g"})
+    found = {f.stage_id: f for f in detect_file_io(StageTable(objs), conf) if f.code == "OVERSIZED_INPUT_SPLITS"}
+    assert found[1].severity == "ERROR" and found[1].evidence["unsplittable"] and not found[1].evidence["recommended_conf"]
+    assert found[2].severity == "WARN" and found[2].evidence["recommended_conf"] == {"spark.sql.files.maxPartitionBytes": "128m"}
+    [rec] = recommend(list(found.values()), conf)
+    assert rec.stage_ids == [1, 2] and rec.severity == "ERROR"
+    assert any("gzip" in a for a in rec.actions) and "Set spark.sql.files.maxPartitionBytes=128m." in rec.actions
+
+def test_synthetic_small_file_scans_and_writes(synthetic_app):
+    app = synthetic_app(tasks=4000, stages=12, small_file_stages=0.7, small_file_writes=0.7, seed=3)
+    found = detect_file_io(StageTable(app.metrics), SparkConf(), attribute_operators(app.metrics, app.meta))
+    assert sorted(f.stage_id for f in found if f.code == "SMALL_FILE_SCAN") == app.info["small_file_stages"]
+    writes = [f.stage_id for f in found if f.code == "SMALL_FILE_WRITES"]
+    assert writes and set(writes) <= set(app.info["small_write_stages"])
+    assert not [f for f in found if f.code == "OVERSIZED_INPUT_SPLITS"]
@@ -0,0 +1,29 @@
+import json, os, shutil
+import pytest
+from spark_opt.fleet import discover_eventlogs, run_fleet, FleetRanking
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "..", "samples", "sample_eventlog.jsonl")
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_fleet_survives_bad_log_and_ranks(tmp_path, workers):
+    logs = tmp_path / "logs"
+    logs.mkdir()
+    for i in range(3):
+        shutil.copy(SAMPLE, logs / f"app{i}.jsonl")
+    (logs / "broken.jsonl").write_text('{"Event": nope\n')
+    out = tmp_path / "summary.jsonl"
+    result = run_fleet(discover_eventlogs(str(logs)), str(out), workers=workers, use_cache=False, top_n=4)
+
+    rows = [json.loads(l) for l in out.read_text().splitlines()]
+    assert len(rows) == 4
+    assert result["apps_ok"] == 3 and result["apps_failed"] == 1
+    assert [r["status"] for r in rows if r["path"].endswith("broken.jsonl")] == ["error"]
+    assert len(result["worst_stages"]) == 4
+    assert result["worst_stages"][0]["stage_duration_ms"] == 180000
+    assert result["top_findings"][0]["severity"] == "ERROR"
+
+def test_ranking_is_bounded():
+    r = FleetRanking(top_n=2)
+    for d in (5, 1, 9, 7):
+        r.add({"status": "ok", "path": str(d), "top_stages": [{"stage_id": 0, "stage_duration_ms": d}], "findings": []})
+    assert [s["stage_duration_ms"] for s in r.result()["worst_stages"]] == [9, 7]
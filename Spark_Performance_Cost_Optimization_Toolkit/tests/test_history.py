@@ -0,0 +1,47 @@
+import pytest
+from spark_opt.config import SparkConf
+from spark_opt.detectors import detect_all
+from spark_opt.history import HistoryStore
+from helpers import make_stage
+
+def _stage(sid, name, dur, shuffle=100.0, spill=0.0, attempt=0):
+    return make_stage(sid, attempt=attempt, name=name, num_tasks=4, stage_duration_ms=dur, shuffle_read_mb=shuffle,
+                      spill_mb=spill)
+
+def _run(store, i, durs, **kw):
+    stages = [_stage(10 + j, name, d, **kw) for j, (name, d) in enumerate(durs)]
+    store.ingest({"app_id": f"app-{i}", "app_name": "etl"}, stages, run_time_ms=1_000 * i)
+    return stages
+
+def test_baselines_window_and_reingest(tmp_path):
+    with HistoryStore(str(tmp_path / "h.sqlite")) as store:
+        for i, d in enumerate([100_000, 10_000, 10_200, 9_800, 10_000]):
+            _run(store, i, [("join at etl.py:88", d), ("join at etl.py:88", 2 * d)])
+        _run(store, 4, [("join at etl.py:88", 10_000), ("join at etl.py:88", 20_000)])  # same app id: replaced
+        assert store.apps()[0]["runs"] == 5
+        base = store.baselines("etl", before_ms=10_000, window=4)
+        assert set(base) == {("join at etl.py:88", 0), ("join at etl.py:88", 1)}
+        b = base[("join at etl.py:88", 0)]
+        assert b.runs == 4 and b.mean["stage_duration_ms"] == pytest.approx(10_000)
+        assert b.std["stage_duration_ms"] == pytest.approx(163.3, abs=0.1)
+        assert base[("join at etl.py:88", 1)].mean["stage_duration_ms"] == pytest.approx(20_000)
+        assert store.baselines("etl", before_ms=1_000)[("join at etl.py:88", 0)].runs == 1
+        rows = store.stage_history("etl", stage_name="etl.py:88", limit=3)
+        assert [r["run_time_ms"] for r in rows] == [4_000, 4_000, 3_000]
+
+def test_stage_regression_detector(tmp_path):
+    with HistoryStore(str(tmp_path / "h.sqlite")) as store:
+        for i, d in enumerate([10_000, 10_500, 9_500, 10_000, 10_200]):
+            _run(store, i, [("scan", 5_000 + i), ("join", d), ("agg", 3_000)], spill=0.0)
+        current = [_stage(20, "scan", 5_050), _stage(21, "join", 16_000, spill=2_048.0), _stage(22, "agg", 3_300)]
+        base = store.baselines("etl", before_ms=10_000)
+    found = [f for f in detect_all(current, SparkConf(), baselines=base) if f.code == "STAGE_REGRESSION"]
+    assert [(f.stage_id, f.severity, sorted(f.evidence["metrics"])) for f in found] == [
+        (21, "ERROR", ["spill_mb", "stage_duration_ms"])]
+    assert "duration +59%" in found[0].message and "was constant" in found[0].message
+    relaxed = detect_all(current, SparkConf(), baselines=base,
+                         thresholds={"stage_regression": {"sigmas": 100.0, "min_relative_increase": 0.05}})
+    # Looser sigmas drop the noisy duration jump; changes against a constant baseline still count.
+    assert [(f.stage_id, sorted(f.evidence["metrics"])) for f in relaxed if f.code == "STAGE_REGRESSION"] == [
+        (21, ["spill_mb"]), (22, ["stage_duration_ms"])]
+    assert not [f for f in detect_all(current, SparkConf()) if f.code == "STAGE_REGRESSION"]
@@ -0,0 +1,29 @@
+from spark_opt.config import SparkConf
+from spark_opt.detectors import skew_checks, stage_findings
+from spark_opt.findings import StageTable
+from spark_opt.hosts import analyze_hosts, detect_slow_hosts
+from spark_opt.recommendations import recommend
+from spark_opt.synth import SynthSpec
+
+SPEC = dict(tasks=8000, stages=12, skew_stages=0.3, spill_stages=0.0, seed=5)
+
+def test_slow_host_is_reported_with_its_evidence(synthetic_app):
+    app = synthetic_app(slow_hosts=1, **SPEC)
+    slow = detect_slow_hosts(analyze_hosts(app.tasks, app.meta))
+    assert [f.evidence["host"] for f in slow] == app.info["slow_hosts"]
+    assert slow[0].evidence["slowdown"] >= 2 and slow[0].evidence["data_ratio"] < 2
+    rec = recommend(slow, SparkConf())[0]
+    assert app.info["slow_hosts"][0] in rec.title and rec.savings.core_hours_high > 0
+
+def test_slow_host_stragglers_are_not_mistaken_for_skew(synthetic_app):
+    app = synthetic_app(slow_hosts=1, **SPEC)
+    t = StageTable(app.metrics, hosts=analyze_hosts(app.tasks, app.meta))
+    skew = stage_findings(t, skew_checks(t))
+    assert sorted(f.stage_id for f in skew) == app.info["skewed_stages"]
+    assert all(f.evidence["cause"] == "data" and f.evidence["bytes_duration_corr"] >= 0.5 for f in skew)
+
+def test_healthy_cluster_has_no_slow_hosts(synthetic_app):
+    app = synthetic_app(**SPEC)
+    hosts = analyze_hosts(app.tasks, app.meta)
+    assert hosts.slow_hosts == [] and detect_slow_hosts(hosts) == []
+    assert sum(h.tasks for h in hosts.hosts) == len(app.tasks) and len(hosts.executors) == SynthSpec().executors
@@ -0,0 +1,84 @@
+from spark_opt.config import SparkConf, parse_size_mb
+from spark_opt.findings import StageTable
+from spark_opt.memory import analyze_memory, detect_executor_memory, memory_config
+from spark_opt.metrics import MB, build_stage_metrics, sketch_stages
+from helpers import parse_events, task_end
+
+def test_sizes_and_effective_memory_config():
+    assert [parse_size_mb(v) for v in ("4g", "512m", "2048", "1t", "8gb")] == [4096, 512, 2048, 1024 ** 2, 8192]
+    assert parse_size_mb("1073741824", unit="b") == 1024 and parse_size_mb("lots", default=1.0) == 1.0
+    meta = {"spark_properties": {"spark.executor.memory": "8g", "spark.executor.cores": "4"},
+            "executors": [{"executor_id": 1, "cores": 8}]}
+    c = memory_config(SparkConf(conf={"spark.executor.cores": 2}), meta)  # the given conf wins over the log
+    assert (c.executor_mb, c.overhead_mb, c.cores, c.configured) == (8192, 8192 * 0.1, 2, True)
+    assert c.execution_per_task_mb == (8192 - 300) * 0.6 / 2
+    c = memory_config(SparkConf(), {"executors": [{"executor_id": 1, "cores": 8}]})
+    assert (c.executor_mb, c.overhead_mb, c.cores, c.configured) == (1024, 384, 8, False)
+
+def test_parser_reads_executor_peaks_and_properties():
+    _, tasks, meta = parse_events([
+        {"Event": "SparkListenerEnvironmentUpdate",
+         "Spark Properties": {"spark.executor.memory": "4g", "spark.ssl.keyPassword": "x", "java.home": "/jdk"}},
+        {**task_end(1, 7, 10, executor=2, metrics={"Peak Execution Memory": 64 * MB}),
+         "Task Executor Metrics": {"JVMHeapMemory": 900 * MB, "JVMOffHeapMemory": 100 * MB, "DirectPoolMemory": 20 * MB,
+                                   "ProcessTreePythonRSSMemory": 300 * MB}},
+        {"Event": "SparkListenerStageExecutorMetrics", "Executor ID": "3", "Stage ID": 1, "Stage Attempt ID": 0,
+         "Executor Metrics": {"JVMHeapMemory": 1500 * MB}}])
+    assert meta["spark_properties"] == {"spark.executor.memory": "4g"}
+    assert [t.peak_execution_bytes // MB for t in tasks] == [64]
+    assert [(t.jvm_heap_bytes, t.off_heap_bytes, t.python_bytes) for t in tasks] == [(900 * MB, 120 * MB, 300 * MB)]
+    mem = analyze_memory(tasks, meta, SparkConf())
+    assert [(e.executor_id, e.heap_mb, e.non_heap_mb) for e in mem.executors] == [(2, 900, 420), (3, 1500, 0)]
+    assert mem.stage_peaks == {(1, 0): (1500, 0, 0)}
+
+def _memory_findings(app, conf=SparkConf(), **kw):
+    mem = analyze_memory(app.tasks, app.meta, conf)
+    return detect_executor_memory(StageTable(app.metrics), mem, **kw)
+
+def test_spilling_stages_get_a_larger_heap_or_fewer_cores(synthetic_app):
+    app = synthetic_app(tasks=3000, stages=8, spill_stages=0.4, seed=1)
+    [found] = _memory_findings(app)
+    assert found.code == "MEMORY_UNDERSIZED"
+    assert {s["stage_id"] for s in found.evidence["stages"]} == set(app.info["spill_stages"])
+    ev = found.evidence
+    assert ev["executor_memory_mb"] == 4096 and parse_size_mb(ev["recommended_conf"]["spark.executor.memory"]) > 4096
+    capped = _memory_findings(app, max_executor_gb=4, memory_gb_per_node=8)[0].evidence
+    assert capped["recommended_conf"]["spark.executor.cores"] < 4 and capped["fits_node"] is False
+
+def test_peak_execution_memory_merges_exactly_from_sketches(synthetic_app):
+    app = synthetic_app(tasks=3000, stages=8, spill_stages=0.4, seed=1)
+    _, sketched = build_stage_metrics(app.stages, sketches=sketch_stages(app.tasks))
+    assert [s.peak_execution_mb for s in sketched] == [s.peak_execution_mb for s in app.metrics]
+
+def test_unused_heap_is_reclaimed(synthetic_app):
+    app = synthetic_app(tasks=3000, stages=8, spill_stages=0, heap_used=0.2, seed=2)
+    [over] = _memory_findings(app, memory_gb_per_node=32)
+    assert (over.code, over.severity) == ("MEMORY_OVERPROVISIONED", "WARN")
+    ev = over.evidence
+    assert parse_size_mb(ev["recommended_conf"]["spark.executor.memory"]) < 4096 and ev["reclaimed_gb"] > 0
+    assert ev["node_memory_needed_gb"] == ev["recommended_container_mb"] * ev["executors_per_node"] / 1024
+
+def test_killed_executor_flags_overhead_pressure(synthetic_app):
+    app = synthetic_app(tasks=3000, stages=8, spill_stages=0, heap_used=0.2, seed=2)
+    # A tiny overhead plus one executor killed by the resource manager.
+    app.meta["executors"].append({"executor_id": 1, "event": "removed", "time_ms": 0, "host": "host-0",
+                                  "reason": "Container killed by YARN for exceeding memory limits. 4.6 GB of 4.5 GB used."})
+    found = _memory_findings(app, SparkConf(conf={"spark.executor.memoryOverhead": "128m"}))
+    [press] = [f for f in found if f.code == "MEMORY_OVERHEAD_PRESSURE"]
+    assert press.severity == "ERROR" and press.evidence["memory_kills"] == 1
+    assert parse_size_mb(press.evidence["recommended_conf"]["spark.executor.memoryOverhead"]) >= 160 * 1.25
+
+def test_report_analyzes_memory_once(synthetic_app, monkeypatch):
+    import spark_opt.detectors, spark_opt.report
+    app = synthetic_app(tasks=2000, stages=6, spill_stages=0.4, seed=1)
+    calls = []
+
+    def counted(*args):
+        calls.append(args)
+        return analyze_memory(*args)
+
+    monkeypatch.setattr(spark_opt.report, "analyze_memory", counted)
+    monkeypatch.setattr(spark_opt.detectors, "analyze_memory", counted)
+    content, recs = spark_opt.report.build_markdown_report(app.info["path"], SparkConf(), use_cache=False)
+    assert len(calls) == 1 and "## Executor Memory" in content
+    assert any(r.title.startswith("Give tasks enough execution memory") for r in recs)
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+from spark_opt.eventlog_reader import StageCompleted, TaskTable, TASK_COLUMNS
+from spark_opt.metrics import build_stage_metrics, _percentile
+
+def _random_tasks(rng, n_tasks, n_stages):
+    cols = {name: rng.integers(0, 10**7, size=n_tasks) for name, _ in TASK_COLUMNS}
+    cols["stage_id"] = rng.integers(0, n_stages, size=n_tasks).astype(np.int32)
+    cols["attempt"] = rng.integers(0, 2, size=n_tasks).astype(np.int32)
+    cols["duration_ms"] = rng.lognormal(6, 1.5, size=n_tasks).astype(np.int64)
+    return TaskTable(cols)
+
+def _reference(stages, tasks):
+    rows = []
+    for s in stages:
+        m = (tasks["stage_id"] == s.stage_id) & (tasks["attempt"] == s.attempt)
+        d = tasks["duration_ms"][m].tolist()
+        p50, p95 = _percentile(d, 50), _percentile(d, 95)
+        mx = int(max(d) if d else 0)
+        run = sum(d) or 1
+        rows.append((p50, p95, mx, int(tasks["gc_time_ms"][m].sum()) / run,
+                     (int(tasks["spill_mem_bytes"][m].sum()) + int(tasks["spill_disk_bytes"][m].sum())) / (1024 * 1024)))
+    return rows
+
+def test_vectorized_metrics_match_per_stage_reference():
+    rng = np.random.default_rng(7)
+    tasks = _random_tasks(rng, 5000, 40)
+    # include a stage without tasks, a single-task stage and a duplicated stage entry
+    tasks["stage_id"][:1] = 99
+    stages = [StageCompleted(i, a, f"s{i}", 0, None, None) for i in list(range(40)) + [99, 123] for a in (0, 1)]
+    stages.append(stages[0])
+    _, objs = build_stage_metrics(stages, tasks)
+    for o, (p50, p95, mx, gc_pct, spill) in zip(objs, _reference(stages, tasks)):
+        assert (o.task_p50_ms, o.task_p95_ms, o.task_max_ms, o.gc_pct, o.spill_mb) == (p50, p95, mx, gc_pct, spill)
+
+def test_empty_inputs():
+    df, objs = build_stage_metrics([], TaskTable.empty())
+    assert df.empty and objs == []
+    df, objs = build_stage_metrics([StageCompleted(1, 0, "x", 0, 0, 10)], TaskTable.empty())
+    assert objs[0].task_max_ms == 0 and objs[0].stage_duration_ms == 10
+    assert isinstance(df, pd.DataFrame) and len(df) == 1
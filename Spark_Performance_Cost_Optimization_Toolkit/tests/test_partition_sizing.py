@@ -0,0 +1,35 @@
+from spark_opt.config import SparkConf
+from spark_opt.detectors import StageTable, detect_all, partition_sizing
+from spark_opt.recommendations import recommend
+from helpers import make_stage
+
+def _stage(sid, read_mb, tasks, spill=0.0):
+    return make_stage(sid, name=f"join {sid}", num_tasks=tasks, stage_duration_ms=60_000, shuffle_read_mb=read_mb,
+                      spill_mb=spill)
+
+STAGES = [_stage(1, 0.0, 100),                   # no shuffle read: ignored
+          _stage(2, 2_000.0, 2_000),             # 1 MB partitions, 50 waves on 40 cores
+          _stage(3, 100_000.0, 200, spill=9_000),  # 500 MB partitions that spill
+          _stage(4, 1_000.0, 2_000, spill=10.0),   # tiny partitions but spilling: left alone
+          _stage(5, 5_000.0, 40)]                # 125 MB: fine
+
+def test_partition_sizing_rows_and_waves():
+    rows = {r["stage_id"]: r for r in partition_sizing(StageTable(STAGES), cores_total=40, target_partition_mb=128)}
+    assert sorted(rows) == [2, 3, 4, 5]
+    assert (rows[2]["recommended_partitions"], rows[2]["waves"], rows[2]["recommended_waves"]) == (16, 50, 1)
+    assert (rows[3]["mb_per_partition"], rows[3]["recommended_partitions"], rows[3]["recommended_waves"]) == (500.0, 800, 20)
+    assert rows[5]["recommended_partitions"] == 40
+
+def test_shuffle_partition_sizing_finding_and_recommendation():
+    [f] = [f for f in detect_all(STAGES, SparkConf(), cores_total=40) if f.code == "SHUFFLE_PARTITION_SIZING"]
+    assert f.severity == "ERROR"
+    assert [(r["stage_id"], r["issue"]) for r in f.evidence["stages"]] == [(2, "undersized"), (3, "oversized")]
+    assert f.evidence["recommended_conf"] == {
+        "spark.sql.shuffle.partitions": 800, "spark.sql.adaptive.advisoryPartitionSizeInBytes": "128m",
+        "spark.sql.adaptive.enabled": "true", "spark.sql.adaptive.coalescePartitions.enabled": "true"}
+    [rec] = [r for r in recommend([f], SparkConf()) if r.title.startswith("Size shuffle partitions")]
+    assert "Set spark.sql.shuffle.partitions=800." in rec.actions
+    assert any(a.startswith("Stage 3 (join 3): 200 partitions of 500.0 MB → 800 (5 → 20 waves") for a in rec.actions)
+    aqe = SparkConf(conf={"spark.sql.adaptive.enabled": "true"})
+    [f] = [f for f in detect_all(STAGES[:3], aqe, cores_total=40) if f.code == "SHUFFLE_PARTITION_SIZING"]
+    assert set(f.evidence["recommended_conf"]) == {"spark.sql.shuffle.partitions", "spark.sql.adaptive.advisoryPartitionSizeInBytes"}
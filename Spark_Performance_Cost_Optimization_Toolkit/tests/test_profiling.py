@@ -0,0 +1,33 @@
+import os
+from spark_opt import profiling
+from spark_opt.config import SparkConf
+from spark_opt.report import generate_markdown_report
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "..", "samples", "sample_eventlog.jsonl")
+
+def test_profile_records_each_phase(tmp_path):
+    out = tmp_path / "r.md"
+    with profiling.profiling() as prof:
+        generate_markdown_report(SAMPLE, SparkConf(), str(out), cores_total=40, use_cache=False)
+    phases = prof.to_dict()["phases"]
+    by_name = {p["name"]: p for p in phases}
+    for name in ("parse", "metrics", "metrics/aggregate", "metrics/dataframe", "timeline", "detectors",
+                 "detectors/skew", "detectors/partitioning", "recommend", "render"):
+        assert by_name[name]["calls"] == 1 and by_name[name]["wall_s"] >= 0, name
+    with open(SAMPLE, "rb") as f:
+        lines = f.read().splitlines()
+    assert by_name["parse"]["events"] == len(lines)
+    assert by_name["parse"]["bytes"] == os.path.getsize(SAMPLE)
+    assert by_name["parse"]["events_per_s"] > 0 and by_name["parse"]["peak_rss_mb"] > 0
+    assert by_name["metrics/aggregate"]["events"] == 250  # TaskEnd events
+    assert "## Appendix: spark-opt Profile" in out.read_text() and "| detectors/skew |" in out.read_text()
+
+def test_disabled_profiling_is_a_no_op(tmp_path):
+    assert profiling.active() is None
+    with profiling.phase("x") as ph:
+        ph.count(events=5)
+    profiling.count(events=1)
+    assert list(profiling.counted([b"a", b"b"])) == [b"a", b"b"]
+    out = tmp_path / "r.md"
+    generate_markdown_report(SAMPLE, SparkConf(), str(out), use_cache=False)
+    assert "Appendix" not in out.read_text()
@@ -0,0 +1,67 @@
+import json
+from spark_opt.config import SparkConf
+from spark_opt.detectors import detect_all
+from spark_opt.eventlog_reader import SQL_EXECUTION_START, python_kind
+from spark_opt.findings import StageTable
+from spark_opt.metrics import build_stage_metrics
+from spark_opt.pyudf import detect_python_udfs, python_stages
+from spark_opt.recommendations import recommend
+from spark_opt.sqlplan import attribute_operators
+from helpers import parse_events, task_end
+
+def test_python_kinds_from_operator_names():
+    assert python_kind("BatchEvalPython [f(x#1)]") == "row_udf"
+    assert [python_kind(n) for n in ("ArrowEvalPython", "FlatMapGroupsInPandas", "mapInArrow", "applyInPandas")] == ["arrow_udf"] * 4
+    assert python_kind("PythonRDD[3] at RDD at PythonRDD.scala:53") == "python_rdd"
+    assert python_kind("collectToPython at NativeMethodAccessorImpl.java:0") is None
+
+def _task(sid, tid, ms, cpu_ms):
+    return task_end(sid, tid, ms, metrics={"Executor Deserialize Time": 5, "Executor Run Time": ms - 10,
+                                           "Result Serialization Time": 5, "JVM GC Time": 10,
+                                           "Executor CPU Time": cpu_ms * 1_000_000,
+                                           "Shuffle Read Metrics": {"Fetch Wait Time": 30},
+                                           "Shuffle Write Metrics": {"Shuffle Write Time": 20_000_000}})
+
+def test_worker_time_from_rdd_scopes_and_sql_plan_nodes():
+    udf = {"nodeName": "ArrowEvalPython", "simpleString": "ArrowEvalPython [score(x#1)]", "children": [],
+           "metrics": [{"name": "data sent to Python workers", "accumulatorId": 70, "metricType": "size"},
+                       {"name": "data returned from Python workers", "accumulatorId": 71, "metricType": "size"}]}
+    events = [{"Event": SQL_EXECUTION_START, "executionId": 1, "description": "score", "sparkPlanInfo": udf},
+              {"Event": "SparkListenerEnvironmentUpdate", "Spark Properties": {"spark.python.worker.reuse": "false"}}]
+    events += [_task(1, i, 1000, 200) for i in range(4)] + [_task(2, 10 + i, 1000, 900) for i in range(4)]
+    events += [{"Event": "SparkListenerStageCompleted", "Stage Info": {
+        "Stage ID": 1, "Stage Attempt ID": 0, "Stage Name": "collect at job.py:12", "Number of Tasks": 4,
+        "Accumulables": [{"ID": 70, "Name": "data sent to Python workers", "Value": str(8 << 20)},
+                         {"ID": 71, "Name": "data returned from Python workers", "Value": str(2 << 20)}]}},
+        {"Event": "SparkListenerStageCompleted", "Stage Info": {
+            "Stage ID": 2, "Stage Attempt ID": 0, "Stage Name": "save at job.py:20", "Number of Tasks": 4,
+            "RDD Info": [{"RDD ID": 9, "Name": "MapPartitionsRDD",
+                          "Scope": json.dumps({"id": "4", "name": "BatchEvalPython"})}]}}]
+    stages, tasks, meta = parse_events(events)
+    assert meta["python_stages"] == {"2": "row_udf"}  # stage 1 is only known from its SQL plan node
+    _, objs = build_stage_metrics(stages, tasks)
+    assert (objs[0].cpu_time_ms, objs[0].serialization_ms, objs[0].fetch_wait_ms, objs[0].shuffle_write_time_ms) == (800, 40, 120, 80)
+    sql = attribute_operators(objs, meta)
+    py = {p.stage_id: p for p in python_stages(StageTable(objs), meta, sql, worker_reuse=False, worker_boot_ms=100)}
+    assert py[1].kind == "arrow_udf" and py[2].kind == "row_udf"
+    # Run time excludes (de)serialization; CPU, GC, fetch waits and shuffle writes are inside it.
+    assert py[1].python_ms == 3960 - 800 - 40 - 120 - 80 and py[1].boot_ms == 400
+    assert (py[1].mb_to_python, py[1].mb_from_python) == (8.0, 2.0)
+    assert py[2].python_ms == 3960 - 3600 - 40 - 120 - 80
+
+    found = detect_all(objs, SparkConf(), tasks=tasks, meta=meta, thresholds={"python_udf": {"min_python_ms": 1000}})
+    udf_findings = [f for f in found if f.code == "PYTHON_UDF_OVERHEAD"]
+    assert [(f.stage_id, f.severity) for f in udf_findings] == [(1, "ERROR")]  # stage 2 is only 5% Python
+    assert udf_findings[0].evidence["worker_reuse"] is False and udf_findings[0].evidence["python_ms_is_upper_bound"]
+    rec = recommend(udf_findings, SparkConf())[0]
+    assert any("spark.python.worker.reuse=true" in a for a in rec.actions)
+    assert rec.savings.core_hours_high == 2920 / 3_600_000
+
+def test_synthetic_python_stages_are_found_with_arrow_estimate(synthetic_app):
+    app = synthetic_app(tasks=4000, stages=10, python_udf_stages=0.4, spill_stages=0, seed=4)
+    found = detect_python_udfs(python_stages(StageTable(app.metrics), app.meta), SparkConf())
+    assert sorted(f.stage_id for f in found) == app.info["python_stages"]
+    for f in found:
+        ev = f.evidence
+        assert 0.6 < ev["python_pct"] < 0.9
+        assert (ev["arrow_savings_ms"] > 0) == (ev["kind"] == "row_udf")
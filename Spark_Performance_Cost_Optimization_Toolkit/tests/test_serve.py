@@ -0,0 +1,122 @@
+import io, json, multiprocessing, os, shutil, signal, threading, time
+import http.client
+import pytest
+from spark_opt.serve import AnalysisService, QueueFull, content_hash, make_server
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "..", "samples", "sample_eventlog.jsonl")
+
+@pytest.fixture
+def server(tmp_path):
+    logs = tmp_path / "logs"
+    logs.mkdir()
+    shutil.copy(SAMPLE, logs / "app.jsonl")
+    service = AnalysisService(workers=1, max_queue=4, cache_dir=str(tmp_path / "cache"), roots=[str(logs)],
+                              defaults={"nodes": 4, "cores_per_node": 8})
+    httpd = make_server(service, port=0)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield service, httpd.server_address[1], logs
+    httpd.shutdown()
+    httpd.server_close()
+    service.close()
+
+def _request(port, method, path, body=None, headers=None):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+    conn.request(method, path, body=body, headers=headers or {})
+    resp = conn.getresponse()
+    data = resp.read().decode("utf-8")
+    conn.close()
+    return resp.status, (json.loads(data) if resp.getheader("Content-Type", "").startswith("application/json") else data)
+
+def _post_path(port, path, wait=60, **options):
+    return _request(port, "POST", f"/jobs?wait={wait}", json.dumps({"path": path, **options}),
+                    {"Content-Type": "application/json"})
+
+def test_path_jobs_return_recommendations_and_report_then_hit_the_cache(server):
+    service, port, logs = server
+    status, job = _post_path(port, str(logs / "app.jsonl"))
+    assert status == 200 and job["status"] == "done" and not job["cached"]
+    assert job["content_hash"] == content_hash(SAMPLE) and job["options"] == {"nodes": 4, "cores_per_node": 8}
+    status, recs = _request(port, "GET", job["links"]["recommendations"])
+    assert status == 200 and recs and {"title", "actions", "savings"} <= set(recs[0])
+    status, report = _request(port, "GET", job["links"]["report"])
+    assert status == 200 and report.startswith("# Spark Performance + Cost Optimization Report")
+
+    # Same bytes under another name, and as an upload: answered from the result cache.
+    shutil.copy(SAMPLE, logs / "copy.jsonl")
+    status, again = _post_path(port, str(logs / "copy.jsonl"), wait=0)
+    assert status == 200 and again["cached"] and again["job_id"] != job["job_id"]
+    with open(SAMPLE, "rb") as f:
+        status, up = _request(port, "POST", "/jobs?name=app.jsonl", f.read())
+    assert status == 200 and up["cached"] and up["path"] is None
+    assert _request(port, "GET", up["links"]["recommendations"])[1] == recs
+    # Other options are another result.
+    status, other = _post_path(port, str(logs / "app.jsonl"), nodes=2, spark_conf={"spark.sql.adaptive.enabled": "true"})
+    assert status == 200 and not other["cached"]
+    stats = _request(port, "GET", "/health")[1]
+    assert (stats["cache_hits"], stats["done"], stats["active"]) == (2, 2, 0)
+
+def test_uploads_errors_and_a_full_queue(server, tmp_path):
+    service, port, logs = server
+    with open(SAMPLE, "rb") as f:
+        data = f.read()
+    status, job = _request(port, "POST", "/jobs?wait=60&options=" + json.dumps({"nodes": 3}).replace(" ", ""), data)
+    assert status == 200 and job["status"] == "done" and job["options"]["nodes"] == 3
+    assert not os.listdir(service.upload_dir)  # uploads are dropped once their jobs finish
+    status, bad = _request(port, "POST", "/jobs?wait=60", b'{"Event": nope\n')
+    assert status == 200 and bad["status"] == "error" and "error" in bad
+    assert _request(port, "GET", bad["links"]["report"])[0] == 422
+
+    outside = tmp_path / "outside.jsonl"
+    shutil.copy(SAMPLE, outside)
+    assert _post_path(port, str(outside))[0] == 403
+    assert _post_path(port, str(logs / "missing.jsonl"))[0] == 404
+    assert _post_path(port, str(logs / "app.jsonl"), colour="red")[0] == 400
+    assert _request(port, "GET", "/jobs/nope")[0] == 404
+    big = json.dumps({"path": str(logs / "app.jsonl"), "spark_conf": {"k": "x" * (2 << 20)}})
+    assert _request(port, "POST", "/jobs", big, {"Content-Type": "application/json"})[0] == 413
+
+    service.max_queue = 0
+    with pytest.raises(QueueFull):
+        service.submit_path(str(logs / "app.jsonl"), {"nodes": 7})
+    status, body = _post_path(port, str(logs / "app.jsonl"), nodes=7)
+    assert status == 503 and "retry" in body["error"]
+
+def test_a_killed_worker_reruns_its_jobs_one_at_a_time(tmp_path):
+    service = AnalysisService(workers=1, cache_dir=str(tmp_path / "cache"))
+    try:
+        jobs = [service.submit_path(SAMPLE, {"nodes": n}) for n in range(1, 7)]
+        deadline = time.time() + 60
+        while not service._pool._processes and time.time() < deadline:
+            time.sleep(0.01)
+        os.kill(next(iter(service._pool._processes)), signal.SIGKILL)
+        peak = 0
+        while not all(j.done.is_set() for j in jobs) and time.time() < deadline + 120:
+            peak = max(peak, len(multiprocessing.active_children()))
+            time.sleep(0.01)
+        assert [j.status for j in jobs] == ["done"] * 6  # none of them was the cause
+        assert service.counts["isolated"] >= 1
+        assert peak <= service.workers
+        assert service.submit_path(SAMPLE, {"nodes": 9}).done.wait(60)  # a fresh pool takes new jobs
+    finally:
+        service.close()
+
+def test_an_upload_survives_a_finishing_job_with_the_same_content(tmp_path, monkeypatch):
+    service = AnalysisService(workers=1, cache_dir=str(tmp_path / "cache"))
+    with open(SAMPLE, "rb") as f:
+        data = f.read()
+    path = os.path.join(service.upload_dir, content_hash(SAMPLE))
+    service._uploads[path] = 1  # an earlier upload of the same bytes, still running
+    submit = service._submit
+
+    def finish_first_then_submit(*args, **kwargs):
+        service._release_upload(path)  # ...finishes between this upload's write and its submit
+        assert os.path.exists(path)
+        return submit(*args, **kwargs)
+
+    monkeypatch.setattr(service, "_submit", finish_first_then_submit)
+    try:
+        job = service.submit_upload(io.BytesIO(data), len(data), "app.jsonl")
+        assert job.done.wait(60) and job.status == "done"
+        assert not os.listdir(service.upload_dir)
+    finally:
+        service.close()
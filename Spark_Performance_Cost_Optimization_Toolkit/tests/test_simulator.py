@@ -0,0 +1,66 @@
+import heapq
+import numpy as np
+from spark_opt.config import ClusterSpec, CostSpec
+from spark_opt.eventlog_reader import StageCompleted, TaskEnd, TaskTable
+from spark_opt.simulator import SizingResult, build_plan, pareto_frontier, simulate, sweep
+
+def _tasks(durations_by_stage, finish=None):
+    rows = [TaskEnd(sid, 0, i, d, 0, 0, 0, 0, 0, finish_time_ms=(finish or {}).get(sid, -1))
+            for sid, ds in durations_by_stage.items() for i, d in enumerate(ds)]
+    return TaskTable.from_records(rows)
+
+def _greedy_lpt(durations, slots):
+    heap = [0] * slots
+    for d in sorted(durations, reverse=True):
+        heapq.heapreplace(heap, heap[0] + d)
+    return max(heap)
+
+def test_stage_makespan_matches_list_scheduling():
+    rng = np.random.default_rng(1)
+    ds = rng.integers(1, 1000, 300).tolist()
+    plan = build_plan([StageCompleted(0, 0, "s", 300, 0, 1)], _tasks({0: ds}), {})
+    for slots in (1, 7, 64, 150, 300, 1000):  # heap path, two-wave snake (exact LPT) and n <= slots
+        assert simulate(plan, slots) == _greedy_lpt(ds, slots)
+    big = rng.integers(1, 1000, 5000).tolist()
+    plan = build_plan([StageCompleted(0, 0, "s", 5000, 0, 1)], _tasks({0: big}), {})
+    for slots in (16, 100):  # snake waves: a valid schedule, between the lower bound and Graham's bound
+        lower = max(max(big), sum(big) / slots)
+        assert lower <= simulate(plan, slots) <= sum(big) / slots + max(big)
+
+def test_dependencies_driver_gaps_and_overhead():
+    stages = [StageCompleted(0, 0, "a", 2, 100, 1_100), StageCompleted(1, 0, "b", 2, 100, 1_100),
+              StageCompleted(2, 0, "c", 2, 1_100, 2_100, parent_ids=[0, 1]),
+              StageCompleted(3, 0, "d", 1, 2_600, 3_600)]  # next job, submitted 500 ms after c completed
+    tasks = _tasks({0: [1_000, 1_000], 1: [1_000, 1_000], 2: [800, 800], 3: [1_000]}, finish={2: 1_900})
+    meta = {"start_time_ms": 0, "end_time_ms": 3_700}
+    plan = build_plan(stages, tasks, meta)
+    assert plan.observed_wall_ms == 3_700
+    # Replays the observed run on 4 slots: 100 lead + 1000 + (800 + 200 overhead) + 500 gap + 1000 + 100 tail.
+    assert simulate(plan, 4) == 3_700
+    # On 2 slots stages 0 and 1 no longer run side by side.
+    assert simulate(plan, 2) == 4_700
+
+def test_sweep_marks_pareto_frontier():
+    hour = 3_600_000
+    stages = [StageCompleted(0, 0, "serial", 1, 0, hour), StageCompleted(1, 0, "wide", 64, hour, 2 * hour)]
+    plan = build_plan(stages, _tasks({0: [hour], 1: [hour] * 64}), {})
+    clusters = [ClusterSpec(nodes=n, cores_per_node=8) for n in (1, 2, 4, 8, 16)] + [ClusterSpec(nodes=2, cores_per_node=4)]
+    results = sweep(plan, clusters, CostSpec(rate_per_node_hour=1.0))
+    assert [(r.nodes, r.runtime_seconds / 3600, r.estimated_cost) for r in results[:5]] == \
+           [(1, 9.0, 9.0), (2, 5.0, 10.0), (4, 3.0, 12.0), (8, 2.0, 16.0), (16, 2.0, 32.0)]
+    # 16 nodes only add idle slots; 2 x 4 matches 1 x 8 on runtime at twice the cost.
+    assert [r.pareto for r in results] == [True, True, True, True, False, False]
+
+def test_pareto_frontier_drops_dominated():
+    rs = [SizingResult(1, 4, 100.0, 0, 10.0, None), SizingResult(2, 4, 60.0, 0, 12.0, None),
+          SizingResult(3, 4, 60.0, 0, 15.0, None), SizingResult(4, 4, 80.0, 0, 20.0, None)]
+    assert [r.nodes for r in pareto_frontier(rs)] == [2, 1]
+
+def test_pareto_frontier_ranks_dbu_cost_and_falls_back_to_node_hours():
+    # Priced only in DBUs: the node rate is zero, so ranking on it would keep just the fastest size.
+    rs = [SizingResult(1, 4, 100.0, 1.0, 0.0, 5.0), SizingResult(2, 4, 60.0, 1.2, 0.0, 6.0),
+          SizingResult(4, 4, 55.0, 2.4, 0.0, 12.0)]
+    assert [r.nodes for r in pareto_frontier(rs)] == [4, 2, 1]
+    unpriced = [SizingResult(r.nodes, 4, r.runtime_seconds, r.node_hours, 0.0, None) for r in rs]
+    assert [r.nodes for r in pareto_frontier(unpriced)] == [4, 2, 1]
+    assert [r.nodes for r in pareto_frontier(unpriced + [SizingResult(8, 4, 58.0, 4.0, 0.0, None)])] == [4, 2, 1]
@@ -0,0 +1,44 @@
+import os
+import numpy as np
+import pytest
+from spark_opt.detectors import detect_skew
+from spark_opt.eventlog_reader import TaskTable, parse_eventlog
+from spark_opt.metrics import build_stage_metrics, merge_stage_sketches, sketch_stages
+from spark_opt.sketch import DDSketch
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "..", "samples", "sample_eventlog.jsonl")
+
+def test_percentiles_within_relative_accuracy():
+    rng = np.random.default_rng(3)
+    v = np.r_[np.zeros(50, dtype=np.int64), rng.lognormal(6, 2, 200_000).astype(np.int64)]
+    s = DDSketch.from_values(v, relative_accuracy=0.02)
+    for p in (0, 1, 25, 50, 90, 95, 99, 99.9, 100):
+        exact = np.percentile(v, p)
+        assert abs(s.percentile(p) - exact) <= 0.02 * exact * (1 + 1e-9)
+    assert (s.min, s.max, s.count, s.sum) == (0, v.max(), len(v), v.sum())
+    with pytest.raises(ValueError):
+        s.merge(DDSketch(0.01))
+
+def test_merge_is_exact():
+    v = np.random.default_rng(5).integers(0, 10**6, 10_000)
+    whole = DDSketch.from_values(v)
+    merged = DDSketch()
+    for part in np.array_split(v, 7)[::-1]:
+        merged.merge(DDSketch.from_values(part))
+    assert (merged.bins == whole.bins).all() and (merged.counts == whole.counts).all()
+    assert [merged.percentile(p) for p in (50, 95)] == [whole.percentile(p) for p in (50, 95)]
+
+def test_stage_sketches_merge_across_parts_and_feed_detectors():
+    stages, tasks, _ = parse_eventlog(SAMPLE)
+    whole = sketch_stages(tasks)
+    merged = {}
+    for idx in np.array_split(np.arange(len(tasks)), 4):
+        merge_stage_sketches(merged, sketch_stages(TaskTable({n: c[idx] for n, c in tasks.columns.items()})))
+    exact = build_stage_metrics(stages, tasks)[1]
+    approx = build_stage_metrics(stages, sketches=merged)[1]
+    assert approx == build_stage_metrics(stages, sketches=whole)[1]
+    for e, a in zip(exact, approx):
+        assert (a.task_max_ms, a.gc_pct, a.spill_mb, a.shuffle_read_mb) == (e.task_max_ms, e.gc_pct, e.spill_mb, e.shuffle_read_mb)
+        assert a.task_p95_ms == pytest.approx(e.task_p95_ms, rel=0.01)
+    assert [(f.code, f.stage_id, f.severity) for f in detect_skew(approx)] == \
+           [(f.code, f.stage_id, f.severity) for f in detect_skew(exact)]
@@ -0,0 +1,78 @@
+import json
+import spark_opt.detectors
+from spark_opt.config import SparkConf
+from spark_opt.detectors import detect_all
+from spark_opt.eventlog_reader import SQL_ADAPTIVE_UPDATE, SQL_EXECUTION_START, parse_eventlog, plan_nodes
+from spark_opt.metrics import build_stage_metrics
+from spark_opt.report import generate_markdown_report
+from spark_opt.sqlplan import attribute_operators
+from spark_opt.synth import SynthSpec, generate_eventlog
+from helpers import task_end
+
+def _node(name, accs, children=()):
+    return {"nodeName": name, "simpleString": f"{name} ...", "children": list(children),
+            "metrics": [{"name": f"m{a}", "accumulatorId": a, "metricType": "sum"} for a in accs]}
+
+def test_plan_walk_is_iterative_and_preorder():
+    plan = _node("leaf", [0])
+    for i in range(1, 5000):  # far deeper than the recursion limit
+        plan = _node(f"n{i}", [i], [plan])
+    names = [n for n, _, _ in plan_nodes(plan)]
+    assert len(names) == 5000 and names[0] == "n4999" and names[-1] == "leaf"
+    wide = _node("root", [], [_node("a", [1]), _node("b", [2], [_node("c", [3])])])
+    assert [n for n, _, _ in plan_nodes(wide)] == ["root", "a", "b", "c"]
+
+def _stage_done(sid, accs, n=4):
+    return {"Event": "SparkListenerStageCompleted", "Stage Info": {
+        "Stage ID": sid, "Stage Attempt ID": 0, "Stage Name": f"save at X.java:{sid}", "Number of Tasks": n,
+        "Submission Time": 0, "Completion Time": 1000,
+        "Accumulables": [{"ID": 1, "Name": "internal.metrics.executorRunTime", "Value": 9}]
+                       + [{"ID": a, "Name": f"m{a}", "Value": str(v)} for a, v in accs]}}
+
+def test_stages_map_to_operators_across_adaptive_replans(tmp_path):
+    scan = _node("Scan parquet db.orders", [10, 11])
+    exchange = _node("Exchange", [20, 21], [scan])
+    smj = _node("SortMergeJoin", [30], [_node("Sort", [40], [exchange])])
+    bhj = _node("BroadcastHashJoin", [50], [exchange])  # AQE switched the join; the exchange is reused
+    events = [{"Event": SQL_EXECUTION_START, "executionId": 7, "description": "nightly join",
+               "sparkPlanInfo": _node("WholeStageCodegen (1)", [5], [smj])},
+              {"Event": "SparkListenerJobStart", "Job ID": 0, "Stage Infos": [], "Properties": {"spark.sql.execution.id": "7"}},
+              task_end(0, 0, 3000), task_end(0, 1, 1000), _stage_done(0, [(10, 500), (20, 64), (5, 3)]),
+              {"Event": SQL_ADAPTIVE_UPDATE, "executionId": 7, "sparkPlanInfo": _node("WholeStageCodegen (2)", [6], [bhj])},
+              task_end(1, 2, 2000), _stage_done(1, [(21, 64), (50, 100), (6, 2)]),
+              task_end(2, 3, 500), _stage_done(2, [])]
+    path = tmp_path / "sql.jsonl"
+    path.write_text("\n".join(json.dumps(e) for e in events) + "\n")
+    stages, tasks, meta = parse_eventlog(str(path))
+    _, metrics = build_stage_metrics(stages, tasks)
+    sql = attribute_operators(metrics, meta)
+    assert sql.for_stage(0).name == "Scan parquet db.orders" and sql.for_stage(1).name == "BroadcastHashJoin"
+    assert sql.for_stage(2) is None and sql.unattributed_ms == 500
+    assert sorted(sql.operators[k].name for k in sql.stage_operators[(0, 0)]) == [
+        "Exchange", "Scan parquet db.orders", "WholeStageCodegen (1)"]
+    assert sql.operators["10"].task_time_ms == 4000 and sql.operators["10"].metrics == {"m10": 500}
+    assert sql.operators["20"].metrics == {"m20": 64, "m21": 64} and sql.executions == {7: "nightly join"}
+
+    # Byte-range parsing sees the plan and the stages in different parts and merges to the same result.
+    _, _, meta2 = parse_eventlog(str(path), workers=3, min_parallel_bytes=0)
+    assert {k: meta2[k] for k in ("sql_operators", "sql_metrics", "stage_accumulables")} == \
+           {k: meta[k] for k in ("sql_operators", "sql_metrics", "stage_accumulables")}
+
+def test_findings_and_report_name_operators(tmp_path, monkeypatch):
+    info = generate_eventlog(str(tmp_path / "a.jsonl"), SynthSpec(tasks=5000, stages=8, skew_stages=0.4, noise=0, seed=0))
+    stages, tasks, meta = parse_eventlog(info["path"])
+    _, metrics = build_stage_metrics(stages, tasks)
+    sql = attribute_operators(metrics, meta)
+    assert sql.unattributed_ms == 0
+    assert sum(o.task_time_ms for o in sql.operators.values()) == sum(s.task_time_ms for s in metrics)
+    assert {sql.for_stage(s.stage_id).name.split()[0] for s in metrics} == {"Scan", "SortMergeJoin", "HashAggregate"}
+    skew = [f for f in detect_all(metrics, SparkConf(), meta=meta) if f.code == "SKEW_DETECTED"]
+    assert [f.stage_id for f in skew] == info["skewed_stages"]
+    assert all(f.evidence["sql_operator"] in f.message for f in skew)
+    # The report attributes operators once and hands the result to the detectors.
+    calls = []
+    monkeypatch.setattr(spark_opt.detectors, "attribute_operators", lambda *a: calls.append(a) or attribute_operators(*a))
+    out = generate_markdown_report(info["path"], SparkConf(), str(tmp_path / "r.md"), use_cache=False)
+    content = open(out).read()
+    assert "## Time by SQL Operator" in content and not calls
+    assert skew[0].evidence["sql_operator"] in content
@@ -0,0 +1,35 @@
+import numpy as np
+from benchmarks.bench_suite import compare
+from spark_opt.config import SparkConf
+from spark_opt.detectors import detect_all
+from spark_opt.eventlog_reader import parse_eventlog
+from spark_opt.metrics import build_stage_metrics
+from spark_opt.synth import SynthSpec, generate_eventlog
+
+def test_generated_log_parses_with_planted_problems(tmp_path):
+    spec = SynthSpec(tasks=3000, stages=12, skew_stages=0.3, spill_stages=0.3, seed=7)
+    info = generate_eventlog(str(tmp_path / "a.jsonl"), spec)
+    stages, tasks, meta = parse_eventlog(info["path"])
+    assert len(tasks) == 3000 and len(stages) == 12 == info["stages"]
+    assert len(meta["jobs"]) == 3 and len(meta["executors"]) == spec.executors
+    _, metrics = build_stage_metrics(stages, tasks)
+    found = detect_all(metrics, SparkConf())
+    codes = lambda code: sorted(f.stage_id for f in found if f.code == code)
+    assert info["skewed_stages"] and codes("SKEW_DETECTED") == info["skewed_stages"]
+    assert info["spill_stages"] and codes("SPILL_DETECTED") == info["spill_stages"] == codes("GC_PRESSURE")
+
+    # Noise events change the file, never the parsed data.
+    quiet = generate_eventlog(str(tmp_path / "b.jsonl"), SynthSpec(**{**info["spec"], "noise": 0.0}))
+    assert quiet["events"] < info["events"]
+    _, tasks_quiet, _ = parse_eventlog(quiet["path"])
+    for name, col in tasks.columns.items():
+        np.testing.assert_array_equal(col, tasks_quiet[name])
+
+def test_benchmark_compare_flags_regressions():
+    ph = lambda tps, rss: {"tasks_per_s": tps, "rss_delta_mb": rss}
+    base = {"s": {"spec": {"tasks": 1}, "phases": {"parse": ph(100.0, 100.0), "metrics": ph(100.0, 10.0)}}}
+    ok = {"s": {"spec": {"tasks": 1}, "phases": {"parse": ph(80.0, 120.0), "metrics": ph(100.0, 40.0)}}}
+    assert compare(ok, base) == []
+    bad = {"s": {"spec": {"tasks": 1}, "phases": {"parse": ph(70.0, 100.0), "metrics": ph(100.0, 60.0)}}}
+    assert [p.split(":")[0] for p in compare(bad, base)] == ["s/parse", "s/metrics"]
+    assert compare({"s": {**bad["s"], "spec": {"tasks": 2}}}, base) == []  # spec changed: no comparable baseline
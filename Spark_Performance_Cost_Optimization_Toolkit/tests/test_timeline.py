@@ -0,0 +1,58 @@
+import json
+from spark_opt.detectors import detect_idle_executors, detect_serial_stage_chains
+from spark_opt.eventlog_reader import parse_eventlog
+from spark_opt.timeline import build_timeline, serial_stage_chains
+from helpers import task_end
+
+def _stage(sid, start, end, parents=()):
+    return {"Stage ID": sid, "Stage Attempt ID": 0, "Stage Name": f"s{sid}", "Number of Tasks": 1,
+            "Submission Time": start, "Completion Time": end, "Parent IDs": list(parents)}
+
+def _write_log(path):
+    ev = [{"Event": "SparkListenerApplicationStart", "App Name": "t", "App ID": "app-t", "Timestamp": 0}]
+    for ex in (1, 2):
+        ev.append({"Event": "SparkListenerExecutorAdded", "Timestamp": 0, "Executor ID": str(ex),
+                   "Executor Info": {"Host": f"h{ex}", "Total Cores": 4}})
+    # Job 0: stages 0 and 2 run in parallel, stage 1 needs both.
+    ev.append({"Event": "SparkListenerJobStart", "Job ID": 0, "Submission Time": 0,
+               "Stage Infos": [_stage(0, None, None), _stage(2, None, None), _stage(1, None, None, (0, 2))]})
+    ev += [task_end(0, i, 10_000) for i in range(4)] + [task_end(2, 4 + i, 30_000, executor=2) for i in range(4)]
+    ev += [{"Event": "SparkListenerStageCompleted", "Stage Info": _stage(0, 0, 10_000)},
+           {"Event": "SparkListenerStageCompleted", "Stage Info": _stage(2, 0, 30_000)}]
+    ev += [task_end(1, 8 + i, 50_000, 30_000, 1 + i % 2) for i in range(8)]
+    ev += [{"Event": "SparkListenerStageCompleted", "Stage Info": _stage(1, 30_000, 50_000, (0, 2))},
+           {"Event": "SparkListenerJobEnd", "Job ID": 0, "Completion Time": 50_000}]
+    # Jobs 1-3: independent single-task stages submitted one after another.
+    for j, sid in enumerate((3, 4, 5), start=1):
+        start = 100_000 + (j - 1) * 60_000
+        ev += [{"Event": "SparkListenerJobStart", "Job ID": j, "Submission Time": start, "Stage Infos": [_stage(sid, None, None)]},
+               task_end(sid, 100 + sid, start + 60_000, start),
+               {"Event": "SparkListenerStageCompleted", "Stage Info": _stage(sid, start, start + 60_000)},
+               {"Event": "SparkListenerJobEnd", "Job ID": j, "Completion Time": start + 60_000}]
+    ev += [{"Event": "SparkListenerExecutorRemoved", "Timestamp": 300_000, "Executor ID": "2", "Removed Reason": "idle"},
+           {"Event": "SparkListenerApplicationEnd", "Timestamp": 400_000}]
+    path.write_text("\n".join(json.dumps(e) for e in ev) + "\n")
+    return str(path)
+
+def test_occupancy_critical_path_and_serial_chain(tmp_path):
+    tl = build_timeline(*parse_eventlog(_write_log(tmp_path / "app.jsonl")))
+    assert int(tl.busy_cores.max()) == 8
+    assert tl.busy_core_ms == 4 * 10_000 + 4 * 30_000 + 8 * 20_000 + 3 * 60_000
+    assert tl.capacity_core_ms == 4 * 400_000 + 4 * 300_000
+    assert [(e.executor_id, e.host, e.cores, e.inferred) for e in tl.executors] == [(1, "h1", 4, False), (2, "h2", 4, False)]
+
+    job0 = next(cp for cp in tl.critical_paths if cp.job_id == 0)
+    assert (job0.stage_ids, job0.length_ms, job0.wall_ms) == ([2, 1], 50_000, 50_000)
+    assert job0.slack_ms == {0: 20_000, 2: 0, 1: 0}
+
+    [chain] = serial_stage_chains(tl)
+    assert chain.stage_ids == [3, 4, 5] and chain.independent and chain.mean_utilization < 0.2
+    assert [f.code for f in detect_serial_stage_chains(tl)] == ["SERIAL_STAGE_CHAIN"]
+    assert detect_idle_executors(tl) == []  # 2.3 idle core-hours is below the default floor
+    assert detect_idle_executors(tl, min_idle_core_ms=0)[0].severity == "ERROR"
+
+def test_parallel_parse_keeps_jobs_and_executors(tmp_path):
+    path = _write_log(tmp_path / "app.jsonl")
+    serial, parallel = parse_eventlog(path), parse_eventlog(path, workers=3, min_parallel_bytes=0)
+    assert serial[2] == parallel[2] and len(serial[2]["jobs"]) == 4
+    assert build_timeline(*serial).critical_paths == build_timeline(*parallel).critical_paths
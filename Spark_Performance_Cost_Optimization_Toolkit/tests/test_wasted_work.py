@@ -0,0 +1,69 @@
+from spark_opt.config import SparkConf
+from spark_opt.cost_model import stage_costs
+from spark_opt.eventlog_reader import (TASK_FAILED, TASK_KILLED, TASK_LOST, TASK_SUCCESS, TASK_SUPERSEDED,
+                                       StageCompleted, TaskEnd, TaskTable, task_outcome)
+from spark_opt.findings import StageTable
+from spark_opt.metrics import build_stage_metrics, sketch_stages
+from spark_opt.recommendations import recommend
+from spark_opt.wasted import detect_wasted_work
+from helpers import make_stage
+
+def test_task_outcomes_from_end_reason():
+    assert task_outcome({"Reason": "Success"}, {}) == TASK_SUCCESS
+    assert task_outcome({"Reason": "FetchFailed"}, {"Failed": True}) == TASK_FAILED
+    assert task_outcome({"Reason": "ExecutorLostFailure"}, {}) == TASK_FAILED
+    assert task_outcome({"Reason": "TaskKilled", "Kill Reason": "Stage cancelled"}, {}) == TASK_KILLED
+    assert task_outcome({"Reason": "TaskKilled", "Kill Reason": "another attempt succeeded"}, {}) == TASK_SUPERSEDED
+    assert task_outcome({"Reason": "TaskCommitDenied"}, {}) == TASK_SUPERSEDED
+    assert task_outcome({"Reason": "Resubmitted"}, {}) == TASK_LOST
+    assert task_outcome(None, {"Killed": True}) == TASK_KILLED and task_outcome(None, {}) == TASK_SUCCESS
+
+def test_wasted_time_per_stage_attempt_exact_and_sketched():
+    rows = [TaskEnd(1, 0, 0, 1000, 0, 0, 0, 0, 0, outcome=TASK_FAILED),
+            TaskEnd(1, 0, 1, 400, 0, 0, 0, 0, 0, outcome=TASK_KILLED),
+            TaskEnd(1, 1, 2, 1000, 0, 0, 0, 0, 0),
+            TaskEnd(1, 1, 3, 900, 0, 0, 0, 0, 0),
+            TaskEnd(1, 1, 4, 300, 0, 0, 0, 0, 0, outcome=TASK_SUPERSEDED, speculative=1),
+            TaskEnd(1, 1, 3, 900, 0, 0, 0, 0, 0, outcome=TASK_LOST)]
+    stages = [StageCompleted(1, 0, "s", 2, 0, 2000), StageCompleted(1, 1, "s", 2, 3000, 5000)]
+    tasks = TaskTable.from_records(rows)
+    _, (a0, a1) = build_stage_metrics(stages, tasks)
+    assert (a0.failed_tasks, a0.failed_ms, a0.killed_tasks, a0.killed_ms, a0.wasted_ms) == (1, 1000, 1, 400, 1400)
+    assert (a1.speculative_tasks, a1.speculation_wasted_ms, a1.wasted_ms) == (1, 300, 1200)
+    assert a1.task_time_ms == 2200  # the Resubmitted marker repeats a run that is already counted
+    _, sketched = build_stage_metrics(stages, sketches=sketch_stages(tasks))
+    assert [(s.wasted_ms, s.task_time_ms) for s in sketched] == [(a0.wasted_ms, a0.task_time_ms), (a1.wasted_ms, a1.task_time_ms)]
+    costs = {c.attempt: c for c in stage_costs([a0, a1], rate_per_core_hour=3.6)}
+    assert costs[0].wasted_core_hours == 1400 / 3_600_000 and abs(costs[0].wasted_cost - 1400 / 1_000_000) < 1e-12
+
+    found = detect_wasted_work(StageTable([a0, a1]), SparkConf())
+    assert [(f.code, f.stage_id) for f in found] == [("STAGE_RETRIES", 1)]
+    assert found[0].evidence["attempts"] == 2 and found[0].evidence["wasted_ms"] == 2300
+
+def _stage(sid, **kw):
+    return make_stage(sid, **{"task_time_ms": 3_600_000, **kw})
+
+def test_failure_share_and_speculation_thresholds():
+    stages = [_stage(1, failed_tasks=30, failed_ms=200_000, wasted_ms=200_000),   # 5.6%: below 10%
+              _stage(2, failed_tasks=90, failed_ms=900_000, wasted_ms=900_000),   # 25%: ERROR
+              _stage(3, speculative_tasks=50, speculation_wasted_ms=700_000, wasted_ms=700_000)]  # 6.5% of all
+    found = detect_wasted_work(StageTable(stages), SparkConf(conf={"spark.speculation": "true"}))
+    assert [(f.code, f.stage_id, f.severity) for f in found] == [("STAGE_RETRIES", 2, "ERROR"),
+                                                                 ("SPECULATION_WASTE", None, "WARN")]
+    assert found[1].evidence["speculation"] is True and found[1].evidence["wasted_ms"] == 700_000
+    assert recommend(found[1:], SparkConf())[0].savings.core_hours_high > 0
+    assert detect_wasted_work(StageTable(stages), SparkConf(), speculation_pct_warn=0.05, min_wasted_ms=10**9) == []
+
+def test_synthetic_failed_and_speculative_attempts_are_counted(synthetic_app):
+    app = synthetic_app(tasks=6000, stages=6, skew_stages=0, spill_stages=0, failed_tasks=0.3, speculative_tasks=0.3, seed=3)
+    info = app.info
+    assert len(app.tasks) == info["tasks"] + info["failed_tasks"] + info["speculative_tasks"]
+    assert sum(s.failed_tasks for s in app.metrics) == info["failed_tasks"]
+    assert sum(s.speculative_tasks for s in app.metrics) == info["speculative_tasks"]
+
+def test_synthetic_retries_and_speculation_are_found(synthetic_app):
+    app = synthetic_app(tasks=6000, stages=6, skew_stages=0, spill_stages=0, failed_tasks=0.3, speculative_tasks=0.3, seed=3)
+    found = detect_wasted_work(StageTable(app.metrics), SparkConf())
+    big = [s.stage_id for s in app.metrics if s.failed_ms >= 60_000]  # smaller stages stay below min_wasted_ms
+    assert big and [f.stage_id for f in found if f.code == "STAGE_RETRIES"] == big
+    assert [f.code for f in found if f.code == "SPECULATION_WASTE"] == ["SPECULATION_WASTE"]
@@ -0,0 +1,77 @@
+import os
+from spark_opt.eventlog_reader import TaskTable, parse_eventlog
+from spark_opt.metrics import build_stage_metrics
+from spark_opt.watch import IncrementalAnalyzer, LogFollower, watch
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "..", "samples", "sample_eventlog.jsonl")
+
+def _batch_metrics():
+    stages, tasks, _ = parse_eventlog(SAMPLE)
+    return build_stage_metrics(stages, tasks)[1]
+
+def test_incremental_tail_matches_batch(tmp_path):
+    src = open(SAMPLE, "rb").read()
+    log = tmp_path / "app-001.inprogress"
+    log.write_bytes(b"")
+    follower, analyzer = LogFollower(str(log)), IncrementalAnalyzer()
+    codes = []
+    for i in range(0, len(src), 2500):  # appends cut lines in half
+        with open(log, "ab") as f:
+            f.write(src[i:i + 2500])
+        codes += [(f.code, f.stage_id) for f in analyzer.ingest(follower.read_lines())]
+    analyzer.ingest(follower.finish())
+    assert ("SKEW_DETECTED", 2) in codes
+    assert all(codes.count(c) <= 2 for c in codes)  # re-emitted only when WARN escalates to ERROR
+    for m in _batch_metrics():
+        assert analyzer.completed[(m.stage_id, m.attempt)] == m
+
+def test_follower_survives_rename_between_polls(tmp_path):
+    src = open(SAMPLE, "rb").read()
+    log = tmp_path / "app-001.inprogress"
+    log.write_bytes(src[:4000])
+    follower = LogFollower(str(log))
+    lines = follower.read_lines()
+    with open(log, "ab") as f:
+        f.write(src[4000:])
+    stale = follower._parts()
+    log.rename(tmp_path / "app-001")  # the application finished between the listing and the read
+    listings = iter([stale])
+    follower._parts = lambda: next(listings, None) or LogFollower._parts(follower)
+    lines += follower.read_lines() + follower.finish()
+    assert lines == src.splitlines()
+
+def test_watch_follows_rolling_parts(tmp_path):
+    lines = open(SAMPLE, "rb").read().splitlines(keepends=True)
+    d = tmp_path / "eventlog_v2_app-001"
+    d.mkdir()
+    (d / "events_1_app-001").write_bytes(b"".join(lines[:120]))
+    (d / "events_2_app-001").write_bytes(b"".join(lines[120:]) + b'\n{"Event":"SparkListenerApplicationEnd","Timestamp":1}\n')
+    found = []
+    analyzer = watch(str(d), found.append, interval_s=0.01, timeout_s=5)
+    assert analyzer.app_ended
+    assert {(f.code, f.stage_id) for f in found} >= {("SKEW_DETECTED", 2), ("SPILL_DETECTED", 2)}
+    for m in _batch_metrics():
+        assert analyzer.completed[(m.stage_id, m.attempt)] == m
+
+def test_sketch_mode_keeps_no_task_rows(tmp_path):
+    log = tmp_path / "app-001.inprogress"
+    log.write_bytes(open(SAMPLE, "rb").read())
+    analyzer = watch(str(log), lambda f: None, once=True, relative_accuracy=0.01)
+    for m in _batch_metrics():
+        got = analyzer.completed[(m.stage_id, m.attempt)]
+        assert got.task_max_ms == m.task_max_ms and abs(got.task_p50_ms - m.task_p50_ms) <= 0.01 * m.task_p50_ms
+    assert all(not isinstance(p, TaskTable) for p in analyzer._pending.values())
+
+def test_state_stays_bounded_on_a_long_log(tmp_path):
+    log = tmp_path / "app-001.inprogress"
+    log.write_bytes(open(SAMPLE, "rb").read())
+    follower, analyzer = LogFollower(str(log)), IncrementalAnalyzer(grace_stages=1, max_completed=2)
+    lines = follower.read_lines() + follower.finish()
+    for i in range(0, len(lines), 25):
+        analyzer.ingest(lines[i:i + 25])
+    batch = _batch_metrics()
+    assert list(analyzer.completed) == [(m.stage_id, m.attempt) for m in batch[-2:]]
+    assert len(analyzer._emitted) <= 2 and set(analyzer.meta) == {"app_id", "app_name", "start_time_ms", "end_time_ms"}
+    # A late task of a stage that has aged out is dropped, not tracked as a new running stage.
+    analyzer.ingest([lines[next(i for i, l in enumerate(lines) if b"SparkListenerTaskEnd" in l)]])
+    assert not analyzer.running and analyzer.late_tasks_dropped >= 1